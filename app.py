@@ -1,34 +1,83 @@
+import functools
+import hashlib
 import json
 import os
 import logging
 import requests
-import openai
-import copy
+import tempfile
+import threading
+import time
 import uuid
-from azure.identity import DefaultAzureCredential
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from base64 import b64encode
-from flask import Flask, Response, request, jsonify, send_from_directory
+from flask import Flask, Response, g, request, jsonify
 from dotenv import load_dotenv
 
+from backend import metrics, tracing
+from backend.admission import AdmissionController, AdmissionRejected, SharedTokenBucket, estimate_tokens
 from backend.auth.auth_utils import get_authenticated_user_details
+from backend.auth.token_cache import CachedTokenCredential
+from backend.answer_cache import AnswerCache, AnswerRecorder, answer_cache_key
+from backend.cache import SingleFlight, TTLCache
 from backend.history.cosmosdbservice import CosmosConversationClient
+from backend.history_budget import HistoryBudgeter
+from backend.settings import CompletionSettings, DataSourceSettings, FieldsMapping
+from backend.static_files import StaticFiles
+from backend.upstream.client import AzureOpenAIClient, parse_sse_json
+from backend.upstream import ndjson
+from backend.upstream.coalesce import DeltaCoalescer, paced
+from backend.upstream.hedge import Hedger
+from backend.upstream.pool import DeploymentPool
+from backend.upstream.relay import ChatRelay, ExtensionsRelay
+from backend.warmup import Warmup
 
 load_dotenv()
 
 app = Flask(__name__, static_folder="static")
 
 # Static Files
+STATIC_CACHE_MAX_FILE_SIZE = os.environ.get("STATIC_CACHE_MAX_FILE_SIZE", 1048576) # Bytes up to which a static file, and each compressed copy of it, is held in memory
+static_files = StaticFiles(app.static_folder, int(STATIC_CACHE_MAX_FILE_SIZE))
+
 @app.route("/")
 def index():
-    return app.send_static_file("index.html")
+    return static_files.serve("index.html")
 
 @app.route("/favicon.ico")
 def favicon():
-    return app.send_static_file('favicon.ico')
+    return static_files.serve("favicon.ico")
 
 @app.route("/assets/<path:path>")
 def assets(path):
-    return send_from_directory("static/assets", path)
+    return static_files.serve(f"assets/{path}")
+
+# Request metrics, served at /metrics, and a trace span per request
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.request_span = tracing.start_request_span(request.method, request.url_rule.rule if request.url_rule else "unmatched", request.headers)
+
+@app.after_request
+def record_request_duration(response):
+    started = g.get("request_started")
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.observe_request(route, request.method, response.status_code, time.perf_counter() - started)
+    g.request_status = response.status_code
+    return response
+
+@app.teardown_request
+def end_request_span(error=None):
+    # streamed answers end after this; their spans are children of the request's and close later
+    tracing.end_request_span(g.pop("request_span", None), g.get("request_status"), error)
+
+@app.route("/metrics")
+def prometheus_metrics():
+    if not METRICS_ENABLED or not metrics.enabled():
+        return jsonify({"error": "Metrics are not enabled"}), 404
+    data, content_type = metrics.render()
+    return Response(data, content_type=content_type)
 
 # Debug settings
 DEBUG = os.environ.get("DEBUG", "false")
@@ -36,6 +85,14 @@ DEBUG_LOGGING = DEBUG.lower() == "true"
 if DEBUG_LOGGING:
     logging.basicConfig(level=logging.DEBUG)
 
+# Metrics Settings
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true" # Serve Prometheus metrics at /metrics, needs prometheus_client
+
+# Tracing Settings
+TRACING_EXPORTER = os.environ.get("TRACING_EXPORTER", "") # console, file, memory or otlp; empty turns tracing off
+TRACING_FILE_PATH = os.environ.get("TRACING_FILE_PATH", "traces.jsonl") # Where the file exporter writes one JSON span per line
+tracing.configure(TRACING_EXPORTER, TRACING_FILE_PATH)
+
 # On Your Data Settings
 DATASOURCE_TYPE = os.environ.get("DATASOURCE_TYPE", "AzureCognitiveSearch")
 SEARCH_TOP_K = os.environ.get("SEARCH_TOP_K", 5)
@@ -57,6 +114,10 @@ AZURE_SEARCH_URL_COLUMN = os.environ.get("AZURE_SEARCH_URL_COLUMN")
 AZURE_SEARCH_VECTOR_COLUMNS = os.environ.get("AZURE_SEARCH_VECTOR_COLUMNS")
 AZURE_SEARCH_QUERY_TYPE = os.environ.get("AZURE_SEARCH_QUERY_TYPE")
 AZURE_SEARCH_PERMITTED_GROUPS_COLUMN = os.environ.get("AZURE_SEARCH_PERMITTED_GROUPS_COLUMN")
+AZURE_SEARCH_PERMITTED_GROUPS_CACHE_TTL = os.environ.get("AZURE_SEARCH_PERMITTED_GROUPS_CACHE_TTL", 300) # Seconds a user's group filter is reused, 0 disables the cache
+AZURE_SEARCH_PERMITTED_GROUPS_CACHE_SIZE = os.environ.get("AZURE_SEARCH_PERMITTED_GROUPS_CACHE_SIZE", 1000) # Users kept in the group filter cache per worker process
+AZURE_SEARCH_PERMITTED_GROUPS_CONNECT_TIMEOUT = os.environ.get("AZURE_SEARCH_PERMITTED_GROUPS_CONNECT_TIMEOUT", 5) # Seconds to open a connection to Microsoft Graph
+AZURE_SEARCH_PERMITTED_GROUPS_READ_TIMEOUT = os.environ.get("AZURE_SEARCH_PERMITTED_GROUPS_READ_TIMEOUT", 10) # Seconds to wait for each page of a user's groups
 AZURE_SEARCH_STRICTNESS = os.environ.get("AZURE_SEARCH_STRICTNESS", SEARCH_STRICTNESS)
 
 # AOAI Integration Settings
@@ -75,6 +136,22 @@ AZURE_OPENAI_MODEL_NAME = os.environ.get("AZURE_OPENAI_MODEL_NAME", "gpt-35-turb
 AZURE_OPENAI_EMBEDDING_ENDPOINT = os.environ.get("AZURE_OPENAI_EMBEDDING_ENDPOINT")
 AZURE_OPENAI_EMBEDDING_KEY = os.environ.get("AZURE_OPENAI_EMBEDDING_KEY")
 AZURE_OPENAI_EMBEDDING_NAME = os.environ.get("AZURE_OPENAI_EMBEDDING_NAME", "")
+AZURE_OPENAI_POOL_SIZE = os.environ.get("AZURE_OPENAI_POOL_SIZE", 10) # Max keep-alive connections to Azure OpenAI per worker process
+AZURE_OPENAI_HTTP2 = os.environ.get("AZURE_OPENAI_HTTP2", "false") # Requires the httpx[http2] package
+AZURE_OPENAI_CONNECT_TIMEOUT = os.environ.get("AZURE_OPENAI_CONNECT_TIMEOUT", 10) # Seconds to open a connection to Azure OpenAI
+AZURE_OPENAI_READ_TIMEOUT = os.environ.get("AZURE_OPENAI_READ_TIMEOUT", 120) # Seconds to wait for response headers or the next bytes of a response
+AZURE_OPENAI_DEPLOYMENTS = os.environ.get("AZURE_OPENAI_DEPLOYMENTS") # JSON list of {"endpoint" or "resource", "deployment", "key"} to balance requests across
+AZURE_OPENAI_UNHEALTHY_SECONDS = os.environ.get("AZURE_OPENAI_UNHEALTHY_SECONDS", 10) # Seconds a deployment in AZURE_OPENAI_DEPLOYMENTS is skipped after a 5xx or connection error
+AZURE_OPENAI_HEDGE_DELAY_MS = os.environ.get("AZURE_OPENAI_HEDGE_DELAY_MS", 0) # Resend a streamed request if no answer has started after this long, 0 disables
+AZURE_OPENAI_HEDGE_BUDGET = os.environ.get("AZURE_OPENAI_HEDGE_BUDGET", 0.05) # Max fraction of each route's streamed requests that are sent twice
+AZURE_OPENAI_ADMISSION_TPM = os.environ.get("AZURE_OPENAI_ADMISSION_TPM", 0) # Estimated tokens per minute admitted by all worker processes on the host, 0 disables
+AZURE_OPENAI_ADMISSION_MAX_WAIT = os.environ.get("AZURE_OPENAI_ADMISSION_MAX_WAIT", 10) # Seconds a request may queue for admission before it gets a 429; keep it short, a queued request holds its worker
+AZURE_OPENAI_ADMISSION_STATE_FILE = os.environ.get("AZURE_OPENAI_ADMISSION_STATE_FILE") or os.path.join(tempfile.gettempdir(), "aoai-admission.bucket") # Token bucket shared by the worker processes
+AZURE_OPENAI_ADMISSION_DATA_TOKENS = os.environ.get("AZURE_OPENAI_ADMISSION_DATA_TOKENS", 3000) # Tokens of retrieved documents charged per request with data
+AZURE_OPENAI_STREAM_READ_SIZE = os.environ.get("AZURE_OPENAI_STREAM_READ_SIZE", 4096) # Max bytes per socket read of a streamed answer
+AZURE_OPENAI_STREAM_COALESCE_MS = os.environ.get("AZURE_OPENAI_STREAM_COALESCE_MS", 0) # Merge answer deltas for up to this long into one frame, 0 disables
+AZURE_OPENAI_STREAM_COALESCE_BYTES = os.environ.get("AZURE_OPENAI_STREAM_COALESCE_BYTES", 0) # Merge answer deltas up to this much text into one frame, 0 disables
+AZURE_OPENAI_PROMPT_TOKEN_BUDGET = os.environ.get("AZURE_OPENAI_PROMPT_TOKEN_BUDGET", 0) # Max tokens of system message plus history sent per turn, 0 sends the whole history
 
 # CosmosDB Mongo vcore vector db Settings
 AZURE_COSMOSDB_MONGO_VCORE_CONNECTION_STRING = os.environ.get("AZURE_COSMOSDB_MONGO_VCORE_CONNECTION_STRING")  #This has to be secure string
@@ -99,6 +176,7 @@ AZURE_COSMOSDB_ACCOUNT = os.environ.get("AZURE_COSMOSDB_ACCOUNT")
 AZURE_COSMOSDB_CONVERSATIONS_CONTAINER = os.environ.get("AZURE_COSMOSDB_CONVERSATIONS_CONTAINER")
 AZURE_COSMOSDB_ACCOUNT_KEY = os.environ.get("AZURE_COSMOSDB_ACCOUNT_KEY")
 AZURE_COSMOSDB_ENABLE_FEEDBACK = os.environ.get("AZURE_COSMOSDB_ENABLE_FEEDBACK", "false").lower() == "true"
+AZURE_COSMOSDB_SAVE_STREAMED_ANSWERS = os.environ.get("AZURE_COSMOSDB_SAVE_STREAMED_ANSWERS", "false").lower() == "true" # /history/generate writes the streamed answer itself, so the client skips /history/update
 
 # Elasticsearch Integration Settings
 ELASTICSEARCH_ENDPOINT = os.environ.get("ELASTICSEARCH_ENDPOINT")
@@ -115,23 +193,52 @@ ELASTICSEARCH_VECTOR_COLUMNS = os.environ.get("ELASTICSEARCH_VECTOR_COLUMNS")
 ELASTICSEARCH_STRICTNESS = os.environ.get("ELASTICSEARCH_STRICTNESS", SEARCH_STRICTNESS)
 ELASTICSEARCH_EMBEDDING_MODEL_ID = os.environ.get("ELASTICSEARCH_EMBEDDING_MODEL_ID")
 
+# Local Retrieval Settings
+LOCAL_CHUNKS_PATH = os.environ.get("LOCAL_CHUNKS_PATH") # JSON lines written by scripts/chunk_documents.py
+LOCAL_SEARCH_QUERY_TYPE = os.environ.get("LOCAL_SEARCH_QUERY_TYPE", "simple") # simple, vector or vectorSimpleHybrid
+LOCAL_SEARCH_TOP_K = os.environ.get("LOCAL_SEARCH_TOP_K", SEARCH_TOP_K)
+LOCAL_SEARCH_ENABLE_IN_DOMAIN = os.environ.get("LOCAL_SEARCH_ENABLE_IN_DOMAIN", SEARCH_ENABLE_IN_DOMAIN)
+
+# Answer Cache Settings
+ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE_ENABLED", "false").lower() == "true"
+ANSWER_CACHE_TTL = os.environ.get("ANSWER_CACHE_TTL", 3600) # Seconds a streamed answer is replayed for identical questions
+ANSWER_CACHE_SIZE = os.environ.get("ANSWER_CACHE_SIZE", 1000) # Answers kept in memory per worker process
+ANSWER_CACHE_DISK_PATH = os.environ.get("ANSWER_CACHE_DISK_PATH") # Optional SQLite file shared by the workers on one host
+ANSWER_CACHE_DISK_SIZE = os.environ.get("ANSWER_CACHE_DISK_SIZE", 10000) # Answers kept in the SQLite file
+ANSWER_CACHE_SEED_FILE = os.environ.get("ANSWER_CACHE_SEED_FILE") # Optional JSON lines file of answers loaded at startup
+SINGLE_FLIGHT_ENABLED = os.environ.get("SINGLE_FLIGHT_ENABLED", "true").lower() == "true" # Identical non-streamed requests in flight share one Azure OpenAI call
+
+# Semantic Answer Cache Settings
+SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = os.environ.get("SEMANTIC_CACHE_THRESHOLD", 0.95) # Cosine similarity above which an earlier answer is replayed
+SEMANTIC_CACHE_TTL = os.environ.get("SEMANTIC_CACHE_TTL", 3600)
+SEMANTIC_CACHE_SIZE = os.environ.get("SEMANTIC_CACHE_SIZE", 1000) # Questions kept per worker process, across all scopes
+SEMANTIC_CACHE_EMBEDDER = os.environ.get("SEMANTIC_CACHE_EMBEDDER", "azure") # "azure", or "local" for the offline stand-in
+
+# Warm-up Settings
+WARMUP_ENABLED = os.environ.get("WARMUP_ENABLED", "false").lower() == "true" # Open upstream connections, fetch tokens and reach Cosmos DB at startup; /status reports progress
+WARMUP_CONNECTIONS = os.environ.get("WARMUP_CONNECTIONS", 4) # Connections opened to each Azure OpenAI deployment during warm-up
+WARMUP_TIMEOUT = os.environ.get("WARMUP_TIMEOUT", 30) # Seconds after which /status stops waiting on unfinished warm-up steps
+
 # Frontend Settings via Environment Variables
 AUTH_ENABLED = os.environ.get("AUTH_ENABLED", "true").lower() == "true"
 frontend_settings = { 
     "auth_enabled": AUTH_ENABLED, 
     "feedback_enabled": AZURE_COSMOSDB_ENABLE_FEEDBACK and AZURE_COSMOSDB_DATABASE not in [None, ""],
+    "answers_saved_by_server": AZURE_COSMOSDB_SAVE_STREAMED_ANSWERS and SHOULD_STREAM,
 }
 
-message_uuid = ""
-
 # Initialize a CosmosDB client with AAD auth and containers for Chat History
 cosmos_conversation_client = None
+cosmos_credential = None
 if AZURE_COSMOSDB_DATABASE and AZURE_COSMOSDB_ACCOUNT and AZURE_COSMOSDB_CONVERSATIONS_CONTAINER:
     try :
         cosmos_endpoint = f'https://{AZURE_COSMOSDB_ACCOUNT}.documents.azure.com:443/'
 
         if not AZURE_COSMOSDB_ACCOUNT_KEY:
-            credential = DefaultAzureCredential()
+            # azure.identity is slow to import, so only when a credential is needed
+            from azure.identity import DefaultAzureCredential
+            credential = cosmos_credential = CachedTokenCredential(DefaultAzureCredential())
         else:
             credential = AZURE_COSMOSDB_ACCOUNT_KEY
 
@@ -146,6 +253,132 @@ if AZURE_COSMOSDB_DATABASE and AZURE_COSMOSDB_ACCOUNT and AZURE_COSMOSDB_CONVERS
         logging.exception("Exception in CosmosDB initialization", e)
         cosmos_conversation_client = None
 
+def create_azure_openai_client(client_class=AzureOpenAIClient, pool_class=DeploymentPool):
+    # One client for AZURE_OPENAI_ENDPOINT/_RESOURCE and AZURE_OPENAI_MODEL, or a pool of them for
+    # AZURE_OPENAI_DEPLOYMENTS; entries leave out fields they share with the single-deployment settings
+    entries = json.loads(AZURE_OPENAI_DEPLOYMENTS) if AZURE_OPENAI_DEPLOYMENTS else [{}]
+    clients = []
+    for entry in entries:
+        endpoint = entry.get("endpoint") or (f"https://{entry['resource']}.openai.azure.com/" if entry.get("resource") else None)
+        clients.append(client_class(
+            base_url=endpoint or (AZURE_OPENAI_ENDPOINT if AZURE_OPENAI_ENDPOINT else f"https://{AZURE_OPENAI_RESOURCE}.openai.azure.com/"),
+            deployment=entry.get("deployment", AZURE_OPENAI_MODEL),
+            api_key=entry.get("key", AZURE_OPENAI_KEY),
+            pool_size=int(AZURE_OPENAI_POOL_SIZE),
+            http2=AZURE_OPENAI_HTTP2.lower() == "true",
+            read_size=int(AZURE_OPENAI_STREAM_READ_SIZE),
+            connect_timeout=float(AZURE_OPENAI_CONNECT_TIMEOUT),
+            read_timeout=float(AZURE_OPENAI_READ_TIMEOUT)
+        ))
+    if not AZURE_OPENAI_DEPLOYMENTS:
+        return clients[0]
+    return pool_class(clients, unhealthy_seconds=float(AZURE_OPENAI_UNHEALTHY_SECONDS))
+
+# Initialize one pooled Azure OpenAI client shared by every chat and title request
+azure_openai_client = create_azure_openai_client()
+
+def create_token_bucket():
+    # Azure OpenAI enforces its per-minute quota over 10 second windows, so the bucket holds 10 seconds of tokens
+    tokens_per_minute = float(AZURE_OPENAI_ADMISSION_TPM)
+    return SharedTokenBucket(tokens_per_minute / 60, tokens_per_minute / 6, AZURE_OPENAI_ADMISSION_STATE_FILE)
+
+# Optional admission control, queueing requests per user to stay under the Azure OpenAI quota
+admission_controller = AdmissionController(create_token_bucket(), float(AZURE_OPENAI_ADMISSION_MAX_WAIT)) if float(AZURE_OPENAI_ADMISSION_TPM) > 0 else None
+
+# Optional hedging of streamed answers that are slow to start
+hedger = Hedger(float(AZURE_OPENAI_HEDGE_DELAY_MS), float(AZURE_OPENAI_HEDGE_BUDGET)) if float(AZURE_OPENAI_HEDGE_DELAY_MS) > 0 else None
+
+# Identical non-streamed requests wait on the one already in flight instead of calling again
+single_flight = SingleFlight() if SINGLE_FLIGHT_ENABLED else None
+
+# Conversation titles are generated off the request path, a few at a time per worker process
+title_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="title")
+
+# /history/generate writes the conversation and question here while the answer is requested
+history_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="history")
+
+# Optional cache of finished answers, replayed for identical questions without calling Azure OpenAI
+answer_cache = None
+if ANSWER_CACHE_ENABLED:
+    answer_cache = AnswerCache(
+        ttl_seconds=float(ANSWER_CACHE_TTL),
+        max_entries=int(ANSWER_CACHE_SIZE),
+        disk_path=ANSWER_CACHE_DISK_PATH,
+        disk_max_entries=int(ANSWER_CACHE_DISK_SIZE)
+    )
+
+def build_embedder(local=False):
+    ## embeds text for the semantic cache and local vector search; local hashes words in-process.
+    ## These modules need numpy, which is imported only when one of these features is on.
+    from backend.embeddings import AzureOpenAIEmbedder, HashingEmbedder
+    if local:
+        return HashingEmbedder()
+    timeouts = {"connect_timeout": float(AZURE_OPENAI_CONNECT_TIMEOUT), "read_timeout": float(AZURE_OPENAI_READ_TIMEOUT)}
+    if AZURE_OPENAI_EMBEDDING_ENDPOINT:
+        return AzureOpenAIEmbedder(AZURE_OPENAI_EMBEDDING_ENDPOINT, AZURE_OPENAI_EMBEDDING_KEY, **timeouts)
+    if AZURE_OPENAI_EMBEDDING_NAME:
+        return AzureOpenAIEmbedder(azure_openai_client.url("embeddings", "2023-05-15", deployment=AZURE_OPENAI_EMBEDDING_NAME), azure_openai_client.default_headers["api-key"], **timeouts)
+    return None
+
+# Optional cache of answers to paraphrased questions, used with data sources
+semantic_answer_cache = None
+if SEMANTIC_CACHE_ENABLED:
+    from backend.semantic_cache import SemanticAnswerCache
+    semantic_embedder = build_embedder(local=SEMANTIC_CACHE_EMBEDDER == "local")
+    if semantic_embedder is None:
+        raise ValueError("SEMANTIC_CACHE_ENABLED needs AZURE_OPENAI_EMBEDDING_ENDPOINT or AZURE_OPENAI_EMBEDDING_NAME, or SEMANTIC_CACHE_EMBEDDER=local")
+    semantic_answer_cache = SemanticAnswerCache(
+        semantic_embedder,
+        threshold=float(SEMANTIC_CACHE_THRESHOLD),
+        ttl_seconds=float(SEMANTIC_CACHE_TTL),
+        max_entries=int(SEMANTIC_CACHE_SIZE)
+    )
+
+# DATASOURCE_TYPE Local: chunks retrieved in-process from an index built at startup
+local_search_index = None
+local_embedder = None
+if DATASOURCE_TYPE == "Local" and LOCAL_CHUNKS_PATH:
+    from backend.local_search import QUERY_TYPES, LocalSearchIndex
+    if LOCAL_SEARCH_QUERY_TYPE not in QUERY_TYPES:
+        raise ValueError(f"LOCAL_SEARCH_QUERY_TYPE must be one of {', '.join(QUERY_TYPES)}, not {LOCAL_SEARCH_QUERY_TYPE}")
+    local_search_index = LocalSearchIndex.from_jsonl(LOCAL_CHUNKS_PATH)
+    if LOCAL_SEARCH_QUERY_TYPE != "simple":
+        local_embedder = build_embedder()
+        if not local_search_index.has_vectors or local_embedder is None:
+            raise ValueError(f"LOCAL_SEARCH_QUERY_TYPE {LOCAL_SEARCH_QUERY_TYPE} needs a contentVector on every chunk and AZURE_OPENAI_EMBEDDING_ENDPOINT or AZURE_OPENAI_EMBEDDING_NAME")
+    logging.info(f"Loaded {len(local_search_index.chunks)} chunks from {LOCAL_CHUNKS_PATH}")
+
+# Security trimming: keep-alive connection to Microsoft Graph and each user's compiled group filter
+graph_session = requests.Session()
+user_filter_cache = TTLCache(
+    ttl_seconds=float(AZURE_SEARCH_PERMITTED_GROUPS_CACHE_TTL),
+    max_entries=int(AZURE_SEARCH_PERMITTED_GROUPS_CACHE_SIZE)
+)
+
+def check_cosmos():
+    if not cosmos_conversation_client.ensure():
+        raise RuntimeError("CosmosDB is not reachable")
+
+def warmup_steps():
+    # What a cold instance would otherwise do on its first requests
+    steps = {"upstream": lambda: azure_openai_client.warm(int(WARMUP_CONNECTIONS))}
+    if cosmos_credential:
+        steps["aad_token"] = lambda: cosmos_credential.get_token(f"https://{AZURE_COSMOSDB_ACCOUNT}.documents.azure.com/.default")
+    if cosmos_conversation_client:
+        steps["cosmos"] = check_cosmos
+    if AZURE_SEARCH_PERMITTED_GROUPS_COLUMN:
+        steps["graph"] = lambda: graph_session.head("https://graph.microsoft.com/v1.0/")
+    steps["static"] = static_files.precompress
+    return steps
+
+# Optional background warm-up; /status answers 503 until it is done so traffic waits for it
+warmup = Warmup(float(WARMUP_TIMEOUT))
+if WARMUP_ENABLED:
+    warmup.start(warmup_steps())
+else:
+    # the frontend build is still compressed at startup, off the request path
+    threading.Thread(target=static_files.precompress, name="static-precompress", daemon=True).start()
+
 
 def is_chat_model():
     if 'gpt-4' in AZURE_OPENAI_MODEL_NAME.lower() or AZURE_OPENAI_MODEL_NAME.lower() in ['gpt-35-turbo-4k', 'gpt-35-turbo-16k']:
@@ -162,6 +395,16 @@ def should_use_data():
         if DEBUG_LOGGING:
             logging.debug("Using Azure CosmosDB Mongo vcore")
         return True
+
+    if ELASTICSEARCH_ENDPOINT and ELASTICSEARCH_ENCODED_API_KEY and ELASTICSEARCH_INDEX:
+        if DEBUG_LOGGING:
+            logging.debug("Using Elasticsearch")
+        return True
+
+    if DATASOURCE_TYPE == "Local" and LOCAL_CHUNKS_PATH:
+        if DEBUG_LOGGING:
+            logging.debug("Using local retrieval")
+        return True
     
     return False
 
@@ -175,38 +418,35 @@ def parse_multi_columns(columns: str) -> list:
     else:
         return columns.split(",")
 
-def fetchUserGroups(userToken, nextLink=None):
-    # Recursively fetch group membership
-    if nextLink:
-        endpoint = nextLink
-    else:
-        endpoint = "https://graph.microsoft.com/v1.0/me/transitiveMemberOf?$select=id"
-    
+@metrics.timed(metrics.GRAPH_GROUP_FETCH_SECONDS)
+@tracing.traced("fetchUserGroups")
+def fetchUserGroups(userToken):
+    # Fetch group membership, following the nextLink pages; raises if Graph fails or times out
+    endpoint = "https://graph.microsoft.com/v1.0/me/transitiveMemberOf?$select=id"
     headers = {
         'Authorization': "bearer " + userToken
     }
-    try :
-        r = requests.get(endpoint, headers=headers)
+    userGroups = []
+    page = 0
+    while endpoint:
+        page += 1
+        with tracing.span("GET /me/transitiveMemberOf", kind="client", page=page) as span:
+            r = graph_session.get(endpoint, headers=headers, timeout=(float(AZURE_SEARCH_PERMITTED_GROUPS_CONNECT_TIMEOUT), float(AZURE_SEARCH_PERMITTED_GROUPS_READ_TIMEOUT)))
+            if span:
+                span.set_attribute("http.status_code", r.status_code)
         if r.status_code != 200:
             if DEBUG_LOGGING:
                 logging.error(f"Error fetching user groups: {r.status_code} {r.text}")
-            return []
-        
+            raise Exception(f"Microsoft Graph returned status {r.status_code}")
+
         r = r.json()
-        if "@odata.nextLink" in r:
-            nextLinkData = fetchUserGroups(userToken, r["@odata.nextLink"])
-            r['value'].extend(nextLinkData)
-        
-        return r['value']
-    except Exception as e:
-        logging.error(f"Exception in fetchUserGroups: {e}")
-        return []
+        userGroups.extend(r['value'])
+        endpoint = r.get("@odata.nextLink")
 
+    return userGroups
 
-def generateFilterString(userToken):
-    # Get list of groups user is a member of
-    userGroups = fetchUserGroups(userToken)
 
+def buildFilterString(userGroups):
     # Construct filter string
     if not userGroups:
         logging.debug("No user groups found")
@@ -215,21 +455,34 @@ def generateFilterString(userToken):
     return f"{AZURE_SEARCH_PERMITTED_GROUPS_COLUMN}/any(g:search.in(g, '{group_ids}'))"
 
 
+def generateFilterString(userToken, userPrincipalId=None):
+    # Keyed by the signed in user and bound to their token, so a forged principal header
+    # can't read someone else's entry; concurrent turns for one user share a single Graph fetch
+    cache_key = (userPrincipalId, hashlib.sha256(userToken.encode("utf-8")).hexdigest())
+    try:
+        return user_filter_cache.get_or_load(cache_key, lambda: buildFilterString(fetchUserGroups(userToken)))
+    except Exception as e:
+        logging.error(f"Exception in fetchUserGroups: {e}")
+        # not cached, the next message asks Graph again
+        return buildFilterString([])
 
-def prepare_body_headers_with_data(request):
-    request_messages = request.json["messages"]
 
-    body = {
-        "messages": request_messages,
-        "temperature": float(AZURE_OPENAI_TEMPERATURE),
-        "max_tokens": int(AZURE_OPENAI_MAX_TOKENS),
-        "top_p": float(AZURE_OPENAI_TOP_P),
-        "stop": AZURE_OPENAI_STOP_SEQUENCE.split("|") if AZURE_OPENAI_STOP_SEQUENCE else None,
-        "stream": SHOULD_STREAM,
-        "dataSources": []
-    }
+def parse_fields_mapping(content_columns, title_column, url_column, filename_column, vector_columns):
+    return FieldsMapping(
+        content_fields=tuple(parse_multi_columns(content_columns)) if content_columns else (),
+        title_field=title_column if title_column else None,
+        url_field=url_column if url_column else None,
+        filepath_field=filename_column if filename_column else None,
+        vector_fields=tuple(parse_multi_columns(vector_columns)) if vector_columns else ()
+    )
 
+
+def build_datasource_settings():
+    # Build the dataSources entry once at startup; a request only adds its security filter
     if DATASOURCE_TYPE == "AzureCognitiveSearch":
+        if not (AZURE_SEARCH_SERVICE and AZURE_SEARCH_INDEX and AZURE_SEARCH_KEY):
+            raise ValueError("AZURE_SEARCH_SERVICE, AZURE_SEARCH_INDEX and AZURE_SEARCH_KEY are required for DATASOURCE_TYPE AzureCognitiveSearch")
+
         # Set query type
         query_type = "simple"
         if AZURE_SEARCH_QUERY_TYPE:
@@ -237,192 +490,240 @@ def prepare_body_headers_with_data(request):
         elif AZURE_SEARCH_USE_SEMANTIC_SEARCH.lower() == "true" and AZURE_SEARCH_SEMANTIC_SEARCH_CONFIG:
             query_type = "semantic"
 
-        # Set filter
-        filter = None
-        userToken = None
-        if AZURE_SEARCH_PERMITTED_GROUPS_COLUMN:
-            userToken = request.headers.get('X-MS-TOKEN-AAD-ACCESS-TOKEN', "")
-            if DEBUG_LOGGING:
-                logging.debug(f"USER TOKEN is {'present' if userToken else 'not present'}")
-
-            filter = generateFilterString(userToken)
-            if DEBUG_LOGGING:
-                logging.debug(f"FILTER: {filter}")
-
-        body["dataSources"].append(
-            {
-                "type": "AzureCognitiveSearch",
-                "parameters": {
-                    "endpoint": f"https://{AZURE_SEARCH_SERVICE}.search.windows.net",
-                    "key": AZURE_SEARCH_KEY,
-                    "indexName": AZURE_SEARCH_INDEX,
-                    "fieldsMapping": {
-                        "contentFields": parse_multi_columns(AZURE_SEARCH_CONTENT_COLUMNS) if AZURE_SEARCH_CONTENT_COLUMNS else [],
-                        "titleField": AZURE_SEARCH_TITLE_COLUMN if AZURE_SEARCH_TITLE_COLUMN else None,
-                        "urlField": AZURE_SEARCH_URL_COLUMN if AZURE_SEARCH_URL_COLUMN else None,
-                        "filepathField": AZURE_SEARCH_FILENAME_COLUMN if AZURE_SEARCH_FILENAME_COLUMN else None,
-                        "vectorFields": parse_multi_columns(AZURE_SEARCH_VECTOR_COLUMNS) if AZURE_SEARCH_VECTOR_COLUMNS else []
-                    },
-                    "inScope": True if AZURE_SEARCH_ENABLE_IN_DOMAIN.lower() == "true" else False,
-                    "topNDocuments": int(AZURE_SEARCH_TOP_K),
-                    "queryType": query_type,
-                    "semanticConfiguration": AZURE_SEARCH_SEMANTIC_SEARCH_CONFIG if AZURE_SEARCH_SEMANTIC_SEARCH_CONFIG else "",
-                    "roleInformation": AZURE_OPENAI_SYSTEM_MESSAGE,
-                    "filter": filter,
-                    "strictness": int(AZURE_SEARCH_STRICTNESS)
-                }
-            })
+        connection = (
+            ("endpoint", f"https://{AZURE_SEARCH_SERVICE}.search.windows.net"),
+            ("key", AZURE_SEARCH_KEY),
+            ("indexName", AZURE_SEARCH_INDEX)
+        )
+        fields_mapping = parse_fields_mapping(AZURE_SEARCH_CONTENT_COLUMNS, AZURE_SEARCH_TITLE_COLUMN, AZURE_SEARCH_URL_COLUMN, AZURE_SEARCH_FILENAME_COLUMN, AZURE_SEARCH_VECTOR_COLUMNS)
+        in_scope = AZURE_SEARCH_ENABLE_IN_DOMAIN.lower() == "true"
+        top_k = AZURE_SEARCH_TOP_K
+        strictness = AZURE_SEARCH_STRICTNESS
+        options = (
+            ("semanticConfiguration", AZURE_SEARCH_SEMANTIC_SEARCH_CONFIG if AZURE_SEARCH_SEMANTIC_SEARCH_CONFIG else ""),
+            ("filter", None)
+        )
     elif DATASOURCE_TYPE == "AzureCosmosDB":
+        if not (AZURE_COSMOSDB_MONGO_VCORE_DATABASE and AZURE_COSMOSDB_MONGO_VCORE_CONTAINER and AZURE_COSMOSDB_MONGO_VCORE_INDEX and AZURE_COSMOSDB_MONGO_VCORE_CONNECTION_STRING):
+            raise ValueError("AZURE_COSMOSDB_MONGO_VCORE_CONNECTION_STRING, _DATABASE, _CONTAINER and _INDEX are required for DATASOURCE_TYPE AzureCosmosDB")
+
         # Set query type
         query_type = "vector"
 
-        body["dataSources"].append(
-            {
-                "type": "AzureCosmosDB",
-                "parameters": {
-                    "connectionString": AZURE_COSMOSDB_MONGO_VCORE_CONNECTION_STRING,
-                    "indexName": AZURE_COSMOSDB_MONGO_VCORE_INDEX,
-                    "databaseName": AZURE_COSMOSDB_MONGO_VCORE_DATABASE,
-                    "containerName": AZURE_COSMOSDB_MONGO_VCORE_CONTAINER,                    
-                    "fieldsMapping": {
-                        "contentFields": parse_multi_columns(AZURE_COSMOSDB_MONGO_VCORE_CONTENT_COLUMNS) if AZURE_COSMOSDB_MONGO_VCORE_CONTENT_COLUMNS else [],
-                        "titleField": AZURE_COSMOSDB_MONGO_VCORE_TITLE_COLUMN if AZURE_COSMOSDB_MONGO_VCORE_TITLE_COLUMN else None,
-                        "urlField": AZURE_COSMOSDB_MONGO_VCORE_URL_COLUMN if AZURE_COSMOSDB_MONGO_VCORE_URL_COLUMN else None,
-                        "filepathField": AZURE_COSMOSDB_MONGO_VCORE_FILENAME_COLUMN if AZURE_COSMOSDB_MONGO_VCORE_FILENAME_COLUMN else None,
-                        "vectorFields": parse_multi_columns(AZURE_COSMOSDB_MONGO_VCORE_VECTOR_COLUMNS) if AZURE_COSMOSDB_MONGO_VCORE_VECTOR_COLUMNS else []
-                    },
-                    "inScope": True if AZURE_COSMOSDB_MONGO_VCORE_ENABLE_IN_DOMAIN.lower() == "true" else False,
-                    "topNDocuments": int(AZURE_COSMOSDB_MONGO_VCORE_TOP_K),
-                    "strictness": int(AZURE_COSMOSDB_MONGO_VCORE_STRICTNESS),
-                    "queryType": query_type,
-                    "roleInformation": AZURE_OPENAI_SYSTEM_MESSAGE
-                }
-            }
+        connection = (
+            ("connectionString", AZURE_COSMOSDB_MONGO_VCORE_CONNECTION_STRING),
+            ("indexName", AZURE_COSMOSDB_MONGO_VCORE_INDEX),
+            ("databaseName", AZURE_COSMOSDB_MONGO_VCORE_DATABASE),
+            ("containerName", AZURE_COSMOSDB_MONGO_VCORE_CONTAINER)
         )
-
+        fields_mapping = parse_fields_mapping(AZURE_COSMOSDB_MONGO_VCORE_CONTENT_COLUMNS, AZURE_COSMOSDB_MONGO_VCORE_TITLE_COLUMN, AZURE_COSMOSDB_MONGO_VCORE_URL_COLUMN, AZURE_COSMOSDB_MONGO_VCORE_FILENAME_COLUMN, AZURE_COSMOSDB_MONGO_VCORE_VECTOR_COLUMNS)
+        in_scope = AZURE_COSMOSDB_MONGO_VCORE_ENABLE_IN_DOMAIN.lower() == "true"
+        top_k = AZURE_COSMOSDB_MONGO_VCORE_TOP_K
+        strictness = AZURE_COSMOSDB_MONGO_VCORE_STRICTNESS
+        options = ()
     elif DATASOURCE_TYPE == "Elasticsearch":
-        body["dataSources"].append(
-            {
-                "messages": request_messages,
-                "temperature": float(AZURE_OPENAI_TEMPERATURE),
-                "max_tokens": int(AZURE_OPENAI_MAX_TOKENS),
-                "top_p": float(AZURE_OPENAI_TOP_P),
-                "stop": AZURE_OPENAI_STOP_SEQUENCE.split("|") if AZURE_OPENAI_STOP_SEQUENCE else None,
-                "stream": SHOULD_STREAM,
-                "dataSources": [
-                    {
-                        "type": "AzureCognitiveSearch",
-                        "parameters": {
-                            "endpoint": ELASTICSEARCH_ENDPOINT,
-                            "encodedApiKey": ELASTICSEARCH_ENCODED_API_KEY,
-                            "indexName": ELASTICSEARCH_INDEX,
-                            "fieldsMapping": {
-                                "contentFields": parse_multi_columns(ELASTICSEARCH_CONTENT_COLUMNS) if ELASTICSEARCH_CONTENT_COLUMNS else [],
-                                "titleField": ELASTICSEARCH_TITLE_COLUMN if ELASTICSEARCH_TITLE_COLUMN else None,
-                                "urlField": ELASTICSEARCH_URL_COLUMN if ELASTICSEARCH_URL_COLUMN else None,
-                                "filepathField": ELASTICSEARCH_FILENAME_COLUMN if ELASTICSEARCH_FILENAME_COLUMN else None,
-                                "vectorFields": parse_multi_columns(ELASTICSEARCH_VECTOR_COLUMNS) if ELASTICSEARCH_VECTOR_COLUMNS else []
-                            },
-                            "inScope": True if ELASTICSEARCH_ENABLE_IN_DOMAIN.lower() == "true" else False,
-                            "topNDocuments": int(ELASTICSEARCH_TOP_K),
-                            "queryType": ELASTICSEARCH_QUERY_TYPE,
-                            "roleInformation": AZURE_OPENAI_SYSTEM_MESSAGE,
-                            "embeddingEndpoint": AZURE_OPENAI_EMBEDDING_ENDPOINT,
-                            "embeddingKey": AZURE_OPENAI_EMBEDDING_KEY,
-                            "embeddingModelId": ELASTICSEARCH_EMBEDDING_MODEL_ID,
-                            "strictness": int(ELASTICSEARCH_STRICTNESS)
-                        }
-                    }
-                ]
-            }
+        if not (ELASTICSEARCH_ENDPOINT and ELASTICSEARCH_ENCODED_API_KEY and ELASTICSEARCH_INDEX):
+            raise ValueError("ELASTICSEARCH_ENDPOINT, ELASTICSEARCH_ENCODED_API_KEY and ELASTICSEARCH_INDEX are required for DATASOURCE_TYPE Elasticsearch")
+
+        # Elasticsearch sends its own embedding settings
+        query_type = ELASTICSEARCH_QUERY_TYPE
+
+        connection = (
+            ("endpoint", ELASTICSEARCH_ENDPOINT),
+            ("encodedApiKey", ELASTICSEARCH_ENCODED_API_KEY),
+            ("indexName", ELASTICSEARCH_INDEX)
+        )
+        fields_mapping = parse_fields_mapping(ELASTICSEARCH_CONTENT_COLUMNS, ELASTICSEARCH_TITLE_COLUMN, ELASTICSEARCH_URL_COLUMN, ELASTICSEARCH_FILENAME_COLUMN, ELASTICSEARCH_VECTOR_COLUMNS)
+        in_scope = ELASTICSEARCH_ENABLE_IN_DOMAIN.lower() == "true"
+        top_k = ELASTICSEARCH_TOP_K
+        strictness = ELASTICSEARCH_STRICTNESS
+        options = (
+            ("embeddingEndpoint", AZURE_OPENAI_EMBEDDING_ENDPOINT),
+            ("embeddingKey", AZURE_OPENAI_EMBEDDING_KEY),
+            ("embeddingModelId", ELASTICSEARCH_EMBEDDING_MODEL_ID)
         )
     else:
-        raise Exception(f"DATASOURCE_TYPE is not configured or unknown: {DATASOURCE_TYPE}")
+        raise ValueError(f"DATASOURCE_TYPE is not configured or unknown: {DATASOURCE_TYPE}")
 
-    if "vector" in query_type.lower():
+    if "vector" in query_type.lower() and DATASOURCE_TYPE != "Elasticsearch":
         if AZURE_OPENAI_EMBEDDING_NAME:
-            body["dataSources"][0]["parameters"]["embeddingDeploymentName"] = AZURE_OPENAI_EMBEDDING_NAME
+            options += (("embeddingDeploymentName", AZURE_OPENAI_EMBEDDING_NAME),)
         else:
-            body["dataSources"][0]["parameters"]["embeddingEndpoint"] = AZURE_OPENAI_EMBEDDING_ENDPOINT
-            body["dataSources"][0]["parameters"]["embeddingKey"] = AZURE_OPENAI_EMBEDDING_KEY
+            options += (("embeddingEndpoint", AZURE_OPENAI_EMBEDDING_ENDPOINT), ("embeddingKey", AZURE_OPENAI_EMBEDDING_KEY))
+
+    return DataSourceSettings(
+        type=DATASOURCE_TYPE,
+        connection=connection,
+        fields_mapping=fields_mapping,
+        in_scope=in_scope,
+        top_n_documents=int(top_k),
+        strictness=int(strictness),
+        query_type=query_type,
+        role_information=AZURE_OPENAI_SYSTEM_MESSAGE,
+        options=options
+    )
 
-    if DEBUG_LOGGING:
-        body_clean = copy.deepcopy(body)
-        if body_clean["dataSources"][0]["parameters"].get("key"):
-            body_clean["dataSources"][0]["parameters"]["key"] = "*****"
-        if body_clean["dataSources"][0]["parameters"].get("connectionString"):
-            body_clean["dataSources"][0]["parameters"]["connectionString"] = "*****"
-        if body_clean["dataSources"][0]["parameters"].get("embeddingKey"):
-            body_clean["dataSources"][0]["parameters"]["embeddingKey"] = "*****"
-            
-        logging.debug(f"REQUEST BODY: {json.dumps(body_clean, indent=4)}")
 
-    headers = {
-        'Content-Type': 'application/json',
-        'api-key': AZURE_OPENAI_KEY,
-        "x-ms-useragent": "GitHubSampleWebApp/PublicAPI/3.0.0"
+## Built and validated once at startup, then shared read-only by every request;
+## bad settings fail here instead of on the first user
+COMPLETION_SETTINGS = CompletionSettings.from_env_values(
+    AZURE_OPENAI_TEMPERATURE,
+    AZURE_OPENAI_MAX_TOKENS,
+    AZURE_OPENAI_TOP_P,
+    AZURE_OPENAI_STOP_SEQUENCE,
+    SHOULD_STREAM
+)
+COMPLETION_BODY = COMPLETION_SETTINGS.as_body()
+history_budgeter = None
+if int(AZURE_OPENAI_PROMPT_TOKEN_BUDGET) > 0:
+    history_budgeter = HistoryBudgeter(
+        prompt_budget=int(AZURE_OPENAI_PROMPT_TOKEN_BUDGET),
+        system_message=AZURE_OPENAI_SYSTEM_MESSAGE,
+        max_tokens=COMPLETION_SETTINGS.max_tokens,
+        model_name=AZURE_OPENAI_MODEL_NAME
+    )
+DATASOURCE_SETTINGS = build_datasource_settings() if should_use_data() and DATASOURCE_TYPE != "Local" else None
+# The api-key comes from the client, which may be any deployment in AZURE_OPENAI_DEPLOYMENTS
+REQUEST_HEADERS = {
+    'Content-Type': 'application/json',
+    "x-ms-useragent": "GitHubSampleWebApp/PublicAPI/3.0.0"
+}
+
+
+def prepare_body_headers_with_data(request_body, request_headers):
+    if DATASOURCE_SETTINGS is None:
+        raise Exception(f"DATASOURCE_TYPE is not configured or unknown: {DATASOURCE_TYPE}")
+
+    overrides = {}
+    if DATASOURCE_TYPE == "AzureCognitiveSearch" and AZURE_SEARCH_PERMITTED_GROUPS_COLUMN:
+        # Set filter
+        userToken = request_headers.get('X-MS-TOKEN-AAD-ACCESS-TOKEN', "")
+        if DEBUG_LOGGING:
+            logging.debug(f"USER TOKEN is {'present' if userToken else 'not present'}")
+
+        filter = generateFilterString(userToken, request_headers.get('X-Ms-Client-Principal-Id'))
+        if DEBUG_LOGGING:
+            logging.debug(f"FILTER: {filter}")
+
+        overrides["filter"] = filter
+
+    body = {
+        "messages": request_body["messages"],
+        **COMPLETION_BODY,
+        "dataSources": [DATASOURCE_SETTINGS.as_body(**overrides)]
     }
 
-    return body, headers
+    if DEBUG_LOGGING:
+        logging.debug(f"REQUEST BODY: {json.dumps({**body, 'dataSources': [DATASOURCE_SETTINGS.redacted_body(**overrides)]}, indent=4)}")
+
+    return body, REQUEST_HEADERS
 
 
-def stream_with_data(body, headers, endpoint, history_metadata={}):
-    s = requests.Session()
+def parse_stream_line_with_data(line):
+    # Parse one SSE line from the extensions endpoint, None means there is nothing to relay
+    if not line:
+        return None
+    if AZURE_OPENAI_PREVIEW_API_VERSION == '2023-06-01-preview':
+        return ndjson.loads(line.lstrip(b'data:'))
     try:
-        with s.post(endpoint, json=body, headers=headers, stream=True) as r:
-            for line in r.iter_lines(chunk_size=10):
-                response = {
-                    "id": "",
-                    "model": "",
-                    "created": 0,
-                    "object": "",
-                    "choices": [{
-                        "messages": []
-                    }],
-                    "apim-request-id": "",
-                    'history_metadata': history_metadata
-                }
-                if line:
-                    if AZURE_OPENAI_PREVIEW_API_VERSION == '2023-06-01-preview':
-                        lineJson = json.loads(line.lstrip(b'data:').decode('utf-8'))
-                    else:
-                        try:
-                            rawResponse = json.loads(line.lstrip(b'data:').decode('utf-8'))
-                            lineJson = formatApiResponseStreaming(rawResponse)
-                        except json.decoder.JSONDecodeError:
-                            continue
-
-                    if 'error' in lineJson:
-                        yield format_as_ndjson(lineJson)
-                    response["id"] = message_uuid
-                    response["model"] = lineJson["model"]
-                    response["created"] = lineJson["created"]
-                    response["object"] = lineJson["object"]
-                    response["apim-request-id"] = r.headers.get('apim-request-id')
-
-                    role = lineJson["choices"][0]["messages"][0]["delta"].get("role")
-
-                    if role == "tool":
-                        response["choices"][0]["messages"].append(lineJson["choices"][0]["messages"][0]["delta"])
-                        yield format_as_ndjson(response)
-                    elif role == "assistant": 
-                        if response['apim-request-id'] and DEBUG_LOGGING: 
-                            logging.debug(f"RESPONSE apim-request-id: {response['apim-request-id']}")
-                        response["choices"][0]["messages"].append({
-                            "role": "assistant",
-                            "content": ""
-                        })
-                        yield format_as_ndjson(response)
-                    else:
-                        deltaText = lineJson["choices"][0]["messages"][0]["delta"]["content"]
-                        if deltaText != "[DONE]":
-                            response["choices"][0]["messages"].append({
-                                "role": "assistant",
-                                "content": deltaText
-                            })
-                            yield format_as_ndjson(response)
+        rawResponse = ndjson.loads(line.lstrip(b'data:'))
+    except json.decoder.JSONDecodeError:
+        return None
+    return formatApiResponseStreaming(rawResponse)
+
+def format_stream_response_with_data(lineJson, apim_request_id, history_metadata={}, message_id="", encoder=None):
+    # Convert one parsed streaming response into NDJSON frames for the client. With the stream's
+    # FrameEncoder, assistant frames are rendered from its template instead of a new dict.
+    if encoder and lineJson and 'error' not in lineJson:
+        delta = lineJson["choices"][0]["messages"][0]["delta"]
+        role = delta.get("role")
+        if role == "assistant":
+            if apim_request_id and DEBUG_LOGGING:
+                logging.debug(f"RESPONSE apim-request-id: {apim_request_id}")
+            yield encoder.content_frame(lineJson["model"], lineJson["created"], lineJson["object"], "")
+            return
+        if role != "tool":
+            if delta["content"] != "[DONE]":
+                yield encoder.content_frame(lineJson["model"], lineJson["created"], lineJson["object"], delta["content"])
+            return
+
+    response = {
+        "id": "",
+        "model": "",
+        "created": 0,
+        "object": "",
+        "choices": [{
+            "messages": []
+        }],
+        "apim-request-id": "",
+        'history_metadata': history_metadata
+    }
+    if lineJson:
+        if 'error' in lineJson:
+            yield format_as_ndjson(lineJson)
+        response["id"] = message_id
+        response["model"] = lineJson["model"]
+        response["created"] = lineJson["created"]
+        response["object"] = lineJson["object"]
+        response["apim-request-id"] = apim_request_id
+
+        role = lineJson["choices"][0]["messages"][0]["delta"].get("role")
+
+        if role == "tool":
+            response["choices"][0]["messages"].append(lineJson["choices"][0]["messages"][0]["delta"])
+            yield format_as_ndjson(response)
+        elif role == "assistant": 
+            if response['apim-request-id'] and DEBUG_LOGGING: 
+                logging.debug(f"RESPONSE apim-request-id: {response['apim-request-id']}")
+            response["choices"][0]["messages"].append({
+                "role": "assistant",
+                "content": ""
+            })
+            yield format_as_ndjson(response)
+        else:
+            deltaText = lineJson["choices"][0]["messages"][0]["delta"]["content"]
+            if deltaText != "[DONE]":
+                response["choices"][0]["messages"].append({
+                    "role": "assistant",
+                    "content": deltaText
+                })
+                yield format_as_ndjson(response)
+
+def post_answer(operation, api_version, body, headers=None, route="default"):
+    # Send an answer request; streamed answers are hedged when AZURE_OPENAI_HEDGE_DELAY_MS is set
+    if hedger and body.get("stream"):
+        return hedger.post(azure_openai_client, operation, api_version, body, headers, route)
+    return azure_openai_client.post(operation, api_version, body, headers)
+
+def relay_for_data(history_metadata={}, message_id="", recorder=None, timer=None, admission=None):
+    # The relay of an answer streamed with data, by the Flask and Quart apps alike
+    coalescer = DeltaCoalescer(int(AZURE_OPENAI_STREAM_COALESCE_MS), int(AZURE_OPENAI_STREAM_COALESCE_BYTES))
+    return ExtensionsRelay(format_stream_response_with_data, history_metadata, message_id, coalescer, recorder, timer, admission)
+
+def relay_without_data(history_metadata={}, message_id="", recorder=None, timer=None, admission=None):
+    return ChatRelay(format_stream_response_without_data, history_metadata, message_id, recorder, timer, admission)
+
+def relay_with_data(lines, relay):
+    # Relay parsed extensions lines, also when the coalescing window runs out between two of them
+    for lineJson in paced(lines, relay.coalescer):
+        yield from relay.flush() if lineJson is None else relay.push(lineJson)
+    yield from relay.finish()
+
+def stream_with_data(body, headers, history_metadata={}, message_id="", recorder=None, timer=None, admission=None):
+    # timer is created by the request handler, so the answer's span belongs to the request's trace
+    relay = relay_for_data(history_metadata, message_id, recorder, timer or metrics.StreamTimer("with_data"), admission)
+    try:
+        with relay.timer.attached():
+            r = post_answer("extensions/chat/completions", AZURE_OPENAI_PREVIEW_API_VERSION, body, headers, route="conversation_with_data")
+        with r:
+            relay.begin(r.headers.get('apim-request-id'))
+            lines = (parse_stream_line_with_data(line) for line in r.iter_lines())
+            yield from relay_with_data((lineJson for lineJson in lines if lineJson is not None), relay)
     except Exception as e:
-        yield format_as_ndjson({"error" + str(e)})
+        relay.fail()
+        yield format_as_ndjson({"error": str(e)})
+    finally:
+        relay.close()
 
 def formatApiResponseNoStreaming(rawResponse):
     if 'error' in rawResponse:
@@ -495,18 +796,23 @@ def formatApiResponseStreaming(rawResponse):
 
     return response
 
-def conversation_with_data(request_body):
-    body, headers = prepare_body_headers_with_data(request)
-    base_url = AZURE_OPENAI_ENDPOINT if AZURE_OPENAI_ENDPOINT else f"https://{AZURE_OPENAI_RESOURCE}.openai.azure.com/"
-    endpoint = f"{base_url}openai/deployments/{AZURE_OPENAI_MODEL}/extensions/chat/completions?api-version={AZURE_OPENAI_PREVIEW_API_VERSION}"
+def conversation_with_data(request_body, message_id, writer=None):
+    if DATASOURCE_TYPE == "Local":
+        return conversation_with_local_data(request_body, message_id, writer)
+
+    body, headers = prepare_body_headers_with_data(request_body, request.headers)
     history_metadata = request_body.get("history_metadata", {})
 
     if not SHOULD_STREAM:
-        r = requests.post(endpoint, headers=headers, json=body)
-        status_code = r.status_code
-        r = r.json()
+        def load():
+            with azure_openai_client.post("extensions/chat/completions", AZURE_OPENAI_PREVIEW_API_VERSION, body, headers) as response:
+                return response.status_code, response.json()
+
+        admission = admit(request_body, int(AZURE_OPENAI_ADMISSION_DATA_TOKENS))
+        status_code, r = complete_once(body, load)
+        settle_admission(admission, r)
         if AZURE_OPENAI_PREVIEW_API_VERSION == "2023-06-01-preview":
-            r['history_metadata'] = history_metadata
+            r = {**r, 'history_metadata': history_metadata}
             return Response(format_as_ndjson(r), status=status_code)
         else:
             result = formatApiResponseNoStreaming(r)
@@ -514,40 +820,248 @@ def conversation_with_data(request_body):
             return Response(format_as_ndjson(result), status=status_code)
 
     else:
-        return Response(stream_with_data(body, headers, endpoint, history_metadata), mimetype='text/event-stream')
+        answer, recorder = lookup_answer(body, semantic=True)
+        if answer:
+            return Response(replay_then_write(replay_answer_with_data(answer, history_metadata, message_id), answer, writer), mimetype='text/event-stream')
+        admission = admit(request_body, int(AZURE_OPENAI_ADMISSION_DATA_TOKENS))
+        recorder = with_writer(recorder, writer)
+        return Response(stream_with_data(body, headers, history_metadata, message_id, recorder, metrics.StreamTimer("with_data"), admission), mimetype='text/event-stream')
+
+def prepare_body_with_local_data(request_body):
+    # Retrieve the top chunks for the last user turn and ground a plain chat completion on them.
+    # Returns the body and the tool message content: the citations, as the extensions API sends them.
+    messages = [message for message in request_body["messages"] if message and message["role"] in ("user", "assistant")]
+    query = next((message["content"] for message in reversed(messages) if message["role"] == "user"), "")
+    query_type = LOCAL_SEARCH_QUERY_TYPE
+    query_vector = None
+    if local_embedder:
+        try:
+            query_vector = local_embedder.embed(query)
+        except Exception as e:
+            # without the question's embedding, keyword search still grounds the answer
+            logging.warning(f"Embedding the question failed, using keyword search: {e}")
+            query_type = "simple"
+    results = local_search_index.search(query, int(LOCAL_SEARCH_TOP_K), query_type, query_vector)
+
+    citations = []
+    documents = []
+    for i, (chunk, score) in enumerate(results, start=1):
+        citations.append({
+            "content": chunk["content"],
+            "id": chunk.get("id"),
+            "title": chunk.get("title"),
+            "filepath": chunk.get("filepath"),
+            "url": chunk.get("url"),
+            "metadata": chunk.get("metadata"),
+            "chunk_id": chunk.get("chunk_id")
+        })
+        documents.append(f"[doc{i}] {chunk.get('title') or ''}\n{chunk['content']}")
+
+    system_message = f"{AZURE_OPENAI_SYSTEM_MESSAGE}\n\nAnswer using the retrieved documents below and cite the ones you use as [doc1], [doc2] and so on."
+    if LOCAL_SEARCH_ENABLE_IN_DOMAIN.lower() == "true":
+        system_message += " If the documents don't contain the answer, say that the requested information is not available in the retrieved data."
+    system_message += "\n\nRetrieved documents:\n" + ("\n\n".join(documents) if documents else "(none)")
 
-def stream_without_data(response, history_metadata={}):
-    responseText = ""
-    for line in response:
-        if line["choices"]:
-            deltaText = line["choices"][0]["delta"].get('content')
-        else:
-            deltaText = ""
-        if deltaText and deltaText != "[DONE]":
-            responseText = deltaText
+    body = {
+        "messages": [{"role": "system", "content": system_message}] + [{"role": message["role"], "content": message["content"]} for message in messages],
+        **COMPLETION_BODY
+    }
+    tool_content = json.dumps({"citations": citations, "intent": json.dumps([query])})
 
-        response_obj = {
-            "id": message_uuid,
-            "model": line["model"],
-            "created": line["created"],
-            "object": line["object"],
-            "choices": [{
-                "messages": [{
-                    "role": "assistant",
-                    "content": responseText
-                }]
-            }],
-            "history_metadata": history_metadata
-        }
-        yield format_as_ndjson(response_obj)
+    if DEBUG_LOGGING:
+        logging.debug(f"LOCAL RETRIEVAL: {len(citations)} chunks for {query!r}")
 
+    return body, tool_content
 
-def conversation_without_data(request_body):
-    openai.api_type = "azure"
-    openai.api_base = AZURE_OPENAI_ENDPOINT if AZURE_OPENAI_ENDPOINT else f"https://{AZURE_OPENAI_RESOURCE}.openai.azure.com/"
-    openai.api_version = "2023-08-01-preview"
-    openai.api_key = AZURE_OPENAI_KEY
+def parse_local_stream_line(line, tool_content=None, recorder=None):
+    # Adapt one parsed chat/completions chunk to extensions lines; tool_content, the retrieved
+    # citations, is sent ahead of the first chunk that has a choice
+    if line is None or not line["choices"]:
+        return []
+    lines = []
+    if tool_content is not None:
+        lines.append(formatApiResponseStreaming({**line, "choices": [{"delta": {"context": {"messages": [{"role": "tool", "content": tool_content}]}}}]}))
+    choice = line["choices"][0]
+    delta = choice["delta"]
+    if choice.get("finish_reason") == "content_filter" and recorder:
+        recorder.failed = True
+    end_turn = choice.get("finish_reason") is not None and not delta.get("content")
+    if delta.get("role") or delta.get("content") or end_turn:
+        lines.append(formatApiResponseStreaming({**line, "choices": [{"delta": delta, "end_turn": end_turn}]}))
+    return lines
+
+def local_stream_parser(tool_content, recorder=None):
+    # parse_local_stream_line for the raw lines of one stream, sending the citations only once
+    def parse(line):
+        nonlocal tool_content
+        lines = parse_local_stream_line(parse_sse_json(line), tool_content, recorder)
+        if lines:
+            tool_content = None
+        return lines
+    return parse
+
+def stream_with_local_data(response, tool_content, history_metadata={}, message_id="", recorder=None, timer=None, admission=None):
+    relay = relay_for_data(history_metadata, message_id, recorder, timer, admission)
+    parse = local_stream_parser(tool_content, recorder)
+    try:
+        with response:
+            relay.begin(response.headers.get('apim-request-id'))
+            yield from relay_with_data((lineJson for line in response.iter_lines() for lineJson in parse(line)), relay)
+    except Exception as e:
+        relay.fail()
+        yield format_as_ndjson({"error": str(e)})
+    finally:
+        relay.close()
+
+def conversation_with_local_data(request_body, message_id, writer=None):
+    body, tool_content = prepare_body_with_local_data(request_body)
+    history_metadata = request_body.get("history_metadata", {})
+
+    answer, recorder = lookup_answer(body, semantic=True)
+    if answer:
+        return Response(replay_then_write(replay_answer_with_data(answer, history_metadata, message_id), answer, writer), mimetype='text/event-stream')
+    # the retrieved chunks are known here, so they are charged as they are
+    admission = admit(request_body, len(tool_content) // 4)
+
+    if not SHOULD_STREAM:
+        def load():
+            with azure_openai_client.post("chat/completions", "2023-08-01-preview", body) as response:
+                response.raise_for_status()
+                completion = response.json()
+            completion["choices"][0]["message"]["context"] = {"messages": [{"role": "tool", "content": tool_content}]}
+            return response.status_code, completion
+
+        status_code, completion = complete_once(body, load)
+        settle_admission(admission, completion)
+        result = formatApiResponseNoStreaming(completion)
+        result['history_metadata'] = history_metadata
+        return Response(format_as_ndjson(result), status=status_code)
+    else:
+        timer = metrics.StreamTimer("local_data")
+        with timer.attached():
+            response = post_answer("chat/completions", "2023-08-01-preview", body, route="conversation_with_local_data")
+        response.raise_for_status()
+        return Response(stream_with_local_data(response, tool_content, history_metadata, message_id, with_writer(recorder, writer), timer, admission), mimetype='text/event-stream')
+
+def format_stream_response_without_data(line, previous_text="", history_metadata={}, message_id="", encoder=None):
+    # Convert one chat completions chunk into an NDJSON frame, returning the text to carry forward
+    if line["choices"]:
+        deltaText = line["choices"][0]["delta"].get('content')
+    else:
+        deltaText = ""
+    responseText = deltaText if deltaText and deltaText != "[DONE]" else previous_text
+    if encoder:
+        return responseText, encoder.content_frame(line["model"], line["created"], line["object"], responseText)
+
+    response_obj = {
+        "id": message_id,
+        "model": line["model"],
+        "created": line["created"],
+        "object": line["object"],
+        "choices": [{
+            "messages": [{
+                "role": "assistant",
+                "content": responseText
+            }]
+        }],
+        "history_metadata": history_metadata
+    }
+    return responseText, format_as_ndjson(response_obj)
 
+def stream_without_data(response, history_metadata={}, message_id="", recorder=None, timer=None, admission=None):
+    relay = relay_without_data(history_metadata, message_id, recorder, timer, admission)
+    try:
+        with response:
+            for line in response.iter_lines():
+                line = parse_sse_json(line)
+                if line is not None:
+                    yield from relay.push(line)
+        yield from relay.finish()
+    except Exception:
+        relay.fail()
+        raise
+    finally:
+        relay.close()
+
+
+def complete_once(body, load):
+    # load() sends a non-streamed request and returns what it parsed; with single flight on,
+    # callers sending the same body at the same time share the first caller's result, so they
+    # must copy it before adding anything of their own
+    if single_flight is None:
+        return load()
+    return single_flight.do(answer_cache_key(body), load)
+
+
+def lookup_answer(body, semantic=False):
+    ## returns (cached answer, None) on a hit and (None, recorder) on a miss; both are None when
+    ## the answer caches are off. Only streamed answers are cached and replayed.
+    ## semantic also looks for paraphrases of the last user turn, which costs an embedding call.
+    use_semantic = semantic and semantic_answer_cache is not None
+    if not SHOULD_STREAM or not (answer_cache or use_semantic):
+        return None, None
+
+    recorder = AnswerRecorder()
+    if answer_cache:
+        key = answer_cache_key(body)
+        answer = answer_cache.get(key)
+        if answer:
+            return answer, None
+        recorder.add_target(answer_cache, key)
+
+    if use_semantic:
+        try:
+            key = semantic_answer_cache.key(body)
+        except Exception as e:
+            logging.warning(f"Semantic cache lookup failed: {e}")
+            key = None
+        if key:
+            answer = semantic_answer_cache.get(key)
+            if answer:
+                return answer, None
+            recorder.add_target(semantic_answer_cache, key)
+
+    return None, recorder
+
+
+def with_writer(recorder, writer):
+    ## the recorder to relay a streamed answer with, also handing the answer to writer if one is set
+    if writer is None:
+        return recorder
+    recorder = recorder or AnswerRecorder()
+    recorder.add_writer(writer)
+    return recorder
+
+
+def replay_answer_with_data(answer, history_metadata={}, message_id=""):
+    ## the frames stream_with_data produces for an answer, built from the cache
+    line = {"model": answer["model"], "created": int(time.time()), "object": answer["object"]}
+    deltas = [{"role": "assistant"}, {"content": answer["content"]}]
+    if answer.get("tool") is not None:
+        deltas.insert(0, {"role": "tool", "content": answer["tool"]})
+    frames = []
+    for delta in deltas:
+        frames.extend(format_stream_response_with_data({**line, "choices": [{"messages": [{"delta": delta}]}]}, "", history_metadata, message_id))
+    return frames
+
+
+def replay_answer_without_data(answer, history_metadata={}, message_id=""):
+    ## the frame stream_without_data produces for an answer, built from the cache
+    line = {"model": answer["model"], "created": int(time.time()), "object": answer["object"], "choices": [{"delta": {"content": answer["content"]}}]}
+    return [format_stream_response_without_data(line, "", history_metadata, message_id)[1]]
+
+
+def replay_then_write(frames, answer, writer=None):
+    ## relays a cached answer's frames, then hands the answer to writer as a streamed answer's
+    ## recorder does, so its history writes run after the replay rather than before it
+    try:
+        yield from frames
+    finally:
+        if writer:
+            writer(answer, False)
+
+
+def prepare_body_without_data(request_body):
     request_messages = request_body["messages"]
     messages = [
         {
@@ -563,28 +1077,38 @@ def conversation_without_data(request_body):
                 "content": message["content"]
             })
 
-    response = openai.ChatCompletion.create(
-        engine=AZURE_OPENAI_MODEL,
-        messages = messages,
-        temperature=float(AZURE_OPENAI_TEMPERATURE),
-        max_tokens=int(AZURE_OPENAI_MAX_TOKENS),
-        top_p=float(AZURE_OPENAI_TOP_P),
-        stop=AZURE_OPENAI_STOP_SEQUENCE.split("|") if AZURE_OPENAI_STOP_SEQUENCE else None,
-        stream=SHOULD_STREAM
-    )
+    return {
+        "messages": messages,
+        **COMPLETION_BODY
+    }
 
+
+def conversation_without_data(request_body, message_id, writer=None):
+    body = prepare_body_without_data(request_body)
     history_metadata = request_body.get("history_metadata", {})
 
+    answer, recorder = lookup_answer(body)
+    if answer:
+        return Response(replay_then_write(replay_answer_without_data(answer, history_metadata, message_id), answer, writer), mimetype='text/event-stream')
+    admission = admit(request_body)
+
     if not SHOULD_STREAM:
+        def load():
+            with azure_openai_client.post("chat/completions", "2023-08-01-preview", body) as response:
+                response.raise_for_status()
+                return response.json()
+
+        completion = complete_once(body, load)
+        settle_admission(admission, completion)
         response_obj = {
-            "id": message_uuid,
-            "model": response.model,
-            "created": response.created,
-            "object": response.object,
+            "id": message_id,
+            "model": completion["model"],
+            "created": completion["created"],
+            "object": completion["object"],
             "choices": [{
                 "messages": [{
                     "role": "assistant",
-                    "content": response.choices[0].message.content
+                    "content": completion["choices"][0]["message"]["content"]
                 }]
             }],
             "history_metadata": history_metadata
@@ -592,21 +1116,60 @@ def conversation_without_data(request_body):
 
         return jsonify(response_obj), 200
     else:
-        return Response(stream_without_data(response, history_metadata), mimetype='text/event-stream')
+        timer = metrics.StreamTimer("without_data")
+        with timer.attached():
+            response = post_answer("chat/completions", "2023-08-01-preview", body, route="conversation_without_data")
+        response.raise_for_status()
+        return Response(stream_without_data(response, history_metadata, message_id, with_writer(recorder, writer), timer, admission), mimetype='text/event-stream')
 
 
 @app.route("/conversation", methods=["GET", "POST"])
 def conversation():
     request_body = request.json
-    return conversation_internal(request_body)
-
-def conversation_internal(request_body):
+    return conversation_internal(request_body, str(uuid.uuid4()))
+
+def trim_history(request_body):
+    # Keep the newest turns within AZURE_OPENAI_PROMPT_TOKEN_BUDGET
+    trimmed = history_budgeter.trim(request_body["messages"])
+    if trimmed.trimmed_tokens:
+        logging.info(f"Trimmed {trimmed.trimmed_tokens} tokens in {trimmed.dropped_messages} messages from the conversation history, sending {trimmed.tokens}")
+    return {**request_body, "messages": trimmed.messages}
+
+def admission_user_and_cost(request_body, request_headers, retrieved_tokens=0):
+    # Requests queue per signed-in user and are charged their prompt estimate plus max_tokens,
+    # plus retrieved_tokens for the documents added to the prompt when chatting with data.
+    # Returns the user, the cost and the part of it that is refunded once the answer is done.
+    user = get_authenticated_user_details(request_headers=request_headers)['user_principal_id']
+    return user, estimate_tokens(request_body["messages"], AZURE_OPENAI_SYSTEM_MESSAGE, COMPLETION_SETTINGS.max_tokens) + retrieved_tokens, COMPLETION_SETTINGS.max_tokens
+
+def admit(request_body, retrieved_tokens=0):
+    # Called once the answer caches have missed, just before Azure OpenAI is called, so a
+    # replayed answer is never charged or queued. Returns the Admission to settle, if any.
+    if admission_controller:
+        return admission_controller.admit(*admission_user_and_cost(request_body, request.headers, retrieved_tokens))
+    return None
+
+def settle_admission(admission, completion):
+    # Refund what a non-streamed answer left of its max_tokens, going by the usage Azure OpenAI
+    # reports; streamed answers are settled by their relay
+    if admission:
+        admission.settle((completion.get("usage") or {}).get("completion_tokens", admission.completion_tokens))
+
+def conversation_internal(request_body, message_id, writer=None):
+    # message_id is the id of the assistant message this request answers; it is
+    # carried per request so concurrent requests in one worker never share it.
+    # writer(answer, failed), if set, is handed the answer when the stream ends.
     try:
+        if history_budgeter:
+            request_body = trim_history(request_body)
         use_data = should_use_data()
         if use_data:
-            return conversation_with_data(request_body)
+            return conversation_with_data(request_body, message_id, writer)
         else:
-            return conversation_without_data(request_body)
+            return conversation_without_data(request_body, message_id, writer)
+    except AdmissionRejected as e:
+        logging.warning(f"Rejected a conversation request at admission: {e}")
+        return jsonify({"error": str(e)}), 429, {"Retry-After": str(e.retry_after)}
     except Exception as e:
         logging.exception("Exception in /conversation")
         return jsonify({"error": str(e)}), 500
@@ -614,52 +1177,146 @@ def conversation_internal(request_body):
 ## Conversation History API ## 
 @app.route("/history/generate", methods=["POST"])
 def add_conversation():
-    global message_uuid
-    message_uuid = str(uuid.uuid4())
+    message_id = str(uuid.uuid4())
     authenticated_user = get_authenticated_user_details(request_headers=request.headers)
     user_id = authenticated_user['user_principal_id']
 
-    ## check request for conversation_id
-    conversation_id = request.json.get("conversation_id", None)
-
     try:
-        # make sure cosmos is configured
-        if not cosmos_conversation_client:
-            raise Exception("CosmosDB is not configured")
+        request_body = request.json
+        conversation_id, history_metadata, title, saved = start_history_turn(request_body, user_id, message_id)
+        if title:
+            title_executor.submit(update_title, user_id, conversation_id, request_body["messages"], title, history_metadata, saved)
 
-        # check for the conversation_id, if the conversation is not set, we will create a new one
-        history_metadata = {}
-        if not conversation_id:
-            title = generate_title(request.json["messages"])
-            conversation_dict = cosmos_conversation_client.create_conversation(user_id=user_id, title=title)
-            conversation_id = conversation_dict['id']
-            history_metadata['title'] = title
-            history_metadata['date'] = conversation_dict['createdAt']
-            
-        ## Format the incoming message object in the "chat/completions" messages format
-        ## then write it to the conversation history in cosmos
-        messages = request.json["messages"]
-        if len(messages) > 0 and messages[-1]['role'] == "user":
-            cosmos_conversation_client.create_message(
-                uuid=str(uuid.uuid4()),
-                conversation_id=conversation_id,
-                user_id=user_id,
-                input_message=messages[-1]
-            )
-        else:
-            raise Exception("No user message found")
-        
         # Submit request to Chat Completions for response
-        request_body = request.json
-        history_metadata['conversation_id'] = conversation_id
-        request_body['history_metadata'] = history_metadata
-        return conversation_internal(request_body)
+        writer = None
+        if AZURE_COSMOSDB_SAVE_STREAMED_ANSWERS:
+            writer = functools.partial(save_answer, user_id, conversation_id, message_id, after=saved)
+        return join_history_writes(conversation_internal(request_body, message_id, writer), saved, history_metadata)
        
     except Exception as e:
         logging.exception("Exception in /history/generate")
         return jsonify({"error": str(e)}), 500
 
 
+def start_history_turn(request_body, user_id, message_id):
+    # The start of /history/generate, in the Flask and Quart apps alike: checks the request,
+    # writes the conversation and the user message to cosmos on history_executor while the answer
+    # is requested, and sets the history_metadata the answer frames carry. Returns the conversation
+    # id, that metadata, the provisional title of a new conversation or None, and the writes' future.
+
+    # make sure cosmos is configured
+    if not cosmos_conversation_client:
+        raise Exception("CosmosDB is not configured")
+
+    messages = request_body["messages"]
+    if not (len(messages) > 0 and messages[-1]['role'] == "user"):
+        raise Exception("No user message found")
+
+    # check for the conversation_id, if the conversation is not set, we will create a new one
+    conversation_id = request_body.get("conversation_id", None)
+    history_metadata = {}
+    title = None
+    if not conversation_id:
+        # start with a cheap title and generate the real one alongside the answer
+        title = provisional_title(messages)
+        conversation_id = str(uuid.uuid4())
+        history_metadata['title'] = title
+        history_metadata['date'] = datetime.utcnow().isoformat()
+
+    saved = history_executor.submit(save_question, user_id, conversation_id, messages[-1], title)
+    history_metadata['conversation_id'] = conversation_id
+    history_metadata['message_id'] = message_id
+    request_body['history_metadata'] = history_metadata
+    return conversation_id, history_metadata, title, saved
+
+
+def save_question(user_id, conversation_id, message, title=None):
+    # Runs on history_executor: creates the conversation first when it is new, which title
+    # is set for, then writes the user message
+    if title is not None and not cosmos_conversation_client.create_conversation(user_id=user_id, title=title, conversation_id=conversation_id):
+        raise Exception("The conversation could not be created")
+    cosmos_conversation_client.create_message(
+        uuid=str(uuid.uuid4()),
+        conversation_id=conversation_id,
+        user_id=user_id,
+        input_message=message
+    )
+
+
+def join_history_writes(response, saved, history_metadata):
+    # A streamed answer waits for the conversation and question writes after its last frame and
+    # reports a failure in one more frame. Any other successful response waits for them before
+    # it is returned, and a failure fails the request; a failed answer is returned as it is, so
+    # the user sees why it failed rather than a later Cosmos DB error.
+    if isinstance(response, Response) and response.mimetype == "text/event-stream":
+        response.response = relay_then_join(response.response, saved, history_metadata)
+        return response
+    if response_status(response) >= 400:
+        saved.add_done_callback(log_failed_save)
+        return response
+    saved.result()
+    return response
+
+
+def response_status(response):
+    # views return a Response or a (body, status[, headers]) tuple
+    if isinstance(response, tuple):
+        return response[1]
+    return response.status_code
+
+
+def log_failed_save(saved):
+    if saved.exception() is not None:
+        logging.error(f"Exception saving the conversation in /history/generate: {saved.exception()}")
+
+
+def save_failed_frame(error, history_metadata):
+    # the frame after a streamed answer when its question could not be saved; it names the
+    # conversation so the client keeps the answer it already shows
+    return format_as_ndjson({
+        "error": f"The conversation could not be saved: {error}",
+        "history_metadata": {key: history_metadata[key] for key in ("conversation_id", "title", "date") if key in history_metadata}
+    })
+
+
+def relay_then_join(frames, saved, history_metadata):
+    yield from frames
+    try:
+        saved.result()
+    except Exception as e:
+        logging.exception("Exception saving the conversation in /history/generate")
+        yield save_failed_frame(e, history_metadata)
+
+
+def save_answer(user_id, conversation_id, message_id, answer, failed=False, after=None):
+    # Write a relayed answer to the conversation as /history/update would: the tool message with
+    # the citations first, then the assistant message under the id it was streamed with. after,
+    # the future of the question's writes, is waited on first. A failed answer, one that ended in
+    # an error or was stopped by the content filter, is not saved, as the browser only saves the
+    # error it shows. Called as the stream ends, so a failure is logged rather than raised.
+    if failed:
+        logging.info(f"Not saving the failed answer {message_id}")
+        return
+    try:
+        if after is not None:
+            after.result()
+        if answer.get("tool") is not None:
+            cosmos_conversation_client.create_message(
+                uuid=str(uuid.uuid4()),
+                conversation_id=conversation_id,
+                user_id=user_id,
+                input_message={"role": "tool", "content": answer["tool"]}
+            )
+        cosmos_conversation_client.create_message(
+            uuid=message_id,
+            conversation_id=conversation_id,
+            user_id=user_id,
+            input_message={"role": "assistant", "content": answer["content"]}
+        )
+    except Exception:
+        logging.exception("Exception saving the streamed answer")
+
+
 @app.route("/history/update", methods=["POST"])
 def update_conversation():
     authenticated_user = get_authenticated_user_details(request_headers=request.headers)
@@ -689,9 +1346,11 @@ def update_conversation():
                     user_id=user_id,
                     input_message=messages[-2]
                 )
-            # write the assistant message
+            # write the assistant message under the id it was streamed with, which the
+            # client echoes back as the message id or in history_metadata
+            message_id = messages[-1].get('id') or request.json.get('history_metadata', {}).get('message_id') or str(uuid.uuid4())
             cosmos_conversation_client.create_message(
-                uuid=message_uuid,
+                uuid=message_id,
                 conversation_id=conversation_id,
                 user_id=user_id,
                 input_message=messages[-1]
@@ -879,6 +1538,11 @@ def ensure_cosmos():
 
     return jsonify({"message": "CosmosDB is configured and working"}), 200
 
+@app.route("/status", methods=["GET"])
+def warmup_status():
+    status = warmup.status()
+    return jsonify(status), 503 if status["state"] == "warming" else 200
+
 @app.route("/frontend_settings", methods=["GET"])  
 def get_frontend_settings():
     try:
@@ -887,30 +1551,72 @@ def get_frontend_settings():
         logging.exception("Exception in /frontend_settings")
         return jsonify({"error": str(e)}), 500  
 
-def generate_title(conversation_messages):
+def prepare_title_body(conversation_messages):
     ## make sure the messages are sorted by _ts descending
     title_prompt = 'Summarize the conversation so far into a 4-word or less title. Do not use any quotation marks or punctuation. Respond with a json object in the format {{"title": string}}. Do not include any other commentary or description.'
 
     messages = [{'role': msg['role'], 'content': msg['content']} for msg in conversation_messages]
     messages.append({'role': 'user', 'content': title_prompt})
+    return {"messages": messages, "temperature": 1, "max_tokens": 64}
+
+def parse_title(completion):
+    return json.loads(completion['choices'][0]['message']['content'])['title']
 
+@metrics.timed(metrics.TITLE_SECONDS)
+@tracing.traced("generate_title")
+def generate_title(conversation_messages):
     try:
         ## Submit prompt to Chat Completions for response
-        base_url = AZURE_OPENAI_ENDPOINT if AZURE_OPENAI_ENDPOINT else f"https://{AZURE_OPENAI_RESOURCE}.openai.azure.com/"
-        openai.api_type = "azure"
-        openai.api_base = base_url
-        openai.api_version = "2023-03-15-preview"
-        openai.api_key = AZURE_OPENAI_KEY
-        completion = openai.ChatCompletion.create(    
-            engine=AZURE_OPENAI_MODEL,
-            messages=messages,
-            temperature=1,
-            max_tokens=64 
-        )
-        title = json.loads(completion['choices'][0]['message']['content'])['title']
-        return title
+        with azure_openai_client.post("chat/completions", "2023-03-15-preview", prepare_title_body(conversation_messages)) as response:
+            response.raise_for_status()
+            completion = response.json()
+        return parse_title(completion)
     except Exception as e:
-        return messages[-2]['content']
+        logging.warning(f"Exception generating a conversation title: {e}")
+        return None
+
+def provisional_title(conversation_messages, max_length=40):
+    ## the start of the first user message, shown until the generated title is ready
+    content = next((msg['content'] for msg in conversation_messages if msg['role'] == 'user'), "")
+    content = " ".join(content.split())
+    if len(content) <= max_length:
+        return content
+    return (content[:max_length].rsplit(" ", 1)[0] or content[:max_length]) + "…"
+
+def update_title(user_id, conversation_id, conversation_messages, provisional, history_metadata, created=None):
+    ## runs on title_executor; answer frames still streaming pick the title up from
+    ## history_metadata, and /history/list reads it from cosmos once created, the future
+    ## of the conversation's creation, is done
+    title = generate_title(conversation_messages)
+    if not title:
+        return
+    history_metadata['title'] = title
+    try:
+        if created is not None:
+            created.result()
+        cosmos_conversation_client.update_conversation_title(user_id, conversation_id, title, provisional)
+    except Exception:
+        logging.exception("Exception updating the conversation title")
+
+def warm_answer_cache(seed_file):
+    ## load the seed answers, one JSON object per line, so the first users asking them hit the cache
+    if should_use_data() and AZURE_SEARCH_PERMITTED_GROUPS_COLUMN:
+        logging.warning("ANSWER_CACHE_SEED_FILE is ignored with AZURE_SEARCH_PERMITTED_GROUPS_COLUMN, answers depend on each user's groups")
+        return 0
+    if should_use_data() and DATASOURCE_TYPE == "Local":
+        prepare_body = lambda request_body: prepare_body_with_local_data(request_body)[0]
+    elif should_use_data():
+        prepare_body = lambda request_body: prepare_body_headers_with_data(request_body, {})[0]
+    else:
+        prepare_body = prepare_body_without_data
+    with open(seed_file, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    count = answer_cache.warm(entries, prepare_body)
+    logging.info(f"Loaded {count} answers from {seed_file}")
+    return count
+
+if answer_cache and ANSWER_CACHE_SEED_FILE:
+    warm_answer_cache(ANSWER_CACHE_SEED_FILE)
 
 if __name__ == "__main__":
     app.run()
\ No newline at end of file
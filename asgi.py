@@ -0,0 +1,442 @@
+"""ASGI entry point that serves the chat routes as coroutines.
+
+Run with `hypercorn asgi:app`. /conversation and /history/generate are handled
+by async Quart views that stream from Azure OpenAI over a pooled async client, so a single
+worker can hold many open answers at once. Every other route is served by the
+Flask app in app.py through a WSGI adapter. Relaying an answer, rendering its frames
+and starting its history writes use the same helpers as app.py, so this module only
+does the async I/O around them.
+"""
+import asyncio
+import functools
+import logging
+import time
+import uuid
+
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from quart import Quart, Response, g, jsonify, request
+
+from app import (
+    app as flask_app,
+    AZURE_COSMOSDB_SAVE_STREAMED_ANSWERS,
+    AZURE_OPENAI_ADMISSION_DATA_TOKENS,
+    AZURE_OPENAI_ADMISSION_MAX_WAIT,
+    AZURE_OPENAI_HEDGE_BUDGET,
+    AZURE_OPENAI_HEDGE_DELAY_MS,
+    AZURE_OPENAI_PREVIEW_API_VERSION,
+    AZURE_SEARCH_PERMITTED_GROUPS_COLUMN,
+    DATASOURCE_TYPE,
+    SHOULD_STREAM,
+    SINGLE_FLIGHT_ENABLED,
+    WARMUP_CONNECTIONS,
+    WARMUP_ENABLED,
+    admission_controller,
+    admission_user_and_cost,
+    answer_cache_key,
+    cosmos_conversation_client,
+    create_azure_openai_client,
+    create_token_bucket,
+    format_as_ndjson,
+    formatApiResponseNoStreaming,
+    history_budgeter,
+    local_stream_parser,
+    log_failed_save,
+    lookup_answer,
+    parse_stream_line_with_data,
+    parse_title,
+    prepare_body_headers_with_data,
+    prepare_body_with_local_data,
+    prepare_body_without_data,
+    prepare_title_body,
+    relay_for_data,
+    relay_without_data,
+    replay_answer_with_data,
+    replay_answer_without_data,
+    response_status,
+    save_answer,
+    save_failed_frame,
+    semantic_answer_cache,
+    settle_admission,
+    should_use_data,
+    start_history_turn,
+    trim_history,
+    warmup,
+    with_writer,
+)
+from backend import metrics, tracing
+from backend.admission import AdmissionRejected, AsyncAdmissionController
+from backend.auth.auth_utils import get_authenticated_user_details
+from backend.cache import AsyncSingleFlight
+from backend.upstream.client import AsyncAzureOpenAIClient, parse_sse_json
+from backend.upstream.coalesce import apaced
+from backend.upstream.hedge import AsyncHedger
+from backend.upstream.pool import AsyncDeploymentPool
+
+ASYNC_ROUTES = {"/conversation", "/history/generate"}
+
+quart_app = Quart(__name__)
+# Answers can stream for longer than Quart's default 60 second response timeout
+quart_app.config["RESPONSE_TIMEOUT"] = None
+
+async_azure_openai_client = None
+async_admission_controller = AsyncAdmissionController(create_token_bucket(), float(AZURE_OPENAI_ADMISSION_MAX_WAIT)) if admission_controller else None
+async_hedger = AsyncHedger(float(AZURE_OPENAI_HEDGE_DELAY_MS), float(AZURE_OPENAI_HEDGE_BUDGET)) if float(AZURE_OPENAI_HEDGE_DELAY_MS) > 0 else None
+async_single_flight = AsyncSingleFlight() if SINGLE_FLIGHT_ENABLED else None
+# strong references to fire-and-forget tasks, such as title generation, until they finish
+background_tasks = set()
+
+
+@quart_app.before_serving
+async def open_upstream_client():
+    # Same deployments and pool settings as the Flask app's client, bound to this event loop
+    global async_azure_openai_client
+    async_azure_openai_client = create_azure_openai_client(AsyncAzureOpenAIClient, AsyncDeploymentPool)
+    # answers stream over this pool, so /status (served by the Flask app) waits for it too
+    if WARMUP_ENABLED:
+        warmup.start_async("upstream_async", lambda: async_azure_openai_client.warm(int(WARMUP_CONNECTIONS)))
+
+
+@quart_app.after_serving
+async def close_upstream_client():
+    if async_azure_openai_client:
+        await async_azure_openai_client.close()
+
+
+@quart_app.before_request
+async def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.request_span = tracing.start_request_span(request.method, request.url_rule.rule if request.url_rule else "unmatched", request.headers)
+
+
+@quart_app.after_request
+async def record_request_duration(response):
+    started = g.get("request_started")
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.observe_request(route, request.method, response.status_code, time.perf_counter() - started)
+    g.request_status = response.status_code
+    return response
+
+
+@quart_app.teardown_request
+async def end_request_span(error=None):
+    tracing.end_request_span(g.pop("request_span", None), g.get("request_status"), error)
+
+
+async def post_answer(operation, api_version, body, headers=None, route="default"):
+    if async_hedger and body.get("stream"):
+        return await async_hedger.post(async_azure_openai_client, operation, api_version, body, headers, route)
+    return await async_azure_openai_client.post(operation, api_version, body, headers)
+
+
+async def complete_once(body, load):
+    if async_single_flight is None:
+        return await load()
+    return await async_single_flight.do(answer_cache_key(body), load)
+
+
+async def admit(request_body, retrieved_tokens=0):
+    # Called once the answer caches have missed, just before Azure OpenAI is called
+    if async_admission_controller:
+        return await async_admission_controller.admit(*admission_user_and_cost(request_body, request.headers, retrieved_tokens))
+    return None
+
+
+async def stream_with_data(body, headers, history_metadata={}, message_id="", recorder=None, timer=None, admission=None):
+    relay = relay_for_data(history_metadata, message_id, recorder, timer or metrics.StreamTimer("with_data"), admission)
+    try:
+        with relay.timer.attached():
+            r = await post_answer("extensions/chat/completions", AZURE_OPENAI_PREVIEW_API_VERSION, body, headers, route="conversation_with_data")
+        async with r:
+            relay.begin(r.headers.get('apim-request-id'))
+            async for line in apaced(r.iter_lines(), relay.coalescer):
+                if line is None:
+                    # the coalescing window ran out while the next line was still on its way
+                    frames = relay.flush()
+                else:
+                    lineJson = parse_stream_line_with_data(line)
+                    frames = relay.push(lineJson) if lineJson is not None else []
+                for frame in frames:
+                    yield frame
+            for frame in relay.finish():
+                yield frame
+    except Exception as e:
+        relay.fail()
+        yield format_as_ndjson({"error": str(e)})
+    finally:
+        relay.close()
+
+
+async def conversation_with_data(request_body, request_headers, message_id, writer=None):
+    if DATASOURCE_TYPE == "Local":
+        return await conversation_with_local_data(request_body, message_id, writer)
+
+    if AZURE_SEARCH_PERMITTED_GROUPS_COLUMN:
+        # the group filter may wait on Microsoft Graph, keep that off the event loop
+        body, headers = await asyncio.to_thread(prepare_body_headers_with_data, request_body, request_headers)
+    else:
+        body, headers = prepare_body_headers_with_data(request_body, request_headers)
+    history_metadata = request_body.get("history_metadata", {})
+
+    if not SHOULD_STREAM:
+        async def load():
+            async with await async_azure_openai_client.post("extensions/chat/completions", AZURE_OPENAI_PREVIEW_API_VERSION, body, headers) as response:
+                return response.status_code, await response.json()
+
+        admission = await admit(request_body, int(AZURE_OPENAI_ADMISSION_DATA_TOKENS))
+        status_code, r = await complete_once(body, load)
+        settle_admission(admission, r)
+        if AZURE_OPENAI_PREVIEW_API_VERSION == "2023-06-01-preview":
+            r = {**r, 'history_metadata': history_metadata}
+            return Response(format_as_ndjson(r), status=status_code)
+        else:
+            result = formatApiResponseNoStreaming(r)
+            result['history_metadata'] = history_metadata
+            return Response(format_as_ndjson(result), status=status_code)
+
+    else:
+        if semantic_answer_cache:
+            # the semantic lookup embeds the question, keep that call off the event loop
+            answer, recorder = await asyncio.to_thread(lookup_answer, body, True)
+        else:
+            answer, recorder = lookup_answer(body)
+        if answer:
+            if writer:
+                writer(answer, False)
+            return Response(replay_answer_with_data(answer, history_metadata, message_id), mimetype='text/event-stream')
+        admission = await admit(request_body, int(AZURE_OPENAI_ADMISSION_DATA_TOKENS))
+        recorder = with_writer(recorder, writer)
+        return Response(stream_with_data(body, headers, history_metadata, message_id, recorder, metrics.StreamTimer("with_data"), admission), mimetype='text/event-stream')
+
+
+async def stream_with_local_data(response, tool_content, history_metadata={}, message_id="", recorder=None, timer=None, admission=None):
+    relay = relay_for_data(history_metadata, message_id, recorder, timer, admission)
+    parse = local_stream_parser(tool_content, recorder)
+    try:
+        async with response:
+            relay.begin(response.headers.get('apim-request-id'))
+            async for line in apaced(response.iter_lines(), relay.coalescer):
+                frames = relay.flush() if line is None else [frame for lineJson in parse(line) for frame in relay.push(lineJson)]
+                for frame in frames:
+                    yield frame
+            for frame in relay.finish():
+                yield frame
+    except Exception as e:
+        relay.fail()
+        yield format_as_ndjson({"error": str(e)})
+    finally:
+        relay.close()
+
+
+async def conversation_with_local_data(request_body, message_id, writer=None):
+    # retrieval, and the query embedding for vector search, run off the event loop
+    body, tool_content = await asyncio.to_thread(prepare_body_with_local_data, request_body)
+    history_metadata = request_body.get("history_metadata", {})
+
+    if semantic_answer_cache:
+        answer, recorder = await asyncio.to_thread(lookup_answer, body, True)
+    else:
+        answer, recorder = lookup_answer(body)
+    if answer:
+        if writer:
+            writer(answer, False)
+        return Response(replay_answer_with_data(answer, history_metadata, message_id), mimetype='text/event-stream')
+    # the retrieved chunks are known here, so they are charged as they are
+    admission = await admit(request_body, len(tool_content) // 4)
+
+    if not SHOULD_STREAM:
+        async def load():
+            async with await async_azure_openai_client.post("chat/completions", "2023-08-01-preview", body) as response:
+                await response.raise_for_status()
+                completion = await response.json()
+            completion["choices"][0]["message"]["context"] = {"messages": [{"role": "tool", "content": tool_content}]}
+            return response.status_code, completion
+
+        status_code, completion = await complete_once(body, load)
+        settle_admission(admission, completion)
+        result = formatApiResponseNoStreaming(completion)
+        result['history_metadata'] = history_metadata
+        return Response(format_as_ndjson(result), status=status_code)
+    else:
+        timer = metrics.StreamTimer("local_data")
+        with timer.attached():
+            response = await post_answer("chat/completions", "2023-08-01-preview", body, route="conversation_with_local_data")
+        await response.raise_for_status()
+        return Response(stream_with_local_data(response, tool_content, history_metadata, message_id, with_writer(recorder, writer), timer, admission), mimetype='text/event-stream')
+
+
+async def stream_without_data(response, history_metadata={}, message_id="", recorder=None, timer=None, admission=None):
+    relay = relay_without_data(history_metadata, message_id, recorder, timer, admission)
+    try:
+        async with response:
+            async for line in response.iter_lines():
+                line = parse_sse_json(line)
+                if line is not None:
+                    for frame in relay.push(line):
+                        yield frame
+        for frame in relay.finish():
+            yield frame
+    except Exception:
+        relay.fail()
+        raise
+    finally:
+        relay.close()
+
+
+async def conversation_without_data(request_body, message_id, writer=None):
+    body = prepare_body_without_data(request_body)
+    history_metadata = request_body.get("history_metadata", {})
+
+    answer, recorder = lookup_answer(body)
+    if answer:
+        if writer:
+            writer(answer, False)
+        return Response(replay_answer_without_data(answer, history_metadata, message_id), mimetype='text/event-stream')
+    admission = await admit(request_body)
+
+    if not SHOULD_STREAM:
+        async def load():
+            async with await async_azure_openai_client.post("chat/completions", "2023-08-01-preview", body) as response:
+                await response.raise_for_status()
+                return await response.json()
+
+        completion = await complete_once(body, load)
+        settle_admission(admission, completion)
+        response_obj = {
+            "id": message_id,
+            "model": completion["model"],
+            "created": completion["created"],
+            "object": completion["object"],
+            "choices": [{
+                "messages": [{
+                    "role": "assistant",
+                    "content": completion["choices"][0]["message"]["content"]
+                }]
+            }],
+            "history_metadata": history_metadata
+        }
+
+        return jsonify(response_obj), 200
+    else:
+        timer = metrics.StreamTimer("without_data")
+        with timer.attached():
+            response = await post_answer("chat/completions", "2023-08-01-preview", body, route="conversation_without_data")
+        await response.raise_for_status()
+        return Response(stream_without_data(response, history_metadata, message_id, with_writer(recorder, writer), timer, admission), mimetype='text/event-stream')
+
+
+async def conversation_internal(request_body, request_headers, message_id, writer=None):
+    try:
+        if history_budgeter:
+            request_body = trim_history(request_body)
+        use_data = should_use_data()
+        if use_data:
+            return await conversation_with_data(request_body, request_headers, message_id, writer)
+        else:
+            return await conversation_without_data(request_body, message_id, writer)
+    except AdmissionRejected as e:
+        logging.warning(f"Rejected a conversation request at admission: {e}")
+        return jsonify({"error": str(e)}), 429, {"Retry-After": str(e.retry_after)}
+    except Exception as e:
+        logging.exception("Exception in /conversation")
+        return jsonify({"error": str(e)}), 500
+
+
+@quart_app.route("/conversation", methods=["GET", "POST"])
+async def conversation():
+    request_body = await request.get_json()
+    return await conversation_internal(request_body, request.headers, str(uuid.uuid4()))
+
+
+@quart_app.route("/history/generate", methods=["POST"])
+async def add_conversation():
+    message_id = str(uuid.uuid4())
+    authenticated_user = get_authenticated_user_details(request_headers=request.headers)
+    user_id = authenticated_user['user_principal_id']
+
+    try:
+        request_body = await request.get_json()
+        conversation_id, history_metadata, title, saved = start_history_turn(request_body, user_id, message_id)
+        if title:
+            task = asyncio.create_task(update_title(user_id, conversation_id, request_body["messages"], title, history_metadata, saved))
+            background_tasks.add(task)
+            task.add_done_callback(background_tasks.discard)
+
+        # Submit request to Chat Completions for response
+        writer = None
+        if AZURE_COSMOSDB_SAVE_STREAMED_ANSWERS:
+            writer = functools.partial(save_answer_in_background, user_id, conversation_id, message_id, after=saved)
+        return await join_history_writes(await conversation_internal(request_body, request.headers, message_id, writer), saved, history_metadata)
+
+    except Exception as e:
+        logging.exception("Exception in /history/generate")
+        return jsonify({"error": str(e)}), 500
+
+
+async def join_history_writes(response, saved, history_metadata):
+    # the async join_history_writes of app.py; saved is a future of history_executor
+    if isinstance(response, Response) and response.mimetype == "text/event-stream":
+        return Response(relay_then_join(response.response, saved, history_metadata), status=response.status_code, headers=response.headers)
+    if response_status(response) >= 400:
+        saved.add_done_callback(log_failed_save)
+        return response
+    await asyncio.wrap_future(saved)
+    return response
+
+
+async def relay_then_join(body, saved, history_metadata):
+    async with body:
+        async for frame in body:
+            yield frame
+    try:
+        await asyncio.wrap_future(saved)
+    except Exception as e:
+        logging.exception("Exception saving the conversation in /history/generate")
+        yield save_failed_frame(e, history_metadata)
+
+
+def save_answer_in_background(user_id, conversation_id, message_id, answer, failed=False, after=None):
+    # Called from the stream as it ends, also when it is cancelled because the client went
+    # away, so the Cosmos DB writes run in a thread the stream doesn't wait for
+    task = asyncio.create_task(asyncio.to_thread(save_answer, user_id, conversation_id, message_id, answer, failed, after))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+@metrics.timed(metrics.TITLE_SECONDS)
+@tracing.traced("generate_title")
+async def generate_title(conversation_messages):
+    try:
+        ## Submit prompt to Chat Completions for response
+        async with await async_azure_openai_client.post("chat/completions", "2023-03-15-preview", prepare_title_body(conversation_messages)) as response:
+            await response.raise_for_status()
+            completion = await response.json()
+        return parse_title(completion)
+    except Exception as e:
+        logging.warning(f"Exception generating a conversation title: {e}")
+        return None
+
+
+async def update_title(user_id, conversation_id, conversation_messages, provisional, history_metadata, created=None):
+    title = await generate_title(conversation_messages)
+    if not title:
+        return
+    history_metadata['title'] = title
+    try:
+        if created is not None:
+            await asyncio.wrap_future(created)
+        await asyncio.to_thread(cosmos_conversation_client.update_conversation_title, user_id, conversation_id, title, provisional)
+    except Exception:
+        logging.exception("Exception updating the conversation title")
+
+
+# Flask answers everything else; the history payloads posted to /history/update
+# can be larger than the adapter's 64KB default body limit
+wsgi_app = AsyncioWSGIMiddleware(flask_app, max_body_size=16 * 1024 * 1024)
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "http" and scope["path"] not in ASYNC_ROUTES:
+        await wsgi_app(scope, receive, send)
+    else:
+        await quart_app(scope, receive, send)
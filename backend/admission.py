@@ -0,0 +1,217 @@
+import asyncio
+import contextlib
+import math
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict, deque
+
+## fcntl locks the shared bucket file; where it is missing (Windows) each process keeps its own bucket
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+BUCKET_STATE = struct.Struct("dd")
+
+
+class AdmissionRejected(Exception):
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Too many requests, retry after {retry_after:.0f} seconds")
+        self.retry_after = retry_after
+
+
+def estimate_tokens(messages, system_message: str, max_tokens: int) -> int:
+    ## tokens a request can use: about 4 characters per prompt token plus the whole completion
+    characters = len(system_message or "") + sum(len(str(message.get("content") or "")) for message in messages if message)
+    return characters // 4 + max_tokens
+
+
+class SharedTokenBucket():
+    ## Token bucket refilled at rate_per_second up to capacity. With a path, its state lives in that
+    ## file and is read and updated under an exclusive lock, so all worker processes on the host
+    ## draw from one bucket. A request costing more than capacity is charged capacity.
+
+    def __init__(self, rate_per_second: float, capacity: float, path: str = None):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600) if path and fcntl else None
+        self.tokens = capacity
+        self.updated = time.time()
+
+    def take(self, cost: float) -> float:
+        ## takes cost tokens and returns 0, or takes nothing and returns the seconds until they are there
+        cost = min(cost, self.capacity)
+        with self.locked() as now:
+            tokens = self.refilled(now)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / self.rate
+            self.write(tokens, now)
+            return wait
+
+    def give_back(self, tokens: float):
+        ## returns tokens taken for a request that turned out not to need them
+        with self.locked() as now:
+            self.write(min(self.capacity, self.refilled(now) + tokens), now)
+
+    @contextlib.contextmanager
+    def locked(self):
+        with self.lock:
+            if self.fd is not None:
+                fcntl.flock(self.fd, fcntl.LOCK_EX)
+            try:
+                yield time.time()
+            finally:
+                if self.fd is not None:
+                    fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def refilled(self, now: float) -> float:
+        tokens, updated = self.read(now)
+        return min(self.capacity, tokens + max(0.0, now - updated) * self.rate)
+
+    def read(self, now: float):
+        if self.fd is None:
+            return self.tokens, self.updated
+        data = os.pread(self.fd, BUCKET_STATE.size, 0)
+        if len(data) < BUCKET_STATE.size:
+            return self.capacity, now
+        return BUCKET_STATE.unpack(data)
+
+    def write(self, tokens: float, now: float):
+        if self.fd is None:
+            self.tokens, self.updated = tokens, now
+        else:
+            os.pwrite(self.fd, BUCKET_STATE.pack(tokens, now), 0)
+
+
+class Admission():
+    ## An admitted request's claim on the bucket. It was charged its whole completion allowance
+    ## up front; settle() gives back what the finished completion didn't use, once.
+
+    def __init__(self, bucket: SharedTokenBucket, completion_tokens: float):
+        self.bucket = bucket
+        self.completion_tokens = completion_tokens
+        self.settled = False
+
+    def settle(self, used_tokens: float):
+        if self.settled:
+            return
+        self.settled = True
+        unused = self.completion_tokens - used_tokens
+        if unused > 0:
+            self.bucket.give_back(unused)
+
+
+class Waiter():
+
+    def __init__(self, user: str, cost: float, deadline: float):
+        self.user = user
+        self.cost = cost
+        self.deadline = deadline
+
+
+class AdmissionController():
+    ## Admits requests against a SharedTokenBucket, queueing them per user when it runs dry.
+    ##
+    ## Users take turns: only the oldest request of the user at the front of the rotation may take
+    ## tokens, and once it is admitted that user moves to the back. So one user sending many
+    ## requests waits behind everybody else's next request instead of in front of it. A request
+    ## that would wait longer than max_wait_seconds is rejected with AdmissionRejected, whose
+    ## retry_after is when the bucket is expected to have its tokens. A waiting request holds its
+    ## worker (a whole uwsgi process or thread in the Flask app), so max_wait_seconds must stay
+    ## short: a few seconds, not the time a burst takes to drain.
+    ##
+    ## admit() charges cost, of which completion_tokens is the most the answer may use, and
+    ## returns an Admission; settling it with the tokens the answer did use refunds the rest.
+
+    def __init__(self, bucket: SharedTokenBucket, max_wait_seconds: float):
+        self.bucket = bucket
+        self.max_wait = max_wait_seconds
+        self.queues = OrderedDict()
+        self.condition = threading.Condition()
+
+    def enqueue(self, user: str, cost: float) -> Waiter:
+        waiter = Waiter(user, cost, time.monotonic() + self.max_wait)
+        self.queues.setdefault(user, deque()).append(waiter)
+        return waiter
+
+    def poll(self, waiter: Waiter):
+        ## None once admitted, otherwise the seconds to wait before polling again
+        if next(iter(self.queues)) != waiter.user or self.queues[waiter.user][0] is not waiter:
+            return waiter.deadline - time.monotonic()
+        wait = self.bucket.take(waiter.cost)
+        if wait > 0:
+            if time.monotonic() + wait > waiter.deadline:
+                self.remove(waiter)
+                raise AdmissionRejected(max(1, math.ceil(wait)))
+            return wait
+        self.remove(waiter)
+        return None
+
+    def remove(self, waiter: Waiter):
+        queue = self.queues.get(waiter.user)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        if queue:
+            self.queues.move_to_end(waiter.user)
+        else:
+            del self.queues[waiter.user]
+
+    def timed_out(self, waiter: Waiter):
+        ## a request still behind others when its wait runs out; retry once its own cost has refilled
+        self.remove(waiter)
+        raise AdmissionRejected(max(1, math.ceil(min(waiter.cost, self.bucket.capacity) / self.bucket.rate)))
+
+    def admission(self, cost: float, completion_tokens: float) -> Admission:
+        # take() charges at most the capacity, so no more than was charged is refunded
+        return Admission(self.bucket, min(completion_tokens, cost, self.bucket.capacity))
+
+    def admit(self, user: str, cost: float, completion_tokens: float = 0) -> Admission:
+        with self.condition:
+            waiter = self.enqueue(user, cost)
+            try:
+                while True:
+                    wait = self.poll(waiter)
+                    if wait is None:
+                        return self.admission(cost, completion_tokens)
+                    if time.monotonic() >= waiter.deadline:
+                        self.timed_out(waiter)
+                    self.condition.wait(min(wait, waiter.deadline - time.monotonic()))
+            finally:
+                self.remove(waiter)
+                self.condition.notify_all()
+
+
+class AsyncAdmissionController(AdmissionController):
+    ## The same queues for the ASGI app; waiting requests sleep on the event loop.
+
+    def __init__(self, bucket: SharedTokenBucket, max_wait_seconds: float):
+        super().__init__(bucket, max_wait_seconds)
+        self.changed = None
+
+    async def admit(self, user: str, cost: float, completion_tokens: float = 0) -> Admission:
+        if self.changed is None:
+            self.changed = asyncio.Condition()
+        async with self.changed:
+            waiter = self.enqueue(user, cost)
+            try:
+                while True:
+                    wait = self.poll(waiter)
+                    if wait is None:
+                        return self.admission(cost, completion_tokens)
+                    if time.monotonic() >= waiter.deadline:
+                        self.timed_out(waiter)
+                    try:
+                        await asyncio.wait_for(self.changed.wait(), min(wait, waiter.deadline - time.monotonic()))
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self.remove(waiter)
+                self.changed.notify_all()
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from backend.cache import TTLCache
+from backend.upstream.coalesce import get_delta_content
+
+
+def normalize_messages(messages) -> list:
+    ## role and whitespace-collapsed, case-folded content; ids, dates and feedback don't change the answer
+    return [[message["role"], " ".join(str(message["content"]).split()).casefold()] for message in messages if message]
+
+
+def answer_cache_key(body: dict) -> str:
+    ## everything sent upstream except the stream flag: the normalized messages, the sampling
+    ## settings, the system message and, with data, the compiled dataSources and security filter
+    keyed = {**body, "messages": normalize_messages(body["messages"]), "stream": None}
+    return hashlib.sha256(json.dumps(keyed, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class DiskAnswerStore():
+    ## SQLite file behind the in-memory tier; it survives restarts and is shared by the worker
+    ## processes on one host. Expiry uses wall-clock time since several processes read it.
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, answer TEXT NOT NULL, expires REAL NOT NULL, used REAL NOT NULL)")
+
+    def get(self, key):
+        ## returns (answer, seconds left) or None
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute("SELECT answer, expires FROM answers WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self.connection.execute("DELETE FROM answers WHERE key = ?", (key,))
+                return None
+            self.connection.execute("UPDATE answers SET used = ? WHERE key = ?", (now, key))
+        return json.loads(row[0]), row[1] - now
+
+    def set(self, key, answer, ttl_seconds: float):
+        now = time.time()
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO answers (key, answer, expires, used) VALUES (?, ?, ?, ?)", (key, json.dumps(answer, ensure_ascii=False), now + ttl_seconds, now))
+            # keep the file bounded: drop expired answers, then the least recently used
+            self.connection.execute("DELETE FROM answers WHERE expires <= ?", (now,))
+            self.connection.execute("DELETE FROM answers WHERE key NOT IN (SELECT key FROM answers ORDER BY used DESC LIMIT ?)", (self.max_entries,))
+
+    def close(self):
+        self.connection.close()
+
+
+class AnswerCache():
+    ## Exact-match cache of finished answers. An in-memory LRU with a TTL, optionally backed by a
+    ## DiskAnswerStore; answers found on disk are promoted to memory for the rest of their lifetime.
+    ## An answer is {"model", "object", "tool", "content"}: the tool message with the citations,
+    ## if any, and the full assistant message.
+
+    def __init__(self, ttl_seconds: float, max_entries: int, disk_path: str = None, disk_max_entries: int = None):
+        self.ttl_seconds = ttl_seconds
+        self.memory = TTLCache(ttl_seconds=ttl_seconds, max_entries=max_entries)
+        self.disk = DiskAnswerStore(disk_path, disk_max_entries or max_entries * 10) if disk_path else None
+
+    def get(self, key):
+        answer = self.memory.get(key)
+        if answer is not None or self.disk is None:
+            return answer
+        try:
+            found = self.disk.get(key)
+        except sqlite3.Error as e:
+            logging.warning(f"Answer cache disk read failed: {e}")
+            return None
+        if found is None:
+            return None
+        answer, ttl_seconds = found
+        self.memory.set(key, answer, ttl_seconds=ttl_seconds)
+        return answer
+
+    def set(self, key, answer):
+        self.memory.set(key, answer)
+        if self.disk:
+            try:
+                self.disk.set(key, answer, self.ttl_seconds)
+            except sqlite3.Error as e:
+                logging.warning(f"Answer cache disk write failed: {e}")
+
+    def warm(self, entries, prepare_body) -> int:
+        ## entries are seed records {"messages": [...], "answer": str, "tool": optional str, "model": optional str};
+        ## prepare_body turns a request body into the upstream body so the keys match live requests
+        count = 0
+        for entry in entries:
+            body = prepare_body({"messages": entry["messages"]})
+            self.set(answer_cache_key(body), {
+                "model": entry.get("model", ""),
+                "object": entry.get("object", "chat.completion.chunk"),
+                "tool": entry.get("tool"),
+                "content": entry["answer"]
+            })
+            count += 1
+        return count
+
+
+class AnswerRecorder():
+    ## Collects a streamed answer as it is relayed and stores it once the stream finishes cleanly,
+    ## under each (cache, key) target. Errors, content filter results and client disconnects are never cached.
+    ## Writers get whatever was relayed however the stream ends, once the stream calls close(), and
+    ## whether the stream failed: it sent an error or was stopped by the content filter. An answer cut
+    ## short because the client went away has not failed, it is the part the user saw before stopping.
+
+    def __init__(self, cache: AnswerCache = None, key: str = None):
+        self.targets = []
+        self.writers = []
+        if cache is not None:
+            self.add_target(cache, key)
+        self.model = ""
+        self.object = ""
+        self.tool = None
+        self.parts = []
+        self.failed = False
+        self.closed = False
+
+    def add_target(self, cache, key):
+        self.targets.append((cache, key))
+
+    def add_writer(self, writer):
+        ## writer(answer, failed) is called once, with an answer of at least one content token
+        self.writers.append(writer)
+
+    def add_extensions_line(self, lineJson):
+        ## one parsed line of the extensions/chat/completions stream
+        if "error" in lineJson:
+            self.failed = True
+            return
+        self.model = lineJson.get("model", self.model)
+        self.object = lineJson.get("object", self.object)
+        try:
+            delta = lineJson["choices"][0]["messages"][0]["delta"]
+        except (KeyError, IndexError, TypeError):
+            return
+        if delta.get("role") == "tool":
+            self.tool = delta.get("content")
+        content = get_delta_content(lineJson)
+        if content:
+            self.parts.append(content)
+
+    def add_chat_line(self, line):
+        ## one parsed chunk of the chat/completions stream
+        self.model = line.get("model", self.model)
+        self.object = line.get("object", self.object)
+        if not line["choices"]:
+            return
+        choice = line["choices"][0]
+        if choice.get("finish_reason") == "content_filter":
+            self.failed = True
+        content = choice["delta"].get("content")
+        if content and content != "[DONE]":
+            self.parts.append(content)
+
+    def answer(self):
+        return {"model": self.model, "object": self.object, "tool": self.tool, "content": "".join(self.parts)}
+
+    def finish(self):
+        ## the stream ended normally
+        if self.closed:
+            return
+        if not self.failed and self.parts:
+            answer = self.answer()
+            for cache, key in self.targets:
+                cache.set(key, answer)
+        self.close()
+
+    def close(self):
+        ## the stream ended, however it did; streams call this last, so it is a no-op after finish()
+        if self.closed:
+            return
+        self.closed = True
+        if self.parts:
+            answer = self.answer()
+            for writer in self.writers:
+                writer(answer, self.failed)
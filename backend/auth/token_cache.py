@@ -0,0 +1,122 @@
+import logging
+import threading
+import time
+import uuid
+
+## every cache unpickled in this process, so copies of one credential share their tokens
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+class CachedTokenCredential():
+    ## Wraps an azure-identity credential and hands out its access tokens from a cache per set of
+    ## scopes, so callers can ask for a token on every request or every chunk without another
+    ## round trip to the identity endpoint (or another `az` subprocess with the CLI credentials).
+    ## A timer refreshes each token in the background refresh_margin seconds before it expires
+    ## (or halfway through its life, when that is sooner), whether or not anyone is asking for it,
+    ## so a process that sat idle still has a good token. Should the timer's fetch fail, a caller
+    ## inside the margin still gets the old token and starts another background refresh. Callers
+    ## only wait for the first token of a scope, or when the cached one has run out. Concurrent
+    ## callers share one fetch.
+    ## Unpickling gives back the one cache this process already holds for the credential, so a
+    ## ProcessPoolExecutor worker fetches once however many tasks the credential is sent with.
+
+    def __init__(self, credential, refresh_margin: float = 300, expiry_margin: float = 30, retry_seconds: float = 30, key: str = None):
+        self.key = key or uuid.uuid4().hex
+        self.credential = credential
+        self.refresh_margin = refresh_margin
+        ## a token this close to expiring is not handed out, so it cannot expire in flight
+        self.expiry_margin = expiry_margin
+        self.retry_seconds = retry_seconds
+        self.tokens = {}
+        self.retry_at = {}
+        self.fetch_locks = {}
+        self.refreshing = set()
+        self.timers = {}
+        self.lock = threading.Lock()
+        self.fetches = 0
+
+    def __getstate__(self):
+        return {"key": self.key, "credential": self.credential, "refresh_margin": self.refresh_margin, "expiry_margin": self.expiry_margin, "retry_seconds": self.retry_seconds}
+
+    def __setstate__(self, state):
+        with _caches_lock:
+            cache = _caches.get(state["key"])
+            if cache is None:
+                self.__init__(**state)
+                _caches[self.key] = self
+                return
+        # share the cache, tokens and locks of the copy unpickled first
+        self.__dict__ = cache.__dict__
+
+    def get_token(self, *scopes, **kwargs):
+        ## claims and tenant_id ask for a token other than the cached one, so they bypass the cache
+        if kwargs:
+            return self.credential.get_token(*scopes, **kwargs)
+        now = time.time()
+        with self.lock:
+            token = self.tokens.get(scopes)
+            if token is not None and token.expires_on - now > self.expiry_margin:
+                if token.expires_on - now <= self.refresh_margin and scopes not in self.refreshing and now >= self.retry_at.get(scopes, 0):
+                    self.refreshing.add(scopes)
+                    threading.Thread(target=self.refresh, args=(scopes,), name="token-refresh", daemon=True).start()
+                return token
+            fetch_lock = self.fetch_locks.setdefault(scopes, threading.Lock())
+        with fetch_lock:
+            with self.lock:
+                token = self.tokens.get(scopes)
+            if token is not None and token.expires_on - time.time() > self.expiry_margin:
+                return token
+            return self.fetch(scopes)
+
+    def fetch(self, scopes):
+        token = self.credential.get_token(*scopes)
+        with self.lock:
+            self.tokens[scopes] = token
+            self.fetches += 1
+            lifetime = token.expires_on - time.time()
+            self.schedule(scopes, max(lifetime - self.refresh_margin, lifetime / 2))
+        return token
+
+    def schedule(self, scopes, delay: float):
+        ## called with self.lock held; replaces the scope's pending refresh, if any
+        timer = self.timers.pop(scopes, None)
+        if timer is not None:
+            timer.cancel()
+        timer = threading.Timer(max(delay, 0), self.refresh_due, args=(scopes,))
+        timer.name = "token-refresh"
+        timer.daemon = True
+        self.timers[scopes] = timer
+        timer.start()
+
+    def refresh_due(self, scopes):
+        with self.lock:
+            if scopes in self.refreshing:
+                return
+            self.refreshing.add(scopes)
+        self.refresh(scopes)
+
+    def refresh(self, scopes):
+        try:
+            with self.fetch_locks[scopes]:
+                self.fetch(scopes)
+        except Exception as e:
+            # the cached token is still good for a while; the timer and callers retry after retry_seconds
+            logging.warning(f"Background token refresh for {' '.join(scopes)} failed: {e}")
+            with self.lock:
+                self.retry_at[scopes] = time.time() + self.retry_seconds
+                token = self.tokens.get(scopes)
+                if token is not None and token.expires_on - self.retry_seconds > time.time():
+                    self.schedule(scopes, self.retry_seconds)
+        finally:
+            with self.lock:
+                self.refreshing.discard(scopes)
+
+    def close(self):
+        with self.lock:
+            for timer in self.timers.values():
+                timer.cancel()
+            self.timers.clear()
+        close = getattr(self.credential, "close", None)
+        if close:
+            close()
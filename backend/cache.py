@@ -0,0 +1,135 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class TTLCache():
+    ## Thread-safe LRU cache whose entries expire ttl_seconds after they are stored.
+    ## get_or_load runs at most one loader per key at a time; concurrent callers for the
+    ## same key wait for that load instead of starting their own. Failed loads are not cached.
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            return self._get(key)
+
+    def _get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires <= time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl_seconds: float = None):
+        ## ttl_seconds overrides the cache's TTL for this entry, e.g. for a value read from a slower tier
+        ttl_seconds = self.ttl_seconds if ttl_seconds is None else min(ttl_seconds, self.ttl_seconds)
+        if ttl_seconds <= 0 or self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl_seconds, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get_or_load(self, key, load):
+        with self.lock:
+            value = self._get(key)
+            if value is not None:
+                return value
+            call = self.in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = Future()
+                self.in_flight[key] = call
+
+        if not leader:
+            return call.result()
+
+        try:
+            value = load()
+        except BaseException as e:
+            with self.lock:
+                del self.in_flight[key]
+            call.set_exception(e)
+            raise
+
+        self.set(key, value)
+        with self.lock:
+            del self.in_flight[key]
+        call.set_result(value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class SingleFlight():
+    ## Runs at most one load per key at a time: callers that arrive while it runs wait for it and
+    ## share its result, or its exception. Unlike TTLCache nothing is kept once the load finishes.
+    ## shared counts the callers that were spared a load of their own.
+
+    def __init__(self):
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.shared = 0
+
+    def do(self, key, load):
+        with self.lock:
+            call = self.in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = Future()
+                self.in_flight[key] = call
+            else:
+                self.shared += 1
+
+        if not leader:
+            return call.result()
+
+        try:
+            value = load()
+        except BaseException as e:
+            with self.lock:
+                del self.in_flight[key]
+            call.set_exception(e)
+            raise
+
+        with self.lock:
+            del self.in_flight[key]
+        call.set_result(value)
+        return value
+
+
+class AsyncSingleFlight():
+    ## SingleFlight for coroutines on one event loop. The load runs as its own task, so a caller
+    ## that goes away doesn't cancel it for the others.
+
+    def __init__(self):
+        self.in_flight = {}
+        self.shared = 0
+
+    async def do(self, key, load):
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(load())
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
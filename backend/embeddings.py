@@ -0,0 +1,49 @@
+import hashlib
+import re
+
+import numpy as np
+import requests
+
+from backend.upstream.client import USER_AGENT
+
+
+class AzureOpenAIEmbedder():
+    ## Embeds text with an Azure OpenAI embeddings deployment over one keep-alive session.
+    ## endpoint is the full embeddings URL, including the deployment and api-version.
+    ## A call that can't connect within connect_timeout, or stalls for read_timeout, raises
+    ## requests.Timeout so callers can go on without the embedding.
+
+    def __init__(self, endpoint: str, api_key: str, connect_timeout: float = 10, read_timeout: float = 120):
+        self.endpoint = endpoint
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        self.headers = {
+            'Content-Type': 'application/json',
+            'api-key': api_key,
+            'x-ms-useragent': USER_AGENT
+        }
+
+    def embed(self, text: str) -> np.ndarray:
+        r = self.session.post(self.endpoint, json={"input": text}, headers=self.headers, timeout=self.timeout)
+        r.raise_for_status()
+        return np.asarray(r.json()["data"][0]["embedding"], dtype=np.float32)
+
+
+class HashingEmbedder():
+    ## Local stand-in for an embeddings deployment, for offline development and tests. Words,
+    ## word pairs and character trigrams are hashed into dimensions buckets, so questions
+    ## sharing most of their wording score close together. It does not understand synonyms.
+
+    def __init__(self, dimensions: int = 512):
+        self.dimensions = dimensions
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        words = re.findall(r"\w+", text.casefold())
+        features = words + [" ".join(pair) for pair in zip(words, words[1:])]
+        features += [word[i:i + 3] for word in words for i in range(max(len(word) - 2, 1))]
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        return vector
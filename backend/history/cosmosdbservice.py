@@ -1,10 +1,14 @@
 import os
 import uuid
 from datetime import datetime
-from flask import Flask, request
-from azure.identity import DefaultAzureCredential  
 from azure.cosmos import CosmosClient, PartitionKey  
+from azure.cosmos.exceptions import CosmosAccessConditionFailedError
+from azure.core import MatchConditions
+
+from backend import metrics, tracing
   
+@metrics.timed_methods(metrics.COSMOS_SECONDS)
+@tracing.traced_methods("cosmos")
 class CosmosConversationClient():
     
     def __init__(self, cosmosdb_endpoint: str, credential: any, database_name: str, container_name: str, enable_message_feedback: bool = False):
@@ -30,9 +34,9 @@ class CosmosConversationClient():
         except:
             return False
 
-    def create_conversation(self, user_id, title = ''):
+    def create_conversation(self, user_id, title = '', conversation_id = None):
         conversation = {
-            'id': str(uuid.uuid4()),  
+            'id': conversation_id or str(uuid.uuid4()),  
             'type': 'conversation',
             'createdAt': datetime.utcnow().isoformat(),  
             'updatedAt': datetime.utcnow().isoformat(),  
@@ -53,6 +57,28 @@ class CosmosConversationClient():
         else:
             return False
 
+    def update_conversation(self, user_id, conversation_id, update, retries = 3):
+        ## read-modify-write guarded by the item's etag, so concurrent writers (a new message
+        ## bumping updatedAt, the background title) can't overwrite each other's fields.
+        ## update changes the conversation in place and returns False to leave it as is
+        for _ in range(retries):
+            conversation = self.container_client.read_item(item=conversation_id, partition_key=user_id)
+            if update(conversation) is False:
+                return conversation
+            try:
+                return self.container_client.replace_item(item=conversation_id, body=conversation, etag=conversation['_etag'], match_condition=MatchConditions.IfNotModified)
+            except CosmosAccessConditionFailedError:
+                continue
+        return False
+
+    def update_conversation_title(self, user_id, conversation_id, title, provisional_title):
+        ## replace the provisional title, unless the user renamed the conversation meanwhile
+        def set_title(conversation):
+            if conversation.get('title') != provisional_title:
+                return False
+            conversation['title'] = title
+        return self.update_conversation(user_id, conversation_id, set_title)
+
     def delete_conversation(self, user_id, conversation_id):
         conversation = self.container_client.read_item(item=conversation_id, partition_key=user_id)        
         if conversation:
@@ -130,9 +156,9 @@ class CosmosConversationClient():
         resp = self.container_client.upsert_item(message)  
         if resp:
             ## update the parent conversations's updatedAt field with the current message's createdAt datetime value
-            conversation = self.get_conversation(user_id, conversation_id)
-            conversation['updatedAt'] = message['createdAt']
-            self.upsert_conversation(conversation)
+            def touch(conversation):
+                conversation['updatedAt'] = message['createdAt']
+            self.update_conversation(user_id, conversation_id, touch)
             return resp
         else:
             return False
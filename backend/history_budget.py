@@ -0,0 +1,98 @@
+import logging
+from dataclasses import dataclass
+from typing import Callable, List
+
+# Context window of the chat models this app is deployed with, by AZURE_OPENAI_MODEL_NAME
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-35-turbo": 4096,
+    "gpt-35-turbo-4k": 4096,
+    "gpt-35-turbo-16k": 16384,
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+}
+
+# Tokens the chat format adds around each message, and once to prime the answer
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_PROMPT = 3
+
+
+def get_token_counter(encoding_name: str = "cl100k_base") -> Callable[[str], int]:
+    ## tiktoken counter for the chat models; tiktoken downloads the encoding on first use, so
+    ## without it (e.g. offline) fall back to the usual estimate of 4 characters per token
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding(encoding_name)
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception as e:
+        logging.warning(f"tiktoken encoding {encoding_name} is unavailable, estimating 4 characters per token: {e}")
+        return lambda text: (len(text) + 3) // 4
+
+
+@dataclass
+class TrimmedHistory:
+    """Result of fitting a conversation into the prompt budget.
+
+    Attributes:
+        messages (List[dict]): The messages to send, oldest first.
+        tokens (int): Tokens of the kept messages, including the system message.
+        trimmed_tokens (int): Tokens of the messages that were dropped.
+        dropped_messages (int): Number of messages that were dropped.
+    """
+    messages: List[dict]
+    tokens: int
+    trimmed_tokens: int = 0
+    dropped_messages: int = 0
+
+
+class HistoryBudgeter():
+    ## Keeps the newest turns of a conversation within prompt_budget tokens, counting the system
+    ## message once. Old tool messages, which carry the citations of earlier answers, go first,
+    ## oldest first; then whole turns from the start of the conversation. The last user message
+    ## is always kept, even when it alone is over budget.
+
+    def __init__(self, prompt_budget: int, system_message: str, max_tokens: int, model_name: str = None, count_tokens: Callable[[str], int] = None):
+        self.count_tokens = count_tokens or get_token_counter()
+        self.prompt_budget = prompt_budget
+        self.system_tokens = self.count_tokens(system_message) + TOKENS_PER_MESSAGE + TOKENS_PER_PROMPT
+        if prompt_budget <= self.system_tokens:
+            raise ValueError(f"AZURE_OPENAI_PROMPT_TOKEN_BUDGET of {prompt_budget} leaves no room for history after the {self.system_tokens} token system message")
+        context_window = MODEL_CONTEXT_WINDOWS.get((model_name or "").lower())
+        if context_window and prompt_budget + max_tokens > context_window:
+            raise ValueError(f"AZURE_OPENAI_PROMPT_TOKEN_BUDGET of {prompt_budget} plus AZURE_OPENAI_MAX_TOKENS of {max_tokens} exceeds the {context_window} token context of {model_name}")
+
+    def message_tokens(self, message: dict) -> int:
+        return self.count_tokens(str(message.get("content") or "")) + TOKENS_PER_MESSAGE
+
+    def trim(self, messages: List[dict]) -> TrimmedHistory:
+        messages = [message for message in messages if message]
+        sizes = [self.message_tokens(message) for message in messages]
+        total = self.system_tokens + sum(sizes)
+        if total <= self.prompt_budget or len(messages) <= 1:
+            return TrimmedHistory(messages, total)
+
+        keep = [True] * len(messages)
+        last = len(messages) - 1
+
+        # old tool messages first
+        for i in range(last):
+            if total <= self.prompt_budget:
+                break
+            if messages[i]["role"] == "tool":
+                keep[i] = False
+                total -= sizes[i]
+
+        # then the oldest turns; a turn starts at a user message, so the kept history does too
+        start = 0
+        while total > self.prompt_budget and start < last:
+            keep_start = start + 1
+            while keep_start < last and messages[keep_start]["role"] != "user":
+                keep_start += 1
+            for i in range(start, keep_start):
+                if keep[i]:
+                    keep[i] = False
+                    total -= sizes[i]
+            start = keep_start
+
+        kept = [message for message, k in zip(messages, keep) if k]
+        trimmed_tokens = sum(size for size, k in zip(sizes, keep) if not k)
+        return TrimmedHistory(kept, total, trimmed_tokens, len(messages) - len(kept))
@@ -0,0 +1,108 @@
+import json
+import math
+import re
+from collections import Counter, defaultdict
+from typing import List
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Reciprocal rank fusion constant for hybrid queries, as in Azure Cognitive Search
+RRF_K = 60
+
+QUERY_TYPES = ("simple", "vector", "vectorSimpleHybrid")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.casefold())
+
+
+def load_chunks(path: str) -> List[dict]:
+    ## the JSON lines written by scripts/chunk_documents.py, one Document per line; it gives every
+    ## chunk the same id, so the chunk_id cited for a chunk is its position in the file
+    with open(path, encoding="utf-8") as f:
+        chunks = [json.loads(line) for line in f if line.strip()]
+    for i, chunk in enumerate(chunks):
+        chunk.setdefault("chunk_id", str(i))
+    return chunks
+
+
+class LocalSearchIndex():
+    ## In-memory retrieval over chunked documents: BM25 over the title and content, and cosine
+    ## similarity over contentVector when every chunk has one. Postings hold each term's
+    ## precomputed BM25 weight per chunk, so a keyword query is a few NumPy scatter-adds.
+
+    def __init__(self, chunks: List[dict], k1: float = 1.2, b: float = 0.75):
+        self.chunks = chunks
+        count = len(chunks)
+
+        term_postings = defaultdict(lambda: ([], []))
+        lengths = np.zeros(count, dtype=np.float32)
+        for i, chunk in enumerate(chunks):
+            terms = Counter(tokenize(f"{chunk.get('title') or ''} {chunk['content']}"))
+            lengths[i] = sum(terms.values())
+            for term, frequency in terms.items():
+                term_postings[term][0].append(i)
+                term_postings[term][1].append(frequency)
+
+        length_norm = k1 * (1 - b + b * lengths / (lengths.mean() if count else 1.0))
+        self.postings = {}
+        for term, (ids, frequencies) in term_postings.items():
+            ids = np.asarray(ids, dtype=np.int32)
+            frequencies = np.asarray(frequencies, dtype=np.float32)
+            idf = math.log(1 + (count - len(ids) + 0.5) / (len(ids) + 0.5))
+            self.postings[term] = (ids, idf * frequencies * (k1 + 1) / (frequencies + length_norm[ids]))
+
+        self.vectors = None
+        if chunks and all(chunk.get("contentVector") for chunk in chunks):
+            vectors = np.asarray([chunk["contentVector"] for chunk in chunks], dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            self.vectors = vectors / np.where(norms == 0, 1, norms)
+
+    @classmethod
+    def from_jsonl(cls, path: str):
+        return cls(load_chunks(path))
+
+    @property
+    def has_vectors(self) -> bool:
+        return self.vectors is not None
+
+    def keyword_scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is not None:
+                np.add.at(scores, posting[0], posting[1])
+        return scores
+
+    def vector_scores(self, query_vector) -> np.ndarray:
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query_vector)
+        return self.vectors @ (query_vector / norm if norm else query_vector)
+
+    def search(self, query: str, top_k: int, query_type: str = "simple", query_vector=None) -> List[tuple]:
+        ## returns [(chunk, score)], best first; keyword matches only score above 0
+        if not self.chunks:
+            return []
+        if query_type == "simple":
+            return self._top(self.keyword_scores(query), top_k, positive=True)
+        if query_type == "vector":
+            return self._top(self.vector_scores(query_vector), top_k)
+
+        # vectorSimpleHybrid: fuse the two rankings by reciprocal rank
+        fused = np.zeros(len(self.chunks), dtype=np.float32)
+        for scores, positive in ((self.keyword_scores(query), True), (self.vector_scores(query_vector), False)):
+            ranked = np.argsort(-scores, kind="stable")
+            if positive:
+                ranked = ranked[scores[ranked] > 0]
+            fused[ranked] += 1.0 / (RRF_K + 1 + np.arange(len(ranked), dtype=np.float32))
+        return self._top(fused, top_k, positive=True)
+
+    def _top(self, scores: np.ndarray, top_k: int, positive: bool = False) -> List[tuple]:
+        top_k = min(top_k, len(scores))
+        if top_k <= 0:
+            return []
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(self.chunks[i], float(scores[i])) for i in candidates if not positive or scores[i] > 0]
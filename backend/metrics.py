@@ -0,0 +1,155 @@
+import functools
+import inspect
+import os
+import time
+
+from backend import tracing
+
+## prometheus_client is optional; without it nothing is recorded and /metrics is not served.
+## Under uwsgi or gunicorn with several worker processes, set PROMETHEUS_MULTIPROC_DIR to an
+## empty directory in the environment the server starts with (it is read when prometheus_client
+## is imported, before .env is loaded). Every worker then writes its samples there and /metrics
+## adds them up, whichever worker answers it.
+try:
+    import prometheus_client
+    from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+except ImportError:
+    prometheus_client = None
+
+MULTIPROCESS_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+STREAM_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+RATE_BUCKETS = (1, 5, 10, 20, 30, 50, 75, 100, 150, 200, 400)
+
+if prometheus_client:
+    REQUEST_SECONDS = Histogram("chat_http_request_duration_seconds", "Seconds until the response of a route starts; streamed answers keep going after this", ["route", "method", "status"], buckets=LATENCY_BUCKETS)
+    TIME_TO_FIRST_TOKEN_SECONDS = Histogram("chat_time_to_first_token_seconds", "Seconds from sending a streamed answer request to its first content token", ["stream"], buckets=LATENCY_BUCKETS)
+    STREAM_SECONDS = Histogram("chat_stream_duration_seconds", "Seconds from sending a streamed answer request to its end", ["stream"], buckets=STREAM_BUCKETS)
+    TOKENS_PER_SECOND = Histogram("chat_stream_tokens_per_second", "Content deltas per second of a streamed answer after its first token", ["stream"], buckets=RATE_BUCKETS)
+    GRAPH_GROUP_FETCH_SECONDS = Histogram("chat_graph_group_fetch_duration_seconds", "Seconds to read a user's groups from Microsoft Graph", buckets=LATENCY_BUCKETS)
+    COSMOS_SECONDS = Histogram("chat_cosmos_operation_duration_seconds", "Seconds per CosmosConversationClient call", ["operation"], buckets=LATENCY_BUCKETS)
+    TITLE_SECONDS = Histogram("chat_title_generation_duration_seconds", "Seconds to generate a conversation title", buckets=LATENCY_BUCKETS)
+    UPSTREAM_RESPONSES = Counter("chat_upstream_responses_total", "Azure OpenAI responses by operation and status code, 'error' when no response came back", ["operation", "status"])
+    HEDGE_REQUESTS = Counter("chat_hedge_requests_total", "Streamed requests that could be hedged", ["route"])
+    HEDGED = Counter("chat_hedge_hedged_total", "Requests sent a second time because their answer was slow to start", ["route"])
+    HEDGE_WINS = Counter("chat_hedge_wins_total", "Hedged requests whose second copy started first", ["route"])
+    HEDGE_OVER_BUDGET = Counter("chat_hedge_over_budget_total", "Slow requests not hedged because the route's budget was spent", ["route"])
+    SEMANTIC_CACHE_LOOKUPS = Counter("chat_semantic_cache_lookups_total", "Semantic cache lookups by result: hit, near_miss (a miss close to the threshold) or miss", ["result"])
+else:
+    REQUEST_SECONDS = TIME_TO_FIRST_TOKEN_SECONDS = STREAM_SECONDS = TOKENS_PER_SECOND = None
+    GRAPH_GROUP_FETCH_SECONDS = COSMOS_SECONDS = TITLE_SECONDS = UPSTREAM_RESPONSES = None
+    HEDGE_REQUESTS = HEDGED = HEDGE_WINS = HEDGE_OVER_BUDGET = SEMANTIC_CACHE_LOOKUPS = None
+
+
+def enabled() -> bool:
+    return prometheus_client is not None
+
+
+def render():
+    ## the exposition text and its content type; with several processes, the sum over all of them
+    if MULTIPROCESS_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def observe_request(route: str, method: str, status: int, seconds: float):
+    if REQUEST_SECONDS:
+        REQUEST_SECONDS.labels(route, method, str(status)).observe(seconds)
+
+
+def count_upstream(operation: str, status):
+    if UPSTREAM_RESPONSES:
+        UPSTREAM_RESPONSES.labels(operation, str(status)).inc()
+
+
+def count_hedge(counter, route: str):
+    ## counter is one of the HEDGE_* counters
+    if counter:
+        counter.labels(route).inc()
+
+
+def count_semantic_lookup(result: str):
+    if SEMANTIC_CACHE_LOOKUPS:
+        SEMANTIC_CACHE_LOOKUPS.labels(result).inc()
+
+
+def timed(histogram, **labels):
+    ## decorator observing how long each call of a function or coroutine takes, raised or not
+    def decorate(func):
+        if histogram is None:
+            return func
+        metric = histogram.labels(**labels) if labels else histogram
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def timed_coroutine(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    metric.observe(time.perf_counter() - started)
+            return timed_coroutine
+
+        @functools.wraps(func)
+        def timed_function(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metric.observe(time.perf_counter() - started)
+        return timed_function
+    return decorate
+
+
+def timed_methods(histogram):
+    ## class decorator timing every public method, labelled operation=<method name>
+    def decorate(cls):
+        for name, member in list(vars(cls).items()):
+            if not name.startswith("_") and inspect.isfunction(member):
+                setattr(cls, name, timed(histogram, operation=name)(member))
+        return cls
+    return decorate
+
+
+class StreamTimer():
+    ## Times one streamed answer from when the request is sent: the first content token, the
+    ## rate of tokens after it and the whole duration, recorded by finish(). Tokens are counted
+    ## as content deltas from Azure OpenAI, which carry one token each. The answer is traced
+    ## too; send the upstream request inside attached() to make it part of the answer's trace.
+
+    def __init__(self, stream: str):
+        self.stream = stream
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.tokens = 0
+        self.finished = False
+        self.trace = tracing.StreamTrace(f"answer stream {stream}")
+
+    def attached(self):
+        return self.trace.attached()
+
+    def token(self, content):
+        if not content or content == "[DONE]":
+            return
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+            self.trace.first_token()
+            if TIME_TO_FIRST_TOKEN_SECONDS:
+                TIME_TO_FIRST_TOKEN_SECONDS.labels(self.stream).observe(self.first_token_at - self.started)
+        self.tokens += 1
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        self.trace.finish(self.tokens)
+        if STREAM_SECONDS is None:
+            return
+        now = time.perf_counter()
+        STREAM_SECONDS.labels(self.stream).observe(now - self.started)
+        if self.tokens > 1 and now > self.first_token_at:
+            TOKENS_PER_SECOND.labels(self.stream).observe((self.tokens - 1) / (now - self.first_token_at))
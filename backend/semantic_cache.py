@@ -0,0 +1,143 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from backend import metrics
+from backend.answer_cache import answer_cache_key
+
+
+class ScopeIndex():
+    ## Normalized question vectors of one scope, searched with a single matrix-vector product.
+    ## Rows grow by doubling and removals swap the last row into the gap.
+
+    def __init__(self, dimensions: int):
+        self.vectors = np.zeros((8, dimensions), dtype=np.float32)
+        self.ids = []
+
+    def add(self, entry_id, vector):
+        if len(self.ids) == len(self.vectors):
+            self.vectors = np.concatenate([self.vectors, np.zeros_like(self.vectors)])
+        self.vectors[len(self.ids)] = vector
+        self.ids.append(entry_id)
+
+    def remove(self, entry_id):
+        row = self.ids.index(entry_id)
+        last = len(self.ids) - 1
+        self.vectors[row] = self.vectors[last]
+        self.ids[row] = self.ids[last]
+        self.ids.pop()
+
+    def search(self, vector):
+        ## returns (entry id, cosine similarity) of the nearest question, or (None, -1.0)
+        if not self.ids:
+            return None, -1.0
+        scores = self.vectors[:len(self.ids)] @ vector
+        row = int(np.argmax(scores))
+        return self.ids[row], float(scores[row])
+
+
+class SemanticAnswerCache():
+    ## Answers earlier questions that are close in meaning to the last user turn.
+    ##
+    ## Questions are only compared within a scope: a hash of everything else sent upstream, i.e. the
+    ## earlier turns, sampling settings, system message and compiled dataSources including the
+    ## user's security filter. So an answer is never replayed to a user whose filter differs.
+    ## Entries expire after ttl_seconds and the least recently used are evicted past max_entries.
+    ## Keys come from key(), which embeds the question; get/set mirror AnswerCache so an
+    ## AnswerRecorder can store into either. A miss within near_miss_margin of the threshold is
+    ## also counted as a near miss; many of them suggest the threshold is set too high.
+
+    def __init__(self, embedder, threshold: float = 0.95, ttl_seconds: float = 3600, max_entries: int = 1000, near_miss_margin: float = 0.05):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.near_miss_margin = near_miss_margin
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.scopes = {}
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.near_misses = 0
+        self.evictions = 0
+
+    def key(self, body: dict):
+        ## (scope, question vector), or None if the conversation doesn't end with a user turn
+        messages = body["messages"]
+        if not messages or messages[-1].get("role") != "user":
+            return None
+        scope = answer_cache_key({**body, "messages": messages[:-1]})
+        vector = self.embedder.embed(" ".join(str(messages[-1]["content"]).split()))
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        return scope, vector / norm
+
+    def get(self, key):
+        scope, vector = key
+        with self.lock:
+            entry_id, score = self._search(scope, vector)
+            if entry_id is None or score < self.threshold:
+                self.misses += 1
+                if score >= self.threshold - self.near_miss_margin:
+                    self.near_misses += 1
+                    metrics.count_semantic_lookup("near_miss")
+                else:
+                    metrics.count_semantic_lookup("miss")
+                return None
+            self.hits += 1
+            metrics.count_semantic_lookup("hit")
+            self.entries.move_to_end(entry_id)
+            return self.entries[entry_id][1]
+
+    def set(self, key, answer):
+        scope, vector = key
+        with self.lock:
+            entry_id, score = self._search(scope, vector)
+            if entry_id is not None and score >= self.threshold:
+                # a concurrent miss already stored this question, keep the newer answer
+                self.entries[entry_id] = (scope, answer, time.monotonic() + self.ttl_seconds)
+                self.entries.move_to_end(entry_id)
+                return
+            entry_id = self.next_id
+            self.next_id += 1
+            if scope not in self.scopes:
+                self.scopes[scope] = ScopeIndex(len(vector))
+            self.scopes[scope].add(entry_id, vector)
+            self.entries[entry_id] = (scope, answer, time.monotonic() + self.ttl_seconds)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def _search(self, scope, vector):
+        index = self.scopes.get(scope)
+        if index is None:
+            return None, -1.0
+        while True:
+            entry_id, score = index.search(vector)
+            if entry_id is None or self.entries[entry_id][2] > time.monotonic():
+                return entry_id, score
+            self._remove(entry_id)
+
+    def _remove(self, entry_id):
+        scope = self.entries.pop(entry_id)[0]
+        index = self.scopes[scope]
+        index.remove(entry_id)
+        if not index.ids:
+            del self.scopes[scope]
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "scopes": len(self.scopes),
+                "hits": self.hits,
+                "misses": self.misses,
+                "near_misses": self.near_misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,137 @@
+from dataclasses import dataclass
+from typing import Any, ClassVar, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class CompletionSettings:
+    """Sampling settings sent with every chat completion request.
+
+    Attributes:
+        temperature (float): Sampling temperature, between 0 and 2.
+        max_tokens (int): Maximum number of tokens in the generated answer.
+        top_p (float): Nucleus sampling probability mass, between 0 and 1.
+        stop (Optional[Tuple[str, ...]]): Up to 4 stop sequences.
+        stream (bool): Whether the answer is streamed.
+    """
+    temperature: float
+    max_tokens: int
+    top_p: float
+    stop: Optional[Tuple[str, ...]]
+    stream: bool
+
+    @classmethod
+    def from_env_values(cls, temperature, max_tokens, top_p, stop_sequence, stream):
+        """Parse and validate the raw environment values, raising ValueError on bad configuration."""
+        settings = cls(
+            temperature=float(temperature),
+            max_tokens=int(max_tokens),
+            top_p=float(top_p),
+            stop=tuple(stop_sequence.split("|")) if stop_sequence else None,
+            stream=stream
+        )
+        if not 0 <= settings.temperature <= 2:
+            raise ValueError(f"AZURE_OPENAI_TEMPERATURE must be between 0 and 2, got {temperature}")
+        if settings.max_tokens <= 0:
+            raise ValueError(f"AZURE_OPENAI_MAX_TOKENS must be a positive integer, got {max_tokens}")
+        if not 0 <= settings.top_p <= 1:
+            raise ValueError(f"AZURE_OPENAI_TOP_P must be between 0 and 1, got {top_p}")
+        if settings.stop and len(settings.stop) > 4:
+            raise ValueError(f"AZURE_OPENAI_STOP_SEQUENCE allows at most 4 sequences, got {len(settings.stop)}")
+        return settings
+
+    def as_body(self) -> dict:
+        return {
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "top_p": self.top_p,
+            "stop": self.stop,
+            "stream": self.stream
+        }
+
+
+@dataclass(frozen=True)
+class FieldsMapping:
+    """Which fields of the index hold each part of a document.
+
+    Attributes:
+        content_fields (Tuple[str, ...]): Fields with the document text.
+        title_field (Optional[str]): Field with the document title.
+        url_field (Optional[str]): Field with the document URL.
+        filepath_field (Optional[str]): Field with the document file name.
+        vector_fields (Tuple[str, ...]): Fields with the document embeddings.
+    """
+    content_fields: Tuple[str, ...] = ()
+    title_field: Optional[str] = None
+    url_field: Optional[str] = None
+    filepath_field: Optional[str] = None
+    vector_fields: Tuple[str, ...] = ()
+
+    def as_body(self) -> dict:
+        return {
+            "contentFields": list(self.content_fields),
+            "titleField": self.title_field,
+            "urlField": self.url_field,
+            "filepathField": self.filepath_field,
+            "vectorFields": list(self.vector_fields)
+        }
+
+
+@dataclass(frozen=True)
+class DataSourceSettings:
+    """The dataSources entry sent with every request on your data.
+
+    Built once at startup and shared by every request. as_body() returns a new entry each
+    time, so a request can add its security filter without touching the settings or
+    another request's body.
+
+    Attributes:
+        type (str): AzureCognitiveSearch, AzureCosmosDB or Elasticsearch.
+        connection (Tuple[Tuple[str, Any], ...]): Endpoint, credential and index parameters, in the order they are sent.
+        fields_mapping (FieldsMapping): Which index fields hold each part of a document.
+        in_scope (bool): Whether answers are limited to the retrieved documents.
+        top_n_documents (int): Number of documents retrieved per question.
+        strictness (int): How strictly retrieved documents are filtered, from 1 to 5.
+        query_type (str): How the index is queried, such as simple, semantic or vector.
+        role_information (str): The system message.
+        options (Tuple[Tuple[str, Any], ...]): Parameters only some types take, such as filter or the embedding settings.
+    """
+    type: str
+    connection: Tuple[Tuple[str, Any], ...] = ()
+    fields_mapping: FieldsMapping = FieldsMapping()
+    in_scope: bool = True
+    top_n_documents: int = 5
+    strictness: int = 3
+    query_type: str = "simple"
+    role_information: str = ""
+    options: Tuple[Tuple[str, Any], ...] = ()
+
+    SECRETS: ClassVar[Tuple[str, ...]] = ("key", "connectionString", "encodedApiKey", "embeddingKey")
+
+    def __post_init__(self):
+        if self.top_n_documents <= 0:
+            raise ValueError(f"{self.type} top k must be a positive integer, got {self.top_n_documents}")
+        if not 1 <= self.strictness <= 5:
+            raise ValueError(f"{self.type} strictness must be between 1 and 5, got {self.strictness}")
+
+    def as_body(self, **overrides) -> dict:
+        """A new dataSources entry; overrides, such as a request's filter, replace its parameters."""
+        parameters = dict(self.connection)
+        parameters.update({
+            "fieldsMapping": self.fields_mapping.as_body(),
+            "inScope": self.in_scope,
+            "topNDocuments": self.top_n_documents,
+            "strictness": self.strictness,
+            "queryType": self.query_type,
+            "roleInformation": self.role_information
+        })
+        parameters.update(self.options)
+        parameters.update(overrides)
+        return {"type": self.type, "parameters": parameters}
+
+    def redacted_body(self, **overrides) -> dict:
+        """as_body() with the secrets masked, for debug logging."""
+        body = self.as_body(**overrides)
+        for secret in self.SECRETS:
+            if body["parameters"].get(secret):
+                body["parameters"][secret] = "*****"
+        return body
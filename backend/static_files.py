@@ -0,0 +1,172 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+from flask import Response, request, send_file
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+from backend.cache import SingleFlight
+
+## brotli is optional; without it compressible files are offered with gzip only
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+## Vite names every file it emits under assets/ <name>-<8 character content hash>.<ext>
+HASHED_NAME = re.compile(r"-[A-Za-z0-9_-]{8}\.[A-Za-z0-9.]+$")
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml", "image/x-icon", "image/vnd.microsoft.icon")
+MIN_COMPRESS_SIZE = 1024
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+class StaticVariant():
+    ## One encoding of a file: its bytes when held in memory, otherwise the path to send, and
+    ## the strong ETag of exactly those bytes
+
+    def __init__(self, etag: str, size: int, data: bytes = None, path: str = None):
+        self.etag = etag
+        self.size = size
+        self.data = data
+        self.path = path
+
+
+class StaticFiles():
+    ## Serves a build folder with validators and content negotiation. Compressible files are
+    ## compressed with brotli and gzip once per build, by precompress() at startup or else by the
+    ## first request that needs them; concurrent requests for the same copy wait for that one.
+    ## Files and compressed copies up to max_memory_size bytes are held in memory. Larger ones are
+    ## compressed to cache_dir, which processes sharing it reuse, and sent from disk.
+    ## Content-hashed names are cached by browsers for a year, anything else is revalidated
+    ## with its ETag on every use. Entries are keyed on the file's size and mtime, so a rebuild
+    ## is picked up without a restart.
+
+    def __init__(self, root: str, max_memory_size: int = 1024 * 1024, cache_dir: str = None):
+        self.root = root
+        self.max_memory_size = max_memory_size
+        self.cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), "static-compressed")
+        self.variants = {}
+        self.in_flight = SingleFlight()
+        self.lock = threading.Lock()
+
+    def encodings(self, mimetype: str) -> list:
+        if not mimetype.startswith(COMPRESSIBLE_TYPES):
+            return ["identity"]
+        return (["br"] if brotli else []) + ["gzip", "identity"]
+
+    def precompress(self) -> int:
+        ## builds every compressed copy the folder will be asked for; returns how many
+        count = 0
+        for folder, _, names in os.walk(self.root):
+            for name in names:
+                full_path = os.path.join(folder, name)
+                mimetype = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+                if os.path.getsize(full_path) < MIN_COMPRESS_SIZE:
+                    continue
+                for encoding in self.encodings(mimetype)[:-1]:
+                    self.variant(full_path, encoding)
+                    count += 1
+        return count
+
+    def variant(self, full_path: str, encoding: str):
+        stat = os.stat(full_path)
+        key = (full_path, stat.st_size, stat.st_mtime_ns, encoding)
+        with self.lock:
+            found = self.variants.get(key)
+        if found is not None:
+            return found
+        # concurrent requests for a copy that is still being compressed wait for that one
+        return self.in_flight.do(key, lambda: self.load(key, stat))
+
+    def load(self, key, stat: os.stat_result) -> StaticVariant:
+        with self.lock:
+            found = self.variants.get(key)
+        if found is None:
+            found = self.build(key[0], stat, key[3])
+        with self.lock:
+            # drop what an earlier build of the same file left behind
+            for stale in [k for k in self.variants if k[0] == key[0] and k[1:3] != key[1:3]]:
+                del self.variants[stale]
+            self.variants[key] = found
+        return found
+
+    def build(self, full_path: str, stat: os.stat_result, encoding: str) -> StaticVariant:
+        if stat.st_size > self.max_memory_size:
+            # too big to hold per process: the ETag comes from the size and mtime
+            etag = f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+            if encoding == "identity":
+                return StaticVariant(etag, stat.st_size, path=full_path)
+            path = self.compress_to_disk(full_path, stat, encoding)
+            return StaticVariant(f"{etag}-{encoding}", os.path.getsize(path), path=path)
+
+        with open(full_path, "rb") as f:
+            data = f.read()
+        if encoding == "br":
+            data = brotli.compress(data, quality=9)
+        elif encoding == "gzip":
+            data = gzip.compress(data, compresslevel=9, mtime=0)
+        return StaticVariant(hashlib.sha256(data).hexdigest()[:32], len(data), data=data)
+
+    def compress_to_disk(self, full_path: str, stat: os.stat_result, encoding: str) -> str:
+        name = hashlib.sha256(f"{full_path}|{stat.st_size}|{stat.st_mtime_ns}".encode()).hexdigest()[:32]
+        path = os.path.join(self.cache_dir, f"{name}.{encoding}")
+        if os.path.exists(path):
+            return path
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # written under a temporary name and renamed, so other processes never see half a file
+        with open(full_path, "rb") as source, tempfile.NamedTemporaryFile(dir=self.cache_dir, delete=False) as target:
+            try:
+                if encoding == "br":
+                    compressor = brotli.Compressor(quality=9)
+                    for chunk in iter(lambda: source.read(1024 * 1024), b""):
+                        target.write(compressor.process(chunk))
+                    target.write(compressor.finish())
+                else:
+                    with gzip.GzipFile(filename="", mode="wb", fileobj=target, compresslevel=9, mtime=0) as compressed:
+                        shutil.copyfileobj(source, compressed)
+            except Exception:
+                target.close()
+                os.remove(target.name)
+                raise
+        os.replace(target.name, path)
+        return path
+
+    def serve(self, path: str, immutable: bool = None) -> Response:
+        ## immutable defaults to whether the file name carries a content hash
+        full_path = safe_join(self.root, path)
+        if full_path is None or not os.path.isfile(full_path):
+            raise NotFound()
+        mimetype = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+        if immutable is None:
+            immutable = bool(HASHED_NAME.search(os.path.basename(path)))
+
+        size = os.path.getsize(full_path)
+        encoding, variant = "identity", None
+        negotiated = len(self.encodings(mimetype)) > 1 and size >= MIN_COMPRESS_SIZE
+        if negotiated:
+            encoding = request.accept_encodings.best_match(self.encodings(mimetype), default="identity")
+            variant = self.variant(full_path, encoding)
+            if variant.size >= size:
+                encoding, variant = "identity", None
+        variant = variant or self.variant(full_path, "identity")
+
+        if request.if_none_match.contains(variant.etag):
+            response = Response(status=304)
+        elif variant.data is not None:
+            response = Response(variant.data, mimetype=mimetype)
+        else:
+            response = send_file(variant.path, mimetype=mimetype, conditional=False, etag=False, max_age=None)
+        response.set_etag(variant.etag)
+        response.headers["Cache-Control"] = IMMUTABLE if immutable else REVALIDATE
+        if negotiated:
+            response.vary.add("Accept-Encoding")
+        if encoding != "identity" and response.status_code == 200:
+            response.headers["Content-Encoding"] = encoding
+        return response
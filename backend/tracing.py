@@ -0,0 +1,180 @@
+import contextlib
+import functools
+import inspect
+import logging
+import time
+
+## opentelemetry is optional; without it, or until configure() installs an exporter, spans cost
+## next to nothing and nothing is exported
+try:
+    from opentelemetry import context, propagate, trace
+    from opentelemetry.trace import SpanKind, Status, StatusCode
+except ImportError:
+    trace = None
+
+TRACER_NAME = "sample-app-aoai-chatgpt"
+EXPORTERS = ["console", "file", "memory", "otlp"]
+
+
+def enabled() -> bool:
+    return trace is not None
+
+
+def configure(exporter: str, file_path: str = None, service_name: str = "sample-app-aoai-chatgpt"):
+    ## install the SDK's tracer provider with one exporter and return the exporter, or None.
+    ## file writes one JSON span per line to file_path; memory keeps them for get_finished_spans();
+    ## otlp sends them to OTEL_EXPORTER_OTLP_ENDPOINT.
+    if not exporter:
+        return None
+    if exporter not in EXPORTERS:
+        raise ValueError(f"TRACING_EXPORTER must be one of {', '.join(EXPORTERS)}, not {exporter}")
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SimpleSpanProcessor
+        from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+    except ImportError:
+        logging.warning(f"TRACING_EXPORTER={exporter} needs the opentelemetry-sdk package, tracing is off")
+        return None
+
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    if exporter == "memory":
+        span_exporter = InMemorySpanExporter()
+        provider.add_span_processor(SimpleSpanProcessor(span_exporter))
+    elif exporter == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        span_exporter = OTLPSpanExporter()
+        provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    else:
+        out = open(file_path, "a", encoding="utf-8") if exporter == "file" else None
+        span_exporter = ConsoleSpanExporter(formatter=lambda span: span.to_json(indent=None) + "\n", **({"out": out} if out else {}))
+        provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    trace.set_tracer_provider(provider)
+    return span_exporter
+
+
+def tracer():
+    return trace.get_tracer(TRACER_NAME)
+
+
+@contextlib.contextmanager
+def span(name: str, parent=None, kind: str = "internal", **attributes):
+    ## a child of parent, or of the active span, yielding the span or None; kind is a SpanKind
+    ## name such as "client". Exceptions are recorded on the span and re-raised.
+    if trace is None:
+        yield None
+        return
+    with tracer().start_as_current_span(name, context=parent, kind=getattr(SpanKind, kind.upper()), attributes=attributes) as current:
+        yield current
+
+
+@contextlib.contextmanager
+def attached(parent):
+    ## make parent the active context for the block, e.g. around a call made from a generator
+    if trace is None or parent is None:
+        yield
+        return
+    token = context.attach(parent)
+    try:
+        yield
+    finally:
+        context.detach(token)
+
+
+def inject(headers: dict = None) -> dict:
+    ## headers with the W3C traceparent of the active span added, for the upstream request
+    if trace is None:
+        return headers
+    carrier = dict(headers or {})
+    propagate.inject(carrier)
+    return carrier
+
+
+def traced(name: str):
+    ## decorator running each call of a function or coroutine in its own span
+    def decorate(func):
+        if trace is None:
+            return func
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def traced_coroutine(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return traced_coroutine
+
+        @functools.wraps(func)
+        def traced_function(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return traced_function
+    return decorate
+
+
+def traced_methods(prefix: str):
+    ## class decorator tracing every public method as a span named <prefix>.<method name>
+    def decorate(cls):
+        for name, member in list(vars(cls).items()):
+            if not name.startswith("_") and inspect.isfunction(member):
+                setattr(cls, name, traced(f"{prefix}.{name}")(member))
+        return cls
+    return decorate
+
+
+def start_request_span(method: str, route: str, headers):
+    ## a server span for one request, continuing the caller's trace if it sent one, made active
+    ## until end_request_span; returns what end_request_span needs
+    if trace is None:
+        return None
+    current = tracer().start_span(f"{method} {route}", context=propagate.extract(headers), kind=SpanKind.SERVER, attributes={"http.method": method, "http.route": route})
+    return current, context.attach(trace.set_span_in_context(current))
+
+
+def end_request_span(started, status_code: int = None, error: BaseException = None):
+    if started is None:
+        return
+    current, token = started
+    if status_code is not None:
+        current.set_attribute("http.status_code", status_code)
+        if status_code >= 500:
+            current.set_status(Status(StatusCode.ERROR))
+    if error is not None:
+        current.record_exception(error)
+        current.set_status(Status(StatusCode.ERROR, str(error)))
+    current.end()
+    context.detach(token)
+
+
+class StreamTrace():
+    ## The span of one streamed answer, opened when the request is about to be sent and ended
+    ## by finish(). The upstream request sent inside attached() becomes its child, covering the
+    ## connection until the response headers. finish() adds "first token", from the start until
+    ## the first content token, and "stream", from there until the end, so a slow answer shows
+    ## which phase the time went to.
+
+    def __init__(self, name: str):
+        self.span = None
+        if trace is None:
+            return
+        self.started = time.time_ns()
+        self.first_token_at = None
+        self.span = tracer().start_span(name, start_time=self.started)
+        self.context = trace.set_span_in_context(self.span)
+
+    def attached(self):
+        return attached(self.context if self.span else None)
+
+    def first_token(self):
+        if self.span and self.first_token_at is None:
+            self.first_token_at = time.time_ns()
+
+    def finish(self, tokens: int = 0):
+        if self.span is None or not self.span.is_recording():
+            return
+        now = time.time_ns()
+        first_token_at = self.first_token_at or now
+        tracer().start_span("first token", context=self.context, start_time=self.started).end(end_time=first_token_at)
+        if self.first_token_at:
+            tracer().start_span("stream", context=self.context, start_time=first_token_at, attributes={"tokens": tokens}).end(end_time=now)
+        self.span.set_attribute("tokens", tokens)
+        self.span.end(end_time=now)
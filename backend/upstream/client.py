@@ -0,0 +1,274 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from backend import metrics, tracing
+from backend.upstream.ndjson import loads
+
+USER_AGENT = "GitHubSampleWebApp/PublicAPI/3.0.0"
+## a cheap authenticated GET on the resource, used only to open connections ahead of traffic
+WARM_PATH = "openai/models?api-version=2023-05-15"
+
+
+class UpstreamError(Exception):
+
+    def __init__(self, status_code: int, message: str, headers: dict = None):
+        super().__init__(f"Azure OpenAI request failed with status {status_code}: {message}")
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def split_lines(chunks):
+    ## join the chunks read from the socket and split them on newlines
+    parts = []
+    for chunk in chunks:
+        *lines, rest = chunk.split(b"\n")
+        if lines:
+            lines[0] = b"".join(parts) + lines[0]
+            parts = []
+            for line in lines:
+                yield line.rstrip(b"\r")
+        if rest:
+            parts.append(rest)
+    if parts:
+        yield b"".join(parts)
+
+
+async def asplit_lines(chunks):
+    parts = []
+    async for chunk in chunks:
+        *lines, rest = chunk.split(b"\n")
+        if lines:
+            lines[0] = b"".join(parts) + lines[0]
+            parts = []
+            for line in lines:
+                yield line.rstrip(b"\r")
+        if rest:
+            parts.append(rest)
+    if parts:
+        yield b"".join(parts)
+
+
+def parse_sse_json(line: bytes):
+    ## returns the JSON payload of a "data:" line, or None for blank lines and [DONE]
+    if not line.startswith(b"data:"):
+        return None
+    data = line[5:].strip()
+    if data == b"[DONE]":
+        return None
+    return loads(data)
+
+
+def record_response(span, response):
+    ## status and apim-request-id on the request's span, so a trace can be matched with Azure's logs
+    if span is None:
+        return
+    span.set_attribute("http.status_code", response.status_code)
+    apim_request_id = response.headers.get("apim-request-id")
+    if apim_request_id:
+        span.set_attribute("apim_request_id", apim_request_id)
+
+
+class UpstreamResponse():
+
+    def __init__(self, status_code: int, headers, chunks, close):
+        self.status_code = status_code
+        self.headers = headers
+        self.chunks = chunks
+        self._close = close
+
+    def iter_lines(self):
+        return split_lines(self.chunks)
+
+    def read(self) -> bytes:
+        return b"".join(self.chunks)
+
+    def json(self):
+        return json.loads(self.read())
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            message = self.read().decode("utf-8", errors="replace")
+            self.close()
+            raise UpstreamError(self.status_code, message, dict(self.headers))
+
+    def close(self):
+        self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class AsyncUpstreamResponse(UpstreamResponse):
+
+    def iter_lines(self):
+        return asplit_lines(self.chunks)
+
+    async def read(self) -> bytes:
+        return b"".join([chunk async for chunk in self.chunks])
+
+    async def json(self):
+        return json.loads(await self.read())
+
+    async def raise_for_status(self):
+        if self.status_code >= 400:
+            message = (await self.read()).decode("utf-8", errors="replace")
+            await self.close()
+            raise UpstreamError(self.status_code, message, dict(self.headers))
+
+    async def close(self):
+        result = self._close()
+        if hasattr(result, "__await__"):
+            await result
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+
+class AzureOpenAIClient():
+    ## One keep-alive connection pool to an Azure OpenAI deployment, shared by every request in the process.
+    ## Credentials and api versions are passed per call, so no process-global openai state is touched.
+
+    def __init__(self, base_url: str, deployment: str, api_key: str, pool_size: int = 10, http2: bool = False, read_size: int = 4096, connect_timeout: float = 10, read_timeout: float = 120):
+        self.base_url = base_url
+        self.deployment = deployment
+        self.default_headers = {
+            'Content-Type': 'application/json',
+            'api-key': api_key,
+            'x-ms-useragent': USER_AGENT
+        }
+        self.pool_size = pool_size
+        self.http2 = http2
+        ## bytes per socket read on the requests transport; with chunked responses a read
+        ## returns as soon as the current chunk is drained, so a large value adds no latency
+        self.read_size = read_size
+        ## seconds to open a connection, and to wait for the response headers or any later read;
+        ## waiting for a free pooled connection is not limited
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.open_pool()
+
+    def open_pool(self):
+        if self.http2:
+            ## HTTP/2 needs the optional httpx[http2] package
+            import httpx
+            self.http2_client = httpx.Client(http2=True, timeout=self.httpx_timeout(), limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size))
+        else:
+            self.session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+            self.session.mount("https://", adapter)
+            self.session.mount("http://", adapter)
+
+    def httpx_timeout(self):
+        import httpx
+        return httpx.Timeout(connect=self.connect_timeout, read=self.read_timeout, write=self.read_timeout, pool=None)
+
+    def url(self, operation: str, api_version: str, deployment: str = None) -> str:
+        return f"{self.base_url}openai/deployments/{deployment or self.deployment}/{operation}?api-version={api_version}"
+
+    def post(self, operation: str, api_version: str, body: dict, headers: dict = None) -> UpstreamResponse:
+        ## the span covers connecting until the response headers arrive; the body is read later
+        with tracing.span(f"POST {operation}", kind="client", deployment=self.deployment) as span:
+            try:
+                response = self.send(operation, api_version, body, tracing.inject(headers))
+            except Exception:
+                metrics.count_upstream(operation, "error")
+                raise
+            metrics.count_upstream(operation, response.status_code)
+            record_response(span, response)
+            return response
+
+    def send(self, operation: str, api_version: str, body: dict, headers: dict = None) -> UpstreamResponse:
+        url = self.url(operation, api_version)
+        request_headers = {**self.default_headers, **(headers or {})}
+        if self.http2:
+            request = self.http2_client.build_request("POST", url, json=body, headers=request_headers)
+            r = self.http2_client.send(request, stream=True)
+            return UpstreamResponse(r.status_code, r.headers, r.iter_bytes(), r.close)
+
+        r = self.session.post(url, json=body, headers=request_headers, stream=True, timeout=(self.connect_timeout, self.read_timeout))
+        return UpstreamResponse(r.status_code, r.headers, r.iter_content(chunk_size=self.read_size), r.close)
+
+    def warm(self, connections: int = 1) -> int:
+        ## opens up to connections pooled connections (one with HTTP/2, which multiplexes) by
+        ## sending that many GETs at once; any status will do, the body is read so each connection
+        ## goes back to the pool. Not counted in the upstream metrics. Returns the requests answered.
+        connections = 1 if self.http2 else max(1, min(connections, self.pool_size))
+        with ThreadPoolExecutor(max_workers=connections, thread_name_prefix="warmup") as executor:
+            statuses = list(executor.map(lambda _: self.warm_one(), range(connections)))
+        return len(statuses)
+
+    def warm_one(self) -> int:
+        url = self.base_url + WARM_PATH
+        if self.http2:
+            return self.http2_client.get(url, headers=self.default_headers).status_code
+        return self.session.get(url, headers=self.default_headers, timeout=(self.connect_timeout, self.read_timeout)).status_code
+
+    def close(self):
+        if self.http2:
+            self.http2_client.close()
+        else:
+            self.session.close()
+
+
+class AsyncAzureOpenAIClient(AzureOpenAIClient):
+    ## The same pool for the ASGI app; create it inside the running event loop.
+
+    def open_pool(self):
+        if self.http2:
+            import httpx
+            self.http2_client = httpx.AsyncClient(http2=True, timeout=self.httpx_timeout(), limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size))
+        else:
+            import aiohttp
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.connect_timeout, sock_read=self.read_timeout)
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.pool_size), timeout=timeout)
+
+    async def post(self, operation: str, api_version: str, body: dict, headers: dict = None) -> AsyncUpstreamResponse:
+        with tracing.span(f"POST {operation}", kind="client", deployment=self.deployment) as span:
+            try:
+                response = await self.send(operation, api_version, body, tracing.inject(headers))
+            except Exception:
+                metrics.count_upstream(operation, "error")
+                raise
+            metrics.count_upstream(operation, response.status_code)
+            record_response(span, response)
+            return response
+
+    async def send(self, operation: str, api_version: str, body: dict, headers: dict = None) -> AsyncUpstreamResponse:
+        url = self.url(operation, api_version)
+        request_headers = {**self.default_headers, **(headers or {})}
+        if self.http2:
+            request = self.http2_client.build_request("POST", url, json=body, headers=request_headers)
+            r = await self.http2_client.send(request, stream=True)
+            return AsyncUpstreamResponse(r.status_code, r.headers, r.aiter_bytes(), r.aclose)
+
+        r = await self.session.post(url, json=body, headers=request_headers)
+        return AsyncUpstreamResponse(r.status, r.headers, r.content.iter_any(), r.release)
+
+    async def warm(self, connections: int = 1) -> int:
+        connections = 1 if self.http2 else max(1, min(connections, self.pool_size))
+        statuses = await asyncio.gather(*[self.warm_one() for _ in range(connections)])
+        return len(statuses)
+
+    async def warm_one(self) -> int:
+        url = self.base_url + WARM_PATH
+        if self.http2:
+            return (await self.http2_client.get(url, headers=self.default_headers)).status_code
+        async with self.session.get(url, headers=self.default_headers) as r:
+            await r.read()
+            return r.status
+
+    async def close(self):
+        if self.http2:
+            await self.http2_client.aclose()
+        else:
+            await self.session.close()
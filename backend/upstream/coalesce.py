@@ -0,0 +1,140 @@
+import asyncio
+import contextvars
+import queue
+import threading
+import time
+
+
+def get_delta_content(lineJson):
+    ## returns the text of an assistant content delta, or None for tool/role/error/[DONE] lines
+    try:
+        delta = lineJson["choices"][0]["messages"][0]["delta"]
+    except (KeyError, IndexError, TypeError):
+        return None
+    if delta.get("role"):
+        return None
+    content = delta.get("content")
+    if content is None or content == "[DONE]":
+        return None
+    return content
+
+
+class DeltaCoalescer():
+    ## Merges consecutive assistant content deltas from the extensions stream into one delta,
+    ## so fewer NDJSON frames are built, serialized and written per answer.
+    ## A merged delta is released once it is window_ms old or holds max_bytes of text, checked
+    ## as each upstream line arrives, and always before a non-content line or the end of the stream.
+    ## Read the upstream lines through paced() or apaced() to also release it when its window
+    ## runs out while the next line is slow to come. With both bounds at 0 every delta is passed
+    ## through untouched.
+
+    def __init__(self, window_ms: int = 0, max_bytes: int = 0):
+        self.window_ms = window_ms
+        self.max_bytes = max_bytes
+        self.pending = None
+        self.parts = []
+        self.pending_bytes = 0
+        self.started = 0
+
+    @property
+    def enabled(self):
+        return self.window_ms > 0 or self.max_bytes > 0
+
+    def push(self, lineJson) -> list:
+        content = get_delta_content(lineJson)
+        if not self.enabled or content is None:
+            return self.flush() + [lineJson]
+
+        if self.pending is None:
+            self.pending = lineJson
+            self.started = time.monotonic()
+        self.parts.append(content)
+        self.pending_bytes += len(content.encode("utf-8"))
+
+        if self.window_ms > 0 and (time.monotonic() - self.started) * 1000 >= self.window_ms:
+            return self.flush()
+        if self.max_bytes > 0 and self.pending_bytes >= self.max_bytes:
+            return self.flush()
+        return []
+
+    def time_left(self):
+        ## seconds until the pending delta is window_ms old, or None if nothing has to be released
+        if self.pending is None or self.window_ms <= 0:
+            return None
+        return max(0.0, self.started + self.window_ms / 1000 - time.monotonic())
+
+    def flush(self) -> list:
+        if self.pending is None:
+            return []
+        lineJson = self.pending
+        lineJson["choices"][0]["messages"][0]["delta"]["content"] = "".join(self.parts)
+        self.pending = None
+        self.parts = []
+        self.pending_bytes = 0
+        return [lineJson]
+
+
+_DONE = object()
+
+
+def paced(lines, coalescer: DeltaCoalescer):
+    ## Yields the items of lines, and None whenever the coalescer's window runs out while the next
+    ## item is still being read, so the caller can flush. With a window, lines is read on its own
+    ## thread; without one it is passed through.
+    if coalescer.window_ms <= 0:
+        yield from lines
+        return
+    items = queue.Queue()
+
+    def read():
+        try:
+            for item in lines:
+                items.put((item, None))
+            items.put((_DONE, None))
+        except BaseException as e:
+            items.put((None, e))
+
+    # the thread runs in a copy of the caller's context, so upstream reads stay in the caller's trace
+    threading.Thread(target=contextvars.copy_context().run, args=(read,), name="coalesce-read", daemon=True).start()
+    while True:
+        try:
+            item, error = items.get(timeout=coalescer.time_left())
+        except queue.Empty:
+            yield None
+            continue
+        if error is not None:
+            raise error
+        if item is _DONE:
+            return
+        yield item
+
+
+async def apaced(lines, coalescer: DeltaCoalescer):
+    ## paced() for an async iterator; the pending read is awaited with the window as its timeout
+    if coalescer.window_ms <= 0:
+        async for item in lines:
+            yield item
+        return
+    iterator = lines.__aiter__()
+
+    async def next_item():
+        return await iterator.__anext__()
+
+    reading = None
+    try:
+        while True:
+            if reading is None:
+                reading = asyncio.ensure_future(next_item())
+            done, _ = await asyncio.wait({reading}, timeout=coalescer.time_left())
+            if not done:
+                yield None
+                continue
+            finished, reading = reading, None
+            try:
+                item = finished.result()
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        if reading is not None:
+            reading.cancel()
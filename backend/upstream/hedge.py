@@ -0,0 +1,247 @@
+import asyncio
+import contextvars
+import itertools
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from backend import metrics
+from backend.upstream.client import parse_sse_json
+from backend.upstream.pool import DeploymentPool
+
+
+def starts_answer(line: bytes) -> bool:
+    ## whether a line of the stream carries answer text (a content delta of the chat/completions
+    ## or the extensions stream) or an error; citations, roles and empty deltas don't count
+    try:
+        payload = parse_sse_json(line.rstrip(b"\r"))
+    except ValueError:
+        # not JSON, so nothing to wait for
+        return True
+    if payload is None:
+        return False
+    if "error" in payload:
+        return True
+    for choice in payload.get("choices") or []:
+        messages = choice.get("messages") or [{}]
+        delta = choice.get("delta") or messages[0].get("delta") or {}
+        if delta.get("content") and delta.get("role") != "tool":
+            return True
+    return False
+
+
+class FirstDelta():
+    ## Splits the chunks fed to it into lines and tells when the first line with answer text is
+    ## complete. The chunks read until then are kept, to be put back in front of the rest.
+
+    def __init__(self):
+        self.read = []
+        self.rest = b""
+
+    def feed(self, chunk: bytes) -> bool:
+        self.read.append(chunk)
+        *lines, self.rest = (self.rest + chunk).split(b"\n")
+        return any(starts_answer(line) for line in lines)
+
+
+def prefetch_first_delta(response):
+    ## read until the first answer text arrives, then put what was read back in front of the rest
+    chunks = iter(response.chunks)
+    first = FirstDelta()
+    for chunk in chunks:
+        if first.feed(chunk):
+            break
+    response.chunks = itertools.chain(first.read, chunks)
+    return response
+
+
+async def aprefetch_first_delta(response):
+    chunks = response.chunks.__aiter__()
+    first = FirstDelta()
+
+    async def rest():
+        for chunk in first.read:
+            yield chunk
+        async for chunk in chunks:
+            yield chunk
+
+    async for chunk in chunks:
+        if first.feed(chunk):
+            break
+    response.chunks = rest()
+    return response
+
+
+class RouteStats():
+    ## Hedging counters of one route, and the credit its hedges draw on. The counters are also
+    ## exported to Prometheus as chat_hedge_*_total, labelled by route.
+
+    def __init__(self, route: str):
+        self.route = route
+        self.credit = 0
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.over_budget = 0
+
+    def as_dict(self) -> dict:
+        return {"requests": self.requests, "hedged": self.hedged, "hedge_wins": self.hedge_wins, "over_budget": self.over_budget}
+
+
+class Hedger():
+    ## Hedged streaming requests: if the first answer text hasn't arrived delay_ms after the
+    ## request was sent, the same request is sent again, to another deployment when the client
+    ## is a DeploymentPool. The stream whose answer starts first is relayed and the other is closed.
+    ##
+    ## Each route earns budget credit for every request and spends one per hedge, so at most
+    ## budget (e.g. 0.05 for 5%) of a route's requests are duplicated, with bursts of up to
+    ## max_burst hedges. A route starts without credit, so its first hedge waits for 1 / budget
+    ## requests. stats() has per-route counts of requests, hedges fired and hedges won.
+    ## Only a response with status 200 wins; if both attempts fail, the primary's result is returned.
+
+    def __init__(self, delay_ms: float, budget: float, max_burst: float = 10):
+        self.delay = delay_ms / 1000
+        self.budget = budget
+        self.max_burst = max_burst
+        self.routes = {}
+        self.lock = threading.Lock()
+
+    def start(self, route: str) -> RouteStats:
+        with self.lock:
+            stats = self.routes.get(route)
+            if stats is None:
+                stats = self.routes[route] = RouteStats(route)
+            stats.requests += 1
+            stats.credit = min(self.max_burst, stats.credit + self.budget)
+        metrics.count_hedge(metrics.HEDGE_REQUESTS, route)
+        return stats
+
+    def take_credit(self, stats: RouteStats) -> bool:
+        with self.lock:
+            if stats.credit < 1:
+                stats.over_budget += 1
+                hedged = False
+            else:
+                stats.credit -= 1
+                stats.hedged += 1
+                hedged = True
+        metrics.count_hedge(metrics.HEDGED if hedged else metrics.HEDGE_OVER_BUDGET, stats.route)
+        return hedged
+
+    def won(self, stats: RouteStats):
+        with self.lock:
+            stats.hedge_wins += 1
+        metrics.count_hedge(metrics.HEDGE_WINS, stats.route)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {route: stats.as_dict() for route, stats in self.routes.items()}
+
+    def post(self, client, operation: str, api_version: str, body: dict, headers: dict = None, route: str = "default"):
+        stats = self.start(route)
+        avoid = set() if isinstance(client, DeploymentPool) else None
+        primary = self.attempt(client, operation, api_version, body, headers, avoid)
+        try:
+            return primary.result(timeout=self.delay)
+        except FutureTimeoutError:
+            pass
+        if not self.take_credit(stats):
+            return primary.result()
+
+        hedge = self.attempt(client, operation, api_version, body, headers, avoid)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for attempt in done:
+                if attempt.exception() is None and attempt.result().status_code == 200:
+                    loser = hedge if attempt is primary else primary
+                    self.close(loser)
+                    if attempt is hedge:
+                        self.won(stats)
+                    return attempt.result()
+        # both failed: surface the primary's error or response, and release the hedge's
+        self.close(hedge)
+        return primary.result()
+
+    def attempt(self, client, operation, api_version, body, headers, avoid) -> Future:
+        ## sends the request on its own thread; the future resolves once the first answer text arrives
+        future = Future()
+        future.response = None
+
+        def run():
+            try:
+                if avoid is None:
+                    response = client.post(operation, api_version, body, headers)
+                else:
+                    response = client.post(operation, api_version, body, headers, avoid=avoid)
+                future.response = response
+                if response.status_code == 200:
+                    prefetch_first_delta(response)
+                future.set_result(response)
+            except BaseException as e:
+                future.set_exception(e)
+
+        # the thread runs in a copy of the caller's context, so its request joins the caller's trace
+        threading.Thread(target=contextvars.copy_context().run, args=(run,), name="hedge", daemon=True).start()
+        return future
+
+    def close(self, attempt: Future):
+        ## close the losing attempt now if it has a response, or as soon as it gets one
+        def close_response(_=None):
+            if attempt.response is not None:
+                try:
+                    attempt.response.close()
+                except Exception as e:
+                    logging.debug(f"Closing a hedged response failed: {e}")
+        close_response()
+        attempt.add_done_callback(close_response)
+
+
+class AsyncHedger(Hedger):
+    ## The same hedging with asyncio tasks for the ASGI app; the losing task is cancelled.
+
+    async def post(self, client, operation: str, api_version: str, body: dict, headers: dict = None, route: str = "default"):
+        stats = self.start(route)
+        avoid = set() if isinstance(client, DeploymentPool) else None
+        primary = asyncio.ensure_future(self.attempt(client, operation, api_version, body, headers, avoid))
+        done, _ = await asyncio.wait({primary}, timeout=self.delay)
+        if done or not self.take_credit(stats):
+            return await primary
+
+        hedge = asyncio.ensure_future(self.attempt(client, operation, api_version, body, headers, avoid))
+        pending = {primary, hedge}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for attempt in done:
+                if attempt.exception() is None and attempt.result().status_code == 200:
+                    loser = hedge if attempt is primary else primary
+                    await self.close(loser)
+                    if attempt is hedge:
+                        self.won(stats)
+                    return attempt.result()
+        await self.close(hedge)
+        return await primary
+
+    async def attempt(self, client, operation, api_version, body, headers, avoid):
+        if avoid is None:
+            response = await client.post(operation, api_version, body, headers)
+        else:
+            response = await client.post(operation, api_version, body, headers, avoid=avoid)
+        if response.status_code != 200:
+            return response
+        try:
+            return await aprefetch_first_delta(response)
+        except BaseException:
+            await response.close()
+            raise
+
+    async def close(self, attempt: asyncio.Future):
+        if not attempt.done():
+            attempt.cancel()
+            return
+        if attempt.exception() is None:
+            try:
+                await attempt.result().close()
+            except Exception as e:
+                logging.debug(f"Closing a hedged response failed: {e}")
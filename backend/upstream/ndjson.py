@@ -0,0 +1,58 @@
+import json
+from json.encoder import encode_basestring
+
+## orjson parses upstream lines faster when it is installed; the output is the same either way
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(data):
+    ## parse JSON from bytes or str; raises json.JSONDecodeError (orjson's error subclasses it)
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False)
+
+
+class FrameEncoder():
+    ## Renders the assistant content frames of one streamed answer as NDJSON.
+    ##
+    ## Everything but the content is the same from one token to the next, so the frame is kept
+    ## as a pre-rendered prefix and suffix and each token only escapes its text in between. The
+    ## output is byte-identical to format_as_ndjson of the response dict the stream functions
+    ## build. The template is rendered again when model, created or object change, or when
+    ## history_metadata does, as it can mid-stream when the generated title arrives.
+    ## with_apim_request_id adds the "apim-request-id" field of the frames sent with data.
+
+    def __init__(self, message_id: str, history_metadata: dict, with_apim_request_id: bool = False, apim_request_id: str = None):
+        self.message_id = message_id
+        self.history_metadata = history_metadata
+        self.with_apim_request_id = with_apim_request_id
+        self.apim_request_id = apim_request_id
+        self.fields = None
+        self.metadata = None
+        self.prefix = ""
+        self.suffix = ""
+
+    def content_frame(self, model, created, object, content) -> str:
+        if (model, created, object) != self.fields or self.history_metadata != self.metadata:
+            self.render(model, created, object)
+        if type(content) is not str:
+            return self.prefix + dumps(content) + self.suffix
+        return self.prefix + encode_basestring(content) + self.suffix
+
+    def render(self, model, created, object):
+        self.fields = (model, created, object)
+        # a shallow copy: history_metadata only holds strings
+        self.metadata = dict(self.history_metadata)
+        self.prefix = (
+            f'{{"id": {dumps(self.message_id)}, "model": {dumps(model)}, "created": {dumps(created)}, "object": {dumps(object)}, '
+            '"choices": [{"messages": [{"role": "assistant", "content": '
+        )
+        apim = f', "apim-request-id": {dumps(self.apim_request_id)}' if self.with_apim_request_id else ""
+        self.suffix = f'}}]}}]{apim}, "history_metadata": {dumps(self.history_metadata)}}}\n'
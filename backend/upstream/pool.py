@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import math
+import threading
+import time
+
+# Azure OpenAI quotas are per minute, so remaining-quota headers older than this say nothing
+QUOTA_WINDOW_SECONDS = 60
+
+
+def header_number(headers, name: str):
+    try:
+        return float(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after_seconds(headers):
+    ## seconds to wait from the retry-after-ms or retry-after header of a 429, or None
+    milliseconds = header_number(headers, "retry-after-ms")
+    if milliseconds is not None:
+        return milliseconds / 1000
+    return header_number(headers, "retry-after")
+
+
+class Deployment():
+    ## One member of a DeploymentPool and what its last responses said about its quota.
+
+    def __init__(self, client):
+        self.client = client
+        self.name = f"{client.deployment} at {client.base_url}"
+        self.remaining_requests = None
+        self.remaining_tokens = None
+        self.quota_read_at = 0.0
+        self.unavailable_until = 0.0
+
+    def capacity(self, now: float) -> float:
+        if now - self.quota_read_at > QUOTA_WINDOW_SECONDS:
+            return math.inf
+        if self.remaining_requests is not None and self.remaining_requests <= 0:
+            return 0
+        return math.inf if self.remaining_tokens is None else self.remaining_tokens
+
+
+class DeploymentPool():
+    ## Spreads requests over several Azure OpenAI deployments, each an AzureOpenAIClient, and
+    ## has the same post/url/close surface so it can stand in for a single client.
+    ##
+    ## Each request goes to the available deployment with the most tokens left this minute, as
+    ## reported by the x-ratelimit-remaining-* headers of its last response; deployments nobody
+    ## has heard from lately take turns. A 429 takes a deployment out for its retry-after, and a
+    ## 5xx or connection error for unhealthy_seconds. Both happen before any of the answer has
+    ## been read, so the request moves on to the next deployment without the caller noticing.
+    ## Only when every deployment fails is the last response returned, or the last error raised.
+    ## post adds each deployment it tries to avoid, if given, and tries those already in it last;
+    ## a hedged request passes the primary request's set so the two go to different deployments.
+
+    def __init__(self, clients: list, unhealthy_seconds: float = 10, default_retry_after: float = 10):
+        if not clients:
+            raise ValueError("A deployment pool needs at least one deployment")
+        self.deployments = [Deployment(client) for client in clients]
+        self.unhealthy_seconds = unhealthy_seconds
+        self.default_retry_after = default_retry_after
+        self.lock = threading.Lock()
+        self.turn = 0
+
+    @property
+    def base_url(self):
+        return self.deployments[0].client.base_url
+
+    @property
+    def deployment(self):
+        return self.deployments[0].client.deployment
+
+    @property
+    def default_headers(self):
+        return self.deployments[0].client.default_headers
+
+    def url(self, operation: str, api_version: str, deployment: str = None) -> str:
+        ## operations outside the pool, such as embeddings, use the first deployment's resource
+        return self.deployments[0].client.url(operation, api_version, deployment)
+
+    def candidates(self, avoid: set = None) -> list:
+        ## deployments in the order to try them: available ones by remaining capacity, ties taking
+        ## turns, then the ones taken out, soonest back first. Deployments in avoid go last.
+        now = time.monotonic()
+        with self.lock:
+            self.turn = (self.turn + 1) % len(self.deployments)
+            rotated = self.deployments[self.turn:] + self.deployments[:self.turn]
+        available = sorted((d for d in rotated if d.unavailable_until <= now), key=lambda d: -d.capacity(now))
+        waiting = sorted((d for d in rotated if d.unavailable_until > now), key=lambda d: d.unavailable_until)
+        if avoid:
+            return [d for d in available + waiting if d not in avoid] + [d for d in available + waiting if d in avoid]
+        return available + waiting
+
+    def record(self, deployment: Deployment, status_code: int, headers) -> bool:
+        ## update the deployment from a response; True if the request should try the next one
+        now = time.monotonic()
+        remaining_requests = header_number(headers, "x-ratelimit-remaining-requests")
+        remaining_tokens = header_number(headers, "x-ratelimit-remaining-tokens")
+        if remaining_requests is not None or remaining_tokens is not None:
+            deployment.remaining_requests = remaining_requests
+            deployment.remaining_tokens = remaining_tokens
+            deployment.quota_read_at = now
+
+        if status_code == 429:
+            retry_after = retry_after_seconds(headers)
+            deployment.unavailable_until = now + (self.default_retry_after if retry_after is None else retry_after)
+            logging.warning(f"Azure OpenAI deployment {deployment.name} is throttled, retry after {deployment.unavailable_until - now:.1f}s")
+            return True
+        if status_code >= 500:
+            deployment.unavailable_until = now + self.unhealthy_seconds
+            logging.warning(f"Azure OpenAI deployment {deployment.name} returned {status_code}, taken out for {self.unhealthy_seconds}s")
+            return True
+        return False
+
+    def mark_failed(self, deployment: Deployment, error: Exception):
+        deployment.unavailable_until = time.monotonic() + self.unhealthy_seconds
+        logging.warning(f"Azure OpenAI deployment {deployment.name} failed, taken out for {self.unhealthy_seconds}s: {error}")
+
+    def post(self, operation: str, api_version: str, body: dict, headers: dict = None, avoid: set = None):
+        candidates = self.candidates(avoid)
+        for i, deployment in enumerate(candidates):
+            last = i == len(candidates) - 1
+            if avoid is not None:
+                avoid.add(deployment)
+            try:
+                response = deployment.client.post(operation, api_version, body, headers)
+            except Exception as e:
+                self.mark_failed(deployment, e)
+                if last:
+                    raise
+                continue
+            if self.record(deployment, response.status_code, response.headers) and not last:
+                response.close()
+                continue
+            return response
+
+    def warm(self, connections: int = 1) -> int:
+        return sum(deployment.client.warm(connections) for deployment in self.deployments)
+
+    def close(self):
+        for deployment in self.deployments:
+            deployment.client.close()
+
+
+class AsyncDeploymentPool(DeploymentPool):
+    ## The same pool over AsyncAzureOpenAIClients for the ASGI app.
+
+    async def post(self, operation: str, api_version: str, body: dict, headers: dict = None, avoid: set = None):
+        candidates = self.candidates(avoid)
+        for i, deployment in enumerate(candidates):
+            last = i == len(candidates) - 1
+            if avoid is not None:
+                avoid.add(deployment)
+            try:
+                response = await deployment.client.post(operation, api_version, body, headers)
+            except Exception as e:
+                self.mark_failed(deployment, e)
+                if last:
+                    raise
+                continue
+            if self.record(deployment, response.status_code, response.headers) and not last:
+                await response.close()
+                continue
+            return response
+
+    async def warm(self, connections: int = 1) -> int:
+        return sum(await asyncio.gather(*[deployment.client.warm(connections) for deployment in self.deployments]))
+
+    async def close(self):
+        for deployment in self.deployments:
+            await deployment.client.close()
@@ -0,0 +1,114 @@
+from backend.upstream.ndjson import FrameEncoder
+
+
+def answer_content_with_data(lineJson):
+    ## the answer text a parsed extensions line adds; None for citations, roles and errors
+    if 'error' in lineJson:
+        return None
+    delta = lineJson["choices"][0]["messages"][0]["delta"]
+    return None if delta.get("role") == "tool" else delta.get("content")
+
+
+class StreamRelay():
+    ## Relays one answer stream without doing any I/O, so the Flask and Quart apps share it: each
+    ## reads upstream its own way, hands every parsed line to push() and sends the frames it gets
+    ## back. A line is timed, coalesced when there is a coalescer, recorded and then rendered.
+    ## The stream calls finish() when upstream ends, fail() when relaying raised, and close() last.
+    ## close() settles the request's admission, if any, with the tokens the answer used.
+
+    def __init__(self, coalescer=None, recorder=None, timer=None, admission=None):
+        self.coalescer = coalescer
+        self.recorder = recorder
+        self.timer = timer
+        self.admission = admission
+        self.characters = 0
+
+    def push(self, line) -> list:
+        content = self.content(line)
+        if content and content != "[DONE]":
+            self.characters += len(content)
+        if self.timer:
+            self.timer.token(content)
+        return self._frames(self.coalescer.push(line) if self.coalescer else [line])
+
+    def flush(self) -> list:
+        ## the coalescing window ran out while the next line was still on its way
+        return self._frames(self.coalescer.flush() if self.coalescer else [])
+
+    def finish(self) -> list:
+        frames = self.flush()
+        if self.recorder:
+            self.recorder.finish()
+        return frames
+
+    def fail(self):
+        if self.recorder:
+            self.recorder.failed = True
+
+    def close(self):
+        if self.timer:
+            self.timer.finish()
+        if self.admission:
+            # about 4 characters per token, as the admission estimate
+            self.admission.settle(self.characters // 4)
+        if self.recorder:
+            self.recorder.close()
+
+    def _frames(self, lines):
+        frames = []
+        for line in lines:
+            if self.recorder:
+                self.record(line)
+            frames.extend(self.render(line))
+        return frames
+
+
+class ExtensionsRelay(StreamRelay):
+    ## Lines of the extensions stream, or local chunks adapted to it, rendered by
+    ## format(lineJson, apim_request_id, history_metadata, message_id, encoder). begin() is
+    ## called with the upstream response's apim-request-id before the first line is pushed.
+
+    def __init__(self, format, history_metadata, message_id, coalescer=None, recorder=None, timer=None, admission=None):
+        super().__init__(coalescer, recorder, timer, admission)
+        self.format = format
+        self.history_metadata = history_metadata
+        self.message_id = message_id
+        self.apim_request_id = None
+        self.encoder = None
+
+    def begin(self, apim_request_id):
+        self.apim_request_id = apim_request_id
+        self.encoder = FrameEncoder(self.message_id, self.history_metadata, with_apim_request_id=True, apim_request_id=apim_request_id)
+
+    def content(self, lineJson):
+        return answer_content_with_data(lineJson)
+
+    def record(self, lineJson):
+        self.recorder.add_extensions_line(lineJson)
+
+    def render(self, lineJson):
+        return self.format(lineJson, self.apim_request_id, self.history_metadata, self.message_id, self.encoder)
+
+
+class ChatRelay(StreamRelay):
+    ## Chunks of the chat/completions stream, rendered by
+    ## format(line, previous_text, history_metadata, message_id, encoder), which returns the text
+    ## to carry forward and the chunk's one frame.
+
+    def __init__(self, format, history_metadata, message_id, recorder=None, timer=None, admission=None):
+        super().__init__(None, recorder, timer, admission)
+        self.format = format
+        self.history_metadata = history_metadata
+        self.message_id = message_id
+        self.encoder = FrameEncoder(message_id, history_metadata)
+        self.text = ""
+
+    def content(self, line):
+        return line["choices"][0]["delta"].get("content") if line["choices"] else None
+
+    def record(self, line):
+        self.recorder.add_chat_line(line)
+
+    def render(self, line):
+        self.text, frame = self.format(line, self.text, self.history_metadata, self.message_id, self.encoder)
+        return [frame]
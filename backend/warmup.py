@@ -0,0 +1,75 @@
+import asyncio
+import logging
+import threading
+import time
+
+
+class Warmup():
+    ## Runs the start-up steps that make the first requests fast (opening upstream connections,
+    ## fetching tokens, reaching Cosmos DB) side by side in the background, and reports how far
+    ## they got. A failed step is logged and reported but never stops the app: requests then pay
+    ## for it themselves, as they would without warm-up. Steps still running after timeout
+    ## seconds no longer hold the instance back.
+
+    def __init__(self, timeout: float = 30):
+        self.timeout = timeout
+        self.started = time.monotonic()
+        self.steps = {}
+        self.tasks = []
+        self.lock = threading.Lock()
+
+    def begin(self, name: str):
+        with self.lock:
+            self.steps[name] = {"state": "pending", "seconds": None, "error": None}
+
+    def end(self, name: str, started: float, error: Exception = None):
+        seconds = round(time.monotonic() - started, 3)
+        if error is None:
+            logging.info(f"Warm-up step {name} finished in {seconds}s")
+        else:
+            logging.warning(f"Warm-up step {name} failed after {seconds}s: {error}")
+        with self.lock:
+            self.steps[name] = {"state": "failed" if error else "ok", "seconds": seconds, "error": str(error) if error else None}
+
+    def run(self, name: str, step):
+        started = time.monotonic()
+        try:
+            step()
+        except Exception as e:
+            self.end(name, started, e)
+        else:
+            self.end(name, started)
+
+    def start(self, steps: dict):
+        ## steps maps a name to a function taking no arguments; each runs on its own daemon thread
+        for name, step in steps.items():
+            self.begin(name)
+            threading.Thread(target=self.run, args=(name, step), name=f"warmup-{name}", daemon=True).start()
+
+    async def arun(self, name: str, step):
+        started = time.monotonic()
+        try:
+            await step()
+        except Exception as e:
+            self.end(name, started, e)
+        else:
+            self.end(name, started)
+
+    def start_async(self, name: str, step):
+        ## step is a coroutine function; call from inside the running event loop
+        self.begin(name)
+        self.tasks.append(asyncio.create_task(self.arun(name, step)))
+
+    def status(self) -> dict:
+        ## state is warming while any step runs, then ready, or degraded if a step failed or ran out of time
+        with self.lock:
+            steps = {name: dict(step) for name, step in self.steps.items()}
+        pending = any(step["state"] == "pending" for step in steps.values())
+        timed_out = time.monotonic() - self.started > self.timeout
+        if pending and not timed_out:
+            state = "warming"
+        elif pending or any(step["state"] == "failed" for step in steps.values()):
+            state = "degraded"
+        else:
+            state = "ready"
+        return {"state": state, "steps": steps}
@@ -0,0 +1,135 @@
+"""pytest-benchmark suite for the per-token and per-request CPU cost of shaping responses.
+
+Covers formatApiResponseStreaming, formatApiResponseNoStreaming, format_as_ndjson,
+prepare_body_headers_with_data, the message documents CosmosConversationClient
+writes, and whole answers relayed by stream_without_data and stream_with_data from
+a canned SSE byte stream. Nothing leaves the process.
+
+The file name keeps it out of the regular test run; pass it to pytest explicitly.
+--benchmark-json writes the results for comparing runs, or --benchmark-autosave
+keeps them under .benchmarks/ for --benchmark-compare:
+
+    pip install pytest-benchmark
+    python -m pytest benchmarks/bench_hot_paths.py --benchmark-json=benchmark.json
+    python -m pytest benchmarks/bench_hot_paths.py --benchmark-autosave --benchmark-compare
+"""
+import json
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import app  # noqa: E402
+from backend.cache import TTLCache  # noqa: E402
+from backend.history.cosmosdbservice import CosmosConversationClient  # noqa: E402
+from backend.upstream.client import UpstreamResponse  # noqa: E402
+
+TOKENS = 200
+HISTORY_METADATA = {"conversation_id": "5f0a8a5e-2f7d-4f5e-9a43-7f4f3c1d8e0b", "title": "Remote work policy", "date": "2023-11-01T10:00:00.000000", "message_id": "0c5c0e9b-3b1e-4a0c-8f4e-6d7a2f1b9c3d"}
+CITATIONS = json.dumps({"citations": [{"content": "Employees may work remotely up to three days a week. " * 20, "title": f"Handbook part {i}", "url": f"https://example.com/handbook/{i}", "filepath": f"handbook_{i}.pdf", "chunk_id": str(i)} for i in range(5)], "intent": "[\"remote work policy\"]"})
+MESSAGES = [{"role": "user", "content": "What is the remote work policy?"}, {"role": "assistant", "content": "You can work remotely up to three days a week. " * 5}, {"role": "user", "content": "Do I need my manager's approval?"}]
+
+
+def chunk(object_name, choice):
+    return {"id": "chatcmpl-1", "model": "gpt-35-turbo-16k", "created": 1700000000, "object": object_name, "choices": [{"index": 0, **choice}]}
+
+
+def sse(payloads):
+    return b"".join(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n" for payload in payloads) + b"data: [DONE]\n\n"
+
+
+EXTENSIONS_CHUNKS = [
+    chunk("extensions.chat.completion.chunk", {"delta": {"context": {"messages": [{"role": "tool", "content": CITATIONS, "end_turn": False}]}}, "end_turn": False}),
+    chunk("extensions.chat.completion.chunk", {"delta": {"role": "assistant"}, "end_turn": False}),
+    *[chunk("extensions.chat.completion.chunk", {"delta": {"content": f" token{i}"}, "end_turn": False}) for i in range(TOKENS)],
+    chunk("extensions.chat.completion.chunk", {"delta": {}, "end_turn": True}),
+]
+CHAT_CHUNKS = [
+    chunk("chat.completion.chunk", {"delta": {"role": "assistant"}, "finish_reason": None}),
+    *[chunk("chat.completion.chunk", {"delta": {"content": f" token{i}"}, "finish_reason": None}) for i in range(TOKENS)],
+    chunk("chat.completion.chunk", {"delta": {}, "finish_reason": "stop"}),
+]
+
+
+def read_in_pieces(data, size=4096):
+    ## the stream as the socket hands it over, split mid-line
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class CannedUpstreamClient():
+    def __init__(self, data):
+        self.pieces = read_in_pieces(data)
+
+    def post(self, operation, api_version, body, headers=None):
+        return UpstreamResponse(200, {"apim-request-id": "req-1"}, iter(self.pieces), lambda: None)
+
+
+class FormattingOnlyContainer():
+    ## accepts every write, so only the client's own work is measured
+    def upsert_item(self, body):
+        return body
+
+    def read_item(self, item, partition_key):
+        return {"id": item, "type": "conversation", "userId": partition_key, "updatedAt": "", "_etag": "1"}
+
+    def replace_item(self, item, body, etag=None, match_condition=None):
+        return body
+
+
+@pytest.fixture
+def search_datasource(monkeypatch):
+    monkeypatch.setattr(app, "DATASOURCE_TYPE", "AzureCognitiveSearch")
+    monkeypatch.setattr(app, "AZURE_SEARCH_SERVICE", "search")
+    monkeypatch.setattr(app, "AZURE_SEARCH_INDEX", "handbook")
+    monkeypatch.setattr(app, "AZURE_SEARCH_KEY", "key")
+    monkeypatch.setattr(app, "DATASOURCE_SETTINGS", app.build_datasource_settings())
+
+
+def test_format_as_ndjson(benchmark):
+    frame = {"id": HISTORY_METADATA["message_id"], "model": "gpt-35-turbo-16k", "created": 1700000000, "object": "chat.completion.chunk", "choices": [{"messages": [{"role": "assistant", "content": " token"}]}], "history_metadata": HISTORY_METADATA}
+    benchmark(app.format_as_ndjson, frame)
+
+
+@pytest.mark.parametrize("line", ["tool", "role", "content", "end_turn"])
+def test_format_api_response_streaming(benchmark, line):
+    raw = {"tool": EXTENSIONS_CHUNKS[0], "role": EXTENSIONS_CHUNKS[1], "content": EXTENSIONS_CHUNKS[2], "end_turn": EXTENSIONS_CHUNKS[-1]}[line]
+    benchmark(app.formatApiResponseStreaming, raw)
+
+
+def test_format_api_response_no_streaming(benchmark):
+    raw = chunk("extensions.chat.completion", {"message": {"role": "assistant", "content": "You can work remotely up to three days a week. " * 20, "context": {"messages": [{"role": "tool", "content": CITATIONS}]}}, "finish_reason": "stop"})
+    benchmark(app.formatApiResponseNoStreaming, raw)
+
+
+def test_prepare_body_headers_with_data(benchmark, search_datasource):
+    benchmark(app.prepare_body_headers_with_data, {"messages": MESSAGES}, {})
+
+
+def test_prepare_body_headers_with_data_and_security_filter(benchmark, search_datasource, monkeypatch):
+    monkeypatch.setattr(app, "AZURE_SEARCH_PERMITTED_GROUPS_COLUMN", "group_ids")
+    monkeypatch.setattr(app, "user_filter_cache", TTLCache(ttl_seconds=300, max_entries=10))
+    monkeypatch.setattr(app, "fetchUserGroups", lambda token: [{"id": f"group-{i}"} for i in range(20)])
+    headers = {"X-MS-TOKEN-AAD-ACCESS-TOKEN": "token", "X-Ms-Client-Principal-Id": "user"}
+    benchmark(app.prepare_body_headers_with_data, {"messages": MESSAGES}, headers)
+
+
+def test_cosmos_create_message(benchmark):
+    client = CosmosConversationClient.__new__(CosmosConversationClient)
+    client.container_client = FormattingOnlyContainer()
+    client.enable_message_feedback = True
+    benchmark(client.create_message, "message-1", "conversation-1", "user-1", MESSAGES[1])
+
+
+def test_stream_without_data_answer(benchmark):
+    # one whole answer of TOKENS deltas per round
+    client = CannedUpstreamClient(sse(CHAT_CHUNKS))
+    benchmark(lambda: list(app.stream_without_data(client.post("chat/completions", "", {}), HISTORY_METADATA, "m-1")))
+
+
+def test_stream_with_data_answer(benchmark, monkeypatch):
+    monkeypatch.setattr(app, "azure_openai_client", CannedUpstreamClient(sse(EXTENSIONS_CHUNKS)))
+    monkeypatch.setattr(app, "hedger", None)
+    benchmark(lambda: list(app.stream_with_data({"messages": MESSAGES}, {}, HISTORY_METADATA, "m-1")))
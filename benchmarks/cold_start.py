@@ -0,0 +1,100 @@
+"""Measure how long a fresh worker process takes to import the app and answer its first request.
+
+Each run starts a new Python process, as a new instance or uwsgi worker would, which
+times `import app`, optionally waits until /status stops answering 503, and then sends
+one streamed /conversation request through the Flask test client, timing its first
+frame and the whole answer. Runs alternate between WARMUP_ENABLED=false and true.
+
+By default Azure OpenAI is the local mock in mock_aoai.py. Over loopback, opening a
+connection costs next to nothing, so most of what warm-up saves in production is the
+TLS handshake and token fetch it takes off the first request. Pass --real to use the
+endpoint and credentials from the environment or .env instead.
+
+    python benchmarks/cold_start.py --runs 5
+    python benchmarks/cold_start.py --runs 5 --real --json cold_start.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS, ".."))
+
+
+def measure_child():
+    ## runs in the fresh process; prints one JSON line of timings
+    started = time.perf_counter()
+    import app
+    imported = time.perf_counter()
+    while app.warmup.status()["state"] == "warming":
+        time.sleep(0.005)
+    warm = time.perf_counter()
+
+    request_started = time.perf_counter()
+    response = app.app.test_client().post("/conversation", json={"messages": [{"role": "user", "content": "What is in the employee handbook?"}]}, buffered=False)
+    first_frame = None
+    for _ in response.response:
+        if first_frame is None:
+            first_frame = time.perf_counter() - request_started
+    response.close()
+    print(json.dumps({
+        "status": response.status_code,
+        "import_seconds": imported - started,
+        "warmup_seconds": warm - imported,
+        "first_frame_seconds": first_frame,
+        "first_request_seconds": time.perf_counter() - request_started,
+        "warmup": app.warmup.status(),
+    }))
+
+
+def run_child(warmup, env):
+    env = {**env, "WARMUP_ENABLED": "true" if warmup else "false"}
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"], env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(results):
+    fields = ("import_seconds", "warmup_seconds", "first_frame_seconds", "first_request_seconds")
+    return {field: statistics.median(r[field] for r in results if r[field] is not None) for field in fields}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per setting. Default=5")
+    parser.add_argument("--real", action="store_true", help="Use the Azure OpenAI settings from the environment instead of the mock")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before the mock starts each response. Default=0")
+    parser.add_argument("--base-port", type=int, default=8095, help="Port for the mock. Default=8095")
+    parser.add_argument("--json", help="Also write the runs and medians to this file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure_child()
+        sys.exit(0)
+
+    if not args.real:
+        from stream_capacity import configure_environment, start_mock_upstream
+        configure_environment(args.base_port, 10)
+        start_mock_upstream(args.base_port, 40, 0.0, latency=args.latency)
+    env = dict(os.environ)
+
+    results = {False: [], True: []}
+    for _ in range(args.runs):
+        for warmup in (False, True):
+            results[warmup].append(run_child(warmup, env))
+
+    print(f"{'warm-up':<8} {'import':>8} {'warm-up':>8} {'first frame':>12} {'first request':>14}   (medians of {args.runs} runs, seconds)")
+    summary = {}
+    for warmup, runs in results.items():
+        summary["on" if warmup else "off"] = medians = summarize(runs)
+        print(f"{'on' if warmup else 'off':<8} {medians['import_seconds']:>8.3f} {medians['warmup_seconds']:>8.3f} {medians['first_frame_seconds']:>12.3f} {medians['first_request_seconds']:>14.3f}")
+    failed = {step for r in results[True] for step, s in r["warmup"]["steps"].items() if s["state"] != "ok"}
+    if failed:
+        print(f"warm-up steps that did not finish: {', '.join(sorted(failed))}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": vars(args), "medians": summary, "runs": {"off": results[False], "on": results[True]}}, f, indent=2)
@@ -0,0 +1,206 @@
+"""Drive the app at a target concurrency against local stand-ins and report latency percentiles.
+
+Azure OpenAI is replaced by the mock in mock_aoai.py, which streams at a set token
+rate and can add latency and 429s, and Cosmos DB by the in-memory container in
+mock_cosmos.py, so a run spends no quota. Each virtual user keeps going until the
+run ends, either sending one-off questions to /conversation or holding a chat with
+history: /history/generate, then /history/update with the streamed answer, then the
+next turn in the same conversation.
+
+For every route it prints p50/p95/p99 of the time to the first streamed frame and
+of the full response, the requests per second and the share of errors. An HTTP
+error and an error frame in a stream both count. --json writes the same numbers
+to a file, for comparing runs before and after a change.
+
+    python benchmarks/load_test.py --server asgi --concurrency 32 --duration 30 \\
+        --token-rate 50 --latency 0.3 --throttle-rate 0.02 --cosmos-latency 0.005
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+
+import aiohttp
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from mock_cosmos import InMemoryConversationClient  # noqa: E402
+from stream_capacity import configure_environment, percentile, start_asgi, start_flask, start_mock_upstream  # noqa: E402
+
+QUESTIONS = ["What is in the employee handbook?", "How many vacation days do I get?", "Who do I ask about my benefits?", "What is the remote work policy?"]
+
+
+class Results():
+    ## latencies and errors per route, and when the run started and ended
+
+    def __init__(self):
+        self.first_frame = defaultdict(list)
+        self.total = defaultdict(list)
+        self.errors = defaultdict(lambda: defaultdict(int))
+        self.started = time.perf_counter()
+        self.ended = None
+
+    def record(self, route, first_frame, total, error=None):
+        self.total[route].append(total)
+        if first_frame is not None:
+            self.first_frame[route].append(first_frame)
+        if error:
+            self.errors[route][error] += 1
+
+    def summary(self):
+        wall = (self.ended or time.perf_counter()) - self.started
+        routes = {}
+        for route, totals in self.total.items():
+            errors = sum(self.errors[route].values())
+            routes[route] = {
+                "requests": len(totals),
+                "requests_per_second": len(totals) / wall,
+                "error_rate": errors / len(totals),
+                "errors": dict(self.errors[route]),
+                "first_frame": {f"p{p}": percentile(self.first_frame[route], p) for p in (50, 95, 99)},
+                "total": {f"p{p}": percentile(totals, p) for p in (50, 95, 99)},
+            }
+        return {"seconds": wall, "routes": routes}
+
+
+async def post(session, results, url, route, payload, user_id):
+    ## sends one request and returns its NDJSON frames, recording its latency and any error
+    headers = {"X-Ms-Client-Principal-Id": user_id, "X-Ms-Client-Principal-Name": f"{user_id}@example.com"}
+    start = time.perf_counter()
+    first_frame = None
+    frames = []
+    try:
+        async with session.post(url + route, json=payload, headers=headers) as r:
+            async for line in r.content:
+                if first_frame is None:
+                    first_frame = time.perf_counter() - start
+                if line.strip():
+                    frames.append(json.loads(line))
+            error = None if r.status == 200 else f"status {r.status}"
+    except Exception as e:
+        error = type(e).__name__
+    if error is None and any("error" in frame for frame in frames):
+        error = "error frame"
+    results.record(route, first_frame, time.perf_counter() - start, error)
+    return frames if error is None else None
+
+
+def answer_messages(frames):
+    ## the tool and assistant messages a client keeps from a streamed answer
+    tool, content = None, ""
+    for frame in frames:
+        for message in frame.get("choices", [{}])[0].get("messages", []):
+            if message.get("role") == "tool":
+                tool = message
+            elif message.get("role") == "assistant":
+                content += message.get("content") or ""
+    assistant = {"id": frames[-1].get("id"), "role": "assistant", "content": content}
+    return ([tool] if tool else []) + [assistant]
+
+
+def question(n):
+    ## a different question each time, so the answer caches don't hide the upstream calls
+    return f"{QUESTIONS[n % len(QUESTIONS)]} (#{n})"
+
+
+async def one_off_questions(session, results, url, user_id, deadline, counter):
+    while time.perf_counter() < deadline:
+        await post(session, results, url, "/conversation", {"messages": [{"role": "user", "content": question(next(counter))}]}, user_id)
+
+
+async def chat_with_history(session, results, url, user_id, deadline, counter, turns):
+    while time.perf_counter() < deadline:
+        conversation_id, messages = None, []
+        for _ in range(turns):
+            if time.perf_counter() >= deadline:
+                return
+            messages.append({"role": "user", "content": question(next(counter))})
+            frames = await post(session, results, url, "/history/generate", {"conversation_id": conversation_id, "messages": messages}, user_id)
+            if not frames:
+                break
+            conversation_id = frames[-1]["history_metadata"]["conversation_id"]
+            messages.extend(answer_messages(frames))
+            await post(session, results, url, "/history/update", {"conversation_id": conversation_id, "messages": messages}, user_id)
+
+
+async def drive(url, concurrency, duration, scenario, turns, users):
+    results = Results()
+    deadline = time.perf_counter() + duration
+    counter = itertools.count()
+    timeout = aiohttp.ClientTimeout(total=None)
+    async with aiohttp.ClientSession(timeout=timeout, connector=aiohttp.TCPConnector(limit=0)) as session:
+        workers = []
+        for i in range(concurrency):
+            user_id = f"load-test-user-{i % users}"
+            history = scenario == "history" or (scenario == "mixed" and i % 2)
+            if history:
+                workers.append(chat_with_history(session, results, url, user_id, deadline, counter, turns))
+            else:
+                workers.append(one_off_questions(session, results, url, user_id, deadline, counter))
+        await asyncio.gather(*workers)
+    results.ended = time.perf_counter()
+    return results
+
+
+def print_summary(summary, upstream_state, cosmos_calls):
+    print(f"{'route':<18} {'requests':>8} {'req/s':>7} {'errors':>7}   {'first frame p50/p95/p99 (s)':<28} {'total p50/p95/p99 (s)':<24}")
+    for route, r in sorted(summary["routes"].items()):
+        first_frame = "/".join(f"{r['first_frame'][p]:.3f}" for p in ("p50", "p95", "p99"))
+        total = "/".join(f"{r['total'][p]:.3f}" for p in ("p50", "p95", "p99"))
+        print(f"{route:<18} {r['requests']:>8} {r['requests_per_second']:>7.1f} {r['error_rate']:>7.1%}   {first_frame:<28} {total:<24}")
+        for error, count in sorted(r["errors"].items()):
+            print(f"{'':<18} {count:>8} x {error}")
+    print(f"upstream requests={upstream_state['requests']} throttled={upstream_state['throttled']} peak_open_streams={upstream_state['peak_streams']} cosmos_calls={cosmos_calls}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--server", choices=["flask", "asgi"], default="asgi", help="Which app to load. Default=asgi")
+    parser.add_argument("--flask-workers", type=int, default=16, help="Sync workers for the Flask server (uwsgi processes x threads). Default=16")
+    parser.add_argument("--concurrency", type=int, default=32, help="Virtual users sending requests at the same time. Default=32")
+    parser.add_argument("--users", type=int, default=0, help="Distinct signed-in users they are spread over. Default=one per virtual user")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to keep sending requests. Default=30")
+    parser.add_argument("--scenario", choices=["conversation", "history", "mixed"], default="mixed", help="One-off /conversation questions, chats with history, or half of each. Default=mixed")
+    parser.add_argument("--turns", type=int, default=3, help="Questions per conversation with history. Default=3")
+    parser.add_argument("--with-data", action="store_true", help="Take the Azure OpenAI on your data path")
+    parser.add_argument("--tokens", type=int, default=40, help="Content deltas per answer. Default=40")
+    parser.add_argument("--token-rate", type=float, default=50, help="Deltas per second streamed by the mock. Default=50")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before the mock starts each response. Default=0")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of upstream requests answered with a 429. Default=0")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Seconds in the retry-after of those 429s. Default=1")
+    parser.add_argument("--cosmos-latency", type=float, default=0.005, help="Seconds per Cosmos DB container call. Default=0.005")
+    parser.add_argument("--base-port", type=int, default=8090, help="First of two local ports to use. Default=8090")
+    parser.add_argument("--json", help="Also write the summary to this file")
+    args = parser.parse_args()
+
+    upstream_port, app_port = args.base_port, args.base_port + 1
+    # room for the title requests next to the answers, or answers queue for a connection
+    configure_environment(upstream_port, 2 * args.concurrency)
+    if not args.with_data:
+        for name in ("AZURE_SEARCH_SERVICE", "AZURE_SEARCH_INDEX", "AZURE_SEARCH_KEY"):
+            os.environ.pop(name)
+    upstream_state = start_mock_upstream(upstream_port, args.tokens, 1 / args.token_rate, latency=args.latency, throttle_rate=args.throttle_rate, retry_after=args.retry_after, seed=0)
+
+    # injected 429s would print a traceback per failed request; the summary counts them
+    logging.disable(logging.ERROR)
+
+    # asgi takes the Cosmos client from app when it is imported, so replace it first
+    import app
+    app.cosmos_conversation_client = InMemoryConversationClient(args.cosmos_latency)
+    if args.server == "flask":
+        start_flask(app_port, args.flask_workers)
+    else:
+        start_asgi(app_port)
+
+    print(f"{args.server}: {args.concurrency} virtual users, {args.scenario} for {args.duration:.0f}s, "
+          f"{args.tokens} deltas at {args.token_rate:.0f}/s, upstream latency {args.latency}s, {args.throttle_rate:.0%} throttled")
+    results = asyncio.run(drive(f"http://127.0.0.1:{app_port}", args.concurrency, args.duration, args.scenario, args.turns, args.users or args.concurrency))
+    summary = results.summary()
+    print_summary(summary, upstream_state, app.cosmos_conversation_client.container_client.calls)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": vars(args), **summary, "upstream": upstream_state}, f, indent=2)
@@ -0,0 +1,147 @@
+"""Local mock of the Azure OpenAI chat endpoints that streams SSE at a fixed pace.
+
+Every request waits `latency` seconds before the response starts, and a `throttle_rate`
+fraction of them is answered with a 429 and a retry-after, like a deployment out of quota.
+
+    python benchmarks/mock_aoai.py --token-rate 50 --latency 0.3 --throttle-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from aiohttp import web
+
+
+def _sse(payload):
+    return b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n"
+
+
+def _chunk(object_name, choice):
+    return {
+        "id": "chatcmpl-mock",
+        "model": "gpt-35-turbo-16k",
+        "created": int(time.time()),
+        "object": object_name,
+        "choices": [dict(index=0, **choice)],
+    }
+
+
+def create_mock_app(tokens=40, token_delay=0.05, latency=0.0, throttle_rate=0.0, retry_after=1.0, seed=None):
+    state = {"requests": 0, "open_streams": 0, "peak_streams": 0, "throttled": 0}
+    dice = random.Random(seed)
+
+    async def delay_or_throttle():
+        ## None to go on answering, or the 429 to send instead
+        await asyncio.sleep(latency)
+        if throttle_rate and dice.random() < throttle_rate:
+            state["requests"] += 1
+            state["throttled"] += 1
+            return web.json_response(
+                {"error": {"code": "429", "message": "Requests to the mock deployment have exceeded the rate limit."}},
+                status=429,
+                headers={"retry-after-ms": str(int(retry_after * 1000)), "retry-after": str(max(1, round(retry_after))), "apim-request-id": "mock"}
+            )
+        return None
+
+    async def open_stream(request):
+        state["requests"] += 1
+        state["open_streams"] += 1
+        state["peak_streams"] = max(state["peak_streams"], state["open_streams"])
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "apim-request-id": "mock"})
+        await response.prepare(request)
+        return response
+
+    def close_stream():
+        state["open_streams"] -= 1
+
+    async def pace(response, payload):
+        await response.write(_sse(payload))
+        await asyncio.sleep(token_delay)
+
+    async def extensions_chat_completions(request):
+        body = await request.json()
+        throttled = await delay_or_throttle()
+        if throttled:
+            return throttled
+        if not body.get("stream"):
+            state["requests"] += 1
+            await asyncio.sleep(tokens * token_delay)
+            return web.json_response({
+                "id": "chatcmpl-mock",
+                "model": "gpt-35-turbo-16k",
+                "created": int(time.time()),
+                "object": "extensions.chat.completion",
+                "choices": [{
+                    "index": 0,
+                    "message": {
+                        "role": "assistant",
+                        "content": "token " * tokens,
+                        "context": {"messages": [{"role": "tool", "content": json.dumps({"citations": [], "intent": "[]"})}]},
+                    },
+                }],
+            })
+
+        response = await open_stream(request)
+        try:
+            name = "extensions.chat.completion.chunk"
+            tool_content = json.dumps({"citations": [], "intent": "[]"})
+            await pace(response, _chunk(name, {"delta": {"context": {"messages": [{"role": "tool", "content": tool_content, "end_turn": False}]}}, "end_turn": False}))
+            await pace(response, _chunk(name, {"delta": {"role": "assistant"}, "end_turn": False}))
+            for _ in range(tokens):
+                await pace(response, _chunk(name, {"delta": {"content": "token "}, "end_turn": False}))
+            await response.write(_sse(_chunk(name, {"delta": {}, "end_turn": True})))
+            await response.write(b"data: [DONE]\n\n")
+        finally:
+            close_stream()
+        return response
+
+    async def chat_completions(request):
+        body = await request.json()
+        throttled = await delay_or_throttle()
+        if throttled:
+            return throttled
+        if not body.get("stream"):
+            state["requests"] += 1
+            await asyncio.sleep(tokens * token_delay)
+            return web.json_response({
+                "id": "chatcmpl-mock",
+                "model": "gpt-35-turbo-16k",
+                "created": int(time.time()),
+                "object": "chat.completion",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": json.dumps({"title": "Mock title"})}, "finish_reason": "stop"}],
+            })
+
+        response = await open_stream(request)
+        try:
+            name = "chat.completion.chunk"
+            await pace(response, _chunk(name, {"delta": {"role": "assistant"}, "finish_reason": None}))
+            for _ in range(tokens):
+                await pace(response, _chunk(name, {"delta": {"content": "token "}, "finish_reason": None}))
+            await response.write(_sse(_chunk(name, {"delta": {}, "finish_reason": "stop"})))
+            await response.write(b"data: [DONE]\n\n")
+        finally:
+            close_stream()
+        return response
+
+    app = web.Application()
+    app["state"] = state
+    app.router.add_post("/openai/deployments/{deployment}/extensions/chat/completions", extensions_chat_completions)
+    app.router.add_post("/openai/deployments/{deployment}/chat/completions", chat_completions)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8081, help="Port to listen on. Default=8081")
+    parser.add_argument("--tokens", type=int, default=40, help="Number of content deltas per answer. Default=40")
+    parser.add_argument("--token-delay", type=float, default=0.05, help="Seconds between deltas. Default=0.05")
+    parser.add_argument("--token-rate", type=float, help="Deltas per second, instead of --token-delay")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before each response starts. Default=0")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with a 429. Default=0")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Seconds in the retry-after of a 429. Default=1")
+    args = parser.parse_args()
+
+    token_delay = 1 / args.token_rate if args.token_rate else args.token_delay
+    web.run_app(create_mock_app(args.tokens, token_delay, args.latency, args.throttle_rate, args.retry_after), host="127.0.0.1", port=args.port)
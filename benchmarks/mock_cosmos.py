@@ -0,0 +1,112 @@
+"""In-memory stand-in for the Cosmos DB container behind CosmosConversationClient.
+
+InMemoryConversationClient runs the real CosmosConversationClient methods against
+InMemoryContainer, which keeps the items in a dict and understands the handful of
+queries those methods send. Each container call can sleep for a fixed latency to
+stand in for the round trip to Cosmos DB.
+
+    import app
+    from mock_cosmos import InMemoryConversationClient
+    app.cosmos_conversation_client = InMemoryConversationClient(latency=0.005)
+"""
+import copy
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+
+from azure.core import MatchConditions
+from azure.cosmos.exceptions import CosmosAccessConditionFailedError, CosmosResourceNotFoundError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from backend.history.cosmosdbservice import CosmosConversationClient  # noqa: E402
+
+CONDITION = re.compile(r"c\.(\w+)\s*=\s*(@\w+|'[^']*')", re.IGNORECASE)
+ORDER_BY = re.compile(r"order by c\.(\w+)\s*(asc|desc)?", re.IGNORECASE)
+OFFSET_LIMIT = re.compile(r"offset (\d+) limit (\d+)", re.IGNORECASE)
+
+
+class InMemoryContainer():
+    ## The container operations CosmosConversationClient uses, on items partitioned by userId.
+    ## Writes get a new _etag, and replace_item honours IfNotModified like the service does.
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.items = {}
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def call(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def read(self):
+        self.call()
+        return {"id": "conversations"}
+
+    def store(self, body):
+        item = {**copy.deepcopy(body), "_etag": str(uuid.uuid4())}
+        self.items[(body["userId"], body["id"])] = item
+        return copy.deepcopy(item)
+
+    def upsert_item(self, body):
+        self.call()
+        with self.lock:
+            return self.store(body)
+
+    def read_item(self, item, partition_key):
+        self.call()
+        with self.lock:
+            found = self.items.get((partition_key, item))
+            if found is None:
+                raise CosmosResourceNotFoundError(message=f"Item {item} not found")
+            return copy.deepcopy(found)
+
+    def replace_item(self, item, body, etag=None, match_condition=None):
+        self.call()
+        with self.lock:
+            current = self.items.get((body["userId"], item))
+            if current is None:
+                raise CosmosResourceNotFoundError(message=f"Item {item} not found")
+            if match_condition == MatchConditions.IfNotModified and current["_etag"] != etag:
+                raise CosmosAccessConditionFailedError(message=f"Item {item} was modified")
+            return self.store(body)
+
+    def delete_item(self, item, partition_key):
+        self.call()
+        with self.lock:
+            if self.items.pop((partition_key, item), None) is None:
+                raise CosmosResourceNotFoundError(message=f"Item {item} not found")
+
+    def query_items(self, query, parameters=None, enable_cross_partition_query=False):
+        ## supports what the client sends: equality conditions joined by "and", one order by,
+        ## and offset/limit
+        self.call()
+        values = {parameter["name"]: parameter["value"] for parameter in parameters or []}
+        conditions = [(field, values[value] if value.startswith("@") else value.strip("'")) for field, value in CONDITION.findall(query)]
+        with self.lock:
+            matches = [copy.deepcopy(item) for item in self.items.values() if all(item.get(field) == value for field, value in conditions)]
+        order = ORDER_BY.search(query)
+        if order:
+            field, direction = order.group(1), (order.group(2) or "asc").lower()
+            matches.sort(key=lambda item: str(item.get(field, "")), reverse=direction == "desc")
+        page = OFFSET_LIMIT.search(query)
+        if page:
+            offset, limit = int(page.group(1)), int(page.group(2))
+            matches = matches[offset:offset + limit]
+        return iter(matches)
+
+
+class InMemoryConversationClient(CosmosConversationClient):
+
+    def __init__(self, latency: float = 0.0, enable_message_feedback: bool = False):
+        self.cosmosdb_endpoint = "memory"
+        self.credential = None
+        self.database_name = "db_conversation_history"
+        self.container_name = "conversations"
+        self.cosmosdb_client = self.database_client = True
+        self.container_client = InMemoryContainer(latency)
+        self.enable_message_feedback = enable_message_feedback
@@ -0,0 +1,74 @@
+"""Report frames per second of the streaming transforms with and without FrameEncoder.
+
+Runs the per-token path of stream_with_data and stream_without_data in-process,
+from the raw SSE line to the NDJSON frame, over a synthetic answer: parsing
+with json or orjson, and rendering each frame as a new dict passed through
+format_as_ndjson or from the stream's FrameEncoder template.
+
+    python benchmarks/ndjson_frames.py --tokens 200 --answers 500
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import app  # noqa: E402
+from backend.upstream import ndjson  # noqa: E402
+from backend.upstream.client import parse_sse_json  # noqa: E402
+
+HISTORY_METADATA = {"conversation_id": "5f0a8a5e-2f7d-4f5e-9a43-7f4f3c1d8e0b", "title": "Remote work policy", "date": "2023-11-01T10:00:00.000000", "message_id": "0c5c0e9b-3b1e-4a0c-8f4e-6d7a2f1b9c3d"}
+
+
+def sse_lines(tokens, with_data):
+    lines = []
+    for i in range(tokens):
+        delta = {"content": f" token{i} “quoted” ünïcode"}
+        choice = {"delta": delta, "end_turn": False} if with_data else {"delta": delta, "finish_reason": None}
+        chunk = {"id": "chatcmpl-1", "model": "gpt-35-turbo-16k", "created": 1700000000, "object": "chat.completion.chunk", "choices": [{"index": 0, **choice}]}
+        lines.append(b"data: " + json.dumps(chunk).encode("utf-8"))
+    return lines
+
+
+def run_with_data(lines, answers, use_encoder):
+    frames = 0
+    start = time.perf_counter()
+    for _ in range(answers):
+        encoder = ndjson.FrameEncoder("m-1", HISTORY_METADATA, with_apim_request_id=True, apim_request_id="req-1") if use_encoder else None
+        for line in lines:
+            lineJson = app.parse_stream_line_with_data(line)
+            for frame in app.format_stream_response_with_data(lineJson, "req-1", HISTORY_METADATA, "m-1", encoder):
+                frames += 1
+    return frames / (time.perf_counter() - start)
+
+
+def run_without_data(lines, answers, use_encoder):
+    frames = 0
+    start = time.perf_counter()
+    for _ in range(answers):
+        encoder = ndjson.FrameEncoder("m-1", HISTORY_METADATA) if use_encoder else None
+        responseText = ""
+        for line in lines:
+            responseText, frame = app.format_stream_response_without_data(parse_sse_json(line), responseText, HISTORY_METADATA, "m-1", encoder)
+            frames += 1
+    return frames / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--answers", type=int, default=500, help="Answers to render per scenario. Default=500")
+    parser.add_argument("--tokens", type=int, default=200, help="Content deltas per answer. Default=200")
+    args = parser.parse_args()
+
+    orjson = ndjson.orjson
+    parsers = [("json", None)] + ([("orjson", orjson)] if orjson else [])
+    print(f"{args.tokens} deltas per answer, {args.answers} answers per scenario")
+    for path, run, with_data in [("with data", run_with_data, True), ("without data", run_without_data, False)]:
+        lines = sse_lines(args.tokens, with_data)
+        for parser_name, parser_module in parsers:
+            ndjson.orjson = parser_module
+            for encoder_name, use_encoder in [("dict + format_as_ndjson", False), ("FrameEncoder", True)]:
+                rate = run(lines, args.answers, use_encoder)
+                print(f"{path:<13} {parser_name:<7} {encoder_name:<24} {rate:>12,.0f} frames/s")
+    ndjson.orjson = orjson
@@ -0,0 +1,162 @@
+"""Compare concurrent-stream capacity of the Flask handlers and the ASGI handlers.
+
+Both servers talk to the local mock in mock_aoai.py, which paces every answer, so
+the only variable is how many streams a server can keep open at once. The Flask
+app runs on a fixed pool of sync workers, the same shape as uwsgi processes x
+threads; the ASGI app runs in a single hypercorn event loop.
+
+    python benchmarks/stream_capacity.py --concurrency 64 --flask-workers 4
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from socketserver import ThreadingMixIn
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from mock_aoai import create_mock_app  # noqa: E402
+
+
+def configure_environment(upstream_port, concurrency):
+    # Point the app at the mock and take the "on your data" streaming path
+    os.environ["AZURE_OPENAI_ENDPOINT"] = f"http://127.0.0.1:{upstream_port}/"
+    os.environ["AZURE_OPENAI_MODEL"] = "mock"
+    os.environ["AZURE_OPENAI_KEY"] = "mock"
+    os.environ["AZURE_OPENAI_STREAM"] = "true"
+    os.environ["AZURE_OPENAI_POOL_SIZE"] = str(concurrency)
+    os.environ["AZURE_SEARCH_SERVICE"] = "mock"
+    os.environ["AZURE_SEARCH_INDEX"] = "mock"
+    os.environ["AZURE_SEARCH_KEY"] = "mock"
+
+
+def start_in_thread(coroutine_factory):
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(coroutine_factory(started))
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    started.wait()
+    return loop
+
+
+def start_mock_upstream(port, tokens, token_delay, **options):
+    # options are create_mock_app's latency, throttle_rate and retry_after
+    mock_app = create_mock_app(tokens, token_delay, **options)
+
+    async def serve(started):
+        runner = web.AppRunner(mock_app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        started.set()
+
+    start_in_thread(serve)
+    return mock_app["state"]
+
+
+def start_flask(port, workers):
+    from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+    from app import app as flask_app
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    class PooledWSGIServer(ThreadingMixIn, BaseWSGIServer):
+        # A bounded pool of sync workers, like uwsgi processes x threads
+        pool = ThreadPoolExecutor(workers)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self.process_request_thread, request, client_address)
+
+    server = PooledWSGIServer("127.0.0.1", port, flask_app, handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+
+def start_asgi(port):
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+    from asgi import app as asgi_app
+
+    config = Config()
+    config.bind = [f"127.0.0.1:{port}"]
+    config.accesslog = None
+
+    async def run(started):
+        asyncio.get_running_loop().call_later(0.5, started.set)
+        # A shutdown trigger keeps hypercorn from installing signal handlers off the main thread
+        await serve(asgi_app, config, shutdown_trigger=asyncio.Event().wait)
+
+    start_in_thread(run)
+
+
+async def one_stream(session, url):
+    payload = {"messages": [{"role": "user", "content": "What is in the employee handbook?"}]}
+    start = time.perf_counter()
+    first_frame = None
+    async with session.post(url, json=payload) as r:
+        if r.status != 200:
+            raise Exception(f"status {r.status}")
+        async for _ in r.content:
+            if first_frame is None:
+                first_frame = time.perf_counter() - start
+    return first_frame, time.perf_counter() - start
+
+
+async def drive(url, concurrency):
+    timeout = aiohttp.ClientTimeout(total=None)
+    async with aiohttp.ClientSession(timeout=timeout, connector=aiohttp.TCPConnector(limit=0, force_close=True)) as session:
+        start = time.perf_counter()
+        results = await asyncio.gather(*[one_stream(session, url) for _ in range(concurrency)], return_exceptions=True)
+        wall = time.perf_counter() - start
+    ok = [r for r in results if not isinstance(r, BaseException)]
+    return ok, len(results) - len(ok), wall
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def report(name, ok, errors, wall, upstream_state):
+    ttfb = [r[0] for r in ok if r[0] is not None]
+    total = [r[1] for r in ok]
+    print(f"{name:<6} ok={len(ok):<4} errors={errors:<4} peak_open_streams={upstream_state['peak_streams']:<4} "
+          f"ttfb_p50={percentile(ttfb, 50):.2f}s ttfb_p95={percentile(ttfb, 95):.2f}s "
+          f"total_p50={statistics.median(total) if total else float('nan'):.2f}s wall={wall:.2f}s "
+          f"answers/s={len(ok) / wall:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=64, help="Number of simultaneous chat streams. Default=64")
+    parser.add_argument("--flask-workers", type=int, default=4, help="Sync workers for the Flask server (uwsgi processes x threads). Default=4")
+    parser.add_argument("--tokens", type=int, default=40, help="Content deltas per answer. Default=40")
+    parser.add_argument("--token-delay", type=float, default=0.05, help="Seconds between deltas. Default=0.05")
+    parser.add_argument("--base-port", type=int, default=8090, help="First of three local ports to use. Default=8090")
+    args = parser.parse_args()
+
+    upstream_port, flask_port, asgi_port = args.base_port, args.base_port + 1, args.base_port + 2
+    configure_environment(upstream_port, args.concurrency)
+    upstream_state = start_mock_upstream(upstream_port, args.tokens, args.token_delay)
+    start_flask(flask_port, args.flask_workers)
+    start_asgi(asgi_port)
+
+    print(f"{args.concurrency} concurrent streams, {args.tokens} deltas every {args.token_delay}s "
+          f"(ideal answer time {(args.tokens + 2) * args.token_delay:.2f}s)")
+    for name, port in (("flask", flask_port), ("asgi", asgi_port)):
+        upstream_state["peak_streams"] = 0
+        ok, errors, wall = asyncio.run(drive(f"http://127.0.0.1:{port}/conversation", args.concurrency))
+        report(name, ok, errors, wall, upstream_state)
@@ -0,0 +1,81 @@
+"""Report NDJSON frames and relay CPU per answer for stream_with_data settings.
+
+Streams answers from the local mock in mock_aoai.py through the Flask app and
+counts the frames written to the client, the CPU spent relaying them and the
+socket reads made, for a few combinations of AZURE_OPENAI_STREAM_READ_SIZE and
+the delta coalescing window.
+
+    python benchmarks/stream_frames.py --tokens 200 --token-delay 0.01
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from stream_capacity import configure_environment, start_mock_upstream  # noqa: E402
+
+SCENARIOS = [
+    # name, read size, coalesce ms, coalesce bytes
+    ("read=10 (previous)", 10, 0, 0),
+    ("read=4096", 4096, 0, 0),
+    ("read=4096 coalesce=50ms", 4096, 50, 0),
+    ("read=4096 coalesce=100ms/256B", 4096, 100, 256),
+]
+
+
+def run_scenario(app_module, read_size, coalesce_ms, coalesce_bytes, answers):
+    app_module.azure_openai_client.read_size = read_size
+    app_module.AZURE_OPENAI_STREAM_COALESCE_MS = coalesce_ms
+    app_module.AZURE_OPENAI_STREAM_COALESCE_BYTES = coalesce_bytes
+
+    # Count socket reads by wrapping the session used for every upstream call
+    reads = {"count": 0}
+    session = app_module.azure_openai_client.session
+    original_post = session.post
+
+    def counting_post(*args, **kwargs):
+        response = original_post(*args, **kwargs)
+        original_iter_content = response.iter_content
+
+        def iter_content(*a, **kw):
+            for chunk in original_iter_content(*a, **kw):
+                reads["count"] += 1
+                yield chunk
+        response.iter_content = iter_content
+        return response
+
+    session.post = counting_post
+    client = app_module.app.test_client()
+    payload = {"messages": [{"role": "user", "content": "What is in the employee handbook?"}]}
+    frames = 0
+    cpu = 0.0
+    try:
+        for _ in range(answers):
+            response = client.post("/conversation", json=payload, buffered=False)
+            start = time.thread_time()
+            for chunk in response.response:
+                frames += chunk.count(b"\n") if isinstance(chunk, bytes) else chunk.count("\n")
+            cpu += time.thread_time() - start
+            response.close()
+    finally:
+        session.post = original_post
+    return frames / answers, cpu / answers * 1000, reads["count"] / answers
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--answers", type=int, default=5, help="Answers to stream per scenario. Default=5")
+    parser.add_argument("--tokens", type=int, default=200, help="Content deltas per answer. Default=200")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Seconds between deltas. Default=0.01")
+    parser.add_argument("--port", type=int, default=8095, help="Port for the mock upstream. Default=8095")
+    args = parser.parse_args()
+
+    configure_environment(args.port, 1)
+    start_mock_upstream(args.port, args.tokens, args.token_delay)
+    import app
+
+    print(f"{args.tokens} deltas per answer every {args.token_delay}s, {args.answers} answers per scenario")
+    for name, read_size, coalesce_ms, coalesce_bytes in SCENARIOS:
+        frames, cpu_ms, reads = run_scenario(app, read_size, coalesce_ms, coalesce_bytes, args.answers)
+        print(f"{name:<32} frames/answer={frames:7.1f} socket_reads/answer={reads:7.1f} relay_cpu/answer={cpu_ms:6.2f}ms")
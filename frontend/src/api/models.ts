@@ -57,6 +57,7 @@ export type ChatResponse = {
         conversation_id: string;
         title: string;
         date: string;
+        message_id?: string;
     }
     error?: any;
 }
@@ -100,6 +101,7 @@ export type ErrorMessage = {
 export type FrontendSettings = {
     auth_enabled?: string | null;
     feedback_enabled?: string | null;
+    answers_saved_by_server?: boolean | null;
 }
 
 export enum Feedback {
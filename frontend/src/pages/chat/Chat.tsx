@@ -42,6 +42,7 @@ const enum messageStatus {
 const Chat = () => {
     const appStateContext = useContext(AppStateContext)
     const AUTH_ENABLED = appStateContext?.state.frontendSettings?.auth_enabled;
+    const ANSWERS_SAVED_BY_SERVER = appStateContext?.state.frontendSettings?.answers_saved_by_server;
     const chatMessageStreamEnd = useRef<HTMLDivElement | null>(null);
     const [isLoading, setIsLoading] = useState<boolean>(false);
     const [showLoadingMessage, setShowLoadingMessage] = useState<boolean>(false);
@@ -310,6 +311,9 @@ const Chat = () => {
             if (response?.body) {
                 const reader = response.body.getReader();
                 let runningText = "";
+                // an error frame after the answer, such as a failed history write, is kept apart
+                // so the answer already shown is not lost
+                let errorResult = undefined as ChatResponse | undefined;
 
                 while (true) {
                     setProcessMessages(messageStatus.Processing)
@@ -321,7 +325,13 @@ const Chat = () => {
                     objects.forEach((obj) => {
                         try {
                             runningText += obj;
-                            result = JSON.parse(runningText);
+                            const frame: ChatResponse = JSON.parse(runningText);
+                            if (frame.error && !frame.choices) {
+                                errorResult = frame;
+                                runningText = "";
+                                return;
+                            }
+                            result = frame;
                             result.choices[0].messages.forEach((obj) => {
                                 obj.id = result.id;
                                 obj.date = new Date().toISOString();
@@ -336,6 +346,18 @@ const Chat = () => {
                     });
                 }
 
+                if (errorResult && isEmpty(assistantMessage)) {
+                    // nothing was answered: report the error as before
+                    result = errorResult;
+                    throw new Error(errorResult.error);
+                }
+                const errorChatMsgs: ChatMessage[] = errorResult ? [{
+                    id: uuid(),
+                    role: ERROR,
+                    content: typeof errorResult.error === "string" ? errorResult.error : "Chat history can't be saved at this time.",
+                    date: new Date().toISOString()
+                }] : [];
+
                 let resultConversation;
                 if (conversationId) {
                     resultConversation = appStateContext?.state?.chatHistory?.find((conv) => conv.id === conversationId)
@@ -347,18 +369,19 @@ const Chat = () => {
                         return;
                     }
                     isEmpty(toolMessage) ?
-                        resultConversation.messages.push(assistantMessage) :
-                        resultConversation.messages.push(toolMessage, assistantMessage)
+                        resultConversation.messages.push(assistantMessage, ...errorChatMsgs) :
+                        resultConversation.messages.push(toolMessage, assistantMessage, ...errorChatMsgs)
                 } else {
+                    const historyMetadata = result.history_metadata ?? errorResult!.history_metadata;
                     resultConversation = {
-                        id: result.history_metadata.conversation_id,
-                        title: result.history_metadata.title,
+                        id: historyMetadata.conversation_id,
+                        title: historyMetadata.title,
                         messages: [userMessage],
-                        date: result.history_metadata.date
+                        date: historyMetadata.date
                     }
                     isEmpty(toolMessage) ?
-                        resultConversation.messages.push(assistantMessage) :
-                        resultConversation.messages.push(toolMessage, assistantMessage)
+                        resultConversation.messages.push(assistantMessage, ...errorChatMsgs) :
+                        resultConversation.messages.push(toolMessage, assistantMessage, ...errorChatMsgs)
                 }
                 if (!resultConversation) {
                     setIsLoading(false);
@@ -368,8 +391,8 @@ const Chat = () => {
                 }
                 appStateContext?.dispatch({ type: 'UPDATE_CURRENT_CHAT', payload: resultConversation });
                 isEmpty(toolMessage) ?
-                    setMessages([...messages, assistantMessage]) :
-                    setMessages([...messages, toolMessage, assistantMessage]);
+                    setMessages([...messages, assistantMessage, ...errorChatMsgs]) :
+                    setMessages([...messages, toolMessage, assistantMessage, ...errorChatMsgs]);
             }
 
         } catch (e) {
@@ -481,12 +504,13 @@ const Chat = () => {
 
     useLayoutEffect(() => {
         const saveToDB = async (messages: ChatMessage[], id: string) => {
-            const response = await historyUpdate(messages, id)
+            // error messages are only shown, never saved: the last saved message must be the answer
+            const response = await historyUpdate(messages.filter(message => message.role !== ERROR), id)
             return response
         }
 
         if (appStateContext && appStateContext.state.currentChat && processMessages === messageStatus.Done) {
-            if (appStateContext.state.isCosmosDBAvailable.cosmosDB) {
+            if (appStateContext.state.isCosmosDBAvailable.cosmosDB && !ANSWERS_SAVED_BY_SERVER) {
                 if (!appStateContext?.state.currentChat?.messages) {
                     console.error("Failure fetching current chat state.")
                     return
@@ -12,7 +12,7 @@ from azure.identity import AzureCliCredential
 from pymongo.mongo_client import MongoClient
 from typing import List
 
-from data_utils import chunk_directory
+from data_utils import cached_credential, chunk_directory
 
 SUPPORTED_LANGUAGE_CODES = {
     "ar": "Arabic",
@@ -236,7 +236,7 @@ if __name__ == "__main__":
     with open(args.cosmos_config) as f:
         config = json.load(f)
 
-    credential = AzureCliCredential()
+    credential = cached_credential(AzureCliCredential())
     form_recognizer_client = None
 
     print("Data preparation script started")
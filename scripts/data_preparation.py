@@ -13,7 +13,7 @@ from azure.identity import AzureCliCredential
 from azure.search.documents import SearchClient
 from tqdm import tqdm
 
-from data_utils import chunk_directory, chunk_blob_container
+from data_utils import cached_credential, chunk_directory, chunk_blob_container
 
 SUPPORTED_LANGUAGE_CODES = {
     "ar": "Arabic",
@@ -436,7 +436,7 @@ if __name__ == "__main__":
     with open(args.config) as f:
         config = json.load(f)
 
-    credential = AzureCliCredential()
+    credential = cached_credential(AzureCliCredential())
     form_recognizer_client = None
 
     print("Data preparation script started")
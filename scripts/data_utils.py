@@ -7,6 +7,7 @@ import re
 import requests
 import openai
 import re
+import sys
 import tempfile
 import time
 from abc import ABC, abstractmethod
@@ -26,6 +27,14 @@ from langchain.text_splitter import TextSplitter, MarkdownTextSplitter, Recursiv
 from tqdm import tqdm
 from typing import Any
 
+# The token cache is shared with the web app. Azure ML components upload only this folder, so
+# there the credential is used as it is and asks for a new token each time.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+try:
+    from backend.auth.token_cache import CachedTokenCredential
+except ImportError:
+    CachedTokenCredential = None
+
 
 FILE_FORMAT_DICT = {
         "md": "markdown",
@@ -611,6 +620,14 @@ def merge_chunks_serially(chunked_content_list: List[str], num_tokens: int) -> G
         yield current_chunk, total_size
 
 
+def cached_credential(credential):
+    """Wraps an Azure credential so its access tokens are cached and refreshed before they expire.
+    Returns the credential unchanged if it is None, already wrapped, or the cache is not available."""
+    if credential is None or CachedTokenCredential is None or isinstance(credential, CachedTokenCredential):
+        return credential
+    return CachedTokenCredential(credential)
+
+
 def get_embedding(text, embedding_model_endpoint=None, embedding_model_key=None, azure_credential=None):
     endpoint = embedding_model_endpoint if embedding_model_endpoint else os.environ.get("EMBEDDING_MODEL_ENDPOINT")
     key = embedding_model_key if embedding_model_key else os.environ.get("EMBEDDING_MODEL_KEY")
@@ -965,6 +982,8 @@ def chunk_directory(
     chunks = []
     total_files = 0
     num_unsupported_format_files = 0
+    # one token per worker process and hour instead of one per chunk
+    azure_credential = cached_credential(azure_credential)
     num_files_with_errors = 0
     skipped_chunks = 0
 
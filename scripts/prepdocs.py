@@ -23,7 +23,7 @@ from azure.search.documents import SearchClient
 from azure.ai.formrecognizer import DocumentAnalysisClient
 
 
-from data_utils import chunk_directory
+from data_utils import cached_credential, chunk_directory
 
 
 def create_search_index(index_name, index_client):
@@ -204,7 +204,7 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     # Use the current user identity to connect to Azure services unless a key is explicitly set for any of them
-    azd_credential = (
+    azd_credential = cached_credential(
         AzureDeveloperCliCredential()
         if args.tenantid == None
         else AzureDeveloperCliCredential(tenant_id=args.tenantid, process_timeout=60)
@@ -105,6 +105,6 @@ Error generating stack: `+o.message+`
 `||i==="\r"&&this.html[r+1]!==`
 `)&&(t.isEol=!0),t.col=r-t.lineStartPos+1,t.offset=t.droppedBufferSize+r,n.advance.call(this)},retreat(){n.retreat.call(this),t.isEol=!1,t.col=this.pos-t.lineStartPos+1},dropParsedChunk(){const r=this.pos;n.dropParsedChunk.call(this);const i=r-this.pos;t.lineStartPos-=i,t.droppedBufferSize+=i,t.offset=t.droppedBufferSize+this.pos}}}};var JC=bB;const zv=io,e0=ff,kB=JC;let FB=class extends zv{constructor(t){super(t),this.tokenizer=t,this.posTracker=zv.install(t.preprocessor,kB),this.currentAttrLocation=null,this.ctLoc=null}_getCurrentLocation(){return{startLine:this.posTracker.line,startCol:this.posTracker.col,startOffset:this.posTracker.offset,endLine:-1,endCol:-1,endOffset:-1}}_attachCurrentAttrLocationInfo(){this.currentAttrLocation.endLine=this.posTracker.line,this.currentAttrLocation.endCol=this.posTracker.col,this.currentAttrLocation.endOffset=this.posTracker.offset;const t=this.tokenizer.currentToken,n=this.tokenizer.currentAttr;t.location.attrs||(t.location.attrs=Object.create(null)),t.location.attrs[n.name]=this.currentAttrLocation}_getOverriddenMethods(t,n){const r={_createStartTagToken(){n._createStartTagToken.call(this),this.currentToken.location=t.ctLoc},_createEndTagToken(){n._createEndTagToken.call(this),this.currentToken.location=t.ctLoc},_createCommentToken(){n._createCommentToken.call(this),this.currentToken.location=t.ctLoc},_createDoctypeToken(i){n._createDoctypeToken.call(this,i),this.currentToken.location=t.ctLoc},_createCharacterToken(i,o){n._createCharacterToken.call(this,i,o),this.currentCharacterToken.location=t.ctLoc},_createEOFToken(){n._createEOFToken.call(this),this.currentToken.location=t._getCurrentLocation()},_createAttr(i){n._createAttr.call(this,i),t.currentAttrLocation=t._getCurrentLocation()},_leaveAttrName(i){n._leaveAttrName.call(this,i),t._attachCurrentAttrLocationInfo()},_leaveAttrValue(i){n._leaveAttrValue.call(this,i),t._attachCurrentAttrLocationInfo()},_emitCurrentToken(){const i=this.currentToken.location;this.currentCharacterToken&&(this.currentCharacterToken.location.endLine=i.startLine,this.currentCharacterToken.location.endCol=i.startCol,this.currentCharacterToken.location.endOffset=i.startOffset),this.currentToken.type===e0.EOF_TOKEN?(i.endLine=i.startLine,i.endCol=i.startCol,i.endOffset=i.startOffset):(i.endLine=t.posTracker.line,i.endCol=t.posTracker.col+1,i.endOffset=t.posTracker.offset+1),n._emitCurrentToken.call(this)},_emitCurrentCharacterToken(){const i=this.currentCharacterToken&&this.currentCharacterToken.location;i&&i.endOffset===-1&&(i.endLine=t.posTracker.line,i.endCol=t.posTracker.col,i.endOffset=t.posTracker.offset),n._emitCurrentCharacterToken.call(this)}};return Object.keys(e0.MODE).forEach(i=>{const o=e0.MODE[i];r[o]=function(a){t.ctLoc=t._getCurrentLocation(),n[o].call(this,a)}}),r}};var e8=FB;const IB=io;let xB=class extends IB{constructor(t,n){super(t),this.onItemPop=n.onItemPop}_getOverriddenMethods(t,n){return{pop(){t.onItemPop(this.current),n.pop.call(this)},popAllUpToHtmlElement(){for(let r=this.stackTop;r>0;r--)t.onItemPop(this.items[r]);n.popAllUpToHtmlElement.call(this)},remove(r){t.onItemPop(this.current),n.remove.call(this,r)}}}};var NB=xB;const t0=io,Gv=ff,DB=e8,wB=NB,RB=ei,n0=RB.TAG_NAMES;let OB=class extends t0{constructor(t){super(t),this.parser=t,this.treeAdapter=this.parser.treeAdapter,this.posTracker=null,this.lastStartTagToken=null,this.lastFosterParentingLocation=null,this.currentToken=null}_setStartLocation(t){let n=null;this.lastStartTagToken&&(n=Object.assign({},this.lastStartTagToken.location),n.startTag=this.lastStartTagToken.location),this.treeAdapter.setNodeSourceCodeLocation(t,n)}_setEndLocation(t,n){if(this.treeAdapter.getNodeSourceCodeLocation(t)&&n.location){const i=n.location,o=this.treeAdapter.getTagName(t),a=n.type===Gv.END_TAG_TOKEN&&o===n.tagName,s={};a?(s.endTag=Object.assign({},i),s.endLine=i.endLine,s.endCol=i.endCol,s.endOffset=i.endOffset):(s.endLine=i.startLine,s.endCol=i.startCol,s.endOffset=i.startOffset),this.treeAdapter.updateNodeSourceCodeLocation(t,s)}}_getOverriddenMethods(t,n){return{_bootstrap(r,i){n._bootstrap.call(this,r,i),t.lastStartTagToken=null,t.lastFosterParentingLocation=null,t.currentToken=null;const o=t0.install(this.tokenizer,DB);t.posTracker=o.posTracker,t0.install(this.openElements,wB,{onItemPop:function(a){t._setEndLocation(a,t.currentToken)}})},_runParsingLoop(r){n._runParsingLoop.call(this,r);for(let i=this.openElements.stackTop;i>=0;i--)t._setEndLocation(this.openElements.items[i],t.currentToken)},_processTokenInForeignContent(r){t.currentToken=r,n._processTokenInForeignContent.call(this,r)},_processToken(r){if(t.currentToken=r,n._processToken.call(this,r),r.type===Gv.END_TAG_TOKEN&&(r.tagName===n0.HTML||r.tagName===n0.BODY&&this.openElements.hasInScope(n0.BODY)))for(let o=this.openElements.stackTop;o>=0;o--){const a=this.openElements.items[o];if(this.treeAdapter.getTagName(a)===r.tagName){t._setEndLocation(a,r);break}}},_setDocumentType(r){n._setDocumentType.call(this,r);const i=this.treeAdapter.getChildNodes(this.document),o=i.length;for(let a=0;a<o;a++){const s=i[a];if(this.treeAdapter.isDocumentTypeNode(s)){this.treeAdapter.setNodeSourceCodeLocation(s,r.location);break}}},_attachElementToTree(r){t._setStartLocation(r),t.lastStartTagToken=null,n._attachElementToTree.call(this,r)},_appendElement(r,i){t.lastStartTagToken=r,n._appendElement.call(this,r,i)},_insertElement(r,i){t.lastStartTagToken=r,n._insertElement.call(this,r,i)},_insertTemplate(r){t.lastStartTagToken=r,n._insertTemplate.call(this,r);const i=this.treeAdapter.getTemplateContent(this.openElements.current);this.treeAdapter.setNodeSourceCodeLocation(i,null)},_insertFakeRootElement(){n._insertFakeRootElement.call(this),this.treeAdapter.setNodeSourceCodeLocation(this.openElements.current,null)},_appendCommentNode(r,i){n._appendCommentNode.call(this,r,i);const o=this.treeAdapter.getChildNodes(i),a=o[o.length-1];this.treeAdapter.setNodeSourceCodeLocation(a,r.location)},_findFosterParentingLocation(){return t.lastFosterParentingLocation=n._findFosterParentingLocation.call(this),t.lastFosterParentingLocation},_insertCharacters(r){n._insertCharacters.call(this,r);const i=this._shouldFosterParentOnInsertion(),o=i&&t.lastFosterParentingLocation.parent||this.openElements.currentTmplContent||this.openElements.current,a=this.treeAdapter.getChildNodes(o),s=i&&t.lastFosterParentingLocation.beforeElement?a.indexOf(t.lastFosterParentingLocation.beforeElement)-1:a.length-1,l=a[s];if(this.treeAdapter.getNodeSourceCodeLocation(l)){const{endLine:c,endCol:d,endOffset:f}=r.location;this.treeAdapter.updateNodeSourceCodeLocation(l,{endLine:c,endCol:d,endOffset:f})}else this.treeAdapter.setNodeSourceCodeLocation(l,r.location)}}}};var PB=OB;const MB=io;let LB=class extends MB{constructor(t,n){super(t),this.posTracker=null,this.onParseError=n.onParseError}_setErrorLocation(t){t.startLine=t.endLine=this.posTracker.line,t.startCol=t.endCol=this.posTracker.col,t.startOffset=t.endOffset=this.posTracker.offset}_reportError(t){const n={code:t,startLine:-1,startCol:-1,startOffset:-1,endLine:-1,endCol:-1,endOffset:-1};this._setErrorLocation(n),this.onParseError(n)}_getOverriddenMethods(t){return{_err(n){t._reportError(n)}}}};var cg=LB;const BB=cg,HB=JC,UB=io;let zB=class extends BB{constructor(t,n){super(t,n),this.posTracker=UB.install(t,HB),this.lastErrOffset=-1}_reportError(t){this.lastErrOffset!==this.posTracker.offset&&(this.lastErrOffset=this.posTracker.offset,super._reportError(t))}};var GB=zB;const WB=cg,KB=GB,jB=io;let $B=class extends WB{constructor(t,n){super(t,n);const r=jB.install(t.preprocessor,KB,n);this.posTracker=r.posTracker}};var VB=$B;const YB=cg,qB=VB,QB=e8,Wv=io;let XB=class extends YB{constructor(t,n){super(t,n),this.opts=n,this.ctLoc=null,this.locBeforeToken=!1}_setErrorLocation(t){this.ctLoc&&(t.startLine=this.ctLoc.startLine,t.startCol=this.ctLoc.startCol,t.startOffset=this.ctLoc.startOffset,t.endLine=this.locBeforeToken?this.ctLoc.startLine:this.ctLoc.endLine,t.endCol=this.locBeforeToken?this.ctLoc.startCol:this.ctLoc.endCol,t.endOffset=this.locBeforeToken?this.ctLoc.startOffset:this.ctLoc.endOffset)}_getOverriddenMethods(t,n){return{_bootstrap(r,i){n._bootstrap.call(this,r,i),Wv.install(this.tokenizer,qB,t.opts),Wv.install(this.tokenizer,QB)},_processInputToken(r){t.ctLoc=r.location,n._processInputToken.call(this,r)},_err(r,i){t.locBeforeToken=i&&i.beforeToken,t._reportError(r)}}}};var ZB=XB,xe={};const{DOCUMENT_MODE:JB}=ei;xe.createDocument=function(){return{nodeName:"#document",mode:JB.NO_QUIRKS,childNodes:[]}};xe.createDocumentFragment=function(){return{nodeName:"#document-fragment",childNodes:[]}};xe.createElement=function(e,t,n){return{nodeName:e,tagName:e,attrs:n,namespaceURI:t,childNodes:[],parentNode:null}};xe.createCommentNode=function(e){return{nodeName:"#comment",data:e,parentNode:null}};const t8=function(e){return{nodeName:"#text",value:e,parentNode:null}},n8=xe.appendChild=function(e,t){e.childNodes.push(t),t.parentNode=e},eH=xe.insertBefore=function(e,t,n){const r=e.childNodes.indexOf(n);e.childNodes.splice(r,0,t),t.parentNode=e};xe.setTemplateContent=function(e,t){e.content=t};xe.getTemplateContent=function(e){return e.content};xe.setDocumentType=function(e,t,n,r){let i=null;for(let o=0;o<e.childNodes.length;o++)if(e.childNodes[o].nodeName==="#documentType"){i=e.childNodes[o];break}i?(i.name=t,i.publicId=n,i.systemId=r):n8(e,{nodeName:"#documentType",name:t,publicId:n,systemId:r})};xe.setDocumentMode=function(e,t){e.mode=t};xe.getDocumentMode=function(e){return e.mode};xe.detachNode=function(e){if(e.parentNode){const t=e.parentNode.childNodes.indexOf(e);e.parentNode.childNodes.splice(t,1),e.parentNode=null}};xe.insertText=function(e,t){if(e.childNodes.length){const n=e.childNodes[e.childNodes.length-1];if(n.nodeName==="#text"){n.value+=t;return}}n8(e,t8(t))};xe.insertTextBefore=function(e,t,n){const r=e.childNodes[e.childNodes.indexOf(n)-1];r&&r.nodeName==="#text"?r.value+=t:eH(e,t8(t),n)};xe.adoptAttributes=function(e,t){const n=[];for(let r=0;r<e.attrs.length;r++)n.push(e.attrs[r].name);for(let r=0;r<t.length;r++)n.indexOf(t[r].name)===-1&&e.attrs.push(t[r])};xe.getFirstChild=function(e){return e.childNodes[0]};xe.getChildNodes=function(e){return e.childNodes};xe.getParentNode=function(e){return e.parentNode};xe.getAttrList=function(e){return e.attrs};xe.getTagName=function(e){return e.tagName};xe.getNamespaceURI=function(e){return e.namespaceURI};xe.getTextNodeContent=function(e){return e.value};xe.getCommentNodeContent=function(e){return e.data};xe.getDocumentTypeNodeName=function(e){return e.name};xe.getDocumentTypeNodePublicId=function(e){return e.publicId};xe.getDocumentTypeNodeSystemId=function(e){return e.systemId};xe.isTextNode=function(e){return e.nodeName==="#text"};xe.isCommentNode=function(e){return e.nodeName==="#comment"};xe.isDocumentTypeNode=function(e){return e.nodeName==="#documentType"};xe.isElementNode=function(e){return!!e.tagName};xe.setNodeSourceCodeLocation=function(e,t){e.sourceCodeLocation=t};xe.getNodeSourceCodeLocation=function(e){return e.sourceCodeLocation};xe.updateNodeSourceCodeLocation=function(e,t){e.sourceCodeLocation=Object.assign(e.sourceCodeLocation,t)};var tH=function(t,n){return n=n||Object.create(null),[t,n].reduce((r,i)=>(Object.keys(i).forEach(o=>{r[o]=i[o]}),r),Object.create(null))},hf={};const{DOCUMENT_MODE:Xa}=ei,r8="html",nH="about:legacy-compat",rH="http://www.ibm.com/data/dtd/v11/ibmxhtml1-transitional.dtd",i8=["+//silmaril//dtd html pro v0r11 19970101//","-//as//dtd html 3.0 aswedit + extensions//","-//advasoft ltd//dtd html 3.0 aswedit + extensions//","-//ietf//dtd html 2.0 level 1//","-//ietf//dtd html 2.0 level 2//","-//ietf//dtd html 2.0 strict level 1//","-//ietf//dtd html 2.0 strict level 2//","-//ietf//dtd html 2.0 strict//","-//ietf//dtd html 2.0//","-//ietf//dtd html 2.1e//","-//ietf//dtd html 3.0//","-//ietf//dtd html 3.2 final//","-//ietf//dtd html 3.2//","-//ietf//dtd html 3//","-//ietf//dtd html level 0//","-//ietf//dtd html level 1//","-//ietf//dtd html level 2//","-//ietf//dtd html level 3//","-//ietf//dtd html strict level 0//","-//ietf//dtd html strict level 1//","-//ietf//dtd html strict level 2//","-//ietf//dtd html strict level 3//","-//ietf//dtd html strict//","-//ietf//dtd html//","-//metrius//dtd metrius presentational//","-//microsoft//dtd internet explorer 2.0 html strict//","-//microsoft//dtd internet explorer 2.0 html//","-//microsoft//dtd internet explorer 2.0 tables//","-//microsoft//dtd internet explorer 3.0 html strict//","-//microsoft//dtd internet explorer 3.0 html//","-//microsoft//dtd internet explorer 3.0 tables//","-//netscape comm. corp.//dtd html//","-//netscape comm. corp.//dtd strict html//","-//o'reilly and associates//dtd html 2.0//","-//o'reilly and associates//dtd html extended 1.0//","-//o'reilly and associates//dtd html extended relaxed 1.0//","-//sq//dtd html 2.0 hotmetal + extensions//","-//softquad software//dtd hotmetal pro 6.0::19990601::extensions to html 4.0//","-//softquad//dtd hotmetal pro 4.0::19971010::extensions to html 4.0//","-//spyglass//dtd html 2.0 extended//","-//sun microsystems corp.//dtd hotjava html//","-//sun microsystems corp.//dtd hotjava strict html//","-//w3c//dtd html 3 1995-03-24//","-//w3c//dtd html 3.2 draft//","-//w3c//dtd html 3.2 final//","-//w3c//dtd html 3.2//","-//w3c//dtd html 3.2s draft//","-//w3c//dtd html 4.0 frameset//","-//w3c//dtd html 4.0 transitional//","-//w3c//dtd html experimental 19960712//","-//w3c//dtd html experimental 970421//","-//w3c//dtd w3 html//","-//w3o//dtd w3 html 3.0//","-//webtechs//dtd mozilla html 2.0//","-//webtechs//dtd mozilla html//"],iH=i8.concat(["-//w3c//dtd html 4.01 frameset//","-//w3c//dtd html 4.01 transitional//"]),oH=["-//w3o//dtd w3 html strict 3.0//en//","-/w3c/dtd html 4.0 transitional/en","html"],o8=["-//w3c//dtd xhtml 1.0 frameset//","-//w3c//dtd xhtml 1.0 transitional//"],aH=o8.concat(["-//w3c//dtd html 4.01 frameset//","-//w3c//dtd html 4.01 transitional//"]);function Kv(e){const t=e.indexOf('"')!==-1?"'":'"';return t+e+t}function jv(e,t){for(let n=0;n<t.length;n++)if(e.indexOf(t[n])===0)return!0;return!1}hf.isConforming=function(e){return e.name===r8&&e.publicId===null&&(e.systemId===null||e.systemId===nH)};hf.getDocumentMode=function(e){if(e.name!==r8)return Xa.QUIRKS;const t=e.systemId;if(t&&t.toLowerCase()===rH)return Xa.QUIRKS;let n=e.publicId;if(n!==null){if(n=n.toLowerCase(),oH.indexOf(n)>-1)return Xa.QUIRKS;let r=t===null?iH:i8;if(jv(n,r))return Xa.QUIRKS;if(r=t===null?o8:aH,jv(n,r))return Xa.LIMITED_QUIRKS}return Xa.NO_QUIRKS};hf.serializeContent=function(e,t,n){let r="!DOCTYPE ";return e&&(r+=e),t?r+=" PUBLIC "+Kv(t):n&&(r+=" SYSTEM"),n!==null&&(r+=" "+Kv(n)),r};var Xo={};const r0=ff,dg=ei,ae=dg.TAG_NAMES,qt=dg.NAMESPACES,wc=dg.ATTRS,$v={TEXT_HTML:"text/html",APPLICATION_XML:"application/xhtml+xml"},sH="definitionurl",lH="definitionURL",uH={attributename:"attributeName",attributetype:"attributeType",basefrequency:"baseFrequency",baseprofile:"baseProfile",calcmode:"calcMode",clippathunits:"clipPathUnits",diffuseconstant:"diffuseConstant",edgemode:"edgeMode",filterunits:"filterUnits",glyphref:"glyphRef",gradienttransform:"gradientTransform",gradientunits:"gradientUnits",kernelmatrix:"kernelMatrix",kernelunitlength:"kernelUnitLength",keypoints:"keyPoints",keysplines:"keySplines",keytimes:"keyTimes",lengthadjust:"lengthAdjust",limitingconeangle:"limitingConeAngle",markerheight:"markerHeight",markerunits:"markerUnits",markerwidth:"markerWidth",maskcontentunits:"maskContentUnits",maskunits:"maskUnits",numoctaves:"numOctaves",pathlength:"pathLength",patterncontentunits:"patternContentUnits",patterntransform:"patternTransform",patternunits:"patternUnits",pointsatx:"pointsAtX",pointsaty:"pointsAtY",pointsatz:"pointsAtZ",preservealpha:"preserveAlpha",preserveaspectratio:"preserveAspectRatio",primitiveunits:"primitiveUnits",refx:"refX",refy:"refY",repeatcount:"repeatCount",repeatdur:"repeatDur",requiredextensions:"requiredExtensions",requiredfeatures:"requiredFeatures",specularconstant:"specularConstant",specularexponent:"specularExponent",spreadmethod:"spreadMethod",startoffset:"startOffset",stddeviation:"stdDeviation",stitchtiles:"stitchTiles",surfacescale:"surfaceScale",systemlanguage:"systemLanguage",tablevalues:"tableValues",targetx:"targetX",targety:"targetY",textlength:"textLength",viewbox:"viewBox",viewtarget:"viewTarget",xchannelselector:"xChannelSelector",ychannelselector:"yChannelSelector",zoomandpan:"zoomAndPan"},cH={"xlink:actuate":{prefix:"xlink",name:"actuate",namespace:qt.XLINK},"xlink:arcrole":{prefix:"xlink",name:"arcrole",namespace:qt.XLINK},"xlink:href":{prefix:"xlink",name:"href",namespace:qt.XLINK},"xlink:role":{prefix:"xlink",name:"role",namespace:qt.XLINK},"xlink:show":{prefix:"xlink",name:"show",namespace:qt.XLINK},"xlink:title":{prefix:"xlink",name:"title",namespace:qt.XLINK},"xlink:type":{prefix:"xlink",name:"type",namespace:qt.XLINK},"xml:base":{prefix:"xml",name:"base",namespace:qt.XML},"xml:lang":{prefix:"xml",name:"lang",namespace:qt.XML},"xml:space":{prefix:"xml",name:"space",namespace:qt.XML},xmlns:{prefix:"",name:"xmlns",namespace:qt.XMLNS},"xmlns:xlink":{prefix:"xmlns",name:"xlink",namespace:qt.XMLNS}},dH=Xo.SVG_TAG_NAMES_ADJUSTMENT_MAP={altglyph:"altGlyph",altglyphdef:"altGlyphDef",altglyphitem:"altGlyphItem",animatecolor:"animateColor",animatemotion:"animateMotion",animatetransform:"animateTransform",clippath:"clipPath",feblend:"feBlend",fecolormatrix:"feColorMatrix",fecomponenttransfer:"feComponentTransfer",fecomposite:"feComposite",feconvolvematrix:"feConvolveMatrix",fediffuselighting:"feDiffuseLighting",fedisplacementmap:"feDisplacementMap",fedistantlight:"feDistantLight",feflood:"feFlood",fefunca:"feFuncA",fefuncb:"feFuncB",fefuncg:"feFuncG",fefuncr:"feFuncR",fegaussianblur:"feGaussianBlur",feimage:"feImage",femerge:"feMerge",femergenode:"feMergeNode",femorphology:"feMorphology",feoffset:"feOffset",fepointlight:"fePointLight",fespecularlighting:"feSpecularLighting",fespotlight:"feSpotLight",fetile:"feTile",feturbulence:"feTurbulence",foreignobject:"foreignObject",glyphref:"glyphRef",lineargradient:"linearGradient",radialgradient:"radialGradient",textpath:"textPath"},fH={[ae.B]:!0,[ae.BIG]:!0,[ae.BLOCKQUOTE]:!0,[ae.BODY]:!0,[ae.BR]:!0,[ae.CENTER]:!0,[ae.CODE]:!0,[ae.DD]:!0,[ae.DIV]:!0,[ae.DL]:!0,[ae.DT]:!0,[ae.EM]:!0,[ae.EMBED]:!0,[ae.H1]:!0,[ae.H2]:!0,[ae.H3]:!0,[ae.H4]:!0,[ae.H5]:!0,[ae.H6]:!0,[ae.HEAD]:!0,[ae.HR]:!0,[ae.I]:!0,[ae.IMG]:!0,[ae.LI]:!0,[ae.LISTING]:!0,[ae.MENU]:!0,[ae.META]:!0,[ae.NOBR]:!0,[ae.OL]:!0,[ae.P]:!0,[ae.PRE]:!0,[ae.RUBY]:!0,[ae.S]:!0,[ae.SMALL]:!0,[ae.SPAN]:!0,[ae.STRONG]:!0,[ae.STRIKE]:!0,[ae.SUB]:!0,[ae.SUP]:!0,[ae.TABLE]:!0,[ae.TT]:!0,[ae.U]:!0,[ae.UL]:!0,[ae.VAR]:!0};Xo.causesExit=function(e){const t=e.tagName;return t===ae.FONT&&(r0.getTokenAttr(e,wc.COLOR)!==null||r0.getTokenAttr(e,wc.SIZE)!==null||r0.getTokenAttr(e,wc.FACE)!==null)?!0:fH[t]};Xo.adjustTokenMathMLAttrs=function(e){for(let t=0;t<e.attrs.length;t++)if(e.attrs[t].name===sH){e.attrs[t].name=lH;break}};Xo.adjustTokenSVGAttrs=function(e){for(let t=0;t<e.attrs.length;t++){const n=uH[e.attrs[t].name];n&&(e.attrs[t].name=n)}};Xo.adjustTokenXMLAttrs=function(e){for(let t=0;t<e.attrs.length;t++){const n=cH[e.attrs[t].name];n&&(e.attrs[t].prefix=n.prefix,e.attrs[t].name=n.name,e.attrs[t].namespace=n.namespace)}};Xo.adjustTokenSVGTagName=function(e){const t=dH[e.tagName];t&&(e.tagName=t)};function hH(e,t){return t===qt.MATHML&&(e===ae.MI||e===ae.MO||e===ae.MN||e===ae.MS||e===ae.MTEXT)}function mH(e,t,n){if(t===qt.MATHML&&e===ae.ANNOTATION_XML){for(let r=0;r<n.length;r++)if(n[r].name===wc.ENCODING){const i=n[r].value.toLowerCase();return i===$v.TEXT_HTML||i===$v.APPLICATION_XML}}return t===qt.SVG&&(e===ae.FOREIGN_OBJECT||e===ae.DESC||e===ae.TITLE)}Xo.isIntegrationPoint=function(e,t,n,r){return!!((!r||r===qt.HTML)&&mH(e,t,n)||(!r||r===qt.MATHML)&&hH(e,t))};const w=ff,pH=CB,Vv=SB,gH=PB,EH=ZB,Yv=io,vH=xe,TH=tH,qv=hf,gi=Xo,Xt=lg,yH=Jr,Ha=ei,g=Ha.TAG_NAMES,ne=Ha.NAMESPACES,a8=Ha.ATTRS,_H={scriptingEnabled:!0,sourceCodeLocationInfo:!1,onParseError:null,treeAdapter:vH},s8="hidden",CH=8,SH=3,l8="INITIAL_MODE",fg="BEFORE_HTML_MODE",mf="BEFORE_HEAD_MODE",rl="IN_HEAD_MODE",u8="IN_HEAD_NO_SCRIPT_MODE",pf="AFTER_HEAD_MODE",Ci="IN_BODY_MODE",Sd="TEXT_MODE",sn="IN_TABLE_MODE",c8="IN_TABLE_TEXT_MODE",gf="IN_CAPTION_MODE",d1="IN_COLUMN_GROUP_MODE",kr="IN_TABLE_BODY_MODE",Ji="IN_ROW_MODE",Ef="IN_CELL_MODE",hg="IN_SELECT_MODE",mg="IN_SELECT_IN_TABLE_MODE",Ad="IN_TEMPLATE_MODE",pg="AFTER_BODY_MODE",vf="IN_FRAMESET_MODE",d8="AFTER_FRAMESET_MODE",f8="AFTER_AFTER_BODY_MODE",h8="AFTER_AFTER_FRAMESET_MODE",AH={[g.TR]:Ji,[g.TBODY]:kr,[g.THEAD]:kr,[g.TFOOT]:kr,[g.CAPTION]:gf,[g.COLGROUP]:d1,[g.TABLE]:sn,[g.BODY]:Ci,[g.FRAMESET]:vf},bH={[g.CAPTION]:sn,[g.COLGROUP]:sn,[g.TBODY]:sn,[g.TFOOT]:sn,[g.THEAD]:sn,[g.COL]:d1,[g.TR]:kr,[g.TD]:Ji,[g.TH]:Ji},Qv={[l8]:{[w.CHARACTER_TOKEN]:Il,[w.NULL_CHARACTER_TOKEN]:Il,[w.WHITESPACE_CHARACTER_TOKEN]:Se,[w.COMMENT_TOKEN]:Dt,[w.DOCTYPE_TOKEN]:PH,[w.START_TAG_TOKEN]:Il,[w.END_TAG_TOKEN]:Il,[w.EOF_TOKEN]:Il},[fg]:{[w.CHARACTER_TOKEN]:eu,[w.NULL_CHARACTER_TOKEN]:eu,[w.WHITESPACE_CHARACTER_TOKEN]:Se,[w.COMMENT_TOKEN]:Dt,[w.DOCTYPE_TOKEN]:Se,[w.START_TAG_TOKEN]:MH,[w.END_TAG_TOKEN]:LH,[w.EOF_TOKEN]:eu},[mf]:{[w.CHARACTER_TOKEN]:tu,[w.NULL_CHARACTER_TOKEN]:tu,[w.WHITESPACE_CHARACTER_TOKEN]:Se,[w.COMMENT_TOKEN]:Dt,[w.DOCTYPE_TOKEN]:uc,[w.START_TAG_TOKEN]:BH,[w.END_TAG_TOKEN]:HH,[w.EOF_TOKEN]:tu},[rl]:{[w.CHARACTER_TOKEN]:nu,[w.NULL_CHARACTER_TOKEN]:nu,[w.WHITESPACE_CHARACTER_TOKEN]:Pn,[w.COMMENT_TOKEN]:Dt,[w.DOCTYPE_TOKEN]:uc,[w.START_TAG_TOKEN]:Ut,[w.END_TAG_TOKEN]:Ua,[w.EOF_TOKEN]:nu},[u8]:{[w.CHARACTER_TOKEN]:ru,[w.NULL_CHARACTER_TOKEN]:ru,[w.WHITESPACE_CHARACTER_TOKEN]:Pn,[w.COMMENT_TOKEN]:Dt,[w.DOCTYPE_TOKEN]:uc,[w.START_TAG_TOKEN]:UH,[w.END_TAG_TOKEN]:zH,[w.EOF_TOKEN]:ru},[pf]:{[w.CHARACTER_TOKEN]:iu,[w.NULL_CHARACTER_TOKEN]:iu,[w.WHITESPACE_CHARACTER_TOKEN]:Pn,[w.COMMENT_TOKEN]:Dt,[w.DOCTYPE_TOKEN]:uc,[w.START_TAG_TOKEN]:GH,[w.END_TAG_TOKEN]:WH,[w.EOF_TOKEN]:iu},[Ci]:{[w.CHARACTER_TOKEN]:cc,[w.NULL_CHARACTER_TOKEN]:Se,[w.WHITESPACE_CHARACTER_TOKEN]:oa,[w.COMMENT_TOKEN]:Dt,[w.DOCTYPE_TOKEN]:Se,[w.START_TAG_TOKEN]:Vn,[w.END_TAG_TOKEN]:gg,[w.EOF_TOKEN]:Mi},[Sd]:{[w.CHARACTER_TOKEN]:Pn,[w.NULL_CHARACTER_TOKEN]:Pn,[w.WHITESPACE_CHARACTER_TOKEN]:Pn,[w.COMMENT_TOKEN]:Se,[w.DOCTYPE_TOKEN]:Se,[w.START_TAG_TOKEN]:Se,[w.END_TAG_TOKEN]:yU,[w.EOF_TOKEN]:_U},[sn]:{[w.CHARACTER_TOKEN]:Li,[w.NULL_CHARACTER_TOKEN]:Li,[w.WHITESPACE_CHARACTER_TOKEN]:Li,[w.COMMENT_TOKEN]:Dt,[w.DOCTYPE_TOKEN]:Se,[w.START_TAG_TOKEN]:Eg,[w.END_TAG_TOKEN]:vg,[w.EOF_TOKEN]:Mi},[c8]:{[w.CHARACTER_TOKEN]:DU,[w.NULL_CHARACTER_TOKEN]:Se,[w.WHITESPACE_CHARACTER_TOKEN]:NU,[w.COMMENT_TOKEN]:xl,[w.DOCTYPE_TOKEN]:xl,[w.START_TAG_TOKEN]:xl,[w.END_TAG_TOKEN]:xl,[w.EOF_TOKEN]:xl},[gf]:{[w.CHARACTER_TOKEN]:cc,[w.NULL_CHARACTER_TOKEN]:Se,[w.WHITESPACE_CHARACTER_TOKEN]:oa,[w.COMMENT_TOKEN]:Dt,[w.DOCTYPE_TOKEN]:Se,[w.START_TAG_TOKEN]:wU,[w.END_TAG_TOKEN]:RU,[w.EOF_TOKEN]:Mi},[d1]:{[w.CHARACTER_TOKEN]:bd,[w.NULL_CHARACTER_TOKEN]:bd,[w.WHITESPACE_CHARACTER_TOKEN]:Pn,[w.COMMENT_TOKEN]:Dt,[w.DOCTYPE_TOKEN]:Se,[w.START_TAG_TOKEN]:OU,[w.END_TAG_TOKEN]:PU,[w.EOF_TOKEN]:Mi},[kr]:{[w.CHARACTER_TOKEN]:Li,[w.NULL_CHARACTER_TOKEN]:Li,[w.WHITESPACE_CHARACTER_TOKEN]:Li,[w.COMMENT_TOKEN]:Dt,[w.DOCTYPE_TOKEN]:Se,[w.START_TAG_TOKEN]:MU,[w.END_TAG_TOKEN]:LU,[w.EOF_TOKEN]:Mi},[Ji]:{[w.CHARACTER_TOKEN]:Li,[w.NULL_CHARACTER_TOKEN]:Li,[w.WHITESPACE_CHARACTER_TOKEN]:Li,[w.COMMENT_TOKEN]:Dt,[w.DOCTYPE_TOKEN]:Se,[w.START_TAG_TOKEN]:BU,[w.END_TAG_TOKEN]:HU,[w.EOF_TOKEN]:Mi},[Ef]:{[w.CHARACTER_TOKEN]:cc,[w.NULL_CHARACTER_TOKEN]:Se,[w.WHITESPACE_CHARACTER_TOKEN]:oa,[w.COMMENT_TOKEN]:Dt,[w.DOCTYPE_TOKEN]:Se,[w.START_TAG_TOKEN]:UU,[w.END_TAG_TOKEN]:zU,[w.EOF_TOKEN]:Mi},[hg]:{[w.CHARACTER_TOKEN]:Pn,[w.NULL_CHARACTER_TOKEN]:Se,[w.WHITESPACE_CHARACTER_TOKEN]:Pn,[w.COMMENT_TOKEN]:Dt,[w.DOCTYPE_TOKEN]:Se,[w.START_TAG_TOKEN]:m8,[w.END_TAG_TOKEN]:p8,[w.EOF_TOKEN]:Mi},[mg]:{[w.CHARACTER_TOKEN]:Pn,[w.NULL_CHARACTER_TOKEN]:Se,[w.WHITESPACE_CHARACTER_TOKEN]:Pn,[w.COMMENT_TOKEN]:Dt,[w.DOCTYPE_TOKEN]:Se,[w.START_TAG_TOKEN]:GU,[w.END_TAG_TOKEN]:WU,[w.EOF_TOKEN]:Mi},[Ad]:{[w.CHARACTER_TOKEN]:cc,[w.NULL_CHARACTER_TOKEN]:Se,[w.WHITESPACE_CHARACTER_TOKEN]:oa,[w.COMMENT_TOKEN]:Dt,[w.DOCTYPE_TOKEN]:Se,[w.START_TAG_TOKEN]:KU,[w.END_TAG_TOKEN]:jU,[w.EOF_TOKEN]:g8},[pg]:{[w.CHARACTER_TOKEN]:kd,[w.NULL_CHARACTER_TOKEN]:kd,[w.WHITESPACE_CHARACTER_TOKEN]:oa,[w.COMMENT_TOKEN]:OH,[w.DOCTYPE_TOKEN]:Se,[w.START_TAG_TOKEN]:$U,[w.END_TAG_TOKEN]:VU,[w.EOF_TOKEN]:Fl},[vf]:{[w.CHARACTER_TOKEN]:Se,[w.NULL_CHARACTER_TOKEN]:Se,[w.WHITESPACE_CHARACTER_TOKEN]:Pn,[w.COMMENT_TOKEN]:Dt,[w.DOCTYPE_TOKEN]:Se,[w.START_TAG_TOKEN]:YU,[w.END_TAG_TOKEN]:qU,[w.EOF_TOKEN]:Fl},[d8]:{[w.CHARACTER_TOKEN]:Se,[w.NULL_CHARACTER_TOKEN]:Se,[w.WHITESPACE_CHARACTER_TOKEN]:Pn,[w.COMMENT_TOKEN]:Dt,[w.DOCTYPE_TOKEN]:Se,[w.START_TAG_TOKEN]:QU,[w.END_TAG_TOKEN]:XU,[w.EOF_TOKEN]:Fl},[f8]:{[w.CHARACTER_TOKEN]:Rc,[w.NULL_CHARACTER_TOKEN]:Rc,[w.WHITESPACE_CHARACTER_TOKEN]:oa,[w.COMMENT_TOKEN]:Xv,[w.DOCTYPE_TOKEN]:Se,[w.START_TAG_TOKEN]:ZU,[w.END_TAG_TOKEN]:Rc,[w.EOF_TOKEN]:Fl},[h8]:{[w.CHARACTER_TOKEN]:Se,[w.NULL_CHARACTER_TOKEN]:Se,[w.WHITESPACE_CHARACTER_TOKEN]:oa,[w.COMMENT_TOKEN]:Xv,[w.DOCTYPE_TOKEN]:Se,[w.START_TAG_TOKEN]:JU,[w.END_TAG_TOKEN]:Se,[w.EOF_TOKEN]:Fl}};class kH{constructor(t){this.options=TH(_H,t),this.treeAdapter=this.options.treeAdapter,this.pendingScript=null,this.options.sourceCodeLocationInfo&&Yv.install(this,gH),this.options.onParseError&&Yv.install(this,EH,{onParseError:this.options.onParseError})}parse(t){const n=this.treeAdapter.createDocument();return this._bootstrap(n,null),this.tokenizer.write(t,!0),this._runParsingLoop(null),n}parseFragment(t,n){n||(n=this.treeAdapter.createElement(g.TEMPLATE,ne.HTML,[]));const r=this.treeAdapter.createElement("documentmock",ne.HTML,[]);this._bootstrap(r,n),this.treeAdapter.getTagName(n)===g.TEMPLATE&&this._pushTmplInsertionMode(Ad),this._initTokenizerForFragmentParsing(),this._insertFakeRootElement(),this._resetInsertionMode(),this._findFormInFragmentContext(),this.tokenizer.write(t,!0),this._runParsingLoop(null);const i=this.treeAdapter.getFirstChild(r),o=this.treeAdapter.createDocumentFragment();return this._adoptNodes(i,o),o}_bootstrap(t,n){this.tokenizer=new w(this.options),this.stopped=!1,this.insertionMode=l8,this.originalInsertionMode="",this.document=t,this.fragmentContext=n,this.headElement=null,this.formElement=null,this.openElements=new pH(this.document,this.treeAdapter),this.activeFormattingElements=new Vv(this.treeAdapter),this.tmplInsertionModeStack=[],this.tmplInsertionModeStackTop=-1,this.currentTmplInsertionMode=null,this.pendingCharacterTokens=[],this.hasNonWhitespacePendingCharacterToken=!1,this.framesetOk=!0,this.skipNextNewLine=!1,this.fosterParentingEnabled=!1}_err(){}_runParsingLoop(t){for(;!this.stopped;){this._setupTokenizerCDATAMode();const n=this.tokenizer.getNextToken();if(n.type===w.HIBERNATION_TOKEN)break;if(this.skipNextNewLine&&(this.skipNextNewLine=!1,n.type===w.WHITESPACE_CHARACTER_TOKEN&&n.chars[0]===`
 `)){if(n.chars.length===1)continue;n.chars=n.chars.substr(1)}if(this._processInputToken(n),t&&this.pendingScript)break}}runParsingLoopForCurrentChunk(t,n){if(this._runParsingLoop(n),n&&this.pendingScript){const r=this.pendingScript;this.pendingScript=null,n(r);return}t&&t()}_setupTokenizerCDATAMode(){const t=this._getAdjustedCurrentElement();this.tokenizer.allowCDATA=t&&t!==this.document&&this.treeAdapter.getNamespaceURI(t)!==ne.HTML&&!this._isIntegrationPoint(t)}_switchToTextParsing(t,n){this._insertElement(t,ne.HTML),this.tokenizer.state=n,this.originalInsertionMode=this.insertionMode,this.insertionMode=Sd}switchToPlaintextParsing(){this.insertionMode=Sd,this.originalInsertionMode=Ci,this.tokenizer.state=w.MODE.PLAINTEXT}_getAdjustedCurrentElement(){return this.openElements.stackTop===0&&this.fragmentContext?this.fragmentContext:this.openElements.current}_findFormInFragmentContext(){let t=this.fragmentContext;do{if(this.treeAdapter.getTagName(t)===g.FORM){this.formElement=t;break}t=this.treeAdapter.getParentNode(t)}while(t)}_initTokenizerForFragmentParsing(){if(this.treeAdapter.getNamespaceURI(this.fragmentContext)===ne.HTML){const t=this.treeAdapter.getTagName(this.fragmentContext);t===g.TITLE||t===g.TEXTAREA?this.tokenizer.state=w.MODE.RCDATA:t===g.STYLE||t===g.XMP||t===g.IFRAME||t===g.NOEMBED||t===g.NOFRAMES||t===g.NOSCRIPT?this.tokenizer.state=w.MODE.RAWTEXT:t===g.SCRIPT?this.tokenizer.state=w.MODE.SCRIPT_DATA:t===g.PLAINTEXT&&(this.tokenizer.state=w.MODE.PLAINTEXT)}}_setDocumentType(t){const n=t.name||"",r=t.publicId||"",i=t.systemId||"";this.treeAdapter.setDocumentType(this.document,n,r,i)}_attachElementToTree(t){if(this._shouldFosterParentOnInsertion())this._fosterParentElement(t);else{const n=this.openElements.currentTmplContent||this.openElements.current;this.treeAdapter.appendChild(n,t)}}_appendElement(t,n){const r=this.treeAdapter.createElement(t.tagName,n,t.attrs);this._attachElementToTree(r)}_insertElement(t,n){const r=this.treeAdapter.createElement(t.tagName,n,t.attrs);this._attachElementToTree(r),this.openElements.push(r)}_insertFakeElement(t){const n=this.treeAdapter.createElement(t,ne.HTML,[]);this._attachElementToTree(n),this.openElements.push(n)}_insertTemplate(t){const n=this.treeAdapter.createElement(t.tagName,ne.HTML,t.attrs),r=this.treeAdapter.createDocumentFragment();this.treeAdapter.setTemplateContent(n,r),this._attachElementToTree(n),this.openElements.push(n)}_insertFakeRootElement(){const t=this.treeAdapter.createElement(g.HTML,ne.HTML,[]);this.treeAdapter.appendChild(this.openElements.current,t),this.openElements.push(t)}_appendCommentNode(t,n){const r=this.treeAdapter.createCommentNode(t.data);this.treeAdapter.appendChild(n,r)}_insertCharacters(t){if(this._shouldFosterParentOnInsertion())this._fosterParentText(t.chars);else{const n=this.openElements.currentTmplContent||this.openElements.current;this.treeAdapter.insertText(n,t.chars)}}_adoptNodes(t,n){for(let r=this.treeAdapter.getFirstChild(t);r;r=this.treeAdapter.getFirstChild(t))this.treeAdapter.detachNode(r),this.treeAdapter.appendChild(n,r)}_shouldProcessTokenInForeignContent(t){const n=this._getAdjustedCurrentElement();if(!n||n===this.document)return!1;const r=this.treeAdapter.getNamespaceURI(n);if(r===ne.HTML||this.treeAdapter.getTagName(n)===g.ANNOTATION_XML&&r===ne.MATHML&&t.type===w.START_TAG_TOKEN&&t.tagName===g.SVG)return!1;const i=t.type===w.CHARACTER_TOKEN||t.type===w.NULL_CHARACTER_TOKEN||t.type===w.WHITESPACE_CHARACTER_TOKEN;return(t.type===w.START_TAG_TOKEN&&t.tagName!==g.MGLYPH&&t.tagName!==g.MALIGNMARK||i)&&this._isIntegrationPoint(n,ne.MATHML)||(t.type===w.START_TAG_TOKEN||i)&&this._isIntegrationPoint(n,ne.HTML)?!1:t.type!==w.EOF_TOKEN}_processToken(t){Qv[this.insertionMode][t.type](this,t)}_processTokenInBodyMode(t){Qv[Ci][t.type](this,t)}_processTokenInForeignContent(t){t.type===w.CHARACTER_TOKEN?tz(this,t):t.type===w.NULL_CHARACTER_TOKEN?ez(this,t):t.type===w.WHITESPACE_CHARACTER_TOKEN?Pn(this,t):t.type===w.COMMENT_TOKEN?Dt(this,t):t.type===w.START_TAG_TOKEN?nz(this,t):t.type===w.END_TAG_TOKEN&&rz(this,t)}_processInputToken(t){this._shouldProcessTokenInForeignContent(t)?this._processTokenInForeignContent(t):this._processToken(t),t.type===w.START_TAG_TOKEN&&t.selfClosing&&!t.ackSelfClosing&&this._err(Xt.nonVoidHtmlElementStartTagWithTrailingSolidus)}_isIntegrationPoint(t,n){const r=this.treeAdapter.getTagName(t),i=this.treeAdapter.getNamespaceURI(t),o=this.treeAdapter.getAttrList(t);return gi.isIntegrationPoint(r,i,o,n)}_reconstructActiveFormattingElements(){const t=this.activeFormattingElements.length;if(t){let n=t,r=null;do if(n--,r=this.activeFormattingElements.entries[n],r.type===Vv.MARKER_ENTRY||this.openElements.contains(r.element)){n++;break}while(n>0);for(let i=n;i<t;i++)r=this.activeFormattingElements.entries[i],this._insertElement(r.token,this.treeAdapter.getNamespaceURI(r.element)),r.element=this.openElements.current}}_closeTableCell(){this.openElements.generateImpliedEndTags(),this.openElements.popUntilTableCellPopped(),this.activeFormattingElements.clearToLastMarker(),this.insertionMode=Ji}_closePElement(){this.openElements.generateImpliedEndTagsWithExclusion(g.P),this.openElements.popUntilTagNamePopped(g.P)}_resetInsertionMode(){for(let t=this.openElements.stackTop,n=!1;t>=0;t--){let r=this.openElements.items[t];t===0&&(n=!0,this.fragmentContext&&(r=this.fragmentContext));const i=this.treeAdapter.getTagName(r),o=AH[i];if(o){this.insertionMode=o;break}else if(!n&&(i===g.TD||i===g.TH)){this.insertionMode=Ef;break}else if(!n&&i===g.HEAD){this.insertionMode=rl;break}else if(i===g.SELECT){this._resetInsertionModeForSelect(t);break}else if(i===g.TEMPLATE){this.insertionMode=this.currentTmplInsertionMode;break}else if(i===g.HTML){this.insertionMode=this.headElement?pf:mf;break}else if(n){this.insertionMode=Ci;break}}}_resetInsertionModeForSelect(t){if(t>0)for(let n=t-1;n>0;n--){const r=this.openElements.items[n],i=this.treeAdapter.getTagName(r);if(i===g.TEMPLATE)break;if(i===g.TABLE){this.insertionMode=mg;return}}this.insertionMode=hg}_pushTmplInsertionMode(t){this.tmplInsertionModeStack.push(t),this.tmplInsertionModeStackTop++,this.currentTmplInsertionMode=t}_popTmplInsertionMode(){this.tmplInsertionModeStack.pop(),this.tmplInsertionModeStackTop--,this.currentTmplInsertionMode=this.tmplInsertionModeStack[this.tmplInsertionModeStackTop]}_isElementCausesFosterParenting(t){const n=this.treeAdapter.getTagName(t);return n===g.TABLE||n===g.TBODY||n===g.TFOOT||n===g.THEAD||n===g.TR}_shouldFosterParentOnInsertion(){return this.fosterParentingEnabled&&this._isElementCausesFosterParenting(this.openElements.current)}_findFosterParentingLocation(){const t={parent:null,beforeElement:null};for(let n=this.openElements.stackTop;n>=0;n--){const r=this.openElements.items[n],i=this.treeAdapter.getTagName(r),o=this.treeAdapter.getNamespaceURI(r);if(i===g.TEMPLATE&&o===ne.HTML){t.parent=this.treeAdapter.getTemplateContent(r);break}else if(i===g.TABLE){t.parent=this.treeAdapter.getParentNode(r),t.parent?t.beforeElement=r:t.parent=this.openElements.items[n-1];break}}return t.parent||(t.parent=this.openElements.items[0]),t}_fosterParentElement(t){const n=this._findFosterParentingLocation();n.beforeElement?this.treeAdapter.insertBefore(n.parent,t,n.beforeElement):this.treeAdapter.appendChild(n.parent,t)}_fosterParentText(t){const n=this._findFosterParentingLocation();n.beforeElement?this.treeAdapter.insertTextBefore(n.parent,t,n.beforeElement):this.treeAdapter.insertText(n.parent,t)}_isSpecialElement(t){const n=this.treeAdapter.getTagName(t),r=this.treeAdapter.getNamespaceURI(t);return Ha.SPECIAL_ELEMENTS[r][n]}}var FH=kH;function IH(e,t){let n=e.activeFormattingElements.getElementEntryInScopeWithTagName(t.tagName);return n?e.openElements.contains(n.element)?e.openElements.hasInScope(t.tagName)||(n=null):(e.activeFormattingElements.removeEntry(n),n=null):Ur(e,t),n}function xH(e,t){let n=null;for(let r=e.openElements.stackTop;r>=0;r--){const i=e.openElements.items[r];if(i===t.element)break;e._isSpecialElement(i)&&(n=i)}return n||(e.openElements.popUntilElementPopped(t.element),e.activeFormattingElements.removeEntry(t)),n}function NH(e,t,n){let r=t,i=e.openElements.getCommonAncestor(t);for(let o=0,a=i;a!==n;o++,a=i){i=e.openElements.getCommonAncestor(a);const s=e.activeFormattingElements.getElementEntry(a),l=s&&o>=SH;!s||l?(l&&e.activeFormattingElements.removeEntry(s),e.openElements.remove(a)):(a=DH(e,s),r===t&&(e.activeFormattingElements.bookmark=s),e.treeAdapter.detachNode(r),e.treeAdapter.appendChild(a,r),r=a)}return r}function DH(e,t){const n=e.treeAdapter.getNamespaceURI(t.element),r=e.treeAdapter.createElement(t.token.tagName,n,t.token.attrs);return e.openElements.replace(t.element,r),t.element=r,r}function wH(e,t,n){if(e._isElementCausesFosterParenting(t))e._fosterParentElement(n);else{const r=e.treeAdapter.getTagName(t),i=e.treeAdapter.getNamespaceURI(t);r===g.TEMPLATE&&i===ne.HTML&&(t=e.treeAdapter.getTemplateContent(t)),e.treeAdapter.appendChild(t,n)}}function RH(e,t,n){const r=e.treeAdapter.getNamespaceURI(n.element),i=n.token,o=e.treeAdapter.createElement(i.tagName,r,i.attrs);e._adoptNodes(t,o),e.treeAdapter.appendChild(t,o),e.activeFormattingElements.insertElementAfterBookmark(o,n.token),e.activeFormattingElements.removeEntry(n),e.openElements.remove(n.element),e.openElements.insertAfter(t,o)}function So(e,t){let n;for(let r=0;r<CH&&(n=IH(e,t),!!n);r++){const i=xH(e,n);if(!i)break;e.activeFormattingElements.bookmark=n;const o=NH(e,i,n.element),a=e.openElements.getCommonAncestor(n.element);e.treeAdapter.detachNode(o),wH(e,a,o),RH(e,i,n)}}function Se(){}function uc(e){e._err(Xt.misplacedDoctype)}function Dt(e,t){e._appendCommentNode(t,e.openElements.currentTmplContent||e.openElements.current)}function OH(e,t){e._appendCommentNode(t,e.openElements.items[0])}function Xv(e,t){e._appendCommentNode(t,e.document)}function Pn(e,t){e._insertCharacters(t)}function Fl(e){e.stopped=!0}function PH(e,t){e._setDocumentType(t);const n=t.forceQuirks?Ha.DOCUMENT_MODE.QUIRKS:qv.getDocumentMode(t);qv.isConforming(t)||e._err(Xt.nonConformingDoctype),e.treeAdapter.setDocumentMode(e.document,n),e.insertionMode=fg}function Il(e,t){e._err(Xt.missingDoctype,{beforeToken:!0}),e.treeAdapter.setDocumentMode(e.document,Ha.DOCUMENT_MODE.QUIRKS),e.insertionMode=fg,e._processToken(t)}function MH(e,t){t.tagName===g.HTML?(e._insertElement(t,ne.HTML),e.insertionMode=mf):eu(e,t)}function LH(e,t){const n=t.tagName;(n===g.HTML||n===g.HEAD||n===g.BODY||n===g.BR)&&eu(e,t)}function eu(e,t){e._insertFakeRootElement(),e.insertionMode=mf,e._processToken(t)}function BH(e,t){const n=t.tagName;n===g.HTML?Vn(e,t):n===g.HEAD?(e._insertElement(t,ne.HTML),e.headElement=e.openElements.current,e.insertionMode=rl):tu(e,t)}function HH(e,t){const n=t.tagName;n===g.HEAD||n===g.BODY||n===g.HTML||n===g.BR?tu(e,t):e._err(Xt.endTagWithoutMatchingOpenElement)}function tu(e,t){e._insertFakeElement(g.HEAD),e.headElement=e.openElements.current,e.insertionMode=rl,e._processToken(t)}function Ut(e,t){const n=t.tagName;n===g.HTML?Vn(e,t):n===g.BASE||n===g.BASEFONT||n===g.BGSOUND||n===g.LINK||n===g.META?(e._appendElement(t,ne.HTML),t.ackSelfClosing=!0):n===g.TITLE?e._switchToTextParsing(t,w.MODE.RCDATA):n===g.NOSCRIPT?e.options.scriptingEnabled?e._switchToTextParsing(t,w.MODE.RAWTEXT):(e._insertElement(t,ne.HTML),e.insertionMode=u8):n===g.NOFRAMES||n===g.STYLE?e._switchToTextParsing(t,w.MODE.RAWTEXT):n===g.SCRIPT?e._switchToTextParsing(t,w.MODE.SCRIPT_DATA):n===g.TEMPLATE?(e._insertTemplate(t,ne.HTML),e.activeFormattingElements.insertMarker(),e.framesetOk=!1,e.insertionMode=Ad,e._pushTmplInsertionMode(Ad)):n===g.HEAD?e._err(Xt.misplacedStartTagForHeadElement):nu(e,t)}function Ua(e,t){const n=t.tagName;n===g.HEAD?(e.openElements.pop(),e.insertionMode=pf):n===g.BODY||n===g.BR||n===g.HTML?nu(e,t):n===g.TEMPLATE&&e.openElements.tmplCount>0?(e.openElements.generateImpliedEndTagsThoroughly(),e.openElements.currentTagName!==g.TEMPLATE&&e._err(Xt.closingOfElementWithOpenChildElements),e.openElements.popUntilTagNamePopped(g.TEMPLATE),e.activeFormattingElements.clearToLastMarker(),e._popTmplInsertionMode(),e._resetInsertionMode()):e._err(Xt.endTagWithoutMatchingOpenElement)}function nu(e,t){e.openElements.pop(),e.insertionMode=pf,e._processToken(t)}function UH(e,t){const n=t.tagName;n===g.HTML?Vn(e,t):n===g.BASEFONT||n===g.BGSOUND||n===g.HEAD||n===g.LINK||n===g.META||n===g.NOFRAMES||n===g.STYLE?Ut(e,t):n===g.NOSCRIPT?e._err(Xt.nestedNoscriptInHead):ru(e,t)}function zH(e,t){const n=t.tagName;n===g.NOSCRIPT?(e.openElements.pop(),e.insertionMode=rl):n===g.BR?ru(e,t):e._err(Xt.endTagWithoutMatchingOpenElement)}function ru(e,t){const n=t.type===w.EOF_TOKEN?Xt.openElementsLeftAfterEof:Xt.disallowedContentInNoscriptInHead;e._err(n),e.openElements.pop(),e.insertionMode=rl,e._processToken(t)}function GH(e,t){const n=t.tagName;n===g.HTML?Vn(e,t):n===g.BODY?(e._insertElement(t,ne.HTML),e.framesetOk=!1,e.insertionMode=Ci):n===g.FRAMESET?(e._insertElement(t,ne.HTML),e.insertionMode=vf):n===g.BASE||n===g.BASEFONT||n===g.BGSOUND||n===g.LINK||n===g.META||n===g.NOFRAMES||n===g.SCRIPT||n===g.STYLE||n===g.TEMPLATE||n===g.TITLE?(e._err(Xt.abandonedHeadElementChild),e.openElements.push(e.headElement),Ut(e,t),e.openElements.remove(e.headElement)):n===g.HEAD?e._err(Xt.misplacedStartTagForHeadElement):iu(e,t)}function WH(e,t){const n=t.tagName;n===g.BODY||n===g.HTML||n===g.BR?iu(e,t):n===g.TEMPLATE?Ua(e,t):e._err(Xt.endTagWithoutMatchingOpenElement)}function iu(e,t){e._insertFakeElement(g.BODY),e.insertionMode=Ci,e._processToken(t)}function oa(e,t){e._reconstructActiveFormattingElements(),e._insertCharacters(t)}function cc(e,t){e._reconstructActiveFormattingElements(),e._insertCharacters(t),e.framesetOk=!1}function KH(e,t){e.openElements.tmplCount===0&&e.treeAdapter.adoptAttributes(e.openElements.items[0],t.attrs)}function jH(e,t){const n=e.openElements.tryPeekProperlyNestedBodyElement();n&&e.openElements.tmplCount===0&&(e.framesetOk=!1,e.treeAdapter.adoptAttributes(n,t.attrs))}function $H(e,t){const n=e.openElements.tryPeekProperlyNestedBodyElement();e.framesetOk&&n&&(e.treeAdapter.detachNode(n),e.openElements.popAllUpToHtmlElement(),e._insertElement(t,ne.HTML),e.insertionMode=vf)}function Pi(e,t){e.openElements.hasInButtonScope(g.P)&&e._closePElement(),e._insertElement(t,ne.HTML)}function VH(e,t){e.openElements.hasInButtonScope(g.P)&&e._closePElement();const n=e.openElements.currentTagName;(n===g.H1||n===g.H2||n===g.H3||n===g.H4||n===g.H5||n===g.H6)&&e.openElements.pop(),e._insertElement(t,ne.HTML)}function Zv(e,t){e.openElements.hasInButtonScope(g.P)&&e._closePElement(),e._insertElement(t,ne.HTML),e.skipNextNewLine=!0,e.framesetOk=!1}function YH(e,t){const n=e.openElements.tmplCount>0;(!e.formElement||n)&&(e.openElements.hasInButtonScope(g.P)&&e._closePElement(),e._insertElement(t,ne.HTML),n||(e.formElement=e.openElements.current))}function qH(e,t){e.framesetOk=!1;const n=t.tagName;for(let r=e.openElements.stackTop;r>=0;r--){const i=e.openElements.items[r],o=e.treeAdapter.getTagName(i);let a=null;if(n===g.LI&&o===g.LI?a=g.LI:(n===g.DD||n===g.DT)&&(o===g.DD||o===g.DT)&&(a=o),a){e.openElements.generateImpliedEndTagsWithExclusion(a),e.openElements.popUntilTagNamePopped(a);break}if(o!==g.ADDRESS&&o!==g.DIV&&o!==g.P&&e._isSpecialElement(i))break}e.openElements.hasInButtonScope(g.P)&&e._closePElement(),e._insertElement(t,ne.HTML)}function QH(e,t){e.openElements.hasInButtonScope(g.P)&&e._closePElement(),e._insertElement(t,ne.HTML),e.tokenizer.state=w.MODE.PLAINTEXT}function XH(e,t){e.openElements.hasInScope(g.BUTTON)&&(e.openElements.generateImpliedEndTags(),e.openElements.popUntilTagNamePopped(g.BUTTON)),e._reconstructActiveFormattingElements(),e._insertElement(t,ne.HTML),e.framesetOk=!1}function ZH(e,t){const n=e.activeFormattingElements.getElementEntryInScopeWithTagName(g.A);n&&(So(e,t),e.openElements.remove(n.element),e.activeFormattingElements.removeEntry(n)),e._reconstructActiveFormattingElements(),e._insertElement(t,ne.HTML),e.activeFormattingElements.pushElement(e.openElements.current,t)}function Za(e,t){e._reconstructActiveFormattingElements(),e._insertElement(t,ne.HTML),e.activeFormattingElements.pushElement(e.openElements.current,t)}function JH(e,t){e._reconstructActiveFormattingElements(),e.openElements.hasInScope(g.NOBR)&&(So(e,t),e._reconstructActiveFormattingElements()),e._insertElement(t,ne.HTML),e.activeFormattingElements.pushElement(e.openElements.current,t)}function Jv(e,t){e._reconstructActiveFormattingElements(),e._insertElement(t,ne.HTML),e.activeFormattingElements.insertMarker(),e.framesetOk=!1}function eU(e,t){e.treeAdapter.getDocumentMode(e.document)!==Ha.DOCUMENT_MODE.QUIRKS&&e.openElements.hasInButtonScope(g.P)&&e._closePElement(),e._insertElement(t,ne.HTML),e.framesetOk=!1,e.insertionMode=sn}function is(e,t){e._reconstructActiveFormattingElements(),e._appendElement(t,ne.HTML),e.framesetOk=!1,t.ackSelfClosing=!0}function tU(e,t){e._reconstructActiveFormattingElements(),e._appendElement(t,ne.HTML);const n=w.getTokenAttr(t,a8.TYPE);(!n||n.toLowerCase()!==s8)&&(e.framesetOk=!1),t.ackSelfClosing=!0}function eT(e,t){e._appendElement(t,ne.HTML),t.ackSelfClosing=!0}function nU(e,t){e.openElements.hasInButtonScope(g.P)&&e._closePElement(),e._appendElement(t,ne.HTML),e.framesetOk=!1,t.ackSelfClosing=!0}function rU(e,t){t.tagName=g.IMG,is(e,t)}function iU(e,t){e._insertElement(t,ne.HTML),e.skipNextNewLine=!0,e.tokenizer.state=w.MODE.RCDATA,e.originalInsertionMode=e.insertionMode,e.framesetOk=!1,e.insertionMode=Sd}function oU(e,t){e.openElements.hasInButtonScope(g.P)&&e._closePElement(),e._reconstructActiveFormattingElements(),e.framesetOk=!1,e._switchToTextParsing(t,w.MODE.RAWTEXT)}function aU(e,t){e.framesetOk=!1,e._switchToTextParsing(t,w.MODE.RAWTEXT)}function tT(e,t){e._switchToTextParsing(t,w.MODE.RAWTEXT)}function sU(e,t){e._reconstructActiveFormattingElements(),e._insertElement(t,ne.HTML),e.framesetOk=!1,e.insertionMode===sn||e.insertionMode===gf||e.insertionMode===kr||e.insertionMode===Ji||e.insertionMode===Ef?e.insertionMode=mg:e.insertionMode=hg}function nT(e,t){e.openElements.currentTagName===g.OPTION&&e.openElements.pop(),e._reconstructActiveFormattingElements(),e._insertElement(t,ne.HTML)}function rT(e,t){e.openElements.hasInScope(g.RUBY)&&e.openElements.generateImpliedEndTags(),e._insertElement(t,ne.HTML)}function lU(e,t){e.openElements.hasInScope(g.RUBY)&&e.openElements.generateImpliedEndTagsWithExclusion(g.RTC),e._insertElement(t,ne.HTML)}function uU(e,t){e.openElements.hasInButtonScope(g.P)&&e._closePElement(),e._insertElement(t,ne.HTML)}function cU(e,t){e._reconstructActiveFormattingElements(),gi.adjustTokenMathMLAttrs(t),gi.adjustTokenXMLAttrs(t),t.selfClosing?e._appendElement(t,ne.MATHML):e._insertElement(t,ne.MATHML),t.ackSelfClosing=!0}function dU(e,t){e._reconstructActiveFormattingElements(),gi.adjustTokenSVGAttrs(t),gi.adjustTokenXMLAttrs(t),t.selfClosing?e._appendElement(t,ne.SVG):e._insertElement(t,ne.SVG),t.ackSelfClosing=!0}function mr(e,t){e._reconstructActiveFormattingElements(),e._insertElement(t,ne.HTML)}function Vn(e,t){const n=t.tagName;switch(n.length){case 1:n===g.I||n===g.S||n===g.B||n===g.U?Za(e,t):n===g.P?Pi(e,t):n===g.A?ZH(e,t):mr(e,t);break;case 2:n===g.DL||n===g.OL||n===g.UL?Pi(e,t):n===g.H1||n===g.H2||n===g.H3||n===g.H4||n===g.H5||n===g.H6?VH(e,t):n===g.LI||n===g.DD||n===g.DT?qH(e,t):n===g.EM||n===g.TT?Za(e,t):n===g.BR?is(e,t):n===g.HR?nU(e,t):n===g.RB?rT(e,t):n===g.RT||n===g.RP?lU(e,t):n!==g.TH&&n!==g.TD&&n!==g.TR&&mr(e,t);break;case 3:n===g.DIV||n===g.DIR||n===g.NAV?Pi(e,t):n===g.PRE?Zv(e,t):n===g.BIG?Za(e,t):n===g.IMG||n===g.WBR?is(e,t):n===g.XMP?oU(e,t):n===g.SVG?dU(e,t):n===g.RTC?rT(e,t):n!==g.COL&&mr(e,t);break;case 4:n===g.HTML?KH(e,t):n===g.BASE||n===g.LINK||n===g.META?Ut(e,t):n===g.BODY?jH(e,t):n===g.MAIN||n===g.MENU?Pi(e,t):n===g.FORM?YH(e,t):n===g.CODE||n===g.FONT?Za(e,t):n===g.NOBR?JH(e,t):n===g.AREA?is(e,t):n===g.MATH?cU(e,t):n===g.MENU?uU(e,t):n!==g.HEAD&&mr(e,t);break;case 5:n===g.STYLE||n===g.TITLE?Ut(e,t):n===g.ASIDE?Pi(e,t):n===g.SMALL?Za(e,t):n===g.TABLE?eU(e,t):n===g.EMBED?is(e,t):n===g.INPUT?tU(e,t):n===g.PARAM||n===g.TRACK?eT(e,t):n===g.IMAGE?rU(e,t):n!==g.FRAME&&n!==g.TBODY&&n!==g.TFOOT&&n!==g.THEAD&&mr(e,t);break;case 6:n===g.SCRIPT?Ut(e,t):n===g.CENTER||n===g.FIGURE||n===g.FOOTER||n===g.HEADER||n===g.HGROUP||n===g.DIALOG?Pi(e,t):n===g.BUTTON?XH(e,t):n===g.STRIKE||n===g.STRONG?Za(e,t):n===g.APPLET||n===g.OBJECT?Jv(e,t):n===g.KEYGEN?is(e,t):n===g.SOURCE?eT(e,t):n===g.IFRAME?aU(e,t):n===g.SELECT?sU(e,t):n===g.OPTION?nT(e,t):mr(e,t);break;case 7:n===g.BGSOUND?Ut(e,t):n===g.DETAILS||n===g.ADDRESS||n===g.ARTICLE||n===g.SECTION||n===g.SUMMARY?Pi(e,t):n===g.LISTING?Zv(e,t):n===g.MARQUEE?Jv(e,t):n===g.NOEMBED?tT(e,t):n!==g.CAPTION&&mr(e,t);break;case 8:n===g.BASEFONT?Ut(e,t):n===g.FRAMESET?$H(e,t):n===g.FIELDSET?Pi(e,t):n===g.TEXTAREA?iU(e,t):n===g.TEMPLATE?Ut(e,t):n===g.NOSCRIPT?e.options.scriptingEnabled?tT(e,t):mr(e,t):n===g.OPTGROUP?nT(e,t):n!==g.COLGROUP&&mr(e,t);break;case 9:n===g.PLAINTEXT?QH(e,t):mr(e,t);break;case 10:n===g.BLOCKQUOTE||n===g.FIGCAPTION?Pi(e,t):mr(e,t);break;default:mr(e,t)}}function fU(e){e.openElements.hasInScope(g.BODY)&&(e.insertionMode=pg)}function hU(e,t){e.openElements.hasInScope(g.BODY)&&(e.insertionMode=pg,e._processToken(t))}function po(e,t){const n=t.tagName;e.openElements.hasInScope(n)&&(e.openElements.generateImpliedEndTags(),e.openElements.popUntilTagNamePopped(n))}function mU(e){const t=e.openElements.tmplCount>0,n=e.formElement;t||(e.formElement=null),(n||t)&&e.openElements.hasInScope(g.FORM)&&(e.openElements.generateImpliedEndTags(),t?e.openElements.popUntilTagNamePopped(g.FORM):e.openElements.remove(n))}function pU(e){e.openElements.hasInButtonScope(g.P)||e._insertFakeElement(g.P),e._closePElement()}function gU(e){e.openElements.hasInListItemScope(g.LI)&&(e.openElements.generateImpliedEndTagsWithExclusion(g.LI),e.openElements.popUntilTagNamePopped(g.LI))}function EU(e,t){const n=t.tagName;e.openElements.hasInScope(n)&&(e.openElements.generateImpliedEndTagsWithExclusion(n),e.openElements.popUntilTagNamePopped(n))}function vU(e){e.openElements.hasNumberedHeaderInScope()&&(e.openElements.generateImpliedEndTags(),e.openElements.popUntilNumberedHeaderPopped())}function iT(e,t){const n=t.tagName;e.openElements.hasInScope(n)&&(e.openElements.generateImpliedEndTags(),e.openElements.popUntilTagNamePopped(n),e.activeFormattingElements.clearToLastMarker())}function TU(e){e._reconstructActiveFormattingElements(),e._insertFakeElement(g.BR),e.openElements.pop(),e.framesetOk=!1}function Ur(e,t){const n=t.tagName;for(let r=e.openElements.stackTop;r>0;r--){const i=e.openElements.items[r];if(e.treeAdapter.getTagName(i)===n){e.openElements.generateImpliedEndTagsWithExclusion(n),e.openElements.popUntilElementPopped(i);break}if(e._isSpecialElement(i))break}}function gg(e,t){const n=t.tagName;switch(n.length){case 1:n===g.A||n===g.B||n===g.I||n===g.S||n===g.U?So(e,t):n===g.P?pU(e):Ur(e,t);break;case 2:n===g.DL||n===g.UL||n===g.OL?po(e,t):n===g.LI?gU(e):n===g.DD||n===g.DT?EU(e,t):n===g.H1||n===g.H2||n===g.H3||n===g.H4||n===g.H5||n===g.H6?vU(e):n===g.BR?TU(e):n===g.EM||n===g.TT?So(e,t):Ur(e,t);break;case 3:n===g.BIG?So(e,t):n===g.DIR||n===g.DIV||n===g.NAV||n===g.PRE?po(e,t):Ur(e,t);break;case 4:n===g.BODY?fU(e):n===g.HTML?hU(e,t):n===g.FORM?mU(e):n===g.CODE||n===g.FONT||n===g.NOBR?So(e,t):n===g.MAIN||n===g.MENU?po(e,t):Ur(e,t);break;case 5:n===g.ASIDE?po(e,t):n===g.SMALL?So(e,t):Ur(e,t);break;case 6:n===g.CENTER||n===g.FIGURE||n===g.FOOTER||n===g.HEADER||n===g.HGROUP||n===g.DIALOG?po(e,t):n===g.APPLET||n===g.OBJECT?iT(e,t):n===g.STRIKE||n===g.STRONG?So(e,t):Ur(e,t);break;case 7:n===g.ADDRESS||n===g.ARTICLE||n===g.DETAILS||n===g.SECTION||n===g.SUMMARY||n===g.LISTING?po(e,t):n===g.MARQUEE?iT(e,t):Ur(e,t);break;case 8:n===g.FIELDSET?po(e,t):n===g.TEMPLATE?Ua(e,t):Ur(e,t);break;case 10:n===g.BLOCKQUOTE||n===g.FIGCAPTION?po(e,t):Ur(e,t);break;default:Ur(e,t)}}function Mi(e,t){e.tmplInsertionModeStackTop>-1?g8(e,t):e.stopped=!0}function yU(e,t){t.tagName===g.SCRIPT&&(e.pendingScript=e.openElements.current),e.openElements.pop(),e.insertionMode=e.originalInsertionMode}function _U(e,t){e._err(Xt.eofInElementThatCanContainOnlyText),e.openElements.pop(),e.insertionMode=e.originalInsertionMode,e._processToken(t)}function Li(e,t){const n=e.openElements.currentTagName;n===g.TABLE||n===g.TBODY||n===g.TFOOT||n===g.THEAD||n===g.TR?(e.pendingCharacterTokens=[],e.hasNonWhitespacePendingCharacterToken=!1,e.originalInsertionMode=e.insertionMode,e.insertionMode=c8,e._processToken(t)):gr(e,t)}function CU(e,t){e.openElements.clearBackToTableContext(),e.activeFormattingElements.insertMarker(),e._insertElement(t,ne.HTML),e.insertionMode=gf}function SU(e,t){e.openElements.clearBackToTableContext(),e._insertElement(t,ne.HTML),e.insertionMode=d1}function AU(e,t){e.openElements.clearBackToTableContext(),e._insertFakeElement(g.COLGROUP),e.insertionMode=d1,e._processToken(t)}function bU(e,t){e.openElements.clearBackToTableContext(),e._insertElement(t,ne.HTML),e.insertionMode=kr}function kU(e,t){e.openElements.clearBackToTableContext(),e._insertFakeElement(g.TBODY),e.insertionMode=kr,e._processToken(t)}function FU(e,t){e.openElements.hasInTableScope(g.TABLE)&&(e.openElements.popUntilTagNamePopped(g.TABLE),e._resetInsertionMode(),e._processToken(t))}function IU(e,t){const n=w.getTokenAttr(t,a8.TYPE);n&&n.toLowerCase()===s8?e._appendElement(t,ne.HTML):gr(e,t),t.ackSelfClosing=!0}function xU(e,t){!e.formElement&&e.openElements.tmplCount===0&&(e._insertElement(t,ne.HTML),e.formElement=e.openElements.current,e.openElements.pop())}function Eg(e,t){const n=t.tagName;switch(n.length){case 2:n===g.TD||n===g.TH||n===g.TR?kU(e,t):gr(e,t);break;case 3:n===g.COL?AU(e,t):gr(e,t);break;case 4:n===g.FORM?xU(e,t):gr(e,t);break;case 5:n===g.TABLE?FU(e,t):n===g.STYLE?Ut(e,t):n===g.TBODY||n===g.TFOOT||n===g.THEAD?bU(e,t):n===g.INPUT?IU(e,t):gr(e,t);break;case 6:n===g.SCRIPT?Ut(e,t):gr(e,t);break;case 7:n===g.CAPTION?CU(e,t):gr(e,t);break;case 8:n===g.COLGROUP?SU(e,t):n===g.TEMPLATE?Ut(e,t):gr(e,t);break;default:gr(e,t)}}function vg(e,t){const n=t.tagName;n===g.TABLE?e.openElements.hasInTableScope(g.TABLE)&&(e.openElements.popUntilTagNamePopped(g.TABLE),e._resetInsertionMode()):n===g.TEMPLATE?Ua(e,t):n!==g.BODY&&n!==g.CAPTION&&n!==g.COL&&n!==g.COLGROUP&&n!==g.HTML&&n!==g.TBODY&&n!==g.TD&&n!==g.TFOOT&&n!==g.TH&&n!==g.THEAD&&n!==g.TR&&gr(e,t)}function gr(e,t){const n=e.fosterParentingEnabled;e.fosterParentingEnabled=!0,e._processTokenInBodyMode(t),e.fosterParentingEnabled=n}function NU(e,t){e.pendingCharacterTokens.push(t)}function DU(e,t){e.pendingCharacterTokens.push(t),e.hasNonWhitespacePendingCharacterToken=!0}function xl(e,t){let n=0;if(e.hasNonWhitespacePendingCharacterToken)for(;n<e.pendingCharacterTokens.length;n++)gr(e,e.pendingCharacterTokens[n]);else for(;n<e.pendingCharacterTokens.length;n++)e._insertCharacters(e.pendingCharacterTokens[n]);e.insertionMode=e.originalInsertionMode,e._processToken(t)}function wU(e,t){const n=t.tagName;n===g.CAPTION||n===g.COL||n===g.COLGROUP||n===g.TBODY||n===g.TD||n===g.TFOOT||n===g.TH||n===g.THEAD||n===g.TR?e.openElements.hasInTableScope(g.CAPTION)&&(e.openElements.generateImpliedEndTags(),e.openElements.popUntilTagNamePopped(g.CAPTION),e.activeFormattingElements.clearToLastMarker(),e.insertionMode=sn,e._processToken(t)):Vn(e,t)}function RU(e,t){const n=t.tagName;n===g.CAPTION||n===g.TABLE?e.openElements.hasInTableScope(g.CAPTION)&&(e.openElements.generateImpliedEndTags(),e.openElements.popUntilTagNamePopped(g.CAPTION),e.activeFormattingElements.clearToLastMarker(),e.insertionMode=sn,n===g.TABLE&&e._processToken(t)):n!==g.BODY&&n!==g.COL&&n!==g.COLGROUP&&n!==g.HTML&&n!==g.TBODY&&n!==g.TD&&n!==g.TFOOT&&n!==g.TH&&n!==g.THEAD&&n!==g.TR&&gg(e,t)}function OU(e,t){const n=t.tagName;n===g.HTML?Vn(e,t):n===g.COL?(e._appendElement(t,ne.HTML),t.ackSelfClosing=!0):n===g.TEMPLATE?Ut(e,t):bd(e,t)}function PU(e,t){const n=t.tagName;n===g.COLGROUP?e.openElements.currentTagName===g.COLGROUP&&(e.openElements.pop(),e.insertionMode=sn):n===g.TEMPLATE?Ua(e,t):n!==g.COL&&bd(e,t)}function bd(e,t){e.openElements.currentTagName===g.COLGROUP&&(e.openElements.pop(),e.insertionMode=sn,e._processToken(t))}function MU(e,t){const n=t.tagName;n===g.TR?(e.openElements.clearBackToTableBodyContext(),e._insertElement(t,ne.HTML),e.insertionMode=Ji):n===g.TH||n===g.TD?(e.openElements.clearBackToTableBodyContext(),e._insertFakeElement(g.TR),e.insertionMode=Ji,e._processToken(t)):n===g.CAPTION||n===g.COL||n===g.COLGROUP||n===g.TBODY||n===g.TFOOT||n===g.THEAD?e.openElements.hasTableBodyContextInTableScope()&&(e.openElements.clearBackToTableBodyContext(),e.openElements.pop(),e.insertionMode=sn,e._processToken(t)):Eg(e,t)}function LU(e,t){const n=t.tagName;n===g.TBODY||n===g.TFOOT||n===g.THEAD?e.openElements.hasInTableScope(n)&&(e.openElements.clearBackToTableBodyContext(),e.openElements.pop(),e.insertionMode=sn):n===g.TABLE?e.openElements.hasTableBodyContextInTableScope()&&(e.openElements.clearBackToTableBodyContext(),e.openElements.pop(),e.insertionMode=sn,e._processToken(t)):(n!==g.BODY&&n!==g.CAPTION&&n!==g.COL&&n!==g.COLGROUP||n!==g.HTML&&n!==g.TD&&n!==g.TH&&n!==g.TR)&&vg(e,t)}function BU(e,t){const n=t.tagName;n===g.TH||n===g.TD?(e.openElements.clearBackToTableRowContext(),e._insertElement(t,ne.HTML),e.insertionMode=Ef,e.activeFormattingElements.insertMarker()):n===g.CAPTION||n===g.COL||n===g.COLGROUP||n===g.TBODY||n===g.TFOOT||n===g.THEAD||n===g.TR?e.openElements.hasInTableScope(g.TR)&&(e.openElements.clearBackToTableRowContext(),e.openElements.pop(),e.insertionMode=kr,e._processToken(t)):Eg(e,t)}function HU(e,t){const n=t.tagName;n===g.TR?e.openElements.hasInTableScope(g.TR)&&(e.openElements.clearBackToTableRowContext(),e.openElements.pop(),e.insertionMode=kr):n===g.TABLE?e.openElements.hasInTableScope(g.TR)&&(e.openElements.clearBackToTableRowContext(),e.openElements.pop(),e.insertionMode=kr,e._processToken(t)):n===g.TBODY||n===g.TFOOT||n===g.THEAD?(e.openElements.hasInTableScope(n)||e.openElements.hasInTableScope(g.TR))&&(e.openElements.clearBackToTableRowContext(),e.openElements.pop(),e.insertionMode=kr,e._processToken(t)):(n!==g.BODY&&n!==g.CAPTION&&n!==g.COL&&n!==g.COLGROUP||n!==g.HTML&&n!==g.TD&&n!==g.TH)&&vg(e,t)}function UU(e,t){const n=t.tagName;n===g.CAPTION||n===g.COL||n===g.COLGROUP||n===g.TBODY||n===g.TD||n===g.TFOOT||n===g.TH||n===g.THEAD||n===g.TR?(e.openElements.hasInTableScope(g.TD)||e.openElements.hasInTableScope(g.TH))&&(e._closeTableCell(),e._processToken(t)):Vn(e,t)}function zU(e,t){const n=t.tagName;n===g.TD||n===g.TH?e.openElements.hasInTableScope(n)&&(e.openElements.generateImpliedEndTags(),e.openElements.popUntilTagNamePopped(n),e.activeFormattingElements.clearToLastMarker(),e.insertionMode=Ji):n===g.TABLE||n===g.TBODY||n===g.TFOOT||n===g.THEAD||n===g.TR?e.openElements.hasInTableScope(n)&&(e._closeTableCell(),e._processToken(t)):n!==g.BODY&&n!==g.CAPTION&&n!==g.COL&&n!==g.COLGROUP&&n!==g.HTML&&gg(e,t)}function m8(e,t){const n=t.tagName;n===g.HTML?Vn(e,t):n===g.OPTION?(e.openElements.currentTagName===g.OPTION&&e.openElements.pop(),e._insertElement(t,ne.HTML)):n===g.OPTGROUP?(e.openElements.currentTagName===g.OPTION&&e.openElements.pop(),e.openElements.currentTagName===g.OPTGROUP&&e.openElements.pop(),e._insertElement(t,ne.HTML)):n===g.INPUT||n===g.KEYGEN||n===g.TEXTAREA||n===g.SELECT?e.openElements.hasInSelectScope(g.SELECT)&&(e.openElements.popUntilTagNamePopped(g.SELECT),e._resetInsertionMode(),n!==g.SELECT&&e._processToken(t)):(n===g.SCRIPT||n===g.TEMPLATE)&&Ut(e,t)}function p8(e,t){const n=t.tagName;if(n===g.OPTGROUP){const r=e.openElements.items[e.openElements.stackTop-1],i=r&&e.treeAdapter.getTagName(r);e.openElements.currentTagName===g.OPTION&&i===g.OPTGROUP&&e.openElements.pop(),e.openElements.currentTagName===g.OPTGROUP&&e.openElements.pop()}else n===g.OPTION?e.openElements.currentTagName===g.OPTION&&e.openElements.pop():n===g.SELECT&&e.openElements.hasInSelectScope(g.SELECT)?(e.openElements.popUntilTagNamePopped(g.SELECT),e._resetInsertionMode()):n===g.TEMPLATE&&Ua(e,t)}function GU(e,t){const n=t.tagName;n===g.CAPTION||n===g.TABLE||n===g.TBODY||n===g.TFOOT||n===g.THEAD||n===g.TR||n===g.TD||n===g.TH?(e.openElements.popUntilTagNamePopped(g.SELECT),e._resetInsertionMode(),e._processToken(t)):m8(e,t)}function WU(e,t){const n=t.tagName;n===g.CAPTION||n===g.TABLE||n===g.TBODY||n===g.TFOOT||n===g.THEAD||n===g.TR||n===g.TD||n===g.TH?e.openElements.hasInTableScope(n)&&(e.openElements.popUntilTagNamePopped(g.SELECT),e._resetInsertionMode(),e._processToken(t)):p8(e,t)}function KU(e,t){const n=t.tagName;if(n===g.BASE||n===g.BASEFONT||n===g.BGSOUND||n===g.LINK||n===g.META||n===g.NOFRAMES||n===g.SCRIPT||n===g.STYLE||n===g.TEMPLATE||n===g.TITLE)Ut(e,t);else{const r=bH[n]||Ci;e._popTmplInsertionMode(),e._pushTmplInsertionMode(r),e.insertionMode=r,e._processToken(t)}}function jU(e,t){t.tagName===g.TEMPLATE&&Ua(e,t)}function g8(e,t){e.openElements.tmplCount>0?(e.openElements.popUntilTagNamePopped(g.TEMPLATE),e.activeFormattingElements.clearToLastMarker(),e._popTmplInsertionMode(),e._resetInsertionMode(),e._processToken(t)):e.stopped=!0}function $U(e,t){t.tagName===g.HTML?Vn(e,t):kd(e,t)}function VU(e,t){t.tagName===g.HTML?e.fragmentContext||(e.insertionMode=f8):kd(e,t)}function kd(e,t){e.insertionMode=Ci,e._processToken(t)}function YU(e,t){const n=t.tagName;n===g.HTML?Vn(e,t):n===g.FRAMESET?e._insertElement(t,ne.HTML):n===g.FRAME?(e._appendElement(t,ne.HTML),t.ackSelfClosing=!0):n===g.NOFRAMES&&Ut(e,t)}function qU(e,t){t.tagName===g.FRAMESET&&!e.openElements.isRootHtmlElementCurrent()&&(e.openElements.pop(),!e.fragmentContext&&e.openElements.currentTagName!==g.FRAMESET&&(e.insertionMode=d8))}function QU(e,t){const n=t.tagName;n===g.HTML?Vn(e,t):n===g.NOFRAMES&&Ut(e,t)}function XU(e,t){t.tagName===g.HTML&&(e.insertionMode=h8)}function ZU(e,t){t.tagName===g.HTML?Vn(e,t):Rc(e,t)}function Rc(e,t){e.insertionMode=Ci,e._processToken(t)}function JU(e,t){const n=t.tagName;n===g.HTML?Vn(e,t):n===g.NOFRAMES&&Ut(e,t)}function ez(e,t){t.chars=yH.REPLACEMENT_CHARACTER,e._insertCharacters(t)}function tz(e,t){e._insertCharacters(t),e.framesetOk=!1}function nz(e,t){if(gi.causesExit(t)&&!e.fragmentContext){for(;e.treeAdapter.getNamespaceURI(e.openElements.current)!==ne.HTML&&!e._isIntegrationPoint(e.openElements.current);)e.openElements.pop();e._processToken(t)}else{const n=e._getAdjustedCurrentElement(),r=e.treeAdapter.getNamespaceURI(n);r===ne.MATHML?gi.adjustTokenMathMLAttrs(t):r===ne.SVG&&(gi.adjustTokenSVGTagName(t),gi.adjustTokenSVGAttrs(t)),gi.adjustTokenXMLAttrs(t),t.selfClosing?e._appendElement(t,r):e._insertElement(t,r),t.ackSelfClosing=!0}}function rz(e,t){for(let n=e.openElements.stackTop;n>0;n--){const r=e.openElements.items[n];if(e.treeAdapter.getNamespaceURI(r)===ne.HTML){e._processToken(t);break}if(e.treeAdapter.getTagName(r).toLowerCase()===t.tagName){e.openElements.popUntilElementPopped(r);break}}}const oT=/[#.]/g;function iz(e,t){const n=e||"",r={};let i=0,o,a;for(;i<n.length;){oT.lastIndex=i;const s=oT.exec(n),l=n.slice(i,s?s.index:n.length);l&&(o?o==="#"?r.id=l:Array.isArray(r.className)?r.className.push(l):r.className=[l]:a=l,i+=l.length),s&&(o=s[0],i++)}return{type:"element",tagName:a||t||"div",properties:r,children:[]}}const oz=new Set(["menu","submit","reset","button"]),Fm={}.hasOwnProperty;function E8(e,t,n){const r=n&&uz(n);return function(o,a,...s){let l=-1,u;if(o==null)u={type:"root",children:[]},s.unshift(a);else if(u=iz(o,t),u.tagName=u.tagName.toLowerCase(),r&&Fm.call(r,u.tagName)&&(u.tagName=r[u.tagName]),az(a,u.tagName)){let c;for(c in a)Fm.call(a,c)&&sz(e,u.properties,c,a[c])}else s.unshift(a);for(;++l<s.length;)Im(u.children,s[l]);return u.type==="element"&&u.tagName==="template"&&(u.content={type:"root",children:u.children},u.children=[]),u}}function az(e,t){return e==null||typeof e!="object"||Array.isArray(e)?!1:t==="input"||!e.type||typeof e.type!="string"?!0:"children"in e&&Array.isArray(e.children)?!1:t==="button"?oz.has(e.type.toLowerCase()):!("value"in e)}function sz(e,t,n,r){const i=sf(e,n);let o=-1,a;if(r!=null){if(typeof r=="number"){if(Number.isNaN(r))return;a=r}else typeof r=="boolean"?a=r:typeof r=="string"?i.spaceSeparated?a=R5(r):i.commaSeparated?a=O5(r):i.commaOrSpaceSeparated?a=R5(O5(r).join(" ")):a=aT(i,i.property,r):Array.isArray(r)?a=r.concat():a=i.property==="style"?lz(r):String(r);if(Array.isArray(a)){const s=[];for(;++o<a.length;)s[o]=aT(i,i.property,a[o]);a=s}i.property==="className"&&Array.isArray(t.className)&&(a=t.className.concat(a)),t[i.property]=a}}function Im(e,t){let n=-1;if(t!=null)if(typeof t=="string"||typeof t=="number")e.push({type:"text",value:String(t)});else if(Array.isArray(t))for(;++n<t.length;)Im(e,t[n]);else if(typeof t=="object"&&"type"in t)t.type==="root"?Im(e,t.children):e.push(t);else throw new Error("Expected node, nodes, or string, got `"+t+"`")}function aT(e,t,n){if(typeof n=="string"){if(e.number&&n&&!Number.isNaN(Number(n)))return Number(n);if((e.boolean||e.overloadedBoolean)&&(n===""||Pu(n)===Pu(t)))return!0}return n}function lz(e){const t=[];let n;for(n in e)Fm.call(e,n)&&t.push([n,e[n]].join(": "));return t.join("; ")}function uz(e){const t={};let n=-1;for(;++n<e.length;)t[e[n].toLowerCase()]=e[n];return t}const cz=E8(t1,"div"),dz=["altGlyph","altGlyphDef","altGlyphItem","animateColor","animateMotion","animateTransform","clipPath","feBlend","feColorMatrix","feComponentTransfer","feComposite","feConvolveMatrix","feDiffuseLighting","feDisplacementMap","feDistantLight","feDropShadow","feFlood","feFuncA","feFuncB","feFuncG","feFuncR","feGaussianBlur","feImage","feMerge","feMergeNode","feMorphology","feOffset","fePointLight","feSpecularLighting","feSpotLight","feTile","feTurbulence","foreignObject","glyphRef","linearGradient","radialGradient","solidColor","textArea","textPath"],fz=E8(nl,"g",dz);function hz(e){const t=String(e),n=[],r=/\r?\n|\r/g;for(;r.test(t);)n.push(r.lastIndex);return n.push(t.length+1),{toPoint:i,toOffset:o};function i(a){let s=-1;if(typeof a=="number"&&a>-1&&a<n[n.length-1]){for(;++s<n.length;)if(n[s]>a)return{line:s+1,column:a-(s>0?n[s-1]:0)+1,offset:a}}return{line:void 0,column:void 0,offset:void 0}}function o(a){const s=a&&a.line,l=a&&a.column;if(typeof s=="number"&&typeof l=="number"&&!Number.isNaN(s)&&!Number.isNaN(l)&&s-1 in n){const u=(n[s-2]||0)+l-1||0;if(u>-1&&u<n[n.length-1])return u}return-1}}const Mu={html:"http://www.w3.org/1999/xhtml",mathml:"http://www.w3.org/1998/Math/MathML",svg:"http://www.w3.org/2000/svg",xlink:"http://www.w3.org/1999/xlink",xml:"http://www.w3.org/XML/1998/namespace",xmlns:"http://www.w3.org/2000/xmlns/"},v8={}.hasOwnProperty,mz=Object.prototype;function pz(e,t){const n=t||{};let r,i;return vz(n)?(i=n,r={}):(i=n.file||void 0,r=n),Tg({schema:r.space==="svg"?nl:t1,file:i,verbose:r.verbose,location:!1},e)}function Tg(e,t){let n;switch(t.nodeName){case"#comment":{const r=t;return n={type:"comment",value:r.data},Oc(e,r,n),n}case"#document":case"#document-fragment":{const r=t,i="mode"in r?r.mode==="quirks"||r.mode==="limited-quirks":!1;if(n={type:"root",children:T8(e,t.childNodes),data:{quirksMode:i}},e.file&&e.location){const o=String(e.file),a=hz(o),s=a.toPoint(0),l=a.toPoint(o.length);n.position={start:s,end:l}}return n}case"#documentType":{const r=t;return n={type:"doctype"},Oc(e,r,n),n}case"#text":{const r=t;return n={type:"text",value:r.value},Oc(e,r,n),n}default:return n=gz(e,t),n}}function T8(e,t){let n=-1;const r=[];for(;++n<t.length;)r[n]=Tg(e,t[n]);return r}function gz(e,t){const n=e.schema;e.schema=t.namespaceURI===Mu.svg?nl:t1;let r=-1;const i={};for(;++r<t.attrs.length;){const s=t.attrs[r],l=(s.prefix?s.prefix+":":"")+s.name;v8.call(mz,l)||(i[l]=s.value)}const a=(e.schema.space==="svg"?fz:cz)(t.tagName,i,T8(e,t.childNodes));if(Oc(e,t,a),a.tagName==="template"){const s=t,l=s.sourceCodeLocation,u=l&&l.startTag&&ys(l.startTag),c=l&&l.endTag&&ys(l.endTag),d=Tg(e,s.content);u&&c&&e.file&&(d.position={start:u.end,end:c.start}),a.content=d}return e.schema=n,a}function Oc(e,t,n){if("sourceCodeLocation"in t&&t.sourceCodeLocation&&e.file){const r=Ez(e,n,t.sourceCodeLocation);r&&(e.location=!0,n.position=r)}}function Ez(e,t,n){const r=ys(n);if(t.type==="element"){const i=t.children[t.children.length-1];if(r&&!n.endTag&&i&&i.position&&i.position.end&&(r.end=Object.assign({},i.position.end)),e.verbose){const o={};let a;if(n.attrs)for(a in n.attrs)v8.call(n.attrs,a)&&(o[sf(e.schema,a).property]=ys(n.attrs[a]));t.data={position:{opening:ys(n.startTag),closing:n.endTag?ys(n.endTag):null,properties:o}}}}return r}function ys(e){const t=sT({line:e.startLine,column:e.startCol,offset:e.startOffset}),n=sT({line:e.endLine,column:e.endCol,offset:e.endOffset});return t||n?{start:t,end:n}:void 0}function sT(e){return e.line&&e.column?e:void 0}function vz(e){return"messages"in e}const lT={}.hasOwnProperty;function y8(e,t){const n=t||{};function r(i,...o){let a=r.invalid;const s=r.handlers;if(i&&lT.call(i,e)){const l=String(i[e]);a=lT.call(s,l)?s[l]:r.unknown}if(a)return a.call(this,i,...o)}return r.handlers=n.handlers||{},r.invalid=n.invalid,r.unknown=n.unknown,r}const Tz={}.hasOwnProperty,_8=y8("type",{handlers:{root:_z,element:kz,text:Az,comment:bz,doctype:Sz}});function yz(e,t){const n=t&&typeof t=="object"?t.space:t;return _8(e,n==="svg"?nl:t1)}function _z(e,t){const n={nodeName:"#document",mode:(e.data||{}).quirksMode?"quirks":"no-quirks",childNodes:[]};return n.childNodes=yg(e.children,n,t),il(e,n),n}function Cz(e,t){const n={nodeName:"#document-fragment",childNodes:[]};return n.childNodes=yg(e.children,n,t),il(e,n),n}function Sz(e){const t={nodeName:"#documentType",name:"html",publicId:"",systemId:"",parentNode:void 0};return il(e,t),t}function Az(e){const t={nodeName:"#text",value:e.value,parentNode:void 0};return il(e,t),t}function bz(e){const t={nodeName:"#comment",data:e.value,parentNode:void 0};return il(e,t),t}function kz(e,t){const n=t;let r=n;e.type==="element"&&e.tagName.toLowerCase()==="svg"&&n.space==="html"&&(r=nl);const i=[];let o;if(e.properties){for(o in e.properties)if(o!=="children"&&Tz.call(e.properties,o)){const s=Fz(r,o,e.properties[o]);s&&i.push(s)}}const a={nodeName:e.tagName,tagName:e.tagName,attrs:i,namespaceURI:Mu[r.space],childNodes:[],parentNode:void 0};return a.childNodes=yg(e.children,a,r),il(e,a),e.tagName==="template"&&e.content&&(a.content=Cz(e.content,r)),a}function Fz(e,t,n){const r=sf(e,t);if(n==null||n===!1||typeof n=="number"&&Number.isNaN(n)||!n&&r.boolean)return;Array.isArray(n)&&(n=r.commaSeparated?kC(n):bC(n));const i={name:r.attribute,value:n===!0?"":String(n)};if(r.space&&r.space!=="html"&&r.space!=="svg"){const o=i.name.indexOf(":");o<0?i.prefix="":(i.name=i.name.slice(o+1),i.prefix=r.attribute.slice(0,o)),i.namespace=Mu[r.space]}return i}function yg(e,t,n){let r=-1;const i=[];if(e)for(;++r<e.length;){const o=_8(e[r],n);o.parentNode=t,i.push(o)}return i}function il(e,t){const n=e.position;n&&n.start&&n.end&&(t.sourceCodeLocation={startLine:n.start.line,startCol:n.start.column,startOffset:n.start.offset,endLine:n.end.line,endCol:n.end.column,endOffset:n.end.offset})}const Iz=["area","base","basefont","bgsound","br","col","command","embed","frame","hr","image","img","input","isindex","keygen","link","menuitem","meta","nextid","param","source","track","wbr"],xz="IN_TEMPLATE_MODE",Nz="DATA_STATE",Dz="CHARACTER_TOKEN",wz="START_TAG_TOKEN",Rz="END_TAG_TOKEN",Oz="COMMENT_TOKEN",Pz="DOCTYPE_TOKEN",Mz={sourceCodeLocationInfo:!0,scriptingEnabled:!1},C8=function(e,t,n){let r=-1;const i=new FH(Mz),o=y8("type",{handlers:{root:v,element:_,text:m,comment:y,doctype:T,raw:C},unknown:Uz});let a,s,l,u,c;if(Gz(t)&&(n=t,t=void 0),n&&n.passThrough)for(;++r<n.passThrough.length;)o.handlers[n.passThrough[r]]=k;const d=pz(zz(e)?p():f(),t);if(a&&Ks(d,"comment",(S,D,R)=>{const F=S;if(F.value.stitch&&R!==null&&D!==null)return R.children[D]=F.value.stitch,D}),e.type!=="root"&&d.type==="root"&&d.children.length===1)return d.children[0];return d;function f(){const S={nodeName:"template",tagName:"template",attrs:[],namespaceURI:Mu.html,childNodes:[]},D={nodeName:"documentmock",tagName:"documentmock",attrs:[],namespaceURI:Mu.html,childNodes:[]},R={nodeName:"#document-fragment",childNodes:[]};if(i._bootstrap(D,S),i._pushTmplInsertionMode(xz),i._initTokenizerForFragmentParsing(),i._insertFakeRootElement(),i._resetInsertionMode(),i._findFormInFragmentContext(),s=i.tokenizer,!s)throw new Error("Expected `tokenizer`");return l=s.preprocessor,c=s.__mixins[0],u=c.posTracker,o(e),A(),i._adoptNodes(D.childNodes[0],R),R}function p(){const S=i.treeAdapter.createDocument();if(i._bootstrap(S,void 0),s=i.tokenizer,!s)throw new Error("Expected `tokenizer`");return l=s.preprocessor,c=s.__mixins[0],u=c.posTracker,o(e),A(),S}function h(S){let D=-1;if(S)for(;++D<S.length;)o(S[D])}function v(S){h(S.children)}function _(S){A(),i._processInputToken(Lz(S)),h(S.children),Iz.includes(S.tagName)||(A(),i._processInputToken(Hz(S)))}function m(S){A(),i._processInputToken({type:Dz,chars:S.value,location:_s(S)})}function T(S){A(),i._processInputToken({type:Pz,name:"html",forceQuirks:!1,publicId:"",systemId:"",location:_s(S)})}function y(S){A(),i._processInputToken({type:Oz,data:S.value,location:_s(S)})}function C(S){const D=rf(S),R=D.line||1,F=D.column||1,L=D.offset||0;if(!l)throw new Error("Expected `preprocessor`");if(!s)throw new Error("Expected `tokenizer`");if(!u)throw new Error("Expected `posTracker`");if(!c)throw new Error("Expected `locationTracker`");l.html=void 0,l.pos=-1,l.lastGapPos=-1,l.lastCharPos=-1,l.gapStack=[],l.skipNextNewLine=!1,l.lastChunkWritten=!1,l.endOfChunkHit=!1,u.isEol=!1,u.lineStartPos=-F+1,u.droppedBufferSize=L,u.offset=0,u.col=1,u.line=R,c.currentAttrLocation=void 0,c.ctLoc=_s(S),s.write(S.value),i._runParsingLoop(null),(s.state==="NAMED_CHARACTER_REFERENCE_STATE"||s.state==="NUMERIC_CHARACTER_REFERENCE_END_STATE")&&(l.lastChunkWritten=!0,s[s.state](s._consume()))}function k(S){a=!0;let D;"children"in S?D={...S,children:C8({type:"root",children:S.children},t,n).children}:D={...S},y({type:"comment",value:{stitch:D}})}function A(){if(!s)throw new Error("Expected `tokenizer`");if(!u)throw new Error("Expected `posTracker`");const S=s.currentCharacterToken;S&&(S.location.endLine=u.line,S.location.endCol=u.col+1,S.location.endOffset=u.offset+1,i._processInputToken(S)),s.tokenQueue=[],s.state=Nz,s.returnState="",s.charRefCode=-1,s.tempBuff=[],s.lastStartTagName="",s.consumedAfterSnapshot=-1,s.active=!1,s.currentCharacterToken=void 0,s.currentToken=void 0,s.currentAttr=void 0}};function Lz(e){const t=Object.assign(_s(e));return t.startTag=Object.assign({},t),{type:wz,tagName:e.tagName,selfClosing:!1,attrs:Bz(e),location:t}}function Bz(e){return yz({tagName:e.tagName,type:"element",properties:e.properties,children:[]}).attrs}function Hz(e){const t=Object.assign(_s(e));return t.startTag=Object.assign({},t),{type:Rz,tagName:e.tagName,attrs:[],location:t}}function Uz(e){throw new Error("Cannot compile `"+e.type+"` node")}function zz(e){const t=e.type==="root"?e.children[0]:e;return Boolean(t&&(t.type==="doctype"||t.type==="element"&&t.tagName==="html"))}function _s(e){const t=rf(e),n=ig(e);return{startLine:t.line,startCol:t.column,startOffset:t.offset,endLine:n.line,endCol:n.column,endOffset:n.offset}}function Gz(e){return Boolean(e&&!("message"in e&&"messages"in e))}function Wz(e={}){return(t,n)=>C8(t,n,e)}function Kz(){const e=["a","b","c","d","e","f","0","1","2","3","4","5","6","7","8","9"];let t=[];for(let n=0;n<36;n++)n===8||n===13||n===18||n===23?t[n]="-":t[n]=e[Math.ceil(Math.random()*e.length-1)];return t.join("")}var aa=Kz,jz=typeof global=="object"&&global&&global.Object===Object&&global;const S8=jz;var $z=typeof self=="object"&&self&&self.Object===Object&&self,Vz=S8||$z||Function("return this")();const Ii=Vz;var Yz=Ii.Symbol;const js=Yz;var A8=Object.prototype,qz=A8.hasOwnProperty,Qz=A8.toString,Nl=js?js.toStringTag:void 0;function Xz(e){var t=qz.call(e,Nl),n=e[Nl];try{e[Nl]=void 0;var r=!0}catch{}var i=Qz.call(e);return r&&(t?e[Nl]=n:delete e[Nl]),i}var Zz=Object.prototype,Jz=Zz.toString;function eG(e){return Jz.call(e)}var tG="[object Null]",nG="[object Undefined]",uT=js?js.toStringTag:void 0;function f1(e){return e==null?e===void 0?nG:tG:uT&&uT in Object(e)?Xz(e):eG(e)}function h1(e){return e!=null&&typeof e=="object"}var rG=Array.isArray;const Tf=rG;function m1(e){var t=typeof e;return e!=null&&(t=="object"||t=="function")}var iG="[object AsyncFunction]",oG="[object Function]",aG="[object GeneratorFunction]",sG="[object Proxy]";function b8(e){if(!m1(e))return!1;var t=f1(e);return t==oG||t==aG||t==iG||t==sG}var lG=Ii["__core-js_shared__"];const i0=lG;var cT=function(){var e=/[^.]+$/.exec(i0&&i0.keys&&i0.keys.IE_PROTO||"");return e?"Symbol(src)_1."+e:""}();function uG(e){return!!cT&&cT in e}var cG=Function.prototype,dG=cG.toString;function za(e){if(e!=null){try{return dG.call(e)}catch{}try{return e+""}catch{}}return""}var fG=/[\\^$.*+?()[\]{}|]/g,hG=/^\[object .+?Constructor\]$/,mG=Function.prototype,pG=Object.prototype,gG=mG.toString,EG=pG.hasOwnProperty,vG=RegExp("^"+gG.call(EG).replace(fG,"\\$&").replace(/hasOwnProperty|(function).*?(?=\\\()| for .+?(?=\\\])/g,"$1.*?")+"$");function TG(e){if(!m1(e)||uG(e))return!1;var t=b8(e)?vG:hG;return t.test(za(e))}function yG(e,t){return e==null?void 0:e[t]}function Ga(e,t){var n=yG(e,t);return TG(n)?n:void 0}var _G=Ga(Ii,"WeakMap");const xm=_G;var dT=Object.create,CG=function(){function e(){}return function(t){if(!m1(t))return{};if(dT)return dT(t);e.prototype=t;var n=new e;return e.prototype=void 0,n}}();const SG=CG;function AG(e,t){var n=-1,r=e.length;for(t||(t=Array(r));++n<r;)t[n]=e[n];return t}var bG=function(){try{var e=Ga(Object,"defineProperty");return e({},"",{}),e}catch{}}();const fT=bG;function kG(e,t){for(var n=-1,r=e==null?0:e.length;++n<r&&t(e[n],n,e)!==!1;);return e}var FG=9007199254740991,IG=/^(?:0|[1-9]\d*)$/;function xG(e,t){var n=typeof e;return t=t??FG,!!t&&(n=="number"||n!="symbol"&&IG.test(e))&&e>-1&&e%1==0&&e<t}function k8(e,t,n){t=="__proto__"&&fT?fT(e,t,{configurable:!0,enumerable:!0,value:n,writable:!0}):e[t]=n}function F8(e,t){return e===t||e!==e&&t!==t}var NG=Object.prototype,DG=NG.hasOwnProperty;function I8(e,t,n){var r=e[t];(!(DG.call(e,t)&&F8(r,n))||n===void 0&&!(t in e))&&k8(e,t,n)}function yf(e,t,n,r){var i=!n;n||(n={});for(var o=-1,a=t.length;++o<a;){var s=t[o],l=r?r(n[s],e[s],s,n,e):void 0;l===void 0&&(l=e[s]),i?k8(n,s,l):I8(n,s,l)}return n}var wG=9007199254740991;function x8(e){return typeof e=="number"&&e>-1&&e%1==0&&e<=wG}function _g(e){return e!=null&&x8(e.length)&&!b8(e)}var RG=Object.prototype;function _f(e){var t=e&&e.constructor,n=typeof t=="function"&&t.prototype||RG;return e===n}function OG(e,t){for(var n=-1,r=Array(e);++n<e;)r[n]=t(n);return r}var PG="[object Arguments]";function hT(e){return h1(e)&&f1(e)==PG}var N8=Object.prototype,MG=N8.hasOwnProperty,LG=N8.propertyIsEnumerable,BG=hT(function(){return arguments}())?hT:function(e){return h1(e)&&MG.call(e,"callee")&&!LG.call(e,"callee")};const D8=BG;function HG(){return!1}var w8=typeof or=="object"&&or&&!or.nodeType&&or,mT=w8&&typeof ar=="object"&&ar&&!ar.nodeType&&ar,UG=mT&&mT.exports===w8,pT=UG?Ii.Buffer:void 0,zG=pT?pT.isBuffer:void 0,GG=zG||HG;const Cg=GG;var WG="[object Arguments]",KG="[object Array]",jG="[object Boolean]",$G="[object Date]",VG="[object Error]",YG="[object Function]",qG="[object Map]",QG="[object Number]",XG="[object Object]",ZG="[object RegExp]",JG="[object Set]",eW="[object String]",tW="[object WeakMap]",nW="[object ArrayBuffer]",rW="[object DataView]",iW="[object Float32Array]",oW="[object Float64Array]",aW="[object Int8Array]",sW="[object Int16Array]",lW="[object Int32Array]",uW="[object Uint8Array]",cW="[object Uint8ClampedArray]",dW="[object Uint16Array]",fW="[object Uint32Array]",it={};it[iW]=it[oW]=it[aW]=it[sW]=it[lW]=it[uW]=it[cW]=it[dW]=it[fW]=!0;it[WG]=it[KG]=it[nW]=it[jG]=it[rW]=it[$G]=it[VG]=it[YG]=it[qG]=it[QG]=it[XG]=it[ZG]=it[JG]=it[eW]=it[tW]=!1;function hW(e){return h1(e)&&x8(e.length)&&!!it[f1(e)]}function Sg(e){return function(t){return e(t)}}var R8=typeof or=="object"&&or&&!or.nodeType&&or,ou=R8&&typeof ar=="object"&&ar&&!ar.nodeType&&ar,mW=ou&&ou.exports===R8,o0=mW&&S8.process,pW=function(){try{var e=ou&&ou.require&&ou.require("util").types;return e||o0&&o0.binding&&o0.binding("util")}catch{}}();const $s=pW;var gT=$s&&$s.isTypedArray,gW=gT?Sg(gT):hW;const O8=gW;var EW=Object.prototype,vW=EW.hasOwnProperty;function P8(e,t){var n=Tf(e),r=!n&&D8(e),i=!n&&!r&&Cg(e),o=!n&&!r&&!i&&O8(e),a=n||r||i||o,s=a?OG(e.length,String):[],l=s.length;for(var u in e)(t||vW.call(e,u))&&!(a&&(u=="length"||i&&(u=="offset"||u=="parent")||o&&(u=="buffer"||u=="byteLength"||u=="byteOffset")||xG(u,l)))&&s.push(u);return s}function M8(e,t){return function(n){return e(t(n))}}var TW=M8(Object.keys,Object);const yW=TW;var _W=Object.prototype,CW=_W.hasOwnProperty;function L8(e){if(!_f(e))return yW(e);var t=[];for(var n in Object(e))CW.call(e,n)&&n!="constructor"&&t.push(n);return t}function Ag(e){return _g(e)?P8(e):L8(e)}function SW(e){var t=[];if(e!=null)for(var n in Object(e))t.push(n);return t}var AW=Object.prototype,bW=AW.hasOwnProperty;function kW(e){if(!m1(e))return SW(e);var t=_f(e),n=[];for(var r in e)r=="constructor"&&(t||!bW.call(e,r))||n.push(r);return n}function bg(e){return _g(e)?P8(e,!0):kW(e)}var FW=Ga(Object,"create");const Lu=FW;function IW(){this.__data__=Lu?Lu(null):{},this.size=0}function xW(e){var t=this.has(e)&&delete this.__data__[e];return this.size-=t?1:0,t}var NW="__lodash_hash_undefined__",DW=Object.prototype,wW=DW.hasOwnProperty;function RW(e){var t=this.__data__;if(Lu){var n=t[e];return n===NW?void 0:n}return wW.call(t,e)?t[e]:void 0}var OW=Object.prototype,PW=OW.hasOwnProperty;function MW(e){var t=this.__data__;return Lu?t[e]!==void 0:PW.call(t,e)}var LW="__lodash_hash_undefined__";function BW(e,t){var n=this.__data__;return this.size+=this.has(e)?0:1,n[e]=Lu&&t===void 0?LW:t,this}function wa(e){var t=-1,n=e==null?0:e.length;for(this.clear();++t<n;){var r=e[t];this.set(r[0],r[1])}}wa.prototype.clear=IW;wa.prototype.delete=xW;wa.prototype.get=RW;wa.prototype.has=MW;wa.prototype.set=BW;function HW(){this.__data__=[],this.size=0}function Cf(e,t){for(var n=e.length;n--;)if(F8(e[n][0],t))return n;return-1}var UW=Array.prototype,zW=UW.splice;function GW(e){var t=this.__data__,n=Cf(t,e);if(n<0)return!1;var r=t.length-1;return n==r?t.pop():zW.call(t,n,1),--this.size,!0}function WW(e){var t=this.__data__,n=Cf(t,e);return n<0?void 0:t[n][1]}function KW(e){return Cf(this.__data__,e)>-1}function jW(e,t){var n=this.__data__,r=Cf(n,e);return r<0?(++this.size,n.push([e,t])):n[r][1]=t,this}function oo(e){var t=-1,n=e==null?0:e.length;for(this.clear();++t<n;){var r=e[t];this.set(r[0],r[1])}}oo.prototype.clear=HW;oo.prototype.delete=GW;oo.prototype.get=WW;oo.prototype.has=KW;oo.prototype.set=jW;var $W=Ga(Ii,"Map");const Bu=$W;function VW(){this.size=0,this.__data__={hash:new wa,map:new(Bu||oo),string:new wa}}function YW(e){var t=typeof e;return t=="string"||t=="number"||t=="symbol"||t=="boolean"?e!=="__proto__":e===null}function Sf(e,t){var n=e.__data__;return YW(t)?n[typeof t=="string"?"string":"hash"]:n.map}function qW(e){var t=Sf(this,e).delete(e);return this.size-=t?1:0,t}function QW(e){return Sf(this,e).get(e)}function XW(e){return Sf(this,e).has(e)}function ZW(e,t){var n=Sf(this,e),r=n.size;return n.set(e,t),this.size+=n.size==r?0:1,this}function ol(e){var t=-1,n=e==null?0:e.length;for(this.clear();++t<n;){var r=e[t];this.set(r[0],r[1])}}ol.prototype.clear=VW;ol.prototype.delete=qW;ol.prototype.get=QW;ol.prototype.has=XW;ol.prototype.set=ZW;function B8(e,t){for(var n=-1,r=t.length,i=e.length;++n<r;)e[i+n]=t[n];return e}var JW=M8(Object.getPrototypeOf,Object);const H8=JW;function eK(){this.__data__=new oo,this.size=0}function tK(e){var t=this.__data__,n=t.delete(e);return this.size=t.size,n}function nK(e){return this.__data__.get(e)}function rK(e){return this.__data__.has(e)}var iK=200;function oK(e,t){var n=this.__data__;if(n instanceof oo){var r=n.__data__;if(!Bu||r.length<iK-1)return r.push([e,t]),this.size=++n.size,this;n=this.__data__=new ol(r)}return n.set(e,t),this.size=n.size,this}function al(e){var t=this.__data__=new oo(e);this.size=t.size}al.prototype.clear=eK;al.prototype.delete=tK;al.prototype.get=nK;al.prototype.has=rK;al.prototype.set=oK;function aK(e,t){return e&&yf(t,Ag(t),e)}function sK(e,t){return e&&yf(t,bg(t),e)}var U8=typeof or=="object"&&or&&!or.nodeType&&or,ET=U8&&typeof ar=="object"&&ar&&!ar.nodeType&&ar,lK=ET&&ET.exports===U8,vT=lK?Ii.Buffer:void 0,TT=vT?vT.allocUnsafe:void 0;function uK(e,t){if(t)return e.slice();var n=e.length,r=TT?TT(n):new e.constructor(n);return e.copy(r),r}function cK(e,t){for(var n=-1,r=e==null?0:e.length,i=0,o=[];++n<r;){var a=e[n];t(a,n,e)&&(o[i++]=a)}return o}function z8(){return[]}var dK=Object.prototype,fK=dK.propertyIsEnumerable,yT=Object.getOwnPropertySymbols,hK=yT?function(e){return e==null?[]:(e=Object(e),cK(yT(e),function(t){return fK.call(e,t)}))}:z8;const kg=hK;function mK(e,t){return yf(e,kg(e),t)}var pK=Object.getOwnPropertySymbols,gK=pK?function(e){for(var t=[];e;)B8(t,kg(e)),e=H8(e);return t}:z8;const G8=gK;function EK(e,t){return yf(e,G8(e),t)}function W8(e,t,n){var r=t(e);return Tf(e)?r:B8(r,n(e))}function vK(e){return W8(e,Ag,kg)}function TK(e){return W8(e,bg,G8)}var yK=Ga(Ii,"DataView");const Nm=yK;var _K=Ga(Ii,"Promise");const Dm=_K;var CK=Ga(Ii,"Set");const wm=CK;var _T="[object Map]",SK="[object Object]",CT="[object Promise]",ST="[object Set]",AT="[object WeakMap]",bT="[object DataView]",AK=za(Nm),bK=za(Bu),kK=za(Dm),FK=za(wm),IK=za(xm),ca=f1;(Nm&&ca(new Nm(new ArrayBuffer(1)))!=bT||Bu&&ca(new Bu)!=_T||Dm&&ca(Dm.resolve())!=CT||wm&&ca(new wm)!=ST||xm&&ca(new xm)!=AT)&&(ca=function(e){var t=f1(e),n=t==SK?e.constructor:void 0,r=n?za(n):"";if(r)switch(r){case AK:return bT;case bK:return _T;case kK:return CT;case FK:return ST;case IK:return AT}return t});const Af=ca;var xK=Object.prototype,NK=xK.hasOwnProperty;function DK(e){var t=e.length,n=new e.constructor(t);return t&&typeof e[0]=="string"&&NK.call(e,"index")&&(n.index=e.index,n.input=e.input),n}var wK=Ii.Uint8Array;const kT=wK;function Fg(e){var t=new e.constructor(e.byteLength);return new kT(t).set(new kT(e)),t}function RK(e,t){var n=t?Fg(e.buffer):e.buffer;return new e.constructor(n,e.byteOffset,e.byteLength)}var OK=/\w*$/;function PK(e){var t=new e.constructor(e.source,OK.exec(e));return t.lastIndex=e.lastIndex,t}var FT=js?js.prototype:void 0,IT=FT?FT.valueOf:void 0;function MK(e){return IT?Object(IT.call(e)):{}}function LK(e,t){var n=t?Fg(e.buffer):e.buffer;return new e.constructor(n,e.byteOffset,e.length)}var BK="[object Boolean]",HK="[object Date]",UK="[object Map]",zK="[object Number]",GK="[object RegExp]",WK="[object Set]",KK="[object String]",jK="[object Symbol]",$K="[object ArrayBuffer]",VK="[object DataView]",YK="[object Float32Array]",qK="[object Float64Array]",QK="[object Int8Array]",XK="[object Int16Array]",ZK="[object Int32Array]",JK="[object Uint8Array]",ej="[object Uint8ClampedArray]",tj="[object Uint16Array]",nj="[object Uint32Array]";function rj(e,t,n){var r=e.constructor;switch(t){case $K:return Fg(e);case BK:case HK:return new r(+e);case VK:return RK(e,n);case YK:case qK:case QK:case XK:case ZK:case JK:case ej:case tj:case nj:return LK(e,n);case UK:return new r;case zK:case KK:return new r(e);case GK:return PK(e);case WK:return new r;case jK:return MK(e)}}function ij(e){return typeof e.constructor=="function"&&!_f(e)?SG(H8(e)):{}}var oj="[object Map]";function aj(e){return h1(e)&&Af(e)==oj}var xT=$s&&$s.isMap,sj=xT?Sg(xT):aj;const lj=sj;var uj="[object Set]";function cj(e){return h1(e)&&Af(e)==uj}var NT=$s&&$s.isSet,dj=NT?Sg(NT):cj;const fj=dj;var hj=1,mj=2,pj=4,K8="[object Arguments]",gj="[object Array]",Ej="[object Boolean]",vj="[object Date]",Tj="[object Error]",j8="[object Function]",yj="[object GeneratorFunction]",_j="[object Map]",Cj="[object Number]",$8="[object Object]",Sj="[object RegExp]",Aj="[object Set]",bj="[object String]",kj="[object Symbol]",Fj="[object WeakMap]",Ij="[object ArrayBuffer]",xj="[object DataView]",Nj="[object Float32Array]",Dj="[object Float64Array]",wj="[object Int8Array]",Rj="[object Int16Array]",Oj="[object Int32Array]",Pj="[object Uint8Array]",Mj="[object Uint8ClampedArray]",Lj="[object Uint16Array]",Bj="[object Uint32Array]",Xe={};Xe[K8]=Xe[gj]=Xe[Ij]=Xe[xj]=Xe[Ej]=Xe[vj]=Xe[Nj]=Xe[Dj]=Xe[wj]=Xe[Rj]=Xe[Oj]=Xe[_j]=Xe[Cj]=Xe[$8]=Xe[Sj]=Xe[Aj]=Xe[bj]=Xe[kj]=Xe[Pj]=Xe[Mj]=Xe[Lj]=Xe[Bj]=!0;Xe[Tj]=Xe[j8]=Xe[Fj]=!1;function Pc(e,t,n,r,i,o){var a,s=t&hj,l=t&mj,u=t&pj;if(n&&(a=i?n(e,r,i,o):n(e)),a!==void 0)return a;if(!m1(e))return e;var c=Tf(e);if(c){if(a=DK(e),!s)return AG(e,a)}else{var d=Af(e),f=d==j8||d==yj;if(Cg(e))return uK(e,s);if(d==$8||d==K8||f&&!i){if(a=l||f?{}:ij(e),!s)return l?EK(e,sK(a,e)):mK(e,aK(a,e))}else{if(!Xe[d])return i?e:{};a=rj(e,d,s)}}o||(o=new al);var p=o.get(e);if(p)return p;o.set(e,a),fj(e)?e.forEach(function(_){a.add(Pc(_,t,n,_,e,o))}):lj(e)&&e.forEach(function(_,m){a.set(m,Pc(_,t,n,m,e,o))});var h=u?l?TK:vK:l?bg:Ag,v=c?void 0:h(e);return kG(v||e,function(_,m){v&&(m=_,_=e[m]),I8(a,m,Pc(_,t,n,m,e,o))}),a}var Hj=1,Uj=4;function zj(e){return Pc(e,Hj|Uj)}var Gj="[object Map]",Wj="[object Set]",Kj=Object.prototype,jj=Kj.hasOwnProperty;function Dl(e){if(e==null)return!0;if(_g(e)&&(Tf(e)||typeof e=="string"||typeof e.splice=="function"||Cg(e)||O8(e)||D8(e)))return!e.length;var t=Af(e);if(t==Gj||t==Wj)return!e.size;if(_f(e))return!L8(e).length;for(var n in e)if(jj.call(e,n))return!1;return!0}const $j="_container_13vey_1",Vj="_chatRoot_13vey_8",Yj="_chatContainer_13vey_18",qj="_chatEmptyState_13vey_30",Qj="_chatEmptyStateTitle_13vey_38",Xj="_chatEmptyStateSubtitle_13vey_50",Zj="_chatIcon_13vey_63",Jj="_chatMessageStream_13vey_68",e$="_chatMessageUser_13vey_80",t$="_chatMessageUserMessage_13vey_86",n$="_chatMessageGpt_13vey_104",r$="_chatMessageError_13vey_110",i$="_chatMessageErrorContent_13vey_122",o$="_chatInput_13vey_134",a$="_clearChatBroom_13vey_147",s$="_clearChatBroomNoCosmos_13vey_163",l$="_newChatIcon_13vey_179",u$="_stopGeneratingContainer_13vey_195",c$="_stopGeneratingIcon_13vey_212",d$="_stopGeneratingText_13vey_218",f$="_citationPanel_13vey_233",h$="_citationPanelHeaderContainer_13vey_251",m$="_citationPanelHeader_13vey_251",p$="_citationPanelDismiss_13vey_266",g$="_citationPanelTitle_13vey_277",E$="_citationPanelContent_13vey_292",v$="_viewSourceButton_13vey_309",Ie={container:$j,chatRoot:Vj,chatContainer:Yj,chatEmptyState:qj,chatEmptyStateTitle:Qj,chatEmptyStateSubtitle:Xj,chatIcon:Zj,chatMessageStream:Jj,chatMessageUser:e$,chatMessageUserMessage:t$,chatMessageGpt:n$,chatMessageError:r$,chatMessageErrorContent:i$,chatInput:o$,clearChatBroom:a$,clearChatBroomNoCosmos:s$,newChatIcon:l$,stopGeneratingContainer:u$,stopGeneratingIcon:c$,stopGeneratingText:d$,citationPanel:f$,citationPanelHeaderContainer:h$,citationPanelHeader:m$,citationPanelDismiss:p$,citationPanelTitle:g$,citationPanelContent:E$,viewSourceButton:v$},T$="_answerContainer_1xeyy_1",y$="_answerText_1xeyy_12",_$="_answerHeader_1xeyy_29",C$="_answerFooter_1xeyy_33",S$="_answerDisclaimerContainer_1xeyy_42",A$="_answerDisclaimer_1xeyy_42",b$="_citationContainer_1xeyy_62",k$="_citation_1xeyy_62",F$="_accordionIcon_1xeyy_112",I$="_accordionTitle_1xeyy_127",x$="_clickableSup_1xeyy_143",li={answerContainer:T$,answerText:y$,answerHeader:_$,answerFooter:C$,answerDisclaimerContainer:S$,answerDisclaimer:A$,citationContainer:b$,citation:k$,accordionIcon:F$,accordionTitle:I$,clickableSup:x$};function N$(e){let t=e.answer;const n=t.match(/\[(doc\d\d?\d?)]/g),r=4;let i=[],o=0;return n==null||n.forEach(a=>{let s=a.slice(r,a.length-1),l=zj(e.citations[Number(s)-1]);!i.find(u=>u.id===s)&&l&&(t=t.replaceAll(a,` ^${++o}^ `),l.id=s,l.reindex_id=o.toString(),i.push(l))}),{citations:i,markdownFormatText:t}}function D$(){return e=>{Ks(e,["text"],(t,n,r)=>{if(t.type!=="text")return;const{value:i}=t,o=i.split(/\^/);if(o.length===1||o.length%2===0)return;const a=o.map((s,l)=>l%2===0?{type:"text",value:s}:{type:"superscript",data:{hName:"sup"},children:[{type:"text",value:s}]});r.children.splice(n,1,...a)}),Ks(e,["text"],(t,n,r)=>{if(t.type!=="text")return;const{value:i}=t,o=i.split(/\~/);if(o.length===1||o.length%2===0)return;const a=o.map((s,l)=>l%2===0?{type:"text",value:s}:{type:"subscript",data:{hName:"sub"},children:[{type:"text",value:s}]});r.children.splice(n,1,...a)})}}const DT=({answer:e,onCitationClicked:t})=>{var O;const n=U=>{if(U.message_id!=null&&U.feedback!=null)return Object.values(Ae).includes(U.feedback)?U.feedback:Ae.Neutral},[r,{toggle:i}]=qu(!1),o=50,a=E.useMemo(()=>N$(e),[e]),[s,l]=E.useState(r),[u,c]=E.useState(n(e)),[d,f]=E.useState(!1),[p,h]=E.useState(!1),[v,_]=E.useState([]),m=E.useContext(qo),T=(O=m==null?void 0:m.state.frontendSettings)==null?void 0:O.feedback_enabled,y=()=>{l(!s),i()};E.useEffect(()=>{l(r)},[r]),E.useEffect(()=>{if(e.message_id==null)return;let U;m!=null&&m.state.feedbackState&&(m!=null&&m.state.feedbackState[e.message_id])?U=m==null?void 0:m.state.feedbackState[e.message_id]:U=n(e),c(U)},[m==null?void 0:m.state.feedbackState,u,e.message_id]);const C=(U,K,B=!1)=>{let z="";if(U.filepath&&U.chunk_id)if(B&&U.filepath.length>o){const J=U.filepath.length;z=`${U.filepath.substring(0,20)}...${U.filepath.substring(J-20)} - Part ${parseInt(U.chunk_id)+1}`}else z=`${U.filepath} - Part ${parseInt(U.chunk_id)+1}`;else U.filepath&&U.reindex_id?z=`${U.filepath} - Part ${U.reindex_id}`:z=`Citation ${K}`;return z},k=async()=>{if(e.message_id==null)return;let U=u;u==Ae.Positive?U=Ae.Neutral:U=Ae.Positive,m==null||m.dispatch({type:"SET_FEEDBACK_STATE",payload:{answerId:e.message_id,feedback:U}}),c(U),await Fh(e.message_id,U)},A=async()=>{if(e.message_id==null)return;let U=u;u===void 0||u===Ae.Neutral||u===Ae.Positive?(U=Ae.Negative,c(U),f(!0)):(U=Ae.Neutral,c(U),await Fh(e.message_id,Ae.Neutral)),m==null||m.dispatch({type:"SET_FEEDBACK_STATE",payload:{answerId:e.message_id,feedback:U}})},S=(U,K)=>{var J;if(e.message_id==null)return;let B=(J=U==null?void 0:U.target)==null?void 0:J.id,z=v.slice();K?z.push(B):z=z.filter(P=>P!==B),_(z)},D=async()=>{e.message_id!=null&&(await Fh(e.message_id,v.join(",")),R())},R=()=>{f(!1),h(!1),_([])},F=()=>le($i,{children:[M("div",{children:"Why wasn't this response helpful?"}),le(de,{tokens:{childrenGap:4},children:[M(ai,{label:"Citations are missing",id:Ae.MissingCitation,defaultChecked:v.includes(Ae.MissingCitation),onChange:S}),M(ai,{label:"Citations are wrong",id:Ae.WrongCitation,defaultChecked:v.includes(Ae.WrongCitation),onChange:S}),M(ai,{label:"The response is not from my data",id:Ae.OutOfScope,defaultChecked:v.includes(Ae.OutOfScope),onChange:S}),M(ai,{label:"Inaccurate or irrelevant",id:Ae.InaccurateOrIrrelevant,defaultChecked:v.includes(Ae.InaccurateOrIrrelevant),onChange:S}),M(ai,{label:"Other",id:Ae.OtherUnhelpful,defaultChecked:v.includes(Ae.OtherUnhelpful),onChange:S})]}),M("div",{onClick:()=>h(!0),style:{color:"#115EA3",cursor:"pointer"},children:"Report inappropriate content"})]}),L=()=>le($i,{children:[le("div",{children:["The content is ",M("span",{style:{color:"red"},children:"*"})]}),le(de,{tokens:{childrenGap:4},children:[M(ai,{label:"Hate speech, stereotyping, demeaning",id:Ae.HateSpeech,defaultChecked:v.includes(Ae.HateSpeech),onChange:S}),M(ai,{label:"Violent: glorification of violence, self-harm",id:Ae.Violent,defaultChecked:v.includes(Ae.Violent),onChange:S}),M(ai,{label:"Sexual: explicit content, grooming",id:Ae.Sexual,defaultChecked:v.includes(Ae.Sexual),onChange:S}),M(ai,{label:"Manipulative: devious, emotional, pushy, bullying",defaultChecked:v.includes(Ae.Manipulative),id:Ae.Manipulative,onChange:S}),M(ai,{label:"Other",id:Ae.OtherHarmful,defaultChecked:v.includes(Ae.OtherHarmful),onChange:S})]})]});return le($i,{children:[le(de,{className:li.answerContainer,tabIndex:0,children:[M(de.Item,{children:le(de,{horizontal:!0,grow:!0,children:[M(de.Item,{grow:!0,children:M(cf,{linkTarget:"_blank",remarkPlugins:[KC,D$],children:a.markdownFormatText,className:li.answerText})}),M(de.Item,{className:li.answerHeader,children:T&&e.message_id!==void 0&&le(de,{horizontal:!0,horizontalAlign:"space-between",children:[M(dw,{"aria-hidden":"false","aria-label":"Like this response",onClick:()=>k(),style:u===Ae.Positive||(m==null?void 0:m.state.feedbackState[e.message_id])===Ae.Positive?{color:"darkgreen",cursor:"pointer"}:{color:"slategray",cursor:"pointer"}}),M(uw,{"aria-hidden":"false","aria-label":"Dislike this response",onClick:()=>A(),style:u!==Ae.Positive&&u!==Ae.Neutral&&u!==void 0?{color:"darkred",cursor:"pointer"}:{color:"slategray",cursor:"pointer"}})]})})]})}),le(de,{horizontal:!0,className:li.answerFooter,children:[!!a.citations.length&&M(de.Item,{onKeyDown:U=>U.key==="Enter"||U.key===" "?i():null,children:M(de,{style:{width:"100%"},children:le(de,{horizontal:!0,horizontalAlign:"start",verticalAlign:"center",children:[M(No,{className:li.accordionTitle,onClick:i,"aria-label":"Open references",tabIndex:0,role:"button",children:M("span",{children:a.citations.length>1?a.citations.length+" references":"1 reference"})}),M(Td,{className:li.accordionIcon,onClick:y,iconName:s?"ChevronDown":"ChevronRight"})]})})}),M(de.Item,{className:li.answerDisclaimerContainer,children:M("span",{className:li.answerDisclaimer,children:"AI-generated content may be incorrect"})})]}),s&&M("div",{style:{marginTop:8,display:"flex",flexFlow:"wrap column",maxHeight:"150px",gap:"4px"},children:a.citations.map((U,K)=>le("span",{title:C(U,++K),tabIndex:0,role:"link",onClick:()=>t(U),onKeyDown:B=>B.key==="Enter"||B.key===" "?t(U):null,className:li.citationContainer,"aria-label":C(U,K),children:[M("div",{className:li.citation,children:K}),C(U,K,!0)]},K))})]}),M(el,{onDismiss:()=>{R(),c(Ae.Neutral)},hidden:!d,styles:{main:[{selectors:{["@media (min-width: 480px)"]:{maxWidth:"600px",background:"#FFFFFF",boxShadow:"0px 14px 28.8px rgba(0, 0, 0, 0.24), 0px 0px 8px rgba(0, 0, 0, 0.2)",borderRadius:"8px",maxHeight:"600px",minHeight:"100px"}}}]},dialogContentProps:{title:"Submit Feedback",showCloseButton:!0},children:le(de,{tokens:{childrenGap:4},children:[M("div",{children:"Your feedback will improve this experience."}),p?M(L,{}):M(F,{}),M("div",{children:"By pressing submit, your feedback will be visible to the application owner."}),M(Xu,{disabled:v.length<1,onClick:D,children:"Submit"})]})})]})},w$="/assets/Send-d0601aaa.svg",R$="_questionInputContainer_pe9s7_1",O$="_questionInputTextArea_pe9s7_13",P$="_questionInputSendButtonContainer_pe9s7_22",M$="_questionInputSendButton_pe9s7_22",L$="_questionInputSendButtonDisabled_pe9s7_33",B$="_questionInputBottomBorder_pe9s7_41",H$="_questionInputOptionsButton_pe9s7_52",Ja={questionInputContainer:R$,questionInputTextArea:O$,questionInputSendButtonContainer:P$,questionInputSendButton:M$,questionInputSendButtonDisabled:L$,questionInputBottomBorder:B$,questionInputOptionsButton:H$},U$=({onSend:e,disabled:t,placeholder:n,clearOnSend:r,conversationId:i})=>{const[o,a]=E.useState(""),s=()=>{t||!o.trim()||(i?e(o,i):e(o),r&&a(""))},l=d=>{d.key==="Enter"&&!d.shiftKey&&(d.preventDefault(),s())},u=(d,f)=>{a(f||"")},c=t||!o.trim();return le(de,{horizontal:!0,className:Ja.questionInputContainer,children:[M(qp,{className:Ja.questionInputTextArea,placeholder:n,multiline:!0,resizable:!1,borderless:!0,value:o,onChange:u,onKeyDown:l}),M("div",{className:Ja.questionInputSendButtonContainer,role:"button",tabIndex:0,"aria-label":"Ask question button",onClick:s,onKeyDown:d=>d.key==="Enter"||d.key===" "?s():null,children:c?M(rw,{className:Ja.questionInputSendButtonDisabled}):M("img",{src:w$,className:Ja.questionInputSendButton})}),M("div",{className:Ja.questionInputBottomBorder})]})},z$="_container_1qjpx_1",G$="_listContainer_1qjpx_7",W$="_itemCell_1qjpx_12",K$="_itemButton_1qjpx_29",j$="_chatGroup_1qjpx_46",$$="_spinnerContainer_1qjpx_51",V$="_chatList_1qjpx_58",Y$="_chatMonth_1qjpx_62",q$="_chatTitle_1qjpx_69",_r={container:z$,listContainer:G$,itemCell:W$,itemButton:K$,chatGroup:j$,spinnerContainer:$$,chatList:V$,chatMonth:Y$,chatTitle:q$},Q$=e=>{const n=new Date().getFullYear(),[r,i]=e.split(" ");return parseInt(i)===n?r:e},X$=({item:e,onSelect:t})=>{var B,z,J;const[n,r]=E.useState(!1),[i,o]=E.useState(!1),[a,s]=E.useState(""),[l,{toggle:u}]=qu(!0),[c,d]=E.useState(!1),[f,p]=E.useState(!1),[h,v]=E.useState(void 0),[_,m]=E.useState(!1),T=E.useRef(null),y=E.useContext(qo),C=(e==null?void 0:e.id)===((B=y==null?void 0:y.state.currentChat)==null?void 0:B.id),k={type:vi.close,title:"Are you sure you want to delete this item?",closeButtonAriaLabel:"Close",subText:"The history of this chat session will permanently removed."},A={titleAriaId:"labelId",subtitleAriaId:"subTextId",isBlocking:!0,styles:{main:{maxWidth:450}}};if(!e)return null;E.useEffect(()=>{_&&T.current&&(T.current.focus(),m(!1))},[_]),E.useEffect(()=>{var P;((P=y==null?void 0:y.state.currentChat)==null?void 0:P.id)!==(e==null?void 0:e.id)&&(o(!1),s(""))},[(z=y==null?void 0:y.state.currentChat)==null?void 0:z.id,e==null?void 0:e.id]);const S=async()=>{(await Tw(e.id)).ok?y==null||y.dispatch({type:"DELETE_CHAT_ENTRY",payload:e.id}):(d(!0),setTimeout(()=>{d(!1)},5e3)),u()},D=()=>{o(!0),m(!0),s(e==null?void 0:e.title)},R=()=>{t(e),y==null||y.dispatch({type:"UPDATE_CURRENT_CHAT",payload:e})},F=((J=e==null?void 0:e.title)==null?void 0:J.length)>28?`${e.title.substring(0,28)} ...`:e.title,L=async P=>{if(P.preventDefault(),h||f)return;if(a==e.title){v("Error: Enter a new title to proceed."),setTimeout(()=>{v(void 0),m(!0),T.current&&T.current.focus()},5e3);return}p(!0),(await Cw(e.id,a)).ok?(p(!1),o(!1),y==null||y.dispatch({type:"UPDATE_CHAT_TITLE",payload:{...e,title:a}}),s("")):(v("Error: could not rename item"),setTimeout(()=>{m(!0),v(void 0),T.current&&T.current.focus()},5e3))},O=P=>{s(P.target.value)},U=()=>{o(!1),s("")},K=P=>{if(P.key==="Enter")return L(P);if(P.key==="Escape"){U();return}};return le(de,{tabIndex:0,"aria-label":"chat history item",className:_r.itemCell,onClick:()=>R(),onKeyDown:P=>P.key==="Enter"||P.key===" "?R():null,verticalAlign:"center",onMouseEnter:()=>r(!0),onMouseLeave:()=>r(!1),styles:{root:{backgroundColor:C?"#e6e6e6":"transparent"}},children:[i?M($i,{children:M(de.Item,{style:{width:"100%"},children:le("form",{"aria-label":"edit title form",onSubmit:P=>L(P),style:{padding:"5px 0px"},children:[le(de,{horizontal:!0,verticalAlign:"start",children:[M(de.Item,{children:M(qp,{componentRef:T,autoFocus:_,value:a,placeholder:e.title,onChange:O,onKeyDown:K,disabled:!!h})}),a&&M(de.Item,{children:le(de,{"aria-label":"action button group",horizontal:!0,verticalAlign:"center",children:[M(va,{role:"button",disabled:h!==void 0,onKeyDown:P=>P.key===" "||P.key==="Enter"?L(P):null,onClick:P=>L(P),"aria-label":"confirm new title",iconProps:{iconName:"CheckMark"},styles:{root:{color:"green",marginLeft:"5px"}}}),M(va,{role:"button",disabled:h!==void 0,onKeyDown:P=>P.key===" "||P.key==="Enter"?U():null,onClick:()=>U(),"aria-label":"cancel edit title",iconProps:{iconName:"Cancel"},styles:{root:{color:"red",marginLeft:"5px"}}})]})})]}),h&&M(No,{role:"alert","aria-label":h,style:{fontSize:12,fontWeight:400,color:"rgb(164,38,44)"},children:h})]})})}):M($i,{children:le(de,{horizontal:!0,verticalAlign:"center",style:{width:"100%"},children:[M("div",{className:_r.chatTitle,children:F}),(C||n)&&le(de,{horizontal:!0,horizontalAlign:"end",children:[M(va,{className:_r.itemButton,iconProps:{iconName:"Delete"},title:"Delete",onClick:u,onKeyDown:P=>P.key===" "?u():null}),M(va,{className:_r.itemButton,iconProps:{iconName:"Edit"},title:"Edit",onClick:D,onKeyDown:P=>P.key===" "?D():null})]})]})}),c&&M(No,{styles:{root:{color:"red",marginTop:5,fontSize:14}},children:"Error: could not delete item"}),M(el,{hidden:l,onDismiss:u,dialogContentProps:k,modalProps:A,children:le(Qp,{children:[M(T2,{onClick:S,text:"Delete"}),M(Xu,{onClick:u,text:"Cancel"})]})})]},e.id)},Z$=({groupedChatHistory:e})=>{const t=E.useContext(qo),n=E.useRef(null),[,r]=E.useState(null),[i,o]=E.useState(25),[a,s]=E.useState(0),[l,u]=E.useState(!1),c=E.useRef(!0),d=h=>{h&&r(h)},f=h=>M(X$,{item:h,onSelect:()=>d(h)});E.useEffect(()=>{if(c.current){c.current=!1;return}p(),o(h=>h+=25)},[a]);const p=async()=>{const h=t==null?void 0:t.state.chatHistory;u(!0),await O2(i).then(v=>{const _=h&&v&&h.concat(...v);return v?t==null||t.dispatch({type:"FETCH_CHAT_HISTORY",payload:_||v}):t==null||t.dispatch({type:"FETCH_CHAT_HISTORY",payload:null}),u(!1),v})};return E.useEffect(()=>{const h=new IntersectionObserver(v=>{v[0].isIntersecting&&s(_=>_+=1)},{threshold:1});return n.current&&h.observe(n.current),()=>{n.current&&h.unobserve(n.current)}},[n]),le("div",{className:_r.listContainer,"data-is-scrollable":!0,children:[e.map(h=>h.entries.length>0&&le(de,{horizontalAlign:"start",verticalAlign:"center",className:_r.chatGroup,"aria-label":`chat history group: ${h.month}`,children:[M(de,{"aria-label":h.month,className:_r.chatMonth,children:Q$(h.month)}),M(jx,{"aria-label":"chat history list",items:h.entries,onRenderCell:f,className:_r.chatList}),M("div",{ref:n}),M(k2,{styles:{root:{width:"100%",position:"relative","::before":{backgroundColor:"#d6d6d6"}}}})]},h.month)),l&&M("div",{className:_r.spinnerContainer,children:M(C2,{size:$r.small,"aria-label":"loading more chat history",className:_r.spinner})})]})},J$=e=>{const t=[{month:"Recent",entries:[]}],n=new Date;return e.forEach(r=>{const i=new Date(r.date),o=(n.getTime()-i.getTime())/(1e3*60*60*24),a=i.toLocaleString("default",{month:"long",year:"numeric"}),s=t.find(l=>l.month===a);o<=7?t[0].entries.push(r):s?s.entries.push(r):t.push({month:a,entries:[r]})}),t.sort((r,i)=>{if(r.entries.length===0&&i.entries.length===0)return 0;if(r.entries.length===0)return 1;if(i.entries.length===0)return-1;const o=new Date(r.entries[0].date);return new Date(i.entries[0].date).getTime()-o.getTime()}),t.forEach(r=>{r.entries.sort((i,o)=>{const a=new Date(i.date);return new Date(o.date).getTime()-a.getTime()})}),t},eV=()=>{const e=E.useContext(qo),t=e==null?void 0:e.state.chatHistory;Tn.useEffect(()=>{},[e==null?void 0:e.state.chatHistory]);let n;if(t&&t.length>0)n=J$(t);else return M(de,{horizontal:!0,horizontalAlign:"center",verticalAlign:"center",style:{width:"100%",marginTop:10},children:M(ko,{children:M(No,{style:{alignSelf:"center",fontWeight:"400",fontSize:14},children:M("span",{children:"No chat history."})})})});return M(Z$,{groupedChatHistory:n})},wT={root:{padding:"0",display:"flex",justifyContent:"center",backgroundColor:"transparent"}},tV={root:{height:"50px"}};function nV(e){var T,y,C;const t=E.useContext(qo),[n,r]=Tn.useState(!1),[i,{toggle:o}]=qu(!0),[a,s]=Tn.useState(!1),[l,u]=Tn.useState(!1),c={type:vi.close,title:l?"Error deleting all of chat history":"Are you sure you want to clear all chat history?",closeButtonAriaLabel:"Close",subText:l?"Please try again. If the problem persists, please contact the site administrator.":"All chat history will be permanently removed."},d={titleAriaId:"labelId",subtitleAriaId:"subTextId",isBlocking:!0,styles:{main:{maxWidth:450}}},f=[{key:"clearAll",text:"Clear all chat history",iconProps:{iconName:"Delete"}}],p=()=>{t==null||t.dispatch({type:"TOGGLE_CHAT_HISTORY"})},h=Tn.useCallback(k=>{k.preventDefault(),r(!0)},[]),v=Tn.useCallback(()=>r(!1),[]),_=async()=>{s(!0),(await yw()).ok?(t==null||t.dispatch({type:"DELETE_CHAT_HISTORY"}),o()):u(!0),s(!1)},m=()=>{o(),setTimeout(()=>{u(!1)},2e3)};return Tn.useEffect(()=>{},[t==null?void 0:t.state.chatHistory,l]),le("section",{className:_r.container,"data-is-scrollable":!0,"aria-label":"chat history panel",children:[le(de,{horizontal:!0,horizontalAlign:"space-between",verticalAlign:"center",wrap:!0,"aria-label":"chat history header",children:[M(ko,{children:M(No,{role:"heading","aria-level":2,style:{alignSelf:"center",fontWeight:"600",fontSize:"18px",marginRight:"auto",paddingLeft:"20px"},children:"Chat history"})}),M(de,{verticalAlign:"start",children:le(de,{horizontal:!0,styles:tV,children:[M(Ou,{iconProps:{iconName:"More"},title:"Clear all chat history",onClick:h,"aria-label":"clear all chat history",styles:wT,role:"button",id:"moreButton"}),M(yd,{items:f,hidden:!n,target:"#moreButton",onItemClick:o,onDismiss:v}),M(Ou,{iconProps:{iconName:"Cancel"},title:"Hide",onClick:p,"aria-label":"hide button",styles:wT,role:"button"})]})})]}),M(de,{"aria-label":"chat history panel content",styles:{root:{display:"flex",flexGrow:1,flexDirection:"column",paddingTop:"2.5px",maxWidth:"100%"}},style:{display:"flex",flexGrow:1,flexDirection:"column",flexWrap:"wrap",padding:"1px"},children:le(de,{className:_r.chatHistoryListContainer,children:[(t==null?void 0:t.state.chatHistoryLoadingState)===vn.Success&&(t==null?void 0:t.state.isCosmosDBAvailable.cosmosDB)&&M(eV,{}),(t==null?void 0:t.state.chatHistoryLoadingState)===vn.Fail&&(t==null?void 0:t.state.isCosmosDBAvailable)&&M($i,{children:M(de,{children:le(de,{horizontalAlign:"center",verticalAlign:"center",style:{width:"100%",marginTop:10},children:[M(ko,{children:le(No,{style:{alignSelf:"center",fontWeight:"400",fontSize:16},children:[((T=t==null?void 0:t.state.isCosmosDBAvailable)==null?void 0:T.status)&&M("span",{children:(y=t==null?void 0:t.state.isCosmosDBAvailable)==null?void 0:y.status}),!((C=t==null?void 0:t.state.isCosmosDBAvailable)!=null&&C.status)&&M("span",{children:"Error loading chat history"})]})}),M(ko,{children:M(No,{style:{alignSelf:"center",fontWeight:"400",fontSize:14},children:M("span",{children:"Chat history can't be saved at this time"})})})]})})}),(t==null?void 0:t.state.chatHistoryLoadingState)===vn.Loading&&M($i,{children:M(de,{children:le(de,{horizontal:!0,horizontalAlign:"center",verticalAlign:"center",style:{width:"100%",marginTop:10},children:[M(ko,{style:{justifyContent:"center",alignItems:"center"},children:M(C2,{style:{alignSelf:"flex-start",height:"100%",marginRight:"5px"},size:$r.medium})}),M(ko,{children:M(No,{style:{alignSelf:"center",fontWeight:"400",fontSize:14},children:M("span",{style:{whiteSpace:"pre-wrap"},children:"Loading chat history"})})})]})})})]})}),M(el,{hidden:i,onDismiss:a?()=>{}:m,dialogContentProps:c,modalProps:d,children:le(Qp,{children:[!l&&M(T2,{onClick:_,disabled:a,text:"Clear All"}),M(Xu,{onClick:m,disabled:a,text:l?"Close":"Cancel"})]})})]})}const rV=()=>{var Ft,St,ut,jt,Nn,Yn,Rr;const e=E.useContext(qo),t=(Ft=e==null?void 0:e.state.frontendSettings)==null?void 0:Ft.auth_enabled,n=E.useRef(null),[r,i]=E.useState(!1),[o,a]=E.useState(!1),[s,l]=E.useState(),[u,c]=E.useState(!1),d=E.useRef([]),[f,p]=E.useState(!0),[h,v]=E.useState([]),[_,m]=E.useState("Not Running"),[T,y]=E.useState(!1),[C,{toggle:k}]=qu(!0),[A,S]=E.useState(),D={type:vi.close,title:A==null?void 0:A.title,closeButtonAriaLabel:"Close",subText:A==null?void 0:A.subtitle},R={titleAriaId:"labelId",subtitleAriaId:"subTextId",isBlocking:!0,styles:{main:{maxWidth:450}}},[F,L,O]=["assistant","tool","error"];E.useEffect(()=>{var re;if(((re=e==null?void 0:e.state.isCosmosDBAvailable)==null?void 0:re.status)===zn.NotWorking&&e.state.chatHistoryLoadingState===vn.Fail&&C){let me=`${e.state.isCosmosDBAvailable.status}. Please contact the site administrator.`;S({title:"Chat history is not enabled",subtitle:me}),k()}},[e==null?void 0:e.state.isCosmosDBAvailable]);const U=()=>{k(),setTimeout(()=>{S(null)},500)};E.useEffect(()=>{i((e==null?void 0:e.state.chatHistoryLoadingState)===vn.Loading)},[e==null?void 0:e.state.chatHistoryLoadingState]);const K=async()=>{if(!t){p(!1);return}(await gw()).length===0&&window.location.hostname!=="127.0.0.1"?p(!0):p(!1)};let B={},z={},J="";const P=(re,me,ue)=>{re.role===F&&(J+=re.content,B=re,B.content=J),re.role===L&&(z=re),ue?Dl(z)?v([...h,B]):v([...h,z,B]):Dl(z)?v([...h,me,B]):v([...h,me,z,B])},W=async(re,me)=>{var hr,Or;i(!0),a(!0);const ue=new AbortController;d.current.unshift(ue);const qe={id:aa(),role:"user",content:re,date:new Date().toISOString()};let Le;if(!me)Le={id:me??aa(),title:re,messages:[qe],date:new Date().toISOString()};else if(Le=(hr=e==null?void 0:e.state)==null?void 0:hr.currentChat,Le)Le.messages.push(qe);else{console.error("Conversation not found."),i(!1),a(!1),d.current=d.current.filter(It=>It!==ue);return}e==null||e.dispatch({type:"UPDATE_CURRENT_CHAT",payload:Le}),v(Le.messages);const $t={messages:[...Le.messages.filter(It=>It.role!==O)]};let ke={};try{const It=await pw($t,ue.signal);if(It!=null&&It.body){const cn=It.body.getReader();let H="";for(;;){m("Processing");const{done:V,value:ie}=await cn.read();if(V)break;var en=new TextDecoder("utf-8").decode(ie);en.split(`
-`).forEach(X=>{try{H+=X,ke=JSON.parse(H),ke.choices[0].messages.forEach(he=>{he.id=ke.id,he.date=new Date().toISOString()}),a(!1),ke.choices[0].messages.forEach(he=>{P(he,qe,me)}),H=""}catch{}})}Le.messages.push(z,B),e==null||e.dispatch({type:"UPDATE_CURRENT_CHAT",payload:Le}),v([...h,z,B])}}catch{if(ue.signal.aborted)v([...h,qe]);else{let cn="An error occurred. Please try again. If the problem persists, please contact the site administrator.";(Or=ke.error)!=null&&Or.message?cn=ke.error.message:typeof ke.error=="string"&&(cn=ke.error);let H={id:aa(),role:O,content:cn,date:new Date().toISOString()};Le.messages.push(H),e==null||e.dispatch({type:"UPDATE_CURRENT_CHAT",payload:Le}),v([...h,H])}}finally{i(!1),a(!1),d.current=d.current.filter(It=>It!==ue),m("Done")}return ue.abort()},j=async(re,me)=>{var hr,Or,It,cn,H,V,ie,pe,X;i(!0),a(!0);const ue=new AbortController;d.current.unshift(ue);const qe={id:aa(),role:"user",content:re,date:new Date().toISOString()};let Le,$t;if(me)if($t=(Or=(hr=e==null?void 0:e.state)==null?void 0:hr.chatHistory)==null?void 0:Or.find(he=>he.id===me),$t)$t.messages.push(qe),Le={messages:[...$t.messages.filter(he=>he.role!==O)]};else{console.error("Conversation not found."),i(!1),a(!1),d.current=d.current.filter(he=>he!==ue);return}else Le={messages:[qe].filter(he=>he.role!==O)},v(Le.messages);let ke={};try{const he=me?await JE(Le,ue.signal,me):await JE(Le,ue.signal);if(!(he!=null&&he.ok)){let At={id:aa(),role:O,content:"There was an error generating a response. Chat history can't be saved at this time. If the problem persists, please contact the site administrator.",date:new Date().toISOString()},We;if(me){if(We=(cn=(It=e==null?void 0:e.state)==null?void 0:It.chatHistory)==null?void 0:cn.find(ve=>ve.id===me),!We){console.error("Conversation not found."),i(!1),a(!1),d.current=d.current.filter(ve=>ve!==ue);return}We.messages.push(At)}else{v([...h,qe,At]),i(!1),a(!1),d.current=d.current.filter(ve=>ve!==ue);return}e==null||e.dispatch({type:"UPDATE_CURRENT_CHAT",payload:We}),v([...We.messages]);return}if(he!=null&&he.body){const At=he.body.getReader();let We="";for(;;){m("Processing");const{done:Qe,value:Ke}=await At.read();if(Qe)break;var en=new TextDecoder("utf-8").decode(Ke);en.split(`
-`).forEach(dt=>{try{We+=dt,ke=JSON.parse(We),ke.choices[0].messages.forEach(ti=>{ti.id=ke.id,ti.date=new Date().toISOString()}),a(!1),ke.choices[0].messages.forEach(ti=>{P(ti,qe,me)}),We=""}catch{}})}let ve;if(me){if(ve=(V=(H=e==null?void 0:e.state)==null?void 0:H.chatHistory)==null?void 0:V.find(Qe=>Qe.id===me),!ve){console.error("Conversation not found."),i(!1),a(!1),d.current=d.current.filter(Qe=>Qe!==ue);return}Dl(z)?ve.messages.push(B):ve.messages.push(z,B)}else ve={id:ke.history_metadata.conversation_id,title:ke.history_metadata.title,messages:[qe],date:ke.history_metadata.date},Dl(z)?ve.messages.push(B):ve.messages.push(z,B);if(!ve){i(!1),a(!1),d.current=d.current.filter(Qe=>Qe!==ue);return}e==null||e.dispatch({type:"UPDATE_CURRENT_CHAT",payload:ve}),Dl(z)?v([...h,B]):v([...h,z,B])}}catch{if(ue.signal.aborted)v([...h,qe]);else{let At="An error occurred. Please try again. If the problem persists, please contact the site administrator.";(ie=ke.error)!=null&&ie.message?At=ke.error.message:typeof ke.error=="string"&&(At=ke.error);let We={id:aa(),role:O,content:At,date:new Date().toISOString()},ve;if(me){if(ve=(X=(pe=e==null?void 0:e.state)==null?void 0:pe.chatHistory)==null?void 0:X.find(Qe=>Qe.id===me),!ve){console.error("Conversation not found."),i(!1),a(!1),d.current=d.current.filter(Qe=>Qe!==ue);return}ve.messages.push(We)}else{if(!ke.history_metadata){console.error("Error retrieving data.",ke),i(!1),a(!1),d.current=d.current.filter(Qe=>Qe!==ue);return}ve={id:ke.history_metadata.conversation_id,title:ke.history_metadata.title,messages:[qe],date:ke.history_metadata.date},ve.messages.push(We)}if(!ve){i(!1),a(!1),d.current=d.current.filter(Qe=>Qe!==ue);return}e==null||e.dispatch({type:"UPDATE_CURRENT_CHAT",payload:ve}),v([...h,We])}}finally{i(!1),a(!1),d.current=d.current.filter(he=>he!==ue),m("Done")}return ue.abort()},I=async()=>{var re;y(!0),(re=e==null?void 0:e.state.currentChat)!=null&&re.id&&(e!=null&&e.state.isCosmosDBAvailable.cosmosDB)&&((await _w(e==null?void 0:e.state.currentChat.id)).ok?(e==null||e.dispatch({type:"DELETE_CURRENT_CHAT_MESSAGES",payload:e==null?void 0:e.state.currentChat.id}),e==null||e.dispatch({type:"UPDATE_CHAT_HISTORY",payload:e==null?void 0:e.state.currentChat}),l(void 0),c(!1),v([])):(S({title:"Error clearing current chat",subtitle:"Please try again. If the problem persists, please contact the site administrator."}),k())),y(!1)},b=()=>{m("Processing"),v([]),c(!1),l(void 0),e==null||e.dispatch({type:"UPDATE_CURRENT_CHAT",payload:null}),m("Done")},Ge=()=>{d.current.forEach(re=>re.abort()),a(!1),i(!1)};E.useEffect(()=>{e!=null&&e.state.currentChat?v(e.state.currentChat.messages):v([])},[e==null?void 0:e.state.currentChat]),E.useLayoutEffect(()=>{var me;const re=async(ue,qe)=>await vw(ue,qe);if(e&&e.state.currentChat&&_==="Done"){if(e.state.isCosmosDBAvailable.cosmosDB){if(!((me=e==null?void 0:e.state.currentChat)!=null&&me.messages)){console.error("Failure fetching current chat state.");return}re(e.state.currentChat.messages,e.state.currentChat.id).then(ue=>{var qe,Le;if(!ue.ok){let $t="An error occurred. Answers can't be saved at this time. If the problem persists, please contact the site administrator.",ke={id:aa(),role:O,content:$t,date:new Date().toISOString()};if(!((qe=e==null?void 0:e.state.currentChat)!=null&&qe.messages))throw{...new Error,message:"Failure fetching current chat state."};v([...(Le=e==null?void 0:e.state.currentChat)==null?void 0:Le.messages,ke])}return ue}).catch(ue=>(console.error("Error: ",ue),{...new Response,ok:!1,status:500}))}e==null||e.dispatch({type:"UPDATE_CHAT_HISTORY",payload:e.state.currentChat}),v(e.state.currentChat.messages),m("Not Running")}},[_]),E.useEffect(()=>{t!==void 0&&K()},[t]),E.useLayoutEffect(()=>{var re;(re=n.current)==null||re.scrollIntoView({behavior:"smooth"})},[o,_]);const De=re=>{l(re),c(!0)},Ct=re=>{re.url&&!re.url.includes("blob.core")&&window.open(re.url,"_blank")},Ee=re=>{if(re!=null&&re.role&&(re==null?void 0:re.role)==="tool")try{return JSON.parse(re.content).citations}catch{return[]}return[]},we=()=>r||h&&h.length===0||T||(e==null?void 0:e.state.chatHistoryLoadingState)===vn.Loading;return M("div",{className:Ie.container,role:"main",children:f?le(de,{className:Ie.chatEmptyState,children:[M(ow,{className:Ie.chatIcon,style:{color:"darkorange",height:"200px",width:"200px"}}),M("h1",{className:Ie.chatEmptyStateTitle,children:"Authentication Not Configured"}),le("h2",{className:Ie.chatEmptyStateSubtitle,children:["This app does not have authentication configured. Please add an identity provider by finding your app in the",M("a",{href:"https://portal.azure.com/",target:"_blank",children:" Azure Portal "}),"and following",M("a",{href:"https://learn.microsoft.com/en-us/azure/app-service/scenario-secure-app-authentication-app-service#3-configure-authentication-and-authorization",target:"_blank",children:" these instructions"}),"."]}),M("h2",{className:Ie.chatEmptyStateSubtitle,style:{fontSize:"20px"},children:M("strong",{children:"Authentication configuration takes a few minutes to apply. "})}),M("h2",{className:Ie.chatEmptyStateSubtitle,style:{fontSize:"20px"},children:M("strong",{children:"If you deployed in the last 10 minutes, please wait and reload the page after 10 minutes."})})]}):le(de,{horizontal:!0,className:Ie.chatRoot,children:[le("div",{className:Ie.chatContainer,children:[!h||h.length<1?le(de,{className:Ie.chatEmptyState,children:[M("img",{src:D2,className:Ie.chatIcon,"aria-hidden":"true"}),M("h1",{className:Ie.chatEmptyStateTitle,children:"Start chatting"}),M("h2",{className:Ie.chatEmptyStateSubtitle,children:"This chatbot is configured to answer your questions"})]}):le("div",{className:Ie.chatMessageStream,style:{marginBottom:r?"40px":"0px"},role:"log",children:[h.map((re,me)=>M($i,{children:re.role==="user"?M("div",{className:Ie.chatMessageUser,tabIndex:0,children:M("div",{className:Ie.chatMessageUserMessage,children:re.content})}):re.role==="assistant"?M("div",{className:Ie.chatMessageGpt,children:M(DT,{answer:{answer:re.content,citations:Ee(h[me-1]),message_id:re.id,feedback:re.feedback},onCitationClicked:ue=>De(ue)})}):re.role===O?le("div",{className:Ie.chatMessageError,children:[le(de,{horizontal:!0,className:Ie.chatMessageErrorContent,children:[M(tw,{className:Ie.errorIcon,style:{color:"rgba(182, 52, 67, 1)"}}),M("span",{children:"Error"})]}),M("span",{className:Ie.chatMessageErrorContent,children:re.content})]}):null})),o&&M($i,{children:M("div",{className:Ie.chatMessageGpt,children:M(DT,{answer:{answer:"Generating answer...",citations:[]},onCitationClicked:()=>null})})}),M("div",{ref:n})]}),le(de,{horizontal:!0,className:Ie.chatInput,children:[r&&le(de,{horizontal:!0,className:Ie.stopGeneratingContainer,role:"button","aria-label":"Stop generating",tabIndex:0,onClick:Ge,onKeyDown:re=>re.key==="Enter"||re.key===" "?Ge():null,children:[M(sw,{className:Ie.stopGeneratingIcon,"aria-hidden":"true"}),M("span",{className:Ie.stopGeneratingText,"aria-hidden":"true",children:"Stop generating"})]}),le(de,{children:[((St=e==null?void 0:e.state.isCosmosDBAvailable)==null?void 0:St.status)!==zn.NotConfigured&&M(Ou,{role:"button",styles:{icon:{color:"#FFFFFF"},iconDisabled:{color:"#BDBDBD !important"},root:{color:"#FFFFFF",background:"radial-gradient(109.81% 107.82% at 100.1% 90.19%, #0F6CBD 33.63%, #2D87C3 70.31%, #8DDDD8 100%)"},rootDisabled:{background:"#F0F0F0"}},className:Ie.newChatIcon,iconProps:{iconName:"Add"},onClick:b,disabled:we(),"aria-label":"start a new chat button"}),M(Ou,{role:"button",styles:{icon:{color:"#FFFFFF"},iconDisabled:{color:"#BDBDBD !important"},root:{color:"#FFFFFF",background:"radial-gradient(109.81% 107.82% at 100.1% 90.19%, #0F6CBD 33.63%, #2D87C3 70.31%, #8DDDD8 100%)"},rootDisabled:{background:"#F0F0F0"}},className:((ut=e==null?void 0:e.state.isCosmosDBAvailable)==null?void 0:ut.status)!==zn.NotConfigured?Ie.clearChatBroom:Ie.clearChatBroomNoCosmos,iconProps:{iconName:"Broom"},onClick:((jt=e==null?void 0:e.state.isCosmosDBAvailable)==null?void 0:jt.status)!==zn.NotConfigured?I:b,disabled:we(),"aria-label":"clear chat button"}),M(el,{hidden:C,onDismiss:U,dialogContentProps:D,modalProps:R})]}),M(U$,{clearOnSend:!0,placeholder:"Type a new question...",disabled:r,onSend:(re,me)=>{var ue;(ue=e==null?void 0:e.state.isCosmosDBAvailable)!=null&&ue.cosmosDB?j(re,me):W(re,me)},conversationId:(Nn=e==null?void 0:e.state.currentChat)!=null&&Nn.id?(Yn=e==null?void 0:e.state.currentChat)==null?void 0:Yn.id:void 0})]})]}),h&&h.length>0&&u&&s&&le(de.Item,{className:Ie.citationPanel,tabIndex:0,role:"tabpanel","aria-label":"Citations Panel",children:[le(de,{"aria-label":"Citations Panel Header Container",horizontal:!0,className:Ie.citationPanelHeaderContainer,horizontalAlign:"space-between",verticalAlign:"center",children:[M("span",{"aria-label":"Citations",className:Ie.citationPanelHeader,children:"Citations"}),M(va,{iconProps:{iconName:"Cancel"},"aria-label":"Close citations panel",onClick:()=>c(!1)})]}),M("h5",{className:Ie.citationPanelTitle,tabIndex:0,title:s.url&&!s.url.includes("blob.core")?s.url:s.title??"",onClick:()=>Ct(s),children:s.title}),M("div",{tabIndex:0,children:M(cf,{linkTarget:"_blank",className:Ie.citationPanelContent,children:s.content,remarkPlugins:[KC],rehypePlugins:[Wz]})})]}),(e==null?void 0:e.state.isChatHistoryOpen)&&((Rr=e==null?void 0:e.state.isCosmosDBAvailable)==null?void 0:Rr.status)!==zn.NotConfigured&&M(nV,{})]})})};qN();function iV(){return M(kw,{children:M(D7,{children:M(k7,{children:le(Sc,{path:"/",element:M(Fw,{}),children:[M(Sc,{index:!0,element:M(rV,{})}),M(Sc,{path:"*",element:M(Iw,{})})]})})})})}a0.createRoot(document.getElementById("root")).render(M(Tn.StrictMode,{children:M(iV,{})}))});export default oV();
-//# sourceMappingURL=index-87c2be60.js.map
+`).forEach(X=>{try{H+=X,ke=JSON.parse(H),ke.choices[0].messages.forEach(he=>{he.id=ke.id,he.date=new Date().toISOString()}),a(!1),ke.choices[0].messages.forEach(he=>{P(he,qe,me)}),H=""}catch{}})}Le.messages.push(z,B),e==null||e.dispatch({type:"UPDATE_CURRENT_CHAT",payload:Le}),v([...h,z,B])}}catch{if(ue.signal.aborted)v([...h,qe]);else{let cn="An error occurred. Please try again. If the problem persists, please contact the site administrator.";(Or=ke.error)!=null&&Or.message?cn=ke.error.message:typeof ke.error=="string"&&(cn=ke.error);let H={id:aa(),role:O,content:cn,date:new Date().toISOString()};Le.messages.push(H),e==null||e.dispatch({type:"UPDATE_CURRENT_CHAT",payload:Le}),v([...h,H])}}finally{i(!1),a(!1),d.current=d.current.filter(It=>It!==ue),m("Done")}return ue.abort()},j=async(re,me)=>{var hr,Or,It,cn,H,V,ie,pe,X;i(!0),a(!0);const ue=new AbortController;d.current.unshift(ue);const qe={id:aa(),role:"user",content:re,date:new Date().toISOString()};let Le,$t;if(me)if($t=(Or=(hr=e==null?void 0:e.state)==null?void 0:hr.chatHistory)==null?void 0:Or.find(he=>he.id===me),$t)$t.messages.push(qe),Le={messages:[...$t.messages.filter(he=>he.role!==O)]};else{console.error("Conversation not found."),i(!1),a(!1),d.current=d.current.filter(he=>he!==ue);return}else Le={messages:[qe].filter(he=>he.role!==O)},v(Le.messages);let ke={},__errorFrame;try{const he=me?await JE(Le,ue.signal,me):await JE(Le,ue.signal);if(!(he!=null&&he.ok)){let At={id:aa(),role:O,content:"There was an error generating a response. Chat history can't be saved at this time. If the problem persists, please contact the site administrator.",date:new Date().toISOString()},We;if(me){if(We=(cn=(It=e==null?void 0:e.state)==null?void 0:It.chatHistory)==null?void 0:cn.find(ve=>ve.id===me),!We){console.error("Conversation not found."),i(!1),a(!1),d.current=d.current.filter(ve=>ve!==ue);return}We.messages.push(At)}else{v([...h,qe,At]),i(!1),a(!1),d.current=d.current.filter(ve=>ve!==ue);return}e==null||e.dispatch({type:"UPDATE_CURRENT_CHAT",payload:We}),v([...We.messages]);return}if(he!=null&&he.body){const At=he.body.getReader();let We="";for(;;){m("Processing");const{done:Qe,value:Ke}=await At.read();if(Qe)break;var en=new TextDecoder("utf-8").decode(Ke);en.split(`
+`).forEach(dt=>{try{We+=dt;const __frame=JSON.parse(We);if(__frame.error&&!__frame.choices){__errorFrame=__frame,We="";return}ke=__frame,ke.choices[0].messages.forEach(ti=>{ti.id=ke.id,ti.date=new Date().toISOString()}),a(!1),ke.choices[0].messages.forEach(ti=>{P(ti,qe,me)}),We=""}catch{}})}if(__errorFrame&&Dl(B))throw ke=__errorFrame,new Error(__errorFrame.error);const __errorMsgs=__errorFrame?[{id:aa(),role:O,content:typeof __errorFrame.error=="string"?__errorFrame.error:"Chat history can't be saved at this time.",date:new Date().toISOString()}]:[];let ve;if(me){if(ve=(V=(H=e==null?void 0:e.state)==null?void 0:H.chatHistory)==null?void 0:V.find(Qe=>Qe.id===me),!ve){console.error("Conversation not found."),i(!1),a(!1),d.current=d.current.filter(Qe=>Qe!==ue);return}Dl(z)?ve.messages.push(B,...__errorMsgs):ve.messages.push(z,B,...__errorMsgs)}else{const __meta=ke.history_metadata??__errorFrame.history_metadata;ve={id:__meta.conversation_id,title:__meta.title,messages:[qe],date:__meta.date},Dl(z)?ve.messages.push(B,...__errorMsgs):ve.messages.push(z,B,...__errorMsgs)}if(!ve){i(!1),a(!1),d.current=d.current.filter(Qe=>Qe!==ue);return}e==null||e.dispatch({type:"UPDATE_CURRENT_CHAT",payload:ve}),Dl(z)?v([...h,B,...__errorMsgs]):v([...h,z,B,...__errorMsgs])}}catch{if(ue.signal.aborted)v([...h,qe]);else{let At="An error occurred. Please try again. If the problem persists, please contact the site administrator.";(ie=ke.error)!=null&&ie.message?At=ke.error.message:typeof ke.error=="string"&&(At=ke.error);let We={id:aa(),role:O,content:At,date:new Date().toISOString()},ve;if(me){if(ve=(X=(pe=e==null?void 0:e.state)==null?void 0:pe.chatHistory)==null?void 0:X.find(Qe=>Qe.id===me),!ve){console.error("Conversation not found."),i(!1),a(!1),d.current=d.current.filter(Qe=>Qe!==ue);return}ve.messages.push(We)}else{if(!ke.history_metadata){console.error("Error retrieving data.",ke),i(!1),a(!1),d.current=d.current.filter(Qe=>Qe!==ue);return}ve={id:ke.history_metadata.conversation_id,title:ke.history_metadata.title,messages:[qe],date:ke.history_metadata.date},ve.messages.push(We)}if(!ve){i(!1),a(!1),d.current=d.current.filter(Qe=>Qe!==ue);return}e==null||e.dispatch({type:"UPDATE_CURRENT_CHAT",payload:ve}),v([...h,We])}}finally{i(!1),a(!1),d.current=d.current.filter(he=>he!==ue),m("Done")}return ue.abort()},I=async()=>{var re;y(!0),(re=e==null?void 0:e.state.currentChat)!=null&&re.id&&(e!=null&&e.state.isCosmosDBAvailable.cosmosDB)&&((await _w(e==null?void 0:e.state.currentChat.id)).ok?(e==null||e.dispatch({type:"DELETE_CURRENT_CHAT_MESSAGES",payload:e==null?void 0:e.state.currentChat.id}),e==null||e.dispatch({type:"UPDATE_CHAT_HISTORY",payload:e==null?void 0:e.state.currentChat}),l(void 0),c(!1),v([])):(S({title:"Error clearing current chat",subtitle:"Please try again. If the problem persists, please contact the site administrator."}),k())),y(!1)},b=()=>{m("Processing"),v([]),c(!1),l(void 0),e==null||e.dispatch({type:"UPDATE_CURRENT_CHAT",payload:null}),m("Done")},Ge=()=>{d.current.forEach(re=>re.abort()),a(!1),i(!1)};E.useEffect(()=>{e!=null&&e.state.currentChat?v(e.state.currentChat.messages):v([])},[e==null?void 0:e.state.currentChat]),E.useLayoutEffect(()=>{var me;const re=async(ue,qe)=>await vw(ue.filter(Le=>Le.role!==O),qe);if(e&&e.state.currentChat&&_==="Done"){if(e.state.isCosmosDBAvailable.cosmosDB&&!(e.state.frontendSettings!=null&&e.state.frontendSettings.answers_saved_by_server)){if(!((me=e==null?void 0:e.state.currentChat)!=null&&me.messages)){console.error("Failure fetching current chat state.");return}re(e.state.currentChat.messages,e.state.currentChat.id).then(ue=>{var qe,Le;if(!ue.ok){let $t="An error occurred. Answers can't be saved at this time. If the problem persists, please contact the site administrator.",ke={id:aa(),role:O,content:$t,date:new Date().toISOString()};if(!((qe=e==null?void 0:e.state.currentChat)!=null&&qe.messages))throw{...new Error,message:"Failure fetching current chat state."};v([...(Le=e==null?void 0:e.state.currentChat)==null?void 0:Le.messages,ke])}return ue}).catch(ue=>(console.error("Error: ",ue),{...new Response,ok:!1,status:500}))}e==null||e.dispatch({type:"UPDATE_CHAT_HISTORY",payload:e.state.currentChat}),v(e.state.currentChat.messages),m("Not Running")}},[_]),E.useEffect(()=>{t!==void 0&&K()},[t]),E.useLayoutEffect(()=>{var re;(re=n.current)==null||re.scrollIntoView({behavior:"smooth"})},[o,_]);const De=re=>{l(re),c(!0)},Ct=re=>{re.url&&!re.url.includes("blob.core")&&window.open(re.url,"_blank")},Ee=re=>{if(re!=null&&re.role&&(re==null?void 0:re.role)==="tool")try{return JSON.parse(re.content).citations}catch{return[]}return[]},we=()=>r||h&&h.length===0||T||(e==null?void 0:e.state.chatHistoryLoadingState)===vn.Loading;return M("div",{className:Ie.container,role:"main",children:f?le(de,{className:Ie.chatEmptyState,children:[M(ow,{className:Ie.chatIcon,style:{color:"darkorange",height:"200px",width:"200px"}}),M("h1",{className:Ie.chatEmptyStateTitle,children:"Authentication Not Configured"}),le("h2",{className:Ie.chatEmptyStateSubtitle,children:["This app does not have authentication configured. Please add an identity provider by finding your app in the",M("a",{href:"https://portal.azure.com/",target:"_blank",children:" Azure Portal "}),"and following",M("a",{href:"https://learn.microsoft.com/en-us/azure/app-service/scenario-secure-app-authentication-app-service#3-configure-authentication-and-authorization",target:"_blank",children:" these instructions"}),"."]}),M("h2",{className:Ie.chatEmptyStateSubtitle,style:{fontSize:"20px"},children:M("strong",{children:"Authentication configuration takes a few minutes to apply. "})}),M("h2",{className:Ie.chatEmptyStateSubtitle,style:{fontSize:"20px"},children:M("strong",{children:"If you deployed in the last 10 minutes, please wait and reload the page after 10 minutes."})})]}):le(de,{horizontal:!0,className:Ie.chatRoot,children:[le("div",{className:Ie.chatContainer,children:[!h||h.length<1?le(de,{className:Ie.chatEmptyState,children:[M("img",{src:D2,className:Ie.chatIcon,"aria-hidden":"true"}),M("h1",{className:Ie.chatEmptyStateTitle,children:"Start chatting"}),M("h2",{className:Ie.chatEmptyStateSubtitle,children:"This chatbot is configured to answer your questions"})]}):le("div",{className:Ie.chatMessageStream,style:{marginBottom:r?"40px":"0px"},role:"log",children:[h.map((re,me)=>M($i,{children:re.role==="user"?M("div",{className:Ie.chatMessageUser,tabIndex:0,children:M("div",{className:Ie.chatMessageUserMessage,children:re.content})}):re.role==="assistant"?M("div",{className:Ie.chatMessageGpt,children:M(DT,{answer:{answer:re.content,citations:Ee(h[me-1]),message_id:re.id,feedback:re.feedback},onCitationClicked:ue=>De(ue)})}):re.role===O?le("div",{className:Ie.chatMessageError,children:[le(de,{horizontal:!0,className:Ie.chatMessageErrorContent,children:[M(tw,{className:Ie.errorIcon,style:{color:"rgba(182, 52, 67, 1)"}}),M("span",{children:"Error"})]}),M("span",{className:Ie.chatMessageErrorContent,children:re.content})]}):null})),o&&M($i,{children:M("div",{className:Ie.chatMessageGpt,children:M(DT,{answer:{answer:"Generating answer...",citations:[]},onCitationClicked:()=>null})})}),M("div",{ref:n})]}),le(de,{horizontal:!0,className:Ie.chatInput,children:[r&&le(de,{horizontal:!0,className:Ie.stopGeneratingContainer,role:"button","aria-label":"Stop generating",tabIndex:0,onClick:Ge,onKeyDown:re=>re.key==="Enter"||re.key===" "?Ge():null,children:[M(sw,{className:Ie.stopGeneratingIcon,"aria-hidden":"true"}),M("span",{className:Ie.stopGeneratingText,"aria-hidden":"true",children:"Stop generating"})]}),le(de,{children:[((St=e==null?void 0:e.state.isCosmosDBAvailable)==null?void 0:St.status)!==zn.NotConfigured&&M(Ou,{role:"button",styles:{icon:{color:"#FFFFFF"},iconDisabled:{color:"#BDBDBD !important"},root:{color:"#FFFFFF",background:"radial-gradient(109.81% 107.82% at 100.1% 90.19%, #0F6CBD 33.63%, #2D87C3 70.31%, #8DDDD8 100%)"},rootDisabled:{background:"#F0F0F0"}},className:Ie.newChatIcon,iconProps:{iconName:"Add"},onClick:b,disabled:we(),"aria-label":"start a new chat button"}),M(Ou,{role:"button",styles:{icon:{color:"#FFFFFF"},iconDisabled:{color:"#BDBDBD !important"},root:{color:"#FFFFFF",background:"radial-gradient(109.81% 107.82% at 100.1% 90.19%, #0F6CBD 33.63%, #2D87C3 70.31%, #8DDDD8 100%)"},rootDisabled:{background:"#F0F0F0"}},className:((ut=e==null?void 0:e.state.isCosmosDBAvailable)==null?void 0:ut.status)!==zn.NotConfigured?Ie.clearChatBroom:Ie.clearChatBroomNoCosmos,iconProps:{iconName:"Broom"},onClick:((jt=e==null?void 0:e.state.isCosmosDBAvailable)==null?void 0:jt.status)!==zn.NotConfigured?I:b,disabled:we(),"aria-label":"clear chat button"}),M(el,{hidden:C,onDismiss:U,dialogContentProps:D,modalProps:R})]}),M(U$,{clearOnSend:!0,placeholder:"Type a new question...",disabled:r,onSend:(re,me)=>{var ue;(ue=e==null?void 0:e.state.isCosmosDBAvailable)!=null&&ue.cosmosDB?j(re,me):W(re,me)},conversationId:(Nn=e==null?void 0:e.state.currentChat)!=null&&Nn.id?(Yn=e==null?void 0:e.state.currentChat)==null?void 0:Yn.id:void 0})]})]}),h&&h.length>0&&u&&s&&le(de.Item,{className:Ie.citationPanel,tabIndex:0,role:"tabpanel","aria-label":"Citations Panel",children:[le(de,{"aria-label":"Citations Panel Header Container",horizontal:!0,className:Ie.citationPanelHeaderContainer,horizontalAlign:"space-between",verticalAlign:"center",children:[M("span",{"aria-label":"Citations",className:Ie.citationPanelHeader,children:"Citations"}),M(va,{iconProps:{iconName:"Cancel"},"aria-label":"Close citations panel",onClick:()=>c(!1)})]}),M("h5",{className:Ie.citationPanelTitle,tabIndex:0,title:s.url&&!s.url.includes("blob.core")?s.url:s.title??"",onClick:()=>Ct(s),children:s.title}),M("div",{tabIndex:0,children:M(cf,{linkTarget:"_blank",className:Ie.citationPanelContent,children:s.content,remarkPlugins:[KC],rehypePlugins:[Wz]})})]}),(e==null?void 0:e.state.isChatHistoryOpen)&&((Rr=e==null?void 0:e.state.isCosmosDBAvailable)==null?void 0:Rr.status)!==zn.NotConfigured&&M(nV,{})]})})};qN();function iV(){return M(kw,{children:M(D7,{children:M(k7,{children:le(Sc,{path:"/",element:M(Fw,{}),children:[M(Sc,{index:!0,element:M(rV,{})}),M(Sc,{path:"*",element:M(Iw,{})})]})})})})}a0.createRoot(document.getElementById("root")).render(M(Tn.StrictMode,{children:M(iV,{})}))});export default oV();
+//# sourceMappingURL=index-86a12d8a.js.map
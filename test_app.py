@@ -1,6 +1,1250 @@
+import functools
+import gzip
+import json
+import pickle
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+import app
 from app import format_as_ndjson
+from backend.admission import AdmissionController, SharedTokenBucket
+from backend.answer_cache import AnswerCache
+from backend.auth.token_cache import CachedTokenCredential
+from backend.cache import SingleFlight, TTLCache
+from backend.history_budget import HistoryBudgeter
+from backend.embeddings import HashingEmbedder
+from backend.local_search import LocalSearchIndex
+from backend.semantic_cache import SemanticAnswerCache
+from backend.settings import CompletionSettings, DataSourceSettings, FieldsMapping
+from backend.static_files import StaticFiles
+from backend.upstream import ndjson
+from backend.upstream.client import AzureOpenAIClient, UpstreamResponse, parse_sse_json
+from backend.upstream.hedge import Hedger
+from backend.upstream.pool import DeploymentPool
+from backend.warmup import Warmup
 
 
 def test_format_as_ndjson():
     obj = {"message": "I ❤️ 🐍 \n and escaped newlines"}
     assert format_as_ndjson(obj) == '{"message": "I ❤️ 🐍 \\n and escaped newlines"}\n'
+
+
+class FakeUpstreamClient:
+    def __init__(self, chunks, status_code=200, headers=None, deployment="fake"):
+        self.chunks = chunks
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.base_url = "https://fake.openai.azure.com/"
+        self.deployment = deployment
+        self.calls = []
+
+    def post(self, operation, api_version, body, headers=None):
+        self.calls.append((operation, api_version, body))
+        return UpstreamResponse(self.status_code, {"apim-request-id": "req-1", **self.headers}, iter(self.chunks), lambda: None)
+
+
+def sse_body(*texts, extensions=False, citations=None, end=True):
+    ## a streamed answer as Azure OpenAI sends it, one content delta per text; anything else in
+    ## texts is sent as a whole chunk. Chat completions chunks end with [DONE]. Extensions chunks
+    ## (on your data) open with the citations, if any, and the assistant role, and close with
+    ## end_turn. end=False leaves the stream unfinished.
+    def chunk(delta, **choice):
+        return {"id": "1", "model": "gpt-35-turbo", "created": 1, "object": "chunk" if extensions else "chat.completion.chunk", "choices": [{"delta": delta, **choice}]}
+
+    turn = {"end_turn": False} if extensions else {}
+    chunks = []
+    if extensions and citations is not None:
+        chunks.append(chunk({"context": {"messages": [{"role": "tool", "content": citations}]}}, **turn))
+    if extensions:
+        chunks.append(chunk({"role": "assistant"}, **turn))
+    chunks += [chunk({"content": text}, **turn) if isinstance(text, str) else text for text in texts]
+    if end and extensions:
+        chunks.append(chunk({}, end_turn=True))
+    body = b"".join(b"data: " + json.dumps(c).encode("utf-8") + b"\n\n" for c in chunks)
+    return body + b"data: [DONE]\n\n" if end and not extensions else body
+
+
+def test_conversation_without_data_streams_from_shared_client(monkeypatch):
+    body = sse_body("Hello")
+    client = FakeUpstreamClient([body[:20], body[20:]])
+    monkeypatch.setattr(app, "azure_openai_client", client)
+    monkeypatch.setattr(app, "should_use_data", lambda: False)
+
+    response = app.app.test_client().post("/conversation", json={"messages": [{"role": "user", "content": "Hi"}]})
+    frames = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert client.calls[0][0] == "chat/completions"
+    assert client.calls[0][2]["messages"][0]["role"] == "system"
+    assert [frame["choices"][0]["messages"][0]["content"] for frame in frames] == ["Hello"]
+
+
+def test_conversation_without_data_surfaces_upstream_errors(monkeypatch):
+    monkeypatch.setattr(app, "azure_openai_client", FakeUpstreamClient([b'{"error": "throttled"}'], status_code=429))
+    monkeypatch.setattr(app, "should_use_data", lambda: False)
+
+    response = app.app.test_client().post("/conversation", json={"messages": [{"role": "user", "content": "Hi"}]})
+
+    assert response.status_code == 500
+    assert "429" in response.get_json()["error"]
+
+
+def test_client_gives_up_on_a_silent_upstream_after_the_read_timeout():
+    import socket
+    import requests
+    # the listener completes the handshake but never answers
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+    client = AzureOpenAIClient(f"http://127.0.0.1:{listener.getsockname()[1]}/", "gpt", "key", read_timeout=0.2)
+    start = time.monotonic()
+    try:
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            client.post("chat/completions", "2023-08-01-preview", {"stream": True})
+        assert time.monotonic() - start < 2
+    finally:
+        client.close()
+        listener.close()
+
+
+def test_stream_with_data_coalesces_deltas(monkeypatch):
+    monkeypatch.setattr(app, "azure_openai_client", FakeUpstreamClient([sse_body("Hel", "lo", " wor", "ld", extensions=True)]))
+    monkeypatch.setattr(app, "AZURE_OPENAI_STREAM_COALESCE_BYTES", 5)
+
+    frames = [json.loads(frame) for frame in app.stream_with_data({}, {})]
+
+    assert [frame["choices"][0]["messages"][0]["content"] for frame in frames] == ["", "Hello", " world"]
+
+
+def test_stream_with_data_flushes_coalesced_deltas_while_upstream_pauses(monkeypatch):
+    body = sse_body("Hel", "lo", " world", extensions=True)
+    pause_at = body.index(b"data: ", body.index(b'"lo"'))
+
+    def chunks():
+        yield body[:pause_at]
+        time.sleep(0.5)
+        yield body[pause_at:]
+    monkeypatch.setattr(app, "azure_openai_client", FakeUpstreamClient(chunks()))
+    monkeypatch.setattr(app, "AZURE_OPENAI_STREAM_COALESCE_MS", 50)
+
+    start = time.monotonic()
+    frames = [(time.monotonic() - start, json.loads(frame)) for frame in app.stream_with_data({}, {})]
+
+    assert [frame["choices"][0]["messages"][0]["content"] for _, frame in frames] == ["", "Hello", " world"]
+    # "Hello" goes out once its window runs out, not when the next line arrives
+    assert frames[1][0] < 0.3 <= frames[2][0]
+
+
+def test_security_filter_does_not_modify_the_datasource_settings(monkeypatch):
+    settings = DataSourceSettings("AzureCognitiveSearch", connection=(("key", "secret"),), fields_mapping=FieldsMapping(content_fields=("content",)), options=(("filter", None),))
+    monkeypatch.setattr(app, "DATASOURCE_TYPE", "AzureCognitiveSearch")
+    monkeypatch.setattr(app, "DATASOURCE_SETTINGS", settings)
+    monkeypatch.setattr(app, "AZURE_SEARCH_PERMITTED_GROUPS_COLUMN", "group_ids")
+    monkeypatch.setattr(app, "fetchUserGroups", lambda userToken: [{"id": "g1"}, {"id": "g2"}])
+    monkeypatch.setattr(app, "user_filter_cache", TTLCache(ttl_seconds=300, max_entries=10))
+
+    body, headers = app.prepare_body_headers_with_data({"messages": [{"role": "user", "content": "Hi"}]}, {})
+
+    assert body["dataSources"][0]["parameters"]["filter"] == "group_ids/any(g:search.in(g, 'g1, g2'))"
+    assert body["dataSources"][0]["parameters"]["key"] == "secret"
+    assert body["max_tokens"] == app.COMPLETION_SETTINGS.max_tokens
+    # nothing in one request's body, however deep, is shared with the next one
+    body["dataSources"][0]["parameters"]["fieldsMapping"]["contentFields"].append("title")
+    assert settings.as_body()["parameters"]["fieldsMapping"]["contentFields"] == ["content"]
+    assert settings.as_body()["parameters"]["filter"] is None
+    assert settings.redacted_body(filter="f")["parameters"]["key"] == "*****"
+
+
+def test_completion_settings_reject_bad_values():
+    with pytest.raises(ValueError):
+        CompletionSettings.from_env_values("3", "1000", "1.0", None, True)
+    with pytest.raises(ValueError):
+        CompletionSettings.from_env_values("0", "1000", "1.0", "a|b|c|d|e", True)
+    with pytest.raises(ValueError):
+        DataSourceSettings("AzureCognitiveSearch", strictness=6)
+
+
+def test_concurrent_turns_share_one_group_fetch(monkeypatch):
+    calls = []
+
+    def slow_fetch(userToken):
+        calls.append(userToken)
+        time.sleep(0.1)
+        return [{"id": "g1"}]
+
+    monkeypatch.setattr(app, "AZURE_SEARCH_PERMITTED_GROUPS_COLUMN", "group_ids")
+    monkeypatch.setattr(app, "fetchUserGroups", slow_fetch)
+    monkeypatch.setattr(app, "user_filter_cache", TTLCache(ttl_seconds=300, max_entries=10))
+
+    filters = []
+    threads = [threading.Thread(target=lambda: filters.append(app.generateFilterString("token-a", "user-a"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == ["token-a"]
+    assert filters == ["group_ids/any(g:search.in(g, 'g1'))"] * 8
+
+    # another user, or the same principal presenting a different token, is fetched separately
+    app.generateFilterString("token-b", "user-a")
+    assert calls == ["token-a", "token-b"]
+
+
+def test_failed_group_fetch_is_not_cached(monkeypatch):
+    results = [Exception("Microsoft Graph returned status 503"), [{"id": "g1"}]]
+
+    def flaky_fetch(userToken):
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(app, "AZURE_SEARCH_PERMITTED_GROUPS_COLUMN", "group_ids")
+    monkeypatch.setattr(app, "fetchUserGroups", flaky_fetch)
+    monkeypatch.setattr(app, "user_filter_cache", TTLCache(ttl_seconds=300, max_entries=10))
+
+    assert app.generateFilterString("token-a", "user-a") == "group_ids/any(g:search.in(g, ''))"
+    assert app.generateFilterString("token-a", "user-a") == "group_ids/any(g:search.in(g, 'g1'))"
+
+
+def test_stalled_group_fetch_times_out_to_the_empty_filter(monkeypatch):
+    import requests
+    timeouts = []
+
+    class StalledSession:
+        def get(self, url, headers=None, timeout=None):
+            timeouts.append(timeout)
+            raise requests.exceptions.ReadTimeout("Microsoft Graph did not answer")
+
+    monkeypatch.setattr(app, "AZURE_SEARCH_PERMITTED_GROUPS_COLUMN", "group_ids")
+    monkeypatch.setattr(app, "graph_session", StalledSession())
+    monkeypatch.setattr(app, "user_filter_cache", TTLCache(ttl_seconds=300, max_entries=10))
+
+    assert app.generateFilterString("token-a", "user-a") == "group_ids/any(g:search.in(g, ''))"
+    assert timeouts == [(5.0, 10.0)]
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(ttl_seconds=300, max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+class FakeCosmosClient:
+    def __init__(self):
+        self.messages = []
+        self.titles = {}
+
+    def create_conversation(self, user_id, title, conversation_id):
+        self.titles[conversation_id] = title
+        return {"id": conversation_id, "createdAt": "2023-01-01T00:00:00"}
+
+    def update_conversation_title(self, user_id, conversation_id, title, provisional_title):
+        if self.titles[conversation_id] == provisional_title:
+            self.titles[conversation_id] = title
+
+    def create_message(self, uuid, conversation_id, user_id, input_message):
+        self.messages.append((uuid, conversation_id, input_message["role"], input_message["content"]))
+
+
+class BarrierUpstreamClient(FakeUpstreamClient):
+    ## holds every caller until all requests are in flight, then streams an answer echoing the question
+    def __init__(self, parties):
+        super().__init__([])
+        self.barrier = threading.Barrier(parties, timeout=5)
+
+    def post(self, operation, api_version, body, headers=None):
+        if operation == "chat/completions" and not body.get("stream"):
+            return UpstreamResponse(200, {}, iter([json.dumps({"choices": [{"message": {"content": '{"title": "t"}'}}]}).encode("utf-8")]), lambda: None)
+        self.barrier.wait()
+        return UpstreamResponse(200, {}, iter([sse_body("re: " + body["messages"][-1]["content"])]), lambda: None)
+
+
+def test_concurrent_requests_keep_their_own_message_ids(monkeypatch):
+    cosmos = FakeCosmosClient()
+    monkeypatch.setattr(app, "cosmos_conversation_client", cosmos)
+    monkeypatch.setattr(app, "azure_openai_client", BarrierUpstreamClient(parties=4))
+    monkeypatch.setattr(app, "should_use_data", lambda: False)
+
+    answers = {}
+
+    def chat(question):
+        client = app.app.test_client()
+        response = client.post("/history/generate", json={"messages": [{"role": "user", "content": question}]})
+        frames = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        answer = {"id": frames[-1]["id"], "role": "assistant", "content": frames[-1]["choices"][0]["messages"][0]["content"]}
+        client.post("/history/update", json={
+            "conversation_id": frames[-1]["history_metadata"]["conversation_id"],
+            "messages": [{"role": "user", "content": question}, answer]
+        })
+        answers[question] = (frames, answer)
+
+    threads = [threading.Thread(target=chat, args=(f"question {i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    message_ids = set()
+    for question, (frames, answer) in answers.items():
+        assert answer["content"] == "re: " + question
+        assert {frame["id"] for frame in frames} == {frame["history_metadata"]["message_id"] for frame in frames} == {answer["id"]}
+        assert (answer["id"], frames[-1]["history_metadata"]["conversation_id"], "assistant", "re: " + question) in cosmos.messages
+        message_ids.add(answer["id"])
+    assert len(message_ids) == 4
+
+
+class SlowTitleUpstreamClient(FakeUpstreamClient):
+    ## answers right away, but the title call waits until the test releases it
+    def __init__(self):
+        super().__init__([])
+        self.release_title = threading.Event()
+
+    def post(self, operation, api_version, body, headers=None):
+        if not body.get("stream"):
+            assert self.release_title.wait(timeout=5)
+            return UpstreamResponse(200, {}, iter([json.dumps({"choices": [{"message": {"content": '{"title": "Employee handbook"}'}}]}).encode("utf-8")]), lambda: None)
+        return UpstreamResponse(200, {}, iter([sse_body("Hello")]), lambda: None)
+
+
+def test_title_is_generated_after_the_answer_starts(monkeypatch):
+    cosmos = FakeCosmosClient()
+    upstream = SlowTitleUpstreamClient()
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(app, "cosmos_conversation_client", cosmos)
+    monkeypatch.setattr(app, "azure_openai_client", upstream)
+    monkeypatch.setattr(app, "title_executor", executor)
+    monkeypatch.setattr(app, "should_use_data", lambda: False)
+
+    question = "What does the employee handbook say about remote work?"
+    response = app.app.test_client().post("/history/generate", json={"messages": [{"role": "user", "content": question}]})
+    frames = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert frames[-1]["choices"][0]["messages"][0]["content"] == "Hello"
+    assert frames[-1]["history_metadata"]["title"] == "What does the employee handbook say…"
+    conversation_id = frames[-1]["history_metadata"]["conversation_id"]
+    assert cosmos.titles[conversation_id] == "What does the employee handbook say…"
+
+    upstream.release_title.set()
+    executor.shutdown(wait=True)
+    assert cosmos.titles[conversation_id] == "Employee handbook"
+
+
+def test_answer_cache_replays_streamed_answer(monkeypatch):
+    citations = json.dumps({"citations": [{"content": "Remote work is allowed.", "title": "Handbook"}]})
+    body = sse_body("Remote", " work", " is allowed.", extensions=True, citations=citations)
+    upstream = FakeUpstreamClient([body])
+    monkeypatch.setattr(app, "azure_openai_client", upstream)
+    monkeypatch.setattr(app, "answer_cache", AnswerCache(ttl_seconds=300, max_entries=10))
+    monkeypatch.setattr(app, "should_use_data", lambda: True)
+    monkeypatch.setattr(app, "DATASOURCE_SETTINGS", DataSourceSettings("AzureCognitiveSearch", options=(("filter", None),)))
+
+    def ask(question):
+        response = app.app.test_client().post("/conversation", json={"messages": [{"role": "user", "content": question}]})
+        return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    streamed = ask("Can I work remotely?")
+    replayed = ask("  can I work   REMOTELY? ")
+
+    assert len(upstream.calls) == 1
+    assert [frame["choices"][0]["messages"] for frame in replayed] == [
+        [{"role": "tool", "content": citations}],
+        [{"role": "assistant", "content": ""}],
+        [{"role": "assistant", "content": "Remote work is allowed."}]
+    ]
+    assert "".join(frame["choices"][0]["messages"][0]["content"] for frame in streamed[2:]) == replayed[2]["choices"][0]["messages"][0]["content"]
+    assert all(set(frame) == set(streamed[0]) for frame in replayed)
+    assert replayed[0]["id"] != streamed[0]["id"]
+
+
+def test_answer_cache_skips_failed_streams(monkeypatch):
+    upstream = FakeUpstreamClient([sse_body({"error": {"message": "throttled"}}, extensions=True, end=False)])
+    monkeypatch.setattr(app, "azure_openai_client", upstream)
+    monkeypatch.setattr(app, "answer_cache", AnswerCache(ttl_seconds=300, max_entries=10))
+
+    list(app.stream_with_data({"messages": []}, {}, recorder=app.AnswerRecorder(app.answer_cache, "key")))
+
+    assert app.answer_cache.get("key") is None
+
+
+def test_answer_cache_disk_tier_and_seed_file(monkeypatch, tmp_path):
+    seed_file = tmp_path / "seed.jsonl"
+    seed_file.write_text(json.dumps({"messages": [{"role": "user", "content": "Where is the handbook?"}], "answer": "On the intranet."}) + "\n", encoding="utf-8")
+    disk_path = str(tmp_path / "answers.db")
+    monkeypatch.setattr(app, "should_use_data", lambda: False)
+    monkeypatch.setattr(app, "answer_cache", AnswerCache(ttl_seconds=300, max_entries=10, disk_path=disk_path))
+
+    assert app.warm_answer_cache(str(seed_file)) == 1
+
+    # another worker process sharing the SQLite file starts with an empty memory tier
+    monkeypatch.setattr(app, "answer_cache", AnswerCache(ttl_seconds=300, max_entries=10, disk_path=disk_path))
+    monkeypatch.setattr(app, "azure_openai_client", FakeUpstreamClient([], status_code=500))
+    response = app.app.test_client().post("/conversation", json={"messages": [{"role": "user", "content": "where is the handbook?"}]})
+    frames = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert [frame["choices"][0]["messages"][0]["content"] for frame in frames] == ["On the intranet."]
+    assert len(app.answer_cache.memory) == 1
+
+
+def test_semantic_cache_answers_paraphrases_within_a_filter_scope(monkeypatch):
+    body = sse_body("Up to three days a week.", extensions=True)
+    upstream = FakeUpstreamClient([body])
+    cache = SemanticAnswerCache(HashingEmbedder(), threshold=0.8, ttl_seconds=300, max_entries=10)
+    monkeypatch.setattr(app, "azure_openai_client", upstream)
+    monkeypatch.setattr(app, "semantic_answer_cache", cache)
+    monkeypatch.setattr(app, "should_use_data", lambda: True)
+    monkeypatch.setattr(app, "DATASOURCE_TYPE", "AzureCognitiveSearch")
+    monkeypatch.setattr(app, "DATASOURCE_SETTINGS", DataSourceSettings("AzureCognitiveSearch", options=(("filter", None),)))
+    monkeypatch.setattr(app, "AZURE_SEARCH_PERMITTED_GROUPS_COLUMN", "group_ids")
+    monkeypatch.setattr(app, "user_filter_cache", TTLCache(ttl_seconds=300, max_entries=10))
+    monkeypatch.setattr(app, "fetchUserGroups", lambda userToken: [{"id": userToken}])
+
+    def ask(question, token):
+        response = app.app.test_client().post("/conversation", json={"messages": [{"role": "user", "content": question}]}, headers={"X-MS-TOKEN-AAD-ACCESS-TOKEN": token})
+        return [json.loads(line)["choices"][0]["messages"][0]["content"] for line in response.get_data(as_text=True).splitlines()]
+
+    assert ask("What is the remote work policy?", "group-a") == ["", "Up to three days a week."]
+    assert ask("what is the remote-work policy", "group-a") == ["", "Up to three days a week."]
+    assert len(upstream.calls) == 1
+
+    # the same question from a user with other groups goes upstream
+    ask("what is the remote-work policy", "group-b")
+    assert len(upstream.calls) == 2
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["scopes"] == 2
+
+
+def test_semantic_cache_evicts_least_recently_used_and_counts_hits():
+    cache = SemanticAnswerCache(HashingEmbedder(), threshold=0.9, ttl_seconds=300, max_entries=2)
+
+    def key(question):
+        return cache.key({"messages": [{"role": "user", "content": question}]})
+
+    cache.set(key("How many vacation days do I get?"), {"content": "25"})
+    cache.set(key("Where is the office?"), {"content": "Seattle"})
+    assert cache.get(key("How many vacation days do I get?")) == {"content": "25"}
+    cache.set(key("Who is my manager?"), {"content": "Ask HR"})
+
+    assert cache.get(key("Where is the office?")) is None
+    assert cache.get(key("Who is my manager?")) == {"content": "Ask HR"}
+    assert cache.stats() == {"entries": 2, "scopes": 1, "hits": 2, "misses": 1, "near_misses": 0, "evictions": 1, "hit_rate": 2 / 3}
+
+
+def test_semantic_cache_lookups_are_served_on_metrics():
+    prometheus_client = pytest.importorskip("prometheus_client")
+    cache = SemanticAnswerCache(HashingEmbedder(), threshold=0.9, ttl_seconds=300, max_entries=10)
+
+    def key(question):
+        return cache.key({"messages": [{"role": "user", "content": question}]})
+
+    def lookups(result):
+        return prometheus_client.REGISTRY.get_sample_value("chat_semantic_cache_lookups_total", {"result": result}) or 0
+
+    before = {result: lookups(result) for result in ("hit", "near_miss", "miss")}
+    cache.set(key("How many vacation days do I get?"), {"content": "25"})
+    cache.get(key("how many vacation days do I get"))
+    cache.get(key("How many vacation days do I get per year?"))
+    cache.get(key("Where is the office?"))
+    response = app.app.test_client().get("/metrics")
+
+    assert cache.stats()["near_misses"] == 1
+    assert {result: lookups(result) - before[result] for result in before} == {"hit": 1, "near_miss": 1, "miss": 1}
+    assert b'chat_semantic_cache_lookups_total{result="near_miss"}' in response.data
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def test_history_budgeter_drops_old_tool_messages_then_old_turns():
+    budgeter = HistoryBudgeter(prompt_budget=60, system_message="You help.", max_tokens=1000, model_name="gpt-35-turbo-16k", count_tokens=count_words)
+    citations = " ".join(["citation"] * 20)
+    messages = [
+        {"role": "user", "content": "first question"},
+        {"role": "tool", "content": citations},
+        {"role": "assistant", "content": "first answer"},
+        {"role": "user", "content": "second question"},
+        {"role": "tool", "content": citations},
+        {"role": "assistant", "content": "second answer"},
+        {"role": "user", "content": "third question"},
+    ]
+
+    trimmed = budgeter.trim(messages)
+
+    # both tool messages go before any turn does
+    assert [m["content"] for m in trimmed.messages] == ["first question", "first answer", "second question", "second answer", "third question"]
+    assert trimmed.trimmed_tokens == 2 * (20 + 4)
+    assert trimmed.tokens <= 60
+
+    trimmed = HistoryBudgeter(prompt_budget=30, system_message="You help.", max_tokens=1000, count_tokens=count_words).trim(messages)
+    assert [m["content"] for m in trimmed.messages] == ["second question", "second answer", "third question"]
+    assert trimmed.dropped_messages == 4
+
+
+def test_history_budgeter_rejects_budgets_that_do_not_fit():
+    with pytest.raises(ValueError):
+        HistoryBudgeter(prompt_budget=8, system_message="You are a helpful assistant.", max_tokens=1000, count_tokens=count_words)
+    with pytest.raises(ValueError):
+        HistoryBudgeter(prompt_budget=4000, system_message="You help.", max_tokens=1000, model_name="gpt-35-turbo", count_tokens=count_words)
+
+
+def test_conversation_sends_trimmed_history(monkeypatch):
+    client = FakeUpstreamClient([sse_body()])
+    monkeypatch.setattr(app, "azure_openai_client", client)
+    monkeypatch.setattr(app, "should_use_data", lambda: False)
+    monkeypatch.setattr(app, "history_budgeter", HistoryBudgeter(prompt_budget=30, system_message="You help.", max_tokens=1000, count_tokens=count_words))
+
+    history = [{"role": "user", "content": "old question " * 10}, {"role": "assistant", "content": "old answer"}, {"role": "user", "content": "new question"}]
+    app.app.test_client().post("/conversation", json={"messages": history}).get_data()
+
+    assert [m["content"] for m in client.calls[0][2]["messages"]] == [app.AZURE_OPENAI_SYSTEM_MESSAGE, "new question"]
+
+
+LOCAL_CHUNKS = [
+    {"content": "Employees may work remotely up to three days a week.", "title": "Remote work policy", "filepath": "remote.md", "url": None},
+    {"content": "The office is in Seattle, next to the waterfront.", "title": "Office", "filepath": "office.md", "url": None},
+    {"content": "Vacation days accrue monthly, 25 days a year.", "title": "Vacation", "filepath": "vacation.md", "url": None},
+]
+
+
+def test_local_search_ranks_keyword_and_hybrid_matches():
+    embedder = HashingEmbedder()
+    index = LocalSearchIndex([{**chunk, "contentVector": embedder.embed(chunk["content"]).tolist()} for chunk in LOCAL_CHUNKS])
+
+    results = index.search("when does vacation accrue", top_k=2)
+    assert [chunk["title"] for chunk, score in results] == ["Vacation"]
+
+    query = "where is the office"
+    results = index.search(query, top_k=2, query_type="vectorSimpleHybrid", query_vector=embedder.embed(query))
+    assert results[0][0]["title"] == "Office"
+    assert len(results) == 2
+    assert index.search("nothing matches this", top_k=3) == []
+
+
+def test_local_datasource_streams_citations_then_answer(monkeypatch):
+    chunks = [{"choices": [], "model": "", "created": 0, "object": "", "id": ""}]
+    for delta, finish_reason in [({"role": "assistant", "content": ""}, None), ({"content": "Three days [doc1]."}, None), ({}, "stop")]:
+        chunks.append({"id": "1", "model": "gpt-35-turbo", "created": 1, "object": "chat.completion.chunk", "choices": [{"delta": delta, "finish_reason": finish_reason}]})
+    upstream = FakeUpstreamClient([sse_body(*chunks)])
+    monkeypatch.setattr(app, "azure_openai_client", upstream)
+    monkeypatch.setattr(app, "should_use_data", lambda: True)
+    monkeypatch.setattr(app, "DATASOURCE_TYPE", "Local")
+    monkeypatch.setattr(app, "local_search_index", LocalSearchIndex(LOCAL_CHUNKS))
+
+    response = app.app.test_client().post("/conversation", json={"messages": [{"role": "user", "content": "Can I work remotely?"}, {"role": "tool", "content": "{}"}]})
+    messages = [json.loads(line)["choices"][0]["messages"][0] for line in response.get_data(as_text=True).splitlines()]
+
+    assert upstream.calls[0][0] == "chat/completions"
+    sent = upstream.calls[0][2]["messages"]
+    assert [message["role"] for message in sent] == ["system", "user"]
+    assert "[doc1] Remote work policy" in sent[0]["content"]
+    assert messages[0]["role"] == "tool"
+    citations = json.loads(messages[0]["content"])["citations"]
+    assert [citation["filepath"] for citation in citations] == ["remote.md"]
+    assert [message["content"] for message in messages[1:]] == ["", "Three days [doc1]."]
+
+
+
+def test_embedding_timeouts_fall_back_to_a_miss_and_keyword_search(monkeypatch):
+    import socket
+    from backend.embeddings import AzureOpenAIEmbedder
+    # the listener completes the handshake but never answers
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+    embedder = AzureOpenAIEmbedder(f"http://127.0.0.1:{listener.getsockname()[1]}/embeddings", "key", read_timeout=0.2)
+    monkeypatch.setattr(app, "SHOULD_STREAM", True)
+    monkeypatch.setattr(app, "answer_cache", None)
+    monkeypatch.setattr(app, "semantic_answer_cache", SemanticAnswerCache(embedder))
+    monkeypatch.setattr(app, "local_embedder", embedder)
+    monkeypatch.setattr(app, "local_search_index", LocalSearchIndex(LOCAL_CHUNKS))
+    monkeypatch.setattr(app, "LOCAL_SEARCH_QUERY_TYPE", "vector")
+    start = time.monotonic()
+    try:
+        answer, recorder = app.lookup_answer({"messages": [{"role": "user", "content": "Can I work remotely?"}]}, semantic=True)
+        assert answer is None and recorder is not None
+        body, tool_content = app.prepare_body_with_local_data({"messages": [{"role": "user", "content": "Can I work remotely?"}]})
+        assert [citation["filepath"] for citation in json.loads(tool_content)["citations"]] == ["remote.md"]
+        assert time.monotonic() - start < 2
+    finally:
+        listener.close()
+
+
+GOLDEN_DELTAS = ["", "Hello", " \"quoted\" \\ back\\slash", "line\nbreak\ttab\r\x00\x1f", "I ❤️ 🐍 ünïcödé", "\u2028\u2029</script>", "[doc1]"]
+
+
+def test_frame_encoder_matches_format_as_ndjson():
+    history_metadata = {"conversation_id": "c-1", "title": "Provisional…"}
+    encoder = ndjson.FrameEncoder("m-1", history_metadata, with_apim_request_id=True, apim_request_id="req-1")
+    for i, content in enumerate(GOLDEN_DELTAS):
+        if i == 3:
+            # the generated title arrives mid-stream
+            history_metadata["title"] = "Remote work"
+        lineJson = {"id": "1", "model": "gpt-35-turbo", "created": 1700000000 + i // 4, "object": "chunk", "choices": [{"messages": [{"delta": {"content": content}}]}]}
+        assert list(app.format_stream_response_with_data(lineJson, "req-1", history_metadata, "m-1", encoder)) == list(app.format_stream_response_with_data(lineJson, "req-1", history_metadata, "m-1"))
+
+    encoder = ndjson.FrameEncoder("m-1", history_metadata)
+    previous = ""
+    for content in GOLDEN_DELTAS + [None]:
+        line = {"id": "1", "model": "gpt-35-turbo", "created": 1, "object": "chat.completion.chunk", "choices": [{"delta": {"content": content}}]}
+        assert app.format_stream_response_without_data(line, previous, history_metadata, "m-1", encoder) == app.format_stream_response_without_data(line, previous, history_metadata, "m-1")
+        previous = app.format_stream_response_without_data(line, previous, history_metadata, "m-1")[0]
+
+
+def test_frame_encoder_golden_frame():
+    encoder = ndjson.FrameEncoder("m-1", {"title": "Ünïcode"}, with_apim_request_id=True, apim_request_id=None)
+    assert encoder.content_frame("gpt-4", 1, "chunk", "a \"b\"\n🐍") == (
+        '{"id": "m-1", "model": "gpt-4", "created": 1, "object": "chunk", "choices": [{"messages": [{"role": "assistant", "content": "a \\"b\\"\\n🐍"}]}], '
+        '"apim-request-id": null, "history_metadata": {"title": "Ünïcode"}}\n'
+    )
+
+
+def test_deployment_pool_fails_over_on_429_before_streaming(monkeypatch):
+    throttled = FakeUpstreamClient([b'{"error": "throttled"}'], status_code=429, headers={"retry-after": "30"}, deployment="throttled")
+    healthy = FakeUpstreamClient([sse_body("Hello")], headers={"x-ratelimit-remaining-tokens": "1000"}, deployment="healthy")
+    pool = DeploymentPool([throttled, healthy])
+    # the throttled deployment reported the most capacity, so it is tried first
+    for deployment, remaining_tokens in zip(pool.deployments, [5000, 100]):
+        deployment.remaining_tokens = remaining_tokens
+        deployment.quota_read_at = time.monotonic()
+    monkeypatch.setattr(app, "azure_openai_client", pool)
+    monkeypatch.setattr(app, "should_use_data", lambda: False)
+
+    response = app.app.test_client().post("/conversation", json={"messages": [{"role": "user", "content": "Hi"}]})
+    frames = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert [frame["choices"][0]["messages"][0]["content"] for frame in frames] == ["Hello"]
+    assert len(throttled.calls) == 1 and len(healthy.calls) == 1
+    assert pool.deployments[0].unavailable_until - time.monotonic() > 25
+
+    # while it waits out its retry-after, requests go straight to the healthy deployment
+    app.app.test_client().post("/conversation", json={"messages": [{"role": "user", "content": "Hi"}]})
+    assert len(throttled.calls) == 1 and len(healthy.calls) == 2
+
+
+def test_deployment_pool_routes_by_remaining_tokens_and_returns_last_failure():
+    busy = FakeUpstreamClient([], headers={"x-ratelimit-remaining-tokens": "100"}, deployment="busy")
+    idle = FakeUpstreamClient([], headers={"x-ratelimit-remaining-tokens": "90000"}, deployment="idle")
+    pool = DeploymentPool([busy, idle])
+    for _ in range(2):
+        pool.post("chat/completions", "2023-08-01-preview", {})
+    for _ in range(4):
+        pool.post("chat/completions", "2023-08-01-preview", {})
+    # once both have reported their quota, everything goes to the one with the most left
+    assert len(idle.calls) == 5 and len(busy.calls) == 1
+
+    down = DeploymentPool([FakeUpstreamClient([], status_code=503, deployment=name) for name in ["a", "b"]])
+    assert down.post("chat/completions", "2023-08-01-preview", {}).status_code == 503
+    assert all(deployment.unavailable_until > time.monotonic() for deployment in down.deployments)
+
+
+class SlowStartUpstreamClient(FakeUpstreamClient):
+    ## sends headers, and the chunks in head, at once but waits start_seconds before the rest
+    def __init__(self, chunks, start_seconds, deployment, head=()):
+        super().__init__(chunks, deployment=deployment)
+        self.start_seconds = start_seconds
+        self.head = list(head)
+        self.closed = 0
+
+    def post(self, operation, api_version, body, headers=None):
+        self.calls.append((operation, api_version, body))
+
+        def chunks():
+            yield from self.head
+            time.sleep(self.start_seconds)
+            yield from self.chunks
+
+        def close():
+            self.closed += 1
+        return UpstreamResponse(200, {"apim-request-id": "req-1"}, chunks(), close)
+
+
+def test_hedged_request_relays_the_stream_that_starts_first():
+    slow = SlowStartUpstreamClient([b"data: slow\n\n"], start_seconds=0.5, deployment="slow")
+    fast = SlowStartUpstreamClient([b"data: fast\n\n"], start_seconds=0, deployment="fast")
+    pool = DeploymentPool([slow, fast])
+    for deployment, remaining_tokens in zip(pool.deployments, [5000, 100]):
+        deployment.remaining_tokens = remaining_tokens
+        deployment.quota_read_at = time.monotonic()
+    hedger = Hedger(delay_ms=50, budget=0.5, max_burst=1)
+
+    # a route starts without credit and one request only earns half a hedge, so it waits it out
+    response = hedger.post(pool, "chat/completions", "2023-08-01-preview", {"stream": True}, route="chat")
+    assert list(response.iter_lines()) == [b"data: slow", b""]
+    assert hedger.stats() == {"chat": {"requests": 1, "hedged": 0, "hedge_wins": 0, "over_budget": 1}}
+
+    start = time.monotonic()
+    response = hedger.post(pool, "chat/completions", "2023-08-01-preview", {"stream": True}, route="chat")
+    assert list(response.iter_lines()) == [b"data: fast", b""]
+    assert time.monotonic() - start < 0.4
+    assert slow.closed == 1
+    assert hedger.stats()["chat"] == {"requests": 2, "hedged": 1, "hedge_wins": 1, "over_budget": 1}
+
+
+def test_hedge_waits_for_the_first_answer_text_not_the_first_bytes():
+    role = sse_body({"choices": [{"delta": {"role": "assistant"}}]}, end=False)
+    slow = SlowStartUpstreamClient([sse_body("slow")], start_seconds=0.5, deployment="slow", head=[role])
+    fast = SlowStartUpstreamClient([role, sse_body("fast")], start_seconds=0, deployment="fast")
+    pool = DeploymentPool([slow, fast])
+    for deployment, remaining_tokens in zip(pool.deployments, [5000, 100]):
+        deployment.remaining_tokens = remaining_tokens
+        deployment.quota_read_at = time.monotonic()
+    hedger = Hedger(delay_ms=50, budget=1, max_burst=1)
+
+    # the slow deployment sends its role delta at once, but its answer only starts later
+    response = hedger.post(pool, "chat/completions", "2023-08-01-preview", {"stream": True}, route="chat")
+    lines = [parse_sse_json(line) for line in response.iter_lines()]
+    assert [line["choices"][0]["delta"] for line in lines if line] == [{"role": "assistant"}, {"content": "fast"}]
+    assert hedger.stats()["chat"]["hedge_wins"] == 1
+
+
+def test_hedge_counts_are_served_on_metrics():
+    pytest.importorskip("prometheus_client")
+    slow = SlowStartUpstreamClient([b"data: slow\n\n"], start_seconds=0.3, deployment="slow")
+    fast = SlowStartUpstreamClient([b"data: fast\n\n"], start_seconds=0, deployment="fast")
+    pool = DeploymentPool([slow, fast])
+    for deployment, remaining_tokens in zip(pool.deployments, [5000, 100]):
+        deployment.remaining_tokens = remaining_tokens
+        deployment.quota_read_at = time.monotonic()
+    hedger = Hedger(delay_ms=50, budget=0.5, max_burst=1)
+
+    for _ in range(2):
+        list(hedger.post(pool, "chat/completions", "2023-08-01-preview", {"stream": True}, route="metrics-test").iter_lines())
+    exposition = app.app.test_client().get("/metrics").get_data(as_text=True)
+
+    for name, value in [("requests", 2), ("hedged", 1), ("wins", 1), ("over_budget", 1)]:
+        assert f'chat_hedge_{name}_total{{route="metrics-test"}} {value}.0' in exposition
+
+
+def test_token_bucket_is_shared_through_its_state_file(tmp_path):
+    path = str(tmp_path / "bucket")
+    first = SharedTokenBucket(rate_per_second=10, capacity=100, path=path)
+    second = SharedTokenBucket(rate_per_second=10, capacity=100, path=path)
+
+    assert first.take(80) == 0
+    # the other worker's bucket sees the tokens the first one took
+    assert second.take(80) == pytest.approx(6, abs=0.1)
+    assert second.take(20) == 0
+
+
+def test_admission_takes_turns_between_users():
+    controller = AdmissionController(SharedTokenBucket(rate_per_second=100, capacity=5), max_wait_seconds=5)
+    controller.admit("a", 5)
+    admitted = []
+
+    def admit(user, name):
+        controller.admit(user, 5)
+        admitted.append(name)
+
+    threads = []
+    for user, name in [("a", "a2"), ("a", "a3"), ("b", "b1")]:
+        threads.append(threading.Thread(target=admit, args=(user, name)))
+        threads[-1].start()
+        time.sleep(0.01)
+    for thread in threads:
+        thread.join()
+
+    assert admitted == ["a2", "b1", "a3"]
+
+
+def test_admission_refunds_what_the_answer_did_not_use(monkeypatch):
+    bucket = SharedTokenBucket(rate_per_second=0.001, capacity=5000)
+    controller = AdmissionController(bucket, max_wait_seconds=1)
+    admission = controller.admit("a", 1200, completion_tokens=1000)
+    admission.settle(100)
+    admission.settle(0)
+    assert bucket.tokens == pytest.approx(5000 - 1200 + 900, abs=1)
+
+    # a non-streamed answer is settled from the usage Azure OpenAI reports
+    monkeypatch.setattr(app, "admission_controller", controller)
+    monkeypatch.setattr(app, "should_use_data", lambda: False)
+    monkeypatch.setattr(app, "SHOULD_STREAM", False)
+    completion = {"id": "1", "model": "gpt-35-turbo", "created": 1, "object": "chat.completion", "choices": [{"message": {"role": "assistant", "content": "Hello"}}], "usage": {"completion_tokens": 2}}
+    monkeypatch.setattr(app, "azure_openai_client", FakeUpstreamClient([json.dumps(completion).encode()]))
+    before = bucket.tokens
+    app.app.test_client().post("/conversation", json={"messages": [{"role": "user", "content": "Hi"}]})
+    _, cost, completion_tokens = app.admission_user_and_cost({"messages": [{"role": "user", "content": "Hi"}]}, {})
+    assert before - bucket.tokens == pytest.approx(cost - completion_tokens + 2, abs=1)
+
+
+def test_admission_rejects_with_retry_after(monkeypatch):
+    bucket = SharedTokenBucket(rate_per_second=100, capacity=1000)
+    bucket.take(1000)
+    monkeypatch.setattr(app, "admission_controller", AdmissionController(bucket, max_wait_seconds=1))
+    monkeypatch.setattr(app, "should_use_data", lambda: False)
+
+    response = app.app.test_client().post("/conversation", json={"messages": [{"role": "user", "content": "Hi"}]})
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "10"
+    assert "retry after" in response.get_json()["error"]
+
+
+def test_answer_cache_hit_skips_admission(monkeypatch):
+    body = sse_body("Yes.", extensions=True)
+    upstream = FakeUpstreamClient([body])
+    bucket = SharedTokenBucket(rate_per_second=1, capacity=10000)
+    monkeypatch.setattr(app, "azure_openai_client", upstream)
+    monkeypatch.setattr(app, "answer_cache", AnswerCache(ttl_seconds=300, max_entries=10))
+    monkeypatch.setattr(app, "admission_controller", AdmissionController(bucket, max_wait_seconds=1))
+    monkeypatch.setattr(app, "AZURE_OPENAI_ADMISSION_DATA_TOKENS", 3000)
+    monkeypatch.setattr(app, "should_use_data", lambda: True)
+    monkeypatch.setattr(app, "DATASOURCE_SETTINGS", DataSourceSettings("AzureCognitiveSearch", options=(("filter", None),)))
+
+    def ask(question):
+        return app.app.test_client().post("/conversation", json={"messages": [{"role": "user", "content": question}]})
+
+    streamed = ask("Can I work remotely?")
+    assert "Yes." in streamed.get_data(as_text=True)
+    charged = 10000 - bucket.tokens
+    # once the answer is done, what it left of max_tokens is given back
+    _, cost, completion_tokens = app.admission_user_and_cost({"messages": [{"role": "user", "content": "Can I work remotely?"}]}, {})
+    assert charged == pytest.approx(cost + 3000 - (completion_tokens - len("Yes.") // 4), abs=1)
+
+    bucket.write(0, time.time())
+    replayed = ask("can I work remotely?")
+    rejected = ask("Can I work from home?")
+
+    assert replayed.status_code == 200
+    assert "Yes." in replayed.get_data(as_text=True)
+    assert bucket.tokens < 10
+    assert rejected.status_code == 429
+    assert len(upstream.calls) == 1
+
+
+class GatedUpstreamClient(FakeUpstreamClient):
+    ## answers a non-streamed completion once the test opens the gate
+    def __init__(self):
+        super().__init__([])
+        self.gate = threading.Event()
+
+    def post(self, operation, api_version, body, headers=None):
+        self.calls.append((operation, api_version, body))
+        self.gate.wait(5)
+        completion = {"id": "1", "model": "gpt-35-turbo", "created": 1, "object": "chat.completion", "choices": [{"message": {"role": "assistant", "content": "Hello"}}]}
+        return UpstreamResponse(200, {}, iter([json.dumps(completion).encode("utf-8")]), lambda: None)
+
+
+def test_identical_requests_in_flight_share_one_upstream_call(monkeypatch):
+    upstream = GatedUpstreamClient()
+    monkeypatch.setattr(app, "azure_openai_client", upstream)
+    monkeypatch.setattr(app, "single_flight", SingleFlight())
+    monkeypatch.setattr(app, "SHOULD_STREAM", False)
+    monkeypatch.setattr(app, "should_use_data", lambda: False)
+
+    def chat(conversation_id):
+        response = app.app.test_client().post("/conversation", json={
+            "messages": [{"role": "user", "content": "Hi"}],
+            "history_metadata": {"conversation_id": conversation_id}
+        })
+        return response.get_json()
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        first = executor.submit(chat, "a")
+        deadline = time.monotonic() + 5
+        while not upstream.calls and time.monotonic() < deadline:
+            time.sleep(0.01)
+        second = executor.submit(chat, "b")
+        while app.single_flight.shared < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        upstream.gate.set()
+        answers = [first.result(), second.result()]
+
+    assert len(upstream.calls) == 1
+    assert [answer["choices"][0]["messages"][0]["content"] for answer in answers] == ["Hello", "Hello"]
+    assert [answer["history_metadata"]["conversation_id"] for answer in answers] == ["a", "b"]
+    assert app.single_flight.in_flight == {}
+
+
+def test_metrics_time_streamed_answers_and_routes(monkeypatch):
+    prometheus_client = pytest.importorskip("prometheus_client")
+    monkeypatch.setattr(app, "azure_openai_client", FakeUpstreamClient([sse_body("Hel", "lo")]))
+    monkeypatch.setattr(app, "should_use_data", lambda: False)
+
+    def sample(name, **labels):
+        return prometheus_client.REGISTRY.get_sample_value(name, labels) or 0
+
+    first_tokens = sample("chat_time_to_first_token_seconds_count", stream="without_data")
+    rates = sample("chat_stream_tokens_per_second_count", stream="without_data")
+    requests = sample("chat_http_request_duration_seconds_count", route="/conversation", method="POST", status="200")
+
+    client = app.app.test_client()
+    client.post("/conversation", json={"messages": [{"role": "user", "content": "Hi"}]}).get_data()
+    response = client.get("/metrics")
+
+    assert sample("chat_time_to_first_token_seconds_count", stream="without_data") == first_tokens + 1
+    assert sample("chat_stream_tokens_per_second_count", stream="without_data") == rates + 1
+    assert sample("chat_http_request_duration_seconds_count", route="/conversation", method="POST", status="200") == requests + 1
+    assert response.status_code == 200
+    assert b"chat_stream_duration_seconds_bucket" in response.data
+
+
+class RecordingAzureOpenAIClient(AzureOpenAIClient):
+    ## the real client with the HTTP request replaced, keeping the headers it would send
+    def __init__(self, chunks):
+        super().__init__("https://fake.openai.azure.com/", "fake", "key")
+        self.chunks = chunks
+        self.sent_headers = []
+
+    def send(self, operation, api_version, body, headers=None):
+        self.sent_headers.append(headers)
+        return UpstreamResponse(200, {"apim-request-id": "req-1"}, iter(self.chunks), lambda: None)
+
+
+def test_streamed_answer_is_traced_in_phases_under_the_request(monkeypatch):
+    pytest.importorskip("opentelemetry.sdk")
+    from backend import tracing
+    exporter = tracing.configure("memory")
+    upstream = RecordingAzureOpenAIClient([sse_body("Hello")])
+    monkeypatch.setattr(app, "azure_openai_client", upstream)
+    monkeypatch.setattr(app, "should_use_data", lambda: False)
+
+    app.app.test_client().post("/conversation", json={"messages": [{"role": "user", "content": "Hi"}]}).get_data()
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+
+    request_span, stream_span, upstream_span = spans["POST /conversation"], spans["answer stream without_data"], spans["POST chat/completions"]
+    assert stream_span.parent.span_id == request_span.context.span_id
+    assert spans["first token"].parent.span_id == spans["stream"].parent.span_id == upstream_span.parent.span_id == stream_span.context.span_id
+    assert upstream_span.attributes["apim_request_id"] == "req-1"
+    assert {span.context.trace_id for span in spans.values()} == {request_span.context.trace_id}
+    assert upstream.sent_headers[0]["traceparent"].split("-")[2] == format(upstream_span.context.span_id, "016x")
+
+
+def test_streamed_answers_are_saved_by_the_server(monkeypatch):
+    citations = json.dumps({"citations": [{"content": "Remote work is allowed.", "title": "Handbook"}]})
+    body = sse_body("Remote", " work", " is allowed.", extensions=True, citations=citations)
+    cosmos = FakeCosmosClient()
+    monkeypatch.setattr(app, "cosmos_conversation_client", cosmos)
+    monkeypatch.setattr(app, "AZURE_COSMOSDB_SAVE_STREAMED_ANSWERS", True)
+    monkeypatch.setattr(app, "azure_openai_client", FakeUpstreamClient([body[i:i + 40] for i in range(0, len(body), 40)]))
+    monkeypatch.setattr(app, "should_use_data", lambda: True)
+    monkeypatch.setattr(app, "DATASOURCE_SETTINGS", DataSourceSettings("AzureCognitiveSearch", options=(("filter", None),)))
+    client = app.app.test_client()
+
+    response = client.post("/history/generate", json={"conversation_id": "c-1", "messages": [{"role": "user", "content": "Can I work remotely?"}]})
+    message_id = json.loads(response.get_data(as_text=True).splitlines()[-1])["id"]
+    assert cosmos.messages[1:] == [(cosmos.messages[1][0], "c-1", "tool", citations), (message_id, "c-1", "assistant", "Remote work is allowed.")]
+
+    # the client stops reading after the first token: what was streamed is saved
+    cosmos.messages.clear()
+    response = client.post("/history/generate", json={"conversation_id": "c-2", "messages": [{"role": "user", "content": "Can I work remotely?"}]}, buffered=False)
+    frames = iter(response.response)
+    while '"content": "Remote"' not in next(frames).decode("utf-8"):
+        pass
+    response.close()
+    assert [message[1:] for message in cosmos.messages[1:]] == [("c-2", "tool", citations), ("c-2", "assistant", "Remote")]
+
+    # an answer that ends in an error is not saved, only its question is
+    cosmos.messages.clear()
+    body = sse_body("Remote", {"error": {"message": "The server had an error"}}, extensions=True, citations=citations, end=False)
+    monkeypatch.setattr(app, "azure_openai_client", FakeUpstreamClient([body]))
+    client.post("/history/generate", json={"conversation_id": "c-3", "messages": [{"role": "user", "content": "Can I work remotely?"}]}).get_data()
+    assert [message[1:3] for message in cosmos.messages] == [("c-3", "user")]
+
+
+def test_cached_answer_is_saved_after_its_replay(monkeypatch):
+    cosmos = FakeCosmosClient()
+    monkeypatch.setattr(app, "cosmos_conversation_client", cosmos)
+    monkeypatch.setattr(app, "AZURE_COSMOSDB_SAVE_STREAMED_ANSWERS", True)
+    monkeypatch.setattr(app, "azure_openai_client", FakeUpstreamClient([sse_body("Hello")]))
+    monkeypatch.setattr(app, "answer_cache", AnswerCache(ttl_seconds=300, max_entries=10))
+    monkeypatch.setattr(app, "should_use_data", lambda: False)
+    client = app.app.test_client()
+    client.post("/history/generate", json={"conversation_id": "c-1", "messages": [{"role": "user", "content": "Hi"}]}).get_data()
+
+    saves = []
+    monkeypatch.setattr(app, "save_answer", lambda *args, **kwargs: saves.append(args))
+    response = client.post("/history/generate", json={"conversation_id": "c-2", "messages": [{"role": "user", "content": "Hi"}]}, buffered=False)
+    frames = iter(response.response)
+    assert json.loads(next(frames))["choices"][0]["messages"][0]["content"] == "Hello"
+    assert saves == []
+    list(frames)
+    response.close()
+    assert [(args[1], args[3]["content"], args[4]) for args in saves] == [("c-2", "Hello", False)]
+
+
+class GatedCosmosClient(FakeCosmosClient):
+    ## holds every message write until the test releases it, then stores it or fails
+    def __init__(self, error=None):
+        super().__init__()
+        self.release = threading.Event()
+        self.error = error
+
+    def create_message(self, uuid, conversation_id, user_id, input_message):
+        assert self.release.wait(timeout=5)
+        if self.error:
+            raise self.error
+        super().create_message(uuid, conversation_id, user_id, input_message)
+
+
+@pytest.mark.parametrize("error", [None, Exception("Cosmos DB is unavailable")])
+def test_history_writes_overlap_the_answer(monkeypatch, error):
+    cosmos = GatedCosmosClient(error)
+    monkeypatch.setattr(app, "cosmos_conversation_client", cosmos)
+    monkeypatch.setattr(app, "azure_openai_client", FakeUpstreamClient([sse_body("Hello")]))
+    monkeypatch.setattr(app, "should_use_data", lambda: False)
+
+    response = app.app.test_client().post("/history/generate", json={"conversation_id": "c-1", "messages": [{"role": "user", "content": "Hi"}]}, buffered=False)
+    frames = iter(response.response)
+    # the answer starts while the question is still being written
+    assert json.loads(next(frames))["choices"][0]["messages"][0]["content"] == "Hello"
+    cosmos.release.set()
+    rest = [json.loads(frame) for frame in frames]
+    response.close()
+
+    if error:
+        assert rest == [{"error": "The conversation could not be saved: Cosmos DB is unavailable", "history_metadata": {"conversation_id": "c-1"}}]
+    else:
+        assert rest == [] and [message[1:] for message in cosmos.messages] == [("c-1", "user", "Hi")]
+
+
+def test_failed_answer_is_returned_before_a_failed_history_write(monkeypatch):
+    cosmos = GatedCosmosClient(Exception("Cosmos DB is unavailable"))
+    cosmos.release.set()
+    monkeypatch.setattr(app, "cosmos_conversation_client", cosmos)
+    monkeypatch.setattr(app, "azure_openai_client", FakeUpstreamClient([b'{"error": "throttled"}'], status_code=429))
+    monkeypatch.setattr(app, "should_use_data", lambda: False)
+
+    response = app.app.test_client().post("/history/generate", json={"messages": [{"role": "user", "content": "Hi"}]})
+
+    assert response.status_code == 500
+    assert "429" in response.get_json()["error"]
+
+
+def test_static_assets_are_compressed_and_cached(tmp_path, monkeypatch):
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "assets" / "index-5e49c158.js").write_text("console.log('hello');\n" * 200)
+    (tmp_path / "index.html").write_text("<html>" + "<div></div>" * 200 + "</html>")
+    monkeypatch.setattr(app, "static_files", StaticFiles(str(tmp_path)))
+    client = app.app.test_client()
+
+    plain = client.get("/assets/index-5e49c158.js", headers={"Accept-Encoding": "identity"})
+    compressed = client.get("/assets/index-5e49c158.js", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(compressed.data) == plain.data
+    assert compressed.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+    assert compressed.headers["Vary"] == "Accept-Encoding"
+    assert compressed.headers["ETag"] != plain.headers["ETag"]
+    revalidated = client.get("/assets/index-5e49c158.js", headers={"Accept-Encoding": "gzip", "If-None-Match": compressed.headers["ETag"]})
+    assert revalidated.status_code == 304 and revalidated.data == b""
+
+    index = client.get("/")
+    assert index.headers["Cache-Control"] == "no-cache"
+    assert client.get("/", headers={"If-None-Match": index.headers["ETag"]}).status_code == 304
+    assert client.get("/assets/index-00000000.js").status_code == 404
+
+
+def test_large_static_assets_are_compressed_once_at_startup(tmp_path, monkeypatch):
+    (tmp_path / "build" / "assets").mkdir(parents=True)
+    bundle = tmp_path / "build" / "assets" / "index-86a12d8a.js"
+    bundle.write_text("console.log('hello');\n" * 2000)
+    static_files = StaticFiles(str(tmp_path / "build"), max_memory_size=1024, cache_dir=str(tmp_path / "compressed"))
+    monkeypatch.setattr(app, "static_files", static_files)
+    compressions = []
+    real_compress = gzip.GzipFile.__init__
+    monkeypatch.setattr(gzip.GzipFile, "__init__", lambda self, *args, **kwargs: compressions.append(1) or real_compress(self, *args, **kwargs))
+
+    with ThreadPoolExecutor(4) as pool:
+        assert sum(pool.map(lambda _: static_files.precompress(), range(4))) == 4 * len(static_files.encodings("application/javascript")[:-1])
+    assert len(compressions) == 1
+    assert (tmp_path / "compressed").is_dir()
+
+    compressed = app.app.test_client().get("/assets/index-86a12d8a.js", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(compressed.get_data()) == bundle.read_bytes()
+    assert int(compressed.headers["Content-Length"]) < bundle.stat().st_size
+    assert len(compressions) == 1
+
+
+def test_status_reports_warming_until_every_step_is_done(monkeypatch):
+    release = threading.Event()
+    warmup = Warmup(timeout=5)
+    monkeypatch.setattr(app, "warmup", warmup)
+    client = app.app.test_client()
+
+    def fail():
+        raise RuntimeError("CosmosDB is not reachable")
+
+    warmup.start({"upstream": lambda: release.wait(timeout=5), "cosmos": fail})
+    warming = client.get("/status")
+    assert warming.status_code == 503 and warming.json["state"] == "warming"
+    assert warming.json["steps"]["upstream"]["state"] == "pending"
+
+    release.set()
+    for _ in range(100):
+        if warmup.status()["state"] != "warming":
+            break
+        time.sleep(0.01)
+    done = client.get("/status")
+    assert done.status_code == 200 and done.json["state"] == "degraded"
+    assert done.json["steps"]["upstream"]["state"] == "ok"
+    assert done.json["steps"]["cosmos"] == {"state": "failed", "seconds": done.json["steps"]["cosmos"]["seconds"], "error": "CosmosDB is not reachable"}
+
+
+def test_client_warm_opens_pooled_connections():
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    peers = set()
+    arrived = threading.Barrier(3, timeout=5)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            peers.add(self.client_address)
+            arrived.wait()
+            self.send_response(401)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = AzureOpenAIClient(f"http://127.0.0.1:{server.server_port}/", "gpt", "key", pool_size=10)
+        # all three are in flight at once, so each needs its own connection
+        assert client.warm(3) == 3
+        assert len(peers) == 3
+        # and all three went back to the pool: warming again opens none
+        assert client.warm(3) == 3
+        assert len(peers) == 3
+        client.close()
+    finally:
+        server.shutdown()
+
+
+@pytest.mark.skipif(shutil.which("uwsgi") is None, reason="uwsgi is not installed")
+def test_docker_command_warms_every_worker(tmp_path):
+    import os
+    import socket
+    import subprocess
+    import urllib.error
+    import urllib.request
+    root = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(root, "WebApp.Dockerfile")) as dockerfile:
+        command = json.loads(next(line for line in dockerfile if line.startswith("CMD"))[len("CMD"):])
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    command[command.index(":80")] = f"127.0.0.1:{port}"
+    env = dict(os.environ, UWSGI_PROCESSES="2", WARMUP_ENABLED="true", WARMUP_TIMEOUT="60",
+               AZURE_OPENAI_ENDPOINT="http://127.0.0.1:9/", AZURE_OPENAI_KEY="key", AZURE_OPENAI_MODEL="gpt",
+               PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+    server = subprocess.Popen(command, cwd=root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def status():
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/status", timeout=5) as response:
+                return response.status
+        except urllib.error.HTTPError as error:
+            return error.code
+        except OSError:
+            return None
+
+    try:
+        deadline = time.monotonic() + 30
+        while status() != 200 and time.monotonic() < deadline:
+            time.sleep(0.2)
+        time.sleep(1)
+        # a worker whose warm-up thread never ran would answer 503 until WARMUP_TIMEOUT
+        assert [status() for _ in range(20)] == [200] * 20
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+class FakeAccessToken:
+    def __init__(self, token, expires_on):
+        self.token = token
+        self.expires_on = expires_on
+
+
+## every token fetched in this process, by any CountingCredential or copy of one
+FETCHED_TOKENS = []
+
+
+class CountingCredential:
+    ## hands out tokens that live for lifetime seconds, slowly, like a CLI credential
+    def __init__(self, lifetime):
+        self.lifetime = lifetime
+        self.calls = []
+
+    def get_token(self, *scopes, **kwargs):
+        self.calls.append((scopes, kwargs))
+        FETCHED_TOKENS.append(scopes)
+        time.sleep(0.05)
+        return FakeAccessToken(f"token-{len(self.calls)}", time.time() + self.lifetime)
+
+
+def test_cached_token_credential_fetches_once_and_refreshes_in_the_background():
+    credential = CountingCredential(lifetime=3600)
+    cached = CachedTokenCredential(credential, refresh_margin=300)
+    with ThreadPoolExecutor(8) as executor:
+        tokens = list(executor.map(lambda _: cached.get_token("https://cognitiveservices.azure.com/.default").token, range(100)))
+    assert set(tokens) == {"token-1"} and len(credential.calls) == 1
+    assert cached.get_token("https://management.azure.com/.default").token == "token-2"
+    assert cached.get_token("https://cognitiveservices.azure.com/.default", claims="x").token == "token-3"
+
+    # inside the refresh margin the old token is still handed out while its replacement is fetched
+    cached = CachedTokenCredential(CountingCredential(lifetime=200), refresh_margin=300)
+    assert cached.get_token("scope").token == "token-1"
+    assert cached.get_token("scope").token == "token-1"
+    for _ in range(100):
+        if cached.fetches == 2:
+            break
+        time.sleep(0.01)
+    assert cached.get_token("scope").token == "token-2"
+
+    # copies unpickled in one process share one cache
+    data = pickle.dumps(CachedTokenCredential(CountingCredential(lifetime=3600)))
+    first, second = pickle.loads(data), pickle.loads(data)
+    assert first.get_token("scope").token == second.get_token("scope").token == "token-1"
+    assert second.fetches == 1
+
+
+def test_cached_token_credential_refreshes_an_idle_token_before_it_expires():
+    class FlakyCredential(CountingCredential):
+        def get_token(self, *scopes, **kwargs):
+            token = super().get_token(*scopes, **kwargs)
+            if len(self.calls) == 2:
+                raise RuntimeError("identity endpoint unavailable")
+            return token
+
+    credential = FlakyCredential(lifetime=0.8)
+    cached = CachedTokenCredential(credential, refresh_margin=300, expiry_margin=0, retry_seconds=0.1)
+    assert cached.get_token("scope").token == "token-1"
+    # nobody asks again: the timer refreshes it halfway through its life, and retries the failure
+    for _ in range(100):
+        if cached.fetches == 2:
+            break
+        time.sleep(0.01)
+    assert cached.tokens[("scope",)].token == "token-3" and len(credential.calls) == 3
+    assert cached.get_token("scope").token == "token-3"
+    cached.close()
+    assert not cached.timers
+
+
+def embed_file(path, azure_credential=None):
+    ## a chunking task as data_utils.process_file runs it in a worker process
+    azure_credential.get_token("https://cognitiveservices.azure.com/.default")
+    return len(FETCHED_TOKENS)
+
+
+def test_cached_token_credential_fetches_once_per_worker_process():
+    # the partial, credential included, is pickled again for every file
+    task = functools.partial(embed_file, azure_credential=CachedTokenCredential(CountingCredential(lifetime=3600)))
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        first, second = executor.map(task, ["a.md", "b.md"])
+    assert second == first
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import socket
+import time
+
+import pytest
+
+import app
+import asgi
+from backend.settings import DataSourceSettings
+from backend.upstream.client import AsyncAzureOpenAIClient, AsyncUpstreamResponse
+from backend.upstream.hedge import AsyncHedger
+
+
+class FakeUpstreamClient:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def post(self, operation, api_version, body, headers=None):
+        async def chunks():
+            for chunk in self.chunks:
+                yield chunk
+        return AsyncUpstreamResponse(200, {"apim-request-id": "req-1"}, chunks(), lambda: None)
+
+
+def sse_line(delta, end_turn=False):
+    chunk = {"id": "1", "model": "gpt-35-turbo", "created": 1, "object": "chunk", "choices": [{"delta": delta, "end_turn": end_turn}]}
+    return b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n"
+
+
+def test_conversation_streams_from_upstream(monkeypatch):
+    body = sse_line({"role": "assistant"}) + sse_line({"content": "Hello"}) + sse_line({}, end_turn=True)
+    # split mid-line to make sure frames are reassembled across reads
+    monkeypatch.setattr(asgi, "async_azure_openai_client", FakeUpstreamClient([body[:17], body[17:]]))
+    monkeypatch.setattr(asgi, "should_use_data", lambda: True)
+    monkeypatch.setattr(app, "DATASOURCE_SETTINGS", DataSourceSettings("AzureCognitiveSearch", options=(("filter", None),)))
+
+    async def post():
+        client = asgi.quart_app.test_client()
+        response = await client.post("/conversation", json={"messages": [{"role": "user", "content": "Hi"}]})
+        return response.status_code, await response.get_data(as_text=True)
+
+    status_code, data = asyncio.run(post())
+    frames = [json.loads(line) for line in data.splitlines()]
+
+    assert status_code == 200
+    assert [frame["choices"][0]["messages"][0]["content"] for frame in frames] == ["", "Hello"]
+    assert frames[0]["apim-request-id"] == "req-1"
+    assert frames[0]["id"] == frames[1]["id"] != ""
+
+
+def test_async_streams_send_the_same_frames_as_the_flask_streams():
+    from backend.answer_cache import AnswerRecorder
+    from backend.upstream.client import UpstreamResponse
+    chunks = [{"id": "1", "model": "gpt-35-turbo", "created": 1, "object": "chat.completion.chunk", "choices": [{"delta": delta, "finish_reason": finish_reason}]}
+              for delta, finish_reason in [({"role": "assistant", "content": ""}, None), ({"content": "Hel"}, None), ({"content": "lo"}, None), ({}, "stop")]]
+    body = b"".join(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n" for chunk in chunks) + b"data: [DONE]\n\n"
+    tool_content = json.dumps({"citations": [{"content": "Hello", "title": "Greetings"}]})
+
+    def flask(stream, *args):
+        recorder = AnswerRecorder()
+        frames = list(stream(UpstreamResponse(200, {"apim-request-id": "req-1"}, iter([body]), lambda: None), *args, {"title": "t"}, "m-1", recorder))
+        return frames, recorder.answer()
+
+    def quart(stream, *args):
+        async def chunks():
+            yield body
+
+        async def relay():
+            recorder = AnswerRecorder()
+            frames = [frame async for frame in stream(AsyncUpstreamResponse(200, {"apim-request-id": "req-1"}, chunks(), lambda: None), *args, {"title": "t"}, "m-1", recorder)]
+            return frames, recorder.answer()
+        return asyncio.run(relay())
+
+    assert quart(asgi.stream_without_data) == flask(app.stream_without_data)
+    assert quart(asgi.stream_with_local_data, tool_content) == flask(app.stream_with_local_data, tool_content)
+    assert flask(app.stream_with_local_data, tool_content)[1]["tool"] == tool_content
+
+
+def test_other_routes_are_served_by_flask():
+    async def get():
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "http_version": "1.1", "method": "GET", "scheme": "http", "path": "/frontend_settings",
+                 "raw_path": b"/frontend_settings", "query_string": b"", "root_path": "", "headers": [], "server": ("testserver", 80)}
+        await asgi.app(scope, receive, send)
+        return sent
+
+    sent = asyncio.run(get())
+    assert sent[0]["status"] == 200
+    assert "auth_enabled" in json.loads(b"".join(m.get("body", b"") for m in sent[1:]))
+
+
+def test_async_client_gives_up_on_a_silent_upstream_after_the_read_timeout():
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+
+    async def post():
+        client = AsyncAzureOpenAIClient(f"http://127.0.0.1:{listener.getsockname()[1]}/", "gpt", "key", read_timeout=0.2)
+        try:
+            await client.post("chat/completions", "2023-08-01-preview", {"stream": True})
+        finally:
+            await client.close()
+
+    start = time.monotonic()
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(asyncio.wait_for(post(), 5))
+        assert time.monotonic() - start < 2
+    finally:
+        listener.close()
+
+
+class PausingUpstreamClient:
+    def __init__(self, chunks, pause_seconds):
+        self.chunks = chunks
+        self.pause_seconds = pause_seconds
+
+    async def post(self, operation, api_version, body, headers=None):
+        async def chunks():
+            for i, chunk in enumerate(self.chunks):
+                if i:
+                    await asyncio.sleep(self.pause_seconds)
+                yield chunk
+        return AsyncUpstreamResponse(200, {}, chunks(), lambda: None)
+
+
+def test_coalesced_deltas_are_flushed_while_upstream_pauses(monkeypatch):
+    first = sse_line({"role": "assistant"}) + sse_line({"content": "Hel"}) + sse_line({"content": "lo"})
+    monkeypatch.setattr(asgi, "async_azure_openai_client", PausingUpstreamClient([first, sse_line({"content": " world"}) + sse_line({}, end_turn=True)], 0.5))
+    # the relay, and so its coalescing window, comes from app.py as in the Flask app
+    monkeypatch.setattr(app, "AZURE_OPENAI_STREAM_COALESCE_MS", 50)
+
+    async def stream():
+        start = asyncio.get_running_loop().time()
+        return [(asyncio.get_running_loop().time() - start, json.loads(frame)) async for frame in asgi.stream_with_data({}, {})]
+
+    frames = asyncio.run(stream())
+
+    assert [frame["choices"][0]["messages"][0]["content"] for _, frame in frames] == ["", "Hello", " world"]
+    assert frames[1][0] < 0.3 <= frames[2][0]
+
+
+class SlowStartUpstreamClient:
+    def __init__(self, chunk, start_seconds):
+        self.chunk = chunk
+        self.start_seconds = start_seconds
+
+    async def post(self, operation, api_version, body, headers=None):
+        async def chunks():
+            await asyncio.sleep(self.start_seconds)
+            yield self.chunk
+        return AsyncUpstreamResponse(200, {}, chunks(), lambda: None)
+
+
+def test_async_hedger_relays_the_stream_that_starts_first():
+    clients = iter([SlowStartUpstreamClient(b"data: slow\n\n", 5), SlowStartUpstreamClient(b"data: fast\n\n", 0)])
+
+    class Client:
+        async def post(self, *args, **kwargs):
+            return await next(clients).post(*args, **kwargs)
+
+    hedger = AsyncHedger(delay_ms=50, budget=1)
+
+    async def post():
+        response = await hedger.post(Client(), "chat/completions", "2023-08-01-preview", {"stream": True}, route="chat")
+        return [line async for line in response.iter_lines()]
+
+    assert asyncio.run(asyncio.wait_for(post(), 1)) == [b"data: fast", b""]
+    assert hedger.stats()["chat"]["hedge_wins"] == 1